@@ -0,0 +1,196 @@
+from typing import Dict, List, Optional
+
+import json
+import logging
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    handlers=[logging.StreamHandler()],
+)
+logger = logging.getLogger(__name__)
+
+# 需要人工确认的地方：可选的回答，以及无人值守时默认的回答
+GATES = {
+    "delete_todo": (("y", "n"), "n"),
+    "delete_todo_list": (("y", "n"), "n"),
+    "unreadable_files": (("pass",), "pass"),
+    "plan": (("pass", "reject"), "pass"),
+    "review": (("pass", "reject"), "pass"),
+}
+
+INTERACTIVE = "interactive"
+
+# 按规则检查时，最多驳回的轮数，避免一直不通过
+DEFAULT_MAX_ROUNDS = 3
+
+APPROVAL_MODES = ["interactive", "auto-pass", "auto-reject", "file"]
+
+
+def _ask_human(gate: str, prompt: str) -> str:
+    choices, _ = GATES[gate]
+    if choices == ("y", "n"):
+        return "y" if input(prompt) == "y" else "n"
+
+    while True:
+        answer = input(prompt)
+        if answer in choices:
+            return answer
+
+
+def _check_rule(gate: str, rule: Dict) -> None:
+    if gate not in GATES:
+        raise ValueError(f"未知的审批点: {gate}")
+
+    choices, _ = GATES[gate]
+    answer = rule.get("answer")
+    if answer not in (None, INTERACTIVE, "pass") and answer not in choices:
+        raise ValueError(f"审批点{gate}的回答只能是{'/'.join(choices)}或{INTERACTIVE}: {answer}")
+
+
+class ApprovalPolicy:
+    """
+    审批策略，决定需要人工确认的地方如何回答
+
+    每个审批点一条规则，没有规则的审批点使用 default：
+    - {"answer": "pass"}：固定回答，"interactive" 表示由人在终端输入
+    - {"max_rounds": N, ...}：按规则检查，不满足规则时驳回，驳回 N 轮后自动通过
+      - "always_reject": 总是驳回，即修改 N 轮后自动通过
+      - "reject_keywords": 内容包含任一关键词时驳回
+      - "max_steps": 执行计划超过这么多步时驳回
+    """
+
+    def __init__(self, rules: Optional[Dict[str, Dict]] = None, default: Optional[Dict] = None):
+        self.rules = rules or {}
+        self.default = default or {"answer": INTERACTIVE}
+
+        for gate, rule in self.rules.items():
+            _check_rule(gate, rule)
+
+    def is_interactive(self) -> bool:
+        """是否有审批点需要在终端询问；终端询问会阻塞事件循环，不能和其他项目并发执行"""
+        return any(
+            self.rules.get(gate, self.default).get("answer") == INTERACTIVE for gate in GATES
+        )
+
+    def decide(self, gate: str, context: Optional[Dict] = None) -> Optional[str]:
+        """
+        决定审批点的回答
+
+        Args:
+            gate: 审批点，见 GATES
+            context: 审批的内容，"round" 为第几轮，"content" 为需要检查的文本，"steps" 为执行计划
+
+        Returns:
+            回答，需要人工确认时返回 None
+        """
+        context = context or {}
+        choices, pass_answer = GATES[gate]
+        rule = self.rules.get(gate, self.default)
+
+        if "answer" in rule:
+            if rule["answer"] == INTERACTIVE:
+                return None
+            # "pass" 对删除类审批点表示保留已有文件
+            return rule["answer"] if rule["answer"] in choices else pass_answer
+
+        if "reject" not in choices:
+            return pass_answer
+
+        reasons = self._reject_reasons(rule, context)
+        if reasons and context.get("round", 0) < rule.get("max_rounds", DEFAULT_MAX_ROUNDS):
+            logger.info(f"审批点{gate}自动驳回: {'；'.join(reasons)}")
+            return "reject"
+
+        return pass_answer
+
+    def _reject_reasons(self, rule: Dict, context: Dict) -> List[str]:
+        reasons = []
+        if rule.get("always_reject"):
+            reasons.append("继续修改")
+
+        content = context.get("content", "")
+        keywords = [keyword for keyword in rule.get("reject_keywords", []) if keyword in content]
+        if keywords:
+            reasons.append(f"包含关键词{'、'.join(keywords)}")
+
+        steps = context.get("steps")
+        if "max_steps" in rule and steps is not None and len(steps) > rule["max_steps"]:
+            reasons.append(f"执行计划有{len(steps)}步，超过{rule['max_steps']}步")
+
+        return reasons
+
+    def ask(self, gate: str, prompt: str, context: Optional[Dict] = None) -> str:
+        """回答审批点，策略无法决定时在终端询问"""
+        answer = self.decide(gate, context)
+        if answer is None:
+            return _ask_human(gate, prompt)
+
+        logger.info(f"审批点{gate}自动回答: {answer}")
+        return answer
+
+
+def auto_pass_policy() -> ApprovalPolicy:
+    """所有审批点自动通过，已有的 todo.md、todo_list.md 保留"""
+    return ApprovalPolicy(default={"answer": "pass"})
+
+
+def auto_reject_policy(max_rounds: int) -> ApprovalPolicy:
+    """审核意见自动驳回，开发 max_rounds 轮后通过，其他审批点自动通过"""
+    return ApprovalPolicy(
+        rules={"review": {"always_reject": True, "max_rounds": max_rounds}},
+        default={"answer": "pass"},
+    )
+
+
+def load_policy_file(path: str) -> ApprovalPolicy:
+    """
+    从 JSON 文件加载审批策略，格式如下：
+
+    {
+        "default": {"answer": "pass"},
+        "gates": {
+            "plan": {"max_steps": 30, "reject_keywords": ["rm -rf"], "max_rounds": 2},
+            "review": {"reject_keywords": ["未实现"], "max_rounds": 5}
+        }
+    }
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+
+    return ApprovalPolicy(rules=data.get("gates", {}), default=data.get("default"))
+
+
+def build_policy(
+    mode: str = "interactive", max_rounds: int = DEFAULT_MAX_ROUNDS, policy_file: str = ""
+) -> ApprovalPolicy:
+    """根据 main.py 的命令行参数创建审批策略"""
+    if mode == "auto-pass":
+        return auto_pass_policy()
+    if mode == "auto-reject":
+        return auto_reject_policy(max_rounds)
+    if mode == "file":
+        if not policy_file:
+            raise ValueError("使用 file 审批策略时需要指定策略文件")
+        return load_policy_file(policy_file)
+    if mode == "interactive":
+        return ApprovalPolicy()
+
+    raise ValueError(f"未知的审批策略: {mode}")
+
+
+_policy = ApprovalPolicy()
+
+
+def set_policy(policy: ApprovalPolicy) -> None:
+    global _policy
+    _policy = policy
+
+
+def get_policy() -> ApprovalPolicy:
+    return _policy
+
+
+def ask(gate: str, prompt: str, context: Optional[Dict] = None) -> str:
+    """按当前的审批策略回答审批点"""
+    return _policy.ask(gate, prompt, context)
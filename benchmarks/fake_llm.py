@@ -0,0 +1,115 @@
+from typing import Any, Callable, List, Optional
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+from token_budget import count_tokens
+
+import re
+import asyncio
+
+# 脚本根据收到的消息和绑定的工具名返回模型的应答
+Script = Callable[[List[BaseMessage], List[str]], AIMessage]
+
+
+class ScriptedChatModel(BaseChatModel):
+    """
+    按脚本应答的聊天模型，用于在不访问模型服务的情况下测量工作流本身的开销
+
+    支持 bind_tools，所以 with_structured_output 和 create_agent 都可以直接使用：
+    脚本返回调用结构化输出工具的消息即可。token 用量按输入和输出估算，
+    通过 llm_metrics 的回调统计，和真实模型的记录方式一致。
+    """
+
+    script: Script
+    model_name: str = "qwen-plus"
+    latency: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted"
+
+    def bind_tools(self, tools, *, tool_choice=None, **kwargs):
+        return self.bind(tools=[convert_to_openai_tool(tool) for tool in tools], **kwargs)
+
+    def _respond(self, messages: List[BaseMessage], tools: Optional[List]) -> ChatResult:
+        names = [tool["function"]["name"] for tool in tools or []]
+        message = self.script(messages, names)
+        prompt_tokens = sum(count_tokens(str(m.content)) for m in messages)
+        completion_tokens = count_tokens(str(message.content) + str(message.tool_calls))
+        message.usage_metadata = {
+            "input_tokens": prompt_tokens,
+            "output_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager=None,
+        tools: Optional[List] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        return self._respond(messages, tools)
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager=None,
+        tools: Optional[List] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        return self._respond(messages, tools)
+
+
+def tool_call(name: str, args: dict, call_id: str = "call_0") -> AIMessage:
+    return AIMessage(content="", tool_calls=[{"name": name, "args": args, "id": call_id}])
+
+
+def _called_tools(messages: List[BaseMessage]) -> bool:
+    return any(isinstance(message, ToolMessage) for message in messages)
+
+
+def plan_script(steps: int) -> Script:
+    """制定计划：返回 steps 个互不相关的步骤"""
+
+    def script(messages, tools):
+        return tool_call(
+            tools[0], {"steps": [f"在 module_{i}.py 中实现需求点 {i}" for i in range(steps)]}
+        )
+
+    return script
+
+
+def replan_script(messages, tools) -> AIMessage:
+    """重新规划：直接结束本轮开发"""
+    return tool_call(tools[0], {"action": {"response": "本轮开发完成"}})
+
+
+def execute_script(messages, tools) -> AIMessage:
+    """执行步骤：把任务（不含之前步骤的记忆）交给代码专家，拿到结果后结束"""
+    if _called_tools(messages):
+        return AIMessage(content="任务完成")
+
+    task = re.search(r"完成这个任务：(.*)", str(messages[-1].content))
+    return tool_call("code_professional", {"prompt": task.group(1) if task else ""})
+
+
+def review_script(messages, tools) -> AIMessage:
+    """审核：先读开发日志（日志过长时会触发总结），再审核通过"""
+    if _called_tools(messages):
+        return tool_call("Act", {"action": {"response": "审核通过"}}, "call_1")
+
+    return tool_call("read_development_log", {})
+
+
+def text_script(messages, tools) -> AIMessage:
+    """总结和改进意见：返回输入的开头部分"""
+    return AIMessage(content=str(messages[-1].content)[:200])
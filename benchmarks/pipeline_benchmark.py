@@ -0,0 +1,380 @@
+"""
+端到端性能基准
+
+用脚本化的假模型（benchmarks/fake_llm.py）代替所有 LLM，用 sim_sdk（MOCK 模式）代替 cursor-agent，
+运行 main.main 和 execute_zgraph.execute_zgraph，测量工作流本身的吞吐：
+总耗时、各节点耗时、峰值内存和 LLM 调用次数。结果保存为 JSON，可以在版本之间比较。
+
+在项目根目录下运行（需要 config.json）：
+
+    python -m benchmarks.pipeline_benchmark
+    python -m benchmarks.pipeline_benchmark --targets zgraph --plan-steps 1 10 --todo-chars 200000
+    python -m benchmarks.pipeline_benchmark --compare benchmarks/results/a.json benchmarks/results/b.json
+"""
+
+from contextlib import ExitStack, contextmanager
+from dataclasses import asdict, dataclass
+from typing import Dict, Iterator, List
+from unittest.mock import patch
+from langchain.agents import create_agent
+
+from benchmarks.fake_llm import (
+    ScriptedChatModel,
+    execute_script,
+    plan_script,
+    replan_script,
+    review_script,
+    text_script,
+)
+from approval_policy import auto_pass_policy, set_policy
+from cursor_executor import close_sim_clients
+from execute_custom_type import Act as ReplanAct, Plan
+from custom_type import Act as ReviewAct
+from llm_metrics import metrics_handler, metrics_recorder
+from run_context import make_context, use_context
+from summary_service import SummaryCache, SummaryService
+from snapshot_store import SnapshotStore
+from tracing import tracer
+
+import os
+import sys
+import json
+import time
+import shutil
+import asyncio
+import logging
+import argparse
+import platform
+import itertools
+import tempfile
+import subprocess
+import tracemalloc
+
+import main
+import tracing
+import review_node
+import review_tool
+import snapshot_store
+import checkpoint_store
+import summary_service
+import execute_zgraph
+import execute_plan_node
+import execute_replan_node
+import execute_execute_node
+import execute_execute_tool
+
+RESULTS_DIR = os.path.join(".", "benchmarks", "results")
+SIM_CURSOR_PATH = os.path.abspath(
+    os.path.join(os.path.dirname(__file__), "..", "sim_sdk", "sim_sdk.py")
+)
+TARGETS = ["main", "zgraph"]
+
+
+@dataclass(frozen=True)
+class Case:
+    """一组基准参数：运行哪个工作流、计划步数、需求文档大小（字符）和开发日志大小（行）"""
+
+    target: str
+    plan_steps: int
+    todo_chars: int
+    log_lines: int
+
+    @property
+    def project(self) -> str:
+        return f"bench-{self.target}-s{self.plan_steps}-t{self.todo_chars}-l{self.log_lines}"
+
+
+def _write_inputs(case: Case) -> None:
+    todo_dir = os.path.join(".", "todo", case.project)
+    os.makedirs(todo_dir, exist_ok=True)
+    line = "- 需求点：实现一个可以配置的数据导入模块，支持 CSV 和 JSON 两种格式。\n"
+    with open(os.path.join(todo_dir, "todo.md"), "w", encoding="utf-8") as f:
+        f.write("# 需求\n\n" + line * max(1, case.todo_chars // len(line)))
+
+    dist_dir = os.path.join(".", "dist", case.project)
+    os.makedirs(dist_dir, exist_ok=True)
+    log = "".join(f"第{i}步：完成 module_{i}.py，测试通过。\n" for i in range(case.log_lines))
+    for name in ("development_log.md", "development.log"):
+        if log:
+            with open(os.path.join(dist_dir, name), "w", encoding="utf-8") as f:
+                f.write(log)
+
+
+def _cleanup(project: str) -> None:
+    for path in (
+        os.path.join(".", "todo", project),
+        os.path.join(".", "dist", project),
+        os.path.join(".", "history", project),
+    ):
+        shutil.rmtree(path, ignore_errors=True)
+
+    for path in (
+        os.path.join(".", "opinion", f"{project}.md"),
+        os.path.join(".", ".cache", "ingest", f"{project}.json"),
+    ):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def _model(script, model_name: str) -> ScriptedChatModel:
+    return ScriptedChatModel(script=script, model_name=model_name, callbacks=[metrics_handler])
+
+
+@contextmanager
+def _fake_environment(case: Case, work_dir: str, sim_server: bool = False) -> Iterator[Dict]:
+    """
+    把各模块的模型换成脚本化的假模型，检查点、快照、总结缓存、指标和耗时记录写到临时目录
+
+    Returns:
+        项目的配置覆盖项，开启 MOCK 模式使用 sim_sdk，sim_server 为 True 时使用常驻的 sim_sdk 服务
+    """
+    overrides = {
+        "MOCK": True,
+        "SIM_CURSOR_PATH": SIM_CURSOR_PATH,
+        "SIM_SDK_SERVER": sim_server,
+        "CURSOR_API_KEY": "benchmark",
+    }
+    summary = summary_service.summary_service
+    plan_agent = execute_plan_node.plan_prompt | _model(
+        plan_script(case.plan_steps), "qwen-max"
+    ).with_structured_output(Plan)
+    improve_opinion_agent = execute_plan_node.improve_opinion_prompt | _model(
+        text_script, "qwen-plus"
+    )
+    replan_agent = execute_replan_node._prompt | _model(
+        replan_script, "qwen-max"
+    ).with_structured_output(ReplanAct)
+    execute_agent = create_agent(
+        model=_model(execute_script, "qwen-plus"), tools=execute_execute_tool.tools
+    )
+    review_agent = create_agent(
+        model=_model(review_script, "qwen-plus"),
+        tools=review_tool.tools,
+        response_format=ReviewAct,
+    )
+
+    with ExitStack() as stack:
+        for target, name, value in [
+            (execute_plan_node, "_init_agent", lambda: plan_agent),
+            (execute_plan_node, "_init_improve_opinion_agent", lambda: improve_opinion_agent),
+            (execute_replan_node, "_init_agent", lambda: replan_agent),
+            (execute_execute_node, "_init_agent", lambda: execute_agent),
+            (review_node, "init_agent", lambda: review_agent),
+            (
+                summary_service,
+                "summary_service",
+                SummaryService(
+                    _model(text_script, "deepseek-chat"),
+                    summary.prompts,
+                    SummaryCache(os.path.join(work_dir, "summary"), summary.cache.max_bytes),
+                ),
+            ),
+            (
+                checkpoint_store,
+                "config",
+                {
+                    **checkpoint_store.config,
+                    "CHECKPOINT_DB": os.path.join(work_dir, "checkpoints.sqlite"),
+                },
+            ),
+            (
+                main,
+                "config",
+                {**main.config, "PROJECTS": {case.project: overrides}},
+            ),
+            (snapshot_store, "snapshot_store", SnapshotStore(os.path.join(work_dir, "store"))),
+            (tracing, "config", {**tracing.config, "TRACE_DIR": os.path.join(work_dir, "traces")}),
+            (metrics_recorder, "metrics_dir", os.path.join(work_dir, "metrics")),
+        ]:
+            stack.enter_context(patch.object(target, name, value))
+
+        yield overrides
+
+
+def _span_summary(start: int) -> Dict[str, Dict[str, Dict]]:
+    """按类别和名字汇总耗时片段：次数、总耗时（秒）和出错次数"""
+    summary: Dict[str, Dict[str, Dict]] = {}
+    for event in tracer.chrome_trace(start)["traceEvents"]:
+        item = summary.setdefault(event["cat"], {}).setdefault(
+            event["name"], {"count": 0, "seconds": 0.0, "errors": 0}
+        )
+        item["count"] += 1
+        item["seconds"] += event["dur"] / 1e6
+        item["errors"] += "error" in event["args"]
+
+    return summary
+
+
+def _llm_summary(run: int) -> Dict:
+    calls = {}
+    for (node, model), item in metrics_recorder.rollup(run).items():
+        calls[f"{node}/{model}"] = {
+            "calls": item["calls"],
+            "prompt_tokens": item["prompt_tokens"],
+            "completion_tokens": item["completion_tokens"],
+        }
+
+    return {"total": sum(item["calls"] for item in calls.values()), "by_node": calls}
+
+
+async def run_case(case: Case, sim_server: bool = False) -> Dict:
+    """运行一组基准参数，返回测量结果"""
+    _cleanup(case.project)
+    _write_inputs(case)
+
+    with tempfile.TemporaryDirectory() as work_dir, _fake_environment(
+        case, work_dir, sim_server
+    ) as overrides:
+        trace_start = tracer.start_run()
+        metrics_run = metrics_recorder.start_run()
+        tracemalloc.start()
+        start = time.perf_counter()
+        try:
+            if case.target == "main":
+                await main.main(projects=[case.project])
+            else:
+                context = make_context({**main.config, **overrides}, case.project)
+                with use_context(context):
+                    await execute_zgraph.execute_zgraph({"count": 0})
+                await close_sim_clients()
+        finally:
+            wall_seconds = time.perf_counter() - start
+            _, peak_memory = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            _cleanup(case.project)
+
+    spans = _span_summary(trace_start)
+    llm_calls = _llm_summary(metrics_run)
+    metrics_recorder.end_run(metrics_run)
+
+    return {
+        "case": asdict(case),
+        "wall_seconds": wall_seconds,
+        "peak_memory_bytes": peak_memory,
+        "nodes": {name: item["seconds"] for name, item in spans.get("node", {}).items()},
+        "spans": spans,
+        "llm_calls": llm_calls,
+    }
+
+
+def _git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+async def run_benchmarks(cases: List[Case], sim_server: bool = False) -> Dict:
+    set_policy(auto_pass_policy())
+    results = []
+    for case in cases:
+        print(f"运行 {case.project} ...", file=sys.stderr)
+        results.append(await run_case(case, sim_server))
+
+    return {
+        "revision": _git_revision(),
+        "sim_server": sim_server,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "results": results,
+    }
+
+
+def save_results(report: Dict, output: str = "") -> str:
+    if not output:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        name = f"{time.strftime('%Y%m%d_%H%M%S')}_{report['revision'] or 'unknown'}.json"
+        output = os.path.join(RESULTS_DIR, name)
+
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    return output
+
+
+def format_report(report: Dict) -> str:
+    lines = ["用例 | 总耗时(秒) | 峰值内存(MB) | LLM 调用 | 各节点耗时(秒)"]
+    for result in report["results"]:
+        nodes = ", ".join(f"{name}={seconds:.2f}" for name, seconds in result["nodes"].items())
+        lines.append(
+            f"{Case(**result['case']).project} | {result['wall_seconds']:.2f} | "
+            f"{result['peak_memory_bytes'] / 1024 / 1024:.1f} | "
+            f"{result['llm_calls']['total']} | {nodes}"
+        )
+
+    return "\n".join(lines)
+
+
+def compare_reports(base: Dict, head: Dict) -> str:
+    """比较两次基准的结果，只比较两边都有的用例"""
+    base_results = {Case(**r["case"]): r for r in base["results"]}
+    lines = [
+        f"{base['revision'] or '基准'} -> {head['revision'] or '当前'}",
+        "用例 | 总耗时(秒) | 峰值内存(MB) | LLM 调用",
+    ]
+    for result in head["results"]:
+        case = Case(**result["case"])
+        before = base_results.get(case)
+        if before is None:
+            continue
+
+        ratio = result["wall_seconds"] / before["wall_seconds"] if before["wall_seconds"] else 0
+        lines.append(
+            f"{case.project} | {before['wall_seconds']:.2f} -> {result['wall_seconds']:.2f} "
+            f"({ratio:.2f}x) | {before['peak_memory_bytes'] / 1024 / 1024:.1f} -> "
+            f"{result['peak_memory_bytes'] / 1024 / 1024:.1f} | "
+            f"{before['llm_calls']['total']} -> {result['llm_calls']['total']}"
+        )
+
+    return "\n".join(lines)
+
+
+def build_cases(
+    targets: List[str], plan_steps: List[int], todo_chars: List[int], log_lines: List[int]
+) -> List[Case]:
+    return [
+        Case(*values) for values in itertools.product(targets, plan_steps, todo_chars, log_lines)
+    ]
+
+
+parser = argparse.ArgumentParser(description="端到端性能基准")
+parser.add_argument("--targets", nargs="+", choices=TARGETS, default=TARGETS)
+parser.add_argument("--plan-steps", nargs="+", type=int, default=[1, 5, 20])
+parser.add_argument("--todo-chars", nargs="+", type=int, default=[2000, 200000])
+parser.add_argument("--log-lines", nargs="+", type=int, default=[0, 5000])
+parser.add_argument("--output", default="", help="结果文件，默认写入 benchmarks/results/")
+parser.add_argument("--compare", nargs=2, metavar=("BASE", "HEAD"), help="比较两次基准的结果")
+parser.add_argument(
+    "--sim-profile", default="", help="sim_sdk 的负载配置（JSON 字符串或文件），默认固定 0.5 秒"
+)
+parser.add_argument(
+    "--sim-server", action="store_true", help="通过常驻的 sim_sdk 服务调用，不再每次启动子进程"
+)
+parser.add_argument("--verbose", action="store_true", help="输出工作流的日志")
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare[0], "r", encoding="utf-8") as f:
+            base = json.load(f)
+        with open(args.compare[1], "r", encoding="utf-8") as f:
+            head = json.load(f)
+        print(compare_reports(base, head))
+        sys.exit(0)
+
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+
+    if args.sim_profile:
+        # sim_sdk 子进程继承环境变量
+        os.environ["SIM_SDK_PROFILE"] = args.sim_profile
+
+    cases = build_cases(args.targets, args.plan_steps, args.todo_chars, args.log_lines)
+    report = asyncio.run(run_benchmarks(cases, args.sim_server))
+    print(format_report(report))
+    print(f"结果已写入 {save_results(report, args.output)}")
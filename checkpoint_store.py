@@ -0,0 +1,126 @@
+from contextlib import asynccontextmanager, closing
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
+
+import os
+import json
+import asyncio
+import logging
+import sqlite3
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    handlers=[logging.StreamHandler()],
+)
+logger = logging.getLogger(__name__)
+
+config = json.load(open("./config.json", "r", encoding="utf-8"))
+
+CHECKPOINT_DB = "./.cache/checkpoints.sqlite"
+
+
+def _db_path() -> str:
+    return config.get("CHECKPOINT_DB", CHECKPOINT_DB)
+
+
+def thread_id(project: str, round: Optional[int] = None) -> str:
+    """
+    检查点的线程 ID
+
+    主流程每个项目一个线程；开发流程每个项目、每轮开发一个线程。
+    """
+    if round is None:
+        return project
+
+    return f"{project}/round_{round}"
+
+
+def thread_config(project: str, round: Optional[int] = None) -> Dict:
+    return {"configurable": {"thread_id": thread_id(project, round)}}
+
+
+@asynccontextmanager
+async def open_checkpointer() -> AsyncIterator[AsyncSqliteSaver]:
+    """打开保存在本地 SQLite 中的检查点"""
+    path = _db_path()
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    async with AsyncSqliteSaver.from_conn_string(path) as saver:
+        yield saver
+
+
+def _connect_step_results() -> sqlite3.Connection:
+    path = _db_path()
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    conn = sqlite3.connect(path, timeout=30)
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS step_results ("
+        "thread_id TEXT NOT NULL, batch INTEGER NOT NULL, step_index INTEGER NOT NULL, "
+        "step TEXT NOT NULL, result TEXT NOT NULL, "
+        "PRIMARY KEY (thread_id, batch, step_index))"
+    )
+    return conn
+
+
+def save_step_result(thread: str, batch: int, index: int, step: str, result: Any) -> None:
+    """
+    记录计划中一个已经完成的步骤
+
+    一次执行节点会执行整批计划，检查点只在节点结束时保存；每完成一个步骤就记录下来，
+    中断后继续执行时跳过已经完成的步骤。batch 区分同一线程中先后执行的各批计划。
+    """
+    with closing(_connect_step_results()) as conn, conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO step_results VALUES (?, ?, ?, ?, ?)",
+            (thread, batch, index, step, json.dumps(result, ensure_ascii=False)),
+        )
+
+
+def load_step_results(thread: str, batch: int) -> Dict[int, Tuple[str, Any]]:
+    """返回一批计划中已经完成的步骤：步骤下标 -> (步骤, 执行结果)"""
+    with closing(_connect_step_results()) as conn:
+        rows = conn.execute(
+            "SELECT step_index, step, result FROM step_results WHERE thread_id = ? AND batch = ?",
+            (thread, batch),
+        ).fetchall()
+
+    return {index: (step, json.loads(result)) for index, step, result in rows}
+
+
+def clear_step_results(thread: str) -> None:
+    """删除线程及其下各轮开发线程记录的步骤"""
+    with closing(_connect_step_results()) as conn, conn:
+        conn.execute(
+            "DELETE FROM step_results WHERE thread_id = ? OR substr(thread_id, 1, ?) = ?",
+            (thread, len(thread) + 1, f"{thread}/"),
+        )
+
+
+async def can_resume(app, run_config: Dict) -> bool:
+    """线程中有检查点，且还有未执行的节点时可以继续执行"""
+    snapshot = await app.aget_state(run_config)
+
+    return bool(snapshot.next)
+
+
+async def clear_project(saver: AsyncSqliteSaver, project: str) -> None:
+    """删除项目所有线程（主流程和各轮开发流程）的检查点"""
+    thread_ids = set()
+    async for checkpoint in saver.alist(None):
+        current = checkpoint.config["configurable"]["thread_id"]
+        if current == project or current.startswith(f"{project}/"):
+            thread_ids.add(current)
+
+    for current in thread_ids:
+        await saver.adelete_thread(current)
+
+    await asyncio.to_thread(clear_step_results, project)
+
+    if thread_ids:
+        logger.info(f"已清除项目{project}的{len(thread_ids)}个检查点线程")
@@ -1,13 +1,22 @@
 from custom_type import ActionReview
+from snapshot_store import snapshot_project, prune_project_snapshots
+from approval_policy import ask
+from run_context import current_config
+from typing import Dict
 
 import os
 import stat
-import shutil
 import json
+import asyncio
 import logging
 
 config = json.load(open("./config.json", "r", encoding="utf-8"))
 
+
+def _config() -> Dict:
+    return current_config(config)
+
+
 logging.basicConfig(
     level=logging.INFO,
     format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
@@ -23,6 +32,7 @@ def remove_readonly(func, path, _):
 
 
 async def counter_node(state: ActionReview) -> ActionReview:
+    cfg = _config()
     count = 0
     if "count" in state:
         count = state["count"]
@@ -32,23 +42,24 @@ async def counter_node(state: ActionReview) -> ActionReview:
     if "response" in state and len(state["response"]) > 0:
         return {"response": state["response"]}
 
-    opinion_file_path = os.path.join(".", "opinion", f"{config['PROJECT_NAME']}.md")
+    opinion_file_path = os.path.join(".", "opinion", f"{cfg['PROJECT_NAME']}.md")
     if count != 0 and os.path.exists(opinion_file_path):
-        check_input = ""
-        while check_input != "pass" and check_input != "reject":
-            check_input = input(
-                f"请检查审核意见->{opinion_file_path}。如果你认为没有必要继续修改，请输入pass。如果你认为有必要继续修改，请输入reject："
-            )
+        with open(opinion_file_path, "r", encoding="utf-8") as f:
+            opinion = f.read()
+
+        check_input = ask(
+            "review",
+            f"请检查审核意见->{opinion_file_path}。如果你认为没有必要继续修改，请输入pass。如果你认为有必要继续修改，请输入reject：",
+            {"round": count, "content": opinion},
+        )
 
         if check_input == "pass":
             return {"response": "pass"}
 
-    dist_dir = os.path.join(".", "dist", config["PROJECT_NAME"])
+    dist_dir = os.path.join(".", "dist", cfg["PROJECT_NAME"])
     if os.path.exists(dist_dir):
-        history_dir = os.path.join(".", "history", config["PROJECT_NAME"])
-        if os.path.exists(history_dir):
-            shutil.rmtree(history_dir, onerror=remove_readonly)
-
-        shutil.copytree(dist_dir, history_dir, dirs_exist_ok=True)
+        # 每轮开始前打一次快照，只有发生变化的文件会被复制
+        await asyncio.to_thread(snapshot_project, cfg["PROJECT_NAME"], f"round_{count}")
+        await asyncio.to_thread(prune_project_snapshots, cfg["PROJECT_NAME"])
 
     return {"count": count}
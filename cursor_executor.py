@@ -0,0 +1,389 @@
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+from tracing import span
+
+import os
+import sys
+import json
+import time
+import signal
+import asyncio
+import logging
+import platform
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    handlers=[logging.StreamHandler()],
+)
+logger = logging.getLogger(__name__)
+
+# 执行失败时返回给调用方的信息
+EXECUTE_FAIL_MESSAGE = "执行失败！"
+
+
+@dataclass
+class ExecuteResult:
+    """子进程执行结果"""
+
+    exit_code: int
+    duration: float
+    stdout: str
+    stderr: str
+    timed_out: bool = False
+
+    @property
+    def ok(self) -> bool:
+        return self.exit_code == 0 and not self.timed_out
+
+
+def _build_argv(script_command: str) -> list:
+    """根据操作系统构造执行命令的参数列表"""
+    if platform.system() == "Windows":
+        return ["cmd", "/c", script_command]
+
+    return ["bash", "-c", script_command]
+
+
+async def _kill_process(process: asyncio.subprocess.Process):
+    """终止子进程及其派生的子进程（cursor-agent 由 shell 启动）"""
+    if process.returncode is not None:
+        return
+
+    try:
+        if platform.system() == "Windows":
+            killer = await asyncio.create_subprocess_exec(
+                "taskkill",
+                "/F",
+                "/T",
+                "/PID",
+                str(process.pid),
+                stdout=asyncio.subprocess.DEVNULL,
+                stderr=asyncio.subprocess.DEVNULL,
+            )
+            await killer.wait()
+        else:
+            os.killpg(process.pid, signal.SIGKILL)
+    except (ProcessLookupError, OSError):
+        pass
+
+    try:
+        process.kill()
+    except ProcessLookupError:
+        pass
+
+    await process.wait()
+
+
+async def execute_script(
+    script_command: str,
+    cwd: str,
+    env_vars: Optional[Dict[str, str]] = None,
+    timeout: Optional[float] = None,
+) -> ExecuteResult:
+    """
+    异步执行脚本，不阻塞事件循环
+
+    Args:
+        script_command: 要执行的命令字符串
+        cwd: 命令的工作目录
+        env_vars: 要传递的环境变量字典，例如 {"CURSOR_API_KEY": "..."}
+        timeout: 超时时间（秒），为 None 时不限制
+
+    Returns:
+        ExecuteResult，包含退出码、耗时、标准输出和标准错误
+
+    Raises:
+        asyncio.CancelledError: 调用被取消时，子进程会先被终止再抛出
+    """
+    env = os.environ.copy()
+    if env_vars:
+        env.update({k: str(v) for k, v in env_vars.items()})
+
+    kwargs = {}
+    if platform.system() != "Windows":
+        # 新建进程组，超时或取消时可以连同 cursor-agent 一起终止
+        kwargs["start_new_session"] = True
+
+    with span("cursor-agent", "subprocess") as current:
+        start = time.monotonic()
+        process = await asyncio.create_subprocess_exec(
+            *_build_argv(script_command),
+            cwd=cwd,
+            env=env,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            **kwargs,
+        )
+
+        timed_out = False
+        try:
+            stdout, stderr = await asyncio.wait_for(process.communicate(), timeout=timeout)
+        except asyncio.TimeoutError:
+            timed_out = True
+            await _kill_process(process)
+            stdout, stderr = b"", b""
+        except asyncio.CancelledError:
+            await _kill_process(process)
+            raise
+
+        result = ExecuteResult(
+            exit_code=process.returncode if process.returncode is not None else -1,
+            duration=time.monotonic() - start,
+            stdout=stdout.decode("utf-8", errors="replace"),
+            stderr=stderr.decode("utf-8", errors="replace"),
+            timed_out=timed_out,
+        )
+        current.args.update(exit_code=result.exit_code, timed_out=result.timed_out)
+
+    _log_result(result)
+
+    return result
+
+
+def _log_result(result: ExecuteResult) -> None:
+    if result.timed_out:
+        logger.error(f"执行超时！已耗时 {result.duration:.1f} 秒")
+    elif result.ok:
+        logger.info(f"执行成功！耗时 {result.duration:.1f} 秒")
+        logger.info(f"输出: {result.stdout}")
+    else:
+        logger.error(f"执行失败！退出码: {result.exit_code}")
+        logger.error(f"错误: {result.stderr}")
+
+
+async def _result_text(execution) -> str:
+    try:
+        result = await execution
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        logger.error(f"详细信息: {e}")
+        return EXECUTE_FAIL_MESSAGE
+
+    if not result.ok:
+        return EXECUTE_FAIL_MESSAGE
+
+    return result.stdout
+
+
+async def execute_script_text(
+    script_command: str,
+    cwd: str,
+    env_vars: Optional[Dict[str, str]] = None,
+    timeout: Optional[float] = None,
+) -> str:
+    """
+    异步执行脚本，返回标准输出
+
+    Args:
+        script_command: 要执行的命令字符串
+        cwd: 命令的工作目录
+        env_vars: 要传递的环境变量字典
+        timeout: 超时时间（秒）
+
+    Returns:
+        如果执行成功，返回标准输出
+        如果执行失败或超时，返回“执行失败！”
+    """
+    return await _result_text(
+        execute_script(script_command, cwd, env_vars=env_vars, timeout=timeout)
+    )
+
+
+# sim_sdk 服务一行应答的长度上限，流式输出可能有数 MB
+SIM_RESPONSE_LIMIT = 64 * 1024 * 1024
+
+
+class SimSdkClient:
+    """
+    sim_sdk 常驻服务（python sim_sdk.py --serve）的客户端
+
+    服务进程在第一次调用时启动并一直保持连接，之后的调用不再启动 shell 和 Python 解释器。
+    请求和应答是按行分隔的 JSON，用 id 对应，多个调用可以同时进行；服务进程退出后，
+    下一次调用时重新启动。
+    """
+
+    def __init__(self, sim_path: str):
+        self.sim_path = sim_path
+        self.loop = asyncio.get_running_loop()
+        self._process: Optional[asyncio.subprocess.Process] = None
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._next_id = 0
+        self._start_lock = asyncio.Lock()
+        self._write_lock = asyncio.Lock()
+
+    @property
+    def alive(self) -> bool:
+        return self._process is not None and self._process.returncode is None
+
+    async def _ensure_started(self) -> asyncio.subprocess.Process:
+        async with self._start_lock:
+            if not self.alive:
+                self._process = await asyncio.create_subprocess_exec(
+                    sys.executable,
+                    self.sim_path,
+                    "--serve",
+                    stdin=asyncio.subprocess.PIPE,
+                    stdout=asyncio.subprocess.PIPE,
+                    limit=SIM_RESPONSE_LIMIT,
+                )
+                asyncio.create_task(self._read_responses(self._process))
+                logger.info(f"sim_sdk 服务已启动，进程号 {self._process.pid}")
+
+            return self._process
+
+    async def _read_responses(self, process: asyncio.subprocess.Process) -> None:
+        pending = []
+        try:
+            while True:
+                line = await process.stdout.readline()
+                if not line:
+                    break
+                try:
+                    response = json.loads(line)
+                    request_id = response.get("id")
+                except (ValueError, AttributeError):
+                    # 服务进程偶尔混入的非应答输出不影响其他调用
+                    logger.warning(f"忽略 sim_sdk 服务的无效应答: {line[:200]!r}")
+                    continue
+                future = self._pending.pop(request_id, None)
+                if future is not None and not future.done():
+                    future.set_result(response)
+        except Exception as e:
+            logger.error(f"读取 sim_sdk 服务应答失败: {e}")
+        finally:
+            if process is self._process:
+                pending, self._pending = list(self._pending.values()), {}
+            for future in pending:
+                if not future.done():
+                    future.set_exception(ConnectionError("sim_sdk 服务已退出"))
+
+    async def run(
+        self,
+        args: List[str],
+        env_vars: Optional[Dict[str, str]] = None,
+        timeout: Optional[float] = None,
+    ) -> ExecuteResult:
+        """
+        调用一次 sim_sdk
+
+        Args:
+            args: 命令行参数，不包括程序名
+            env_vars: 要传递的环境变量字典
+            timeout: 超时时间（秒），为 None 时不限制；超时后不再等待这次调用的应答
+        """
+        process = await self._ensure_started()
+        self._next_id += 1
+        request_id = self._next_id
+        future = self.loop.create_future()
+        self._pending[request_id] = future
+        request = {
+            "id": request_id,
+            "argv": args,
+            "env": {k: str(v) for k, v in (env_vars or {}).items()},
+        }
+
+        start = time.monotonic()
+        try:
+            async with self._write_lock:
+                process.stdin.write(
+                    (json.dumps(request, ensure_ascii=False) + "\n").encode("utf-8")
+                )
+                await process.stdin.drain()
+            response = await asyncio.wait_for(future, timeout=timeout)
+        except asyncio.TimeoutError:
+            await self._cancel(process, request_id)
+            return ExecuteResult(-1, time.monotonic() - start, "", "", timed_out=True)
+        finally:
+            self._pending.pop(request_id, None)
+
+        return ExecuteResult(
+            exit_code=response["exit_code"],
+            duration=time.monotonic() - start,
+            stdout=response["stdout"],
+            stderr=response["stderr"],
+        )
+
+    async def _cancel(self, process: asyncio.subprocess.Process, request_id: int) -> None:
+        """通知服务进程取消超时的调用，还在排队的调用不再执行，不占用服务进程的线程"""
+        try:
+            async with self._write_lock:
+                process.stdin.write((json.dumps({"cancel": request_id}) + "\n").encode("utf-8"))
+                await process.stdin.drain()
+        except (ConnectionError, RuntimeError) as e:
+            logger.warning(f"取消 sim_sdk 调用 {request_id} 失败: {e}")
+
+    async def aclose(self) -> None:
+        """关闭服务进程：关闭标准输入后服务进程等进行中的调用完成再退出"""
+        if not self.alive:
+            return
+
+        self._process.stdin.close()
+        try:
+            await asyncio.wait_for(self._process.wait(), timeout=5)
+        except asyncio.TimeoutError:
+            await _kill_process(self._process)
+
+
+_sim_clients: Dict[Tuple[int, str], SimSdkClient] = {}
+
+
+def _sim_client(sim_path: str) -> SimSdkClient:
+    """当前事件循环中 sim_path 对应的客户端，不同事件循环各自启动服务进程"""
+    loop = asyncio.get_running_loop()
+    key = (id(loop), os.path.abspath(sim_path))
+    client = _sim_clients.get(key)
+    if client is None or client.loop is not loop:
+        client = _sim_clients[key] = SimSdkClient(os.path.abspath(sim_path))
+
+    return client
+
+
+async def close_sim_clients() -> None:
+    """关闭当前事件循环中启动的 sim_sdk 服务进程"""
+    loop = asyncio.get_running_loop()
+    for key, client in list(_sim_clients.items()):
+        if client.loop is loop:
+            del _sim_clients[key]
+            await client.aclose()
+
+
+async def execute_sim_sdk(
+    sim_path: str,
+    args: List[str],
+    env_vars: Optional[Dict[str, str]] = None,
+    timeout: Optional[float] = None,
+) -> ExecuteResult:
+    """
+    通过常驻的 sim_sdk 服务执行一次调用，结果与启动 sim_sdk 子进程相同
+
+    Args:
+        sim_path: sim_sdk.py 的路径
+        args: 命令行参数，不包括程序名，例如 ["-p", "--force", prompt]
+        env_vars: 要传递的环境变量字典
+        timeout: 超时时间（秒），为 None 时不限制
+    """
+    with span("cursor-agent", "subprocess", mode="sim-server") as current:
+        result = await _sim_client(sim_path).run(args, env_vars=env_vars, timeout=timeout)
+        current.args.update(exit_code=result.exit_code, timed_out=result.timed_out)
+
+    _log_result(result)
+
+    return result
+
+
+async def execute_sim_sdk_text(
+    sim_path: str,
+    args: List[str],
+    env_vars: Optional[Dict[str, str]] = None,
+    timeout: Optional[float] = None,
+) -> str:
+    """
+    通过常驻的 sim_sdk 服务执行一次调用，返回标准输出
+
+    Returns:
+        如果执行成功，返回标准输出
+        如果执行失败或超时，返回“执行失败！”
+    """
+    return await _result_text(execute_sim_sdk(sim_path, args, env_vars=env_vars, timeout=timeout))
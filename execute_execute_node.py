@@ -1,8 +1,15 @@
 from execute_execute_tool import tools
 from execute_custom_type import PlanExecute
-from langchain_openai import ChatOpenAI
+from plan_scheduler import DEFAULT_MAX_WORKERS, run_plan
+from checkpoint_store import load_step_results, save_step_result, thread_id
+from executor_session import MEMORY_MAX_TOKENS, ExecutorSession, StepMemory
 from langchain.agents import create_agent
+from run_context import current_config
+from typing import Dict
+from functools import lru_cache
+from model_pool import get_model
 
+import os
 import json
 import asyncio
 import logging
@@ -17,14 +24,23 @@ logger = logging.getLogger(__name__)
 config = json.load(open("config.json", encoding="utf-8"))
 
 
+def _config() -> Dict:
+    return current_config(config)
+
+
+# 每个项目每轮开发一个会话（按检查点线程 ID），同一轮中重新规划后执行的各批计划共用步骤记忆
+_sessions: Dict[str, ExecutorSession] = {}
+
+
+def release_session(thread: str) -> None:
+    """一轮开发结束后释放这一轮的会话"""
+    _sessions.pop(thread, None)
+
+
+# 模型客户端和智能体在各项目之间共享，工具通过运行上下文找到当前项目
+@lru_cache(maxsize=None)
 def _init_agent():
-    _model = ChatOpenAI(
-        model="qwen-plus",
-        openai_api_key=config["QWEN_API_KEY"],
-        openai_api_base=config["QWEN_API_BASE"],
-        temperature=0.7,
-        max_tokens=10000,
-    )
+    _model = get_model("qwen", "qwen-plus", 0.7, max_tokens=10000)
 
     _prompt = """
         你是一位代码专家、一个删除文件的助手、一位可以列出工作目录下文件的助手、一位可以浏览需求目录下所有文件的助手以及一位创建目录的助手的组长。
@@ -38,7 +54,7 @@ def _init_agent():
         6. 你的组员都非常地忙！所以你必须确保你的命令是没有歧义的、没有错误的！他们没有时间去理解有错误或歧义的命令！
         7. 你的代码专家是个除了分析项目代码、编写代码和文档的时候比较清醒其他时候都不太清醒的糊涂虫！所以你必须告诉他应该把文件放在哪个目录下！另外提醒他不允许对所在目录的父目录进行写入操作！还有提醒他不要做除了交代给他的任务以外多余的事情！
         8. 你的删除文件的助手可以删除文件和文件夹，但是他非常的蠢，如果是文件务必带上扩展名！
-        9. 你的可以浏览需求目录下所有文件的助手可以浏览需求目录下所有文件，但是他非常的蠢，他只会用你告诉他的文件名去搜索需求目录下所有文件！必须告诉在他的文件名后面带上扩展名！
+        9. 你的可以浏览需求目录下所有文件的助手有两种用法：按关键词检索需求，他会返回最相关的几个片段并注明文件和行号；或者按文件名和行号读取需求文件的指定部分！先检索，再按返回的文件和行号读取需要的部分，不要一次读取整个文件！
     """
 
     agent = create_agent(model=_model, system_prompt=_prompt, tools=tools)
@@ -47,9 +63,10 @@ def _init_agent():
 
 
 async def execute_node(state: PlanExecute) -> PlanExecute:
-    # 验证输入格式（虽然count目前未使用，但保留验证逻辑）
+    cfg = _config()
+
     try:
-        _ = int(state["input"].split("：")[1])
+        count = int(state["input"].split("：")[1])
     except (IndexError, ValueError) as e:
         logger.info(f"解析input失败: {state.get('input', '')}, 错误: {e}")
         return {"response": "输入格式错误，无法解析开发轮数"}
@@ -58,24 +75,44 @@ async def execute_node(state: PlanExecute) -> PlanExecute:
         logger.error("计划列表为空，无法执行任务")
         return {"response": "计划列表为空，无法执行任务"}
 
-    agent = _init_agent()
+    plan = state["plan"]
+    project_dir = os.path.join(".", "dist", cfg["PROJECT_NAME"])
+
+    # 每完成一个步骤就记录下来，中断后从检查点继续执行时跳过本批计划中已经完成的步骤；
+    # 同一轮开发中先后执行的各批计划按执行前已完成的步骤数区分
+    thread = thread_id(cfg["PROJECT_NAME"], count)
+    batch = len(state.get("past_steps") or [])
+    saved = await asyncio.to_thread(load_step_results, thread, batch)
+    completed = {
+        index: result
+        for index, (step, result) in saved.items()
+        if index < len(plan) and plan[index] == step
+    }
 
-    task = state["plan"].pop(0)
-    logger.info(f"开发团队正在完成任务：{task}...")
-    formatted_task = f"""
-    完成这个任务：{task}
-    
-    注意！
-    不要做和任务无关的事情！
-    """
+    async def _record_step(index: int, result) -> None:
+        await asyncio.to_thread(save_step_result, thread, batch, index, plan[index], result)
 
-    agent_response = await agent.ainvoke(
-        {"messages": [("user", formatted_task)]}, {"recursion_limit": config["RECURSION_LIMIT"]}
+    # 本轮各批计划的所有步骤共用一个智能体和一份步骤记忆，后面的步骤不必重新查看前面已经确认过的目录和需求
+    session = _sessions.get(thread)
+    if session is None:
+        session = _sessions[thread] = ExecutorSession(
+            _init_agent(),
+            cfg["RECURSION_LIMIT"],
+            StepMemory(cfg.get("EXECUTE_MEMORY_MAX_TOKENS", MEMORY_MAX_TOKENS), project_dir),
+        )
+
+    # 相互独立的步骤并发执行，涉及相同文件或目录的步骤按顺序执行
+    past_steps = await run_plan(
+        plan,
+        session.run_step,
+        max_workers=cfg.get("EXECUTE_MAX_WORKERS", DEFAULT_MAX_WORKERS),
+        project_dir=project_dir,
+        completed=completed,
+        on_step_done=_record_step,
     )
 
-    return {
-        "past_steps": [(task, agent_response["messages"][-1].content)],
-    }
+    # 整个计划执行完后才重新规划，计划保留在状态中，重新规划时作为刚执行完的一批步骤参考
+    return {"past_steps": past_steps}
 
 
 if __name__ == "__main__":
@@ -1,11 +1,14 @@
 from langchain.tools import tool
-from typing import List
+from typing import Dict, List
+from cursor_executor import execute_script_text, execute_sim_sdk_text
+from requirement_index import get_requirement_index, format_search_results
+from run_context import current_config
+from tracing import traced
 
 import os
+import sys
 import stat
 import json
-import shlex
-import subprocess
 import logging
 import platform
 import tempfile
@@ -22,105 +25,39 @@ project_path = os.path.abspath(os.path.dirname(__file__))
 config = json.load(open(os.path.join("./config.json"), "r", encoding="utf-8"))
 
 
+def _config() -> Dict:
+    return current_config(config)
+
+
 def remove_readonly(func, path, exc_info):
     """用于处理只读文件的错误回调函数"""
     os.chmod(path, stat.S_IWRITE)
     func(path)
 
 
-def _get_drive_letter(path):
+async def _execute_script_subprocess(script_command, env_vars=None) -> str:
     """
-    获取路径所在的卷（驱动器字母）
+    在项目的dist目录下异步执行脚本，不阻塞事件循环
 
     Args:
-        path: 文件或目录路径
+        script_command: 要执行的命令字符串
+        env_vars: 要传递的环境变量字典，例如 {"CURSOR_API_KEY": "..."}
 
     Returns:
-        在Windows上返回驱动器字母（如 'C:'），在Linux/Mac上返回空字符串
+        如果执行成功，返回标准输出
+        如果执行失败或超时，返回“执行失败！”
     """
-    if platform.system() == "Windows":
-        drive, _ = os.path.splitdrive(os.path.abspath(path))
-        return drive
-    return ""
+    cfg = _config()
 
+    dist_dir = os.path.join(project_path, "dist", cfg["PROJECT_NAME"])
 
-def _execute_script_subprocess(script_command, env_vars=None) -> str:
-    """
-    使用 subprocess 模块执行脚本（推荐）
-
-    Args:
-        script_command: 要执行的命令字符串
-        env_vars: 要传递的环境变量字典，例如 {"CURSOR_API_KEY": "..."}
-    """
-    try:
-        # 检测操作系统
-        is_windows = platform.system() == "Windows"
-
-        # 如果需要在命令前设置环境变量，可以在命令中导出
-        dist_dir = os.path.join(project_path, "dist", config["PROJECT_NAME"])
-
-        if is_windows:
-            # Windows 使用 cmd /c
-            # 获取目标目录所在的卷
-            drive = _get_drive_letter(dist_dir)
-
-            if drive:
-                # 如果目标目录在不同卷，需要先切换到该卷
-                base_command = rf"{drive} && cd {dist_dir}"
-            else:
-                base_command = rf"cd {dist_dir}"
-
-            full_command = ""
-            if env_vars:
-                env_exports = " && ".join(
-                    [f"set {k}={shlex.quote(str(v))}" for k, v in env_vars.items()]
-                )
-                full_command = f"{base_command} && {env_exports} && {script_command}"
-            else:
-                full_command = f"{base_command} && {script_command}"
-
-            result = subprocess.run(
-                ["cmd", "/c", full_command],
-                capture_output=True,
-                text=True,
-                encoding="utf-8",
-                errors="replace",
-                check=True,
-            )
-        else:
-            # Linux/Unix 使用 bash -c
-            base_command = f"cd {shlex.quote(dist_dir.replace(os.sep, '/'))}"
-            full_command = ""
-            if env_vars:
-                env_exports = " ".join(
-                    [f"export {k}={shlex.quote(str(v))}" for k, v in env_vars.items()]
-                )
-                full_command = f"{base_command} && {env_exports} && {script_command}"
-            else:
-                full_command = f"{base_command} && {script_command}"
-
-            result = subprocess.run(
-                ["bash", "-c", full_command],
-                capture_output=True,
-                text=True,
-                encoding="utf-8",
-                errors="replace",
-                check=True,
-            )
-
-        logger.info("执行成功！")
-        logger.info(f"输出: {result.stdout}")
-        return result.stdout
-    except subprocess.CalledProcessError as e:
-        logger.error("执行失败！")
-        logger.error(f"错误: {e.stderr}")
-        return "执行失败！"
-    except Exception as e:
-        logger.error(f"详细信息: {e}")
-        return "执行失败！"
+    return await execute_script_text(
+        script_command, dist_dir, env_vars=env_vars, timeout=cfg.get("CURSOR_TIMEOUT")
+    )
 
 
 @tool
+@traced("tool:rm", "tool")
 def rm(path: str) -> str:
     """
     删除项目目录下指定相对路径的文件或目录的助手
@@ -136,7 +73,7 @@ def rm(path: str) -> str:
 
     logger.info("use rm tool")
 
-    file_or_dir_path = os.path.join(project_path, "dist", config["PROJECT_NAME"], path)
+    file_or_dir_path = os.path.join(project_path, "dist", _config()["PROJECT_NAME"], path)
     if not os.path.exists(file_or_dir_path):
         return "文件或目录不存在"
 
@@ -149,7 +86,8 @@ def rm(path: str) -> str:
 
 
 @tool
-def code_professional(prompt: str) -> str:
+@traced("tool:code_professional", "tool")
+async def code_professional(prompt: str) -> str:
     """
     可以分析项目代码、编写代码和文档的代码专家
 
@@ -160,7 +98,9 @@ def code_professional(prompt: str) -> str:
         如果执行成功，返回代码专家的应答信息
         如果执行失败，返回“执行失败”
     """
-    env_vars = {"CURSOR_API_KEY": config["CURSOR_API_KEY"]}
+    cfg = _config()
+
+    env_vars = {"CURSOR_API_KEY": cfg["CURSOR_API_KEY"]}
 
     logger.info("use code_professional tool")
     logger.info(f"我收到的命令是: {prompt}")
@@ -174,16 +114,23 @@ def code_professional(prompt: str) -> str:
 
     prompt = "不要等待任何提示！直接开始编写代码！\n\n" + prompt
 
-    if " " in config["PROJECT_NAME"]:
-        project_name = f"\"{config['PROJECT_NAME']}\""
+    if " " in cfg["PROJECT_NAME"]:
+        project_name = f"\"{cfg['PROJECT_NAME']}\""
     else:
-        project_name = config["PROJECT_NAME"]
+        project_name = cfg["PROJECT_NAME"]
 
-    if config["MOCK"]:
-        execute_result = _execute_script_subprocess(
-            f'python {config["SIM_CURSOR_PATH"]} -p --force "{prompt}"', env_vars=env_vars
+    if cfg["MOCK"] and cfg.get("SIM_SDK_SERVER"):
+        execute_result = await execute_sim_sdk_text(
+            cfg["SIM_CURSOR_PATH"],
+            ["-p", "--force", prompt],
+            env_vars=env_vars,
+            timeout=cfg.get("CURSOR_TIMEOUT"),
         )
-    elif platform.system() == "Windows" and "EXECUTE_PATH" in config:
+    elif cfg["MOCK"]:
+        execute_result = await _execute_script_subprocess(
+            f'python {cfg["SIM_CURSOR_PATH"]} -p --force "{prompt}"', env_vars=env_vars
+        )
+    elif platform.system() == "Windows" and "EXECUTE_PATH" in cfg:
         with tempfile.NamedTemporaryFile(
             mode="w", encoding="utf-8", delete=False, suffix=".prompt", dir="."
         ) as temp_file:
@@ -192,13 +139,13 @@ def code_professional(prompt: str) -> str:
 
         logger.info(f"临时提示词文件路径: {temp_file_path}")
 
-        execute_result = _execute_script_subprocess(
-            f'{config["EXECUTE_PATH"]} -p --force --prompt-file {temp_file_path}',
+        execute_result = await _execute_script_subprocess(
+            f'{cfg["EXECUTE_PATH"]} -p --force --prompt-file {temp_file_path}',
             env_vars=env_vars,
         )
     else:
-        execute_result = _execute_script_subprocess(
-            f'{config["CURSOR_PATH"]} -p --force "@../../todo/{project_name} {prompt}"',
+        execute_result = await _execute_script_subprocess(
+            f'{cfg["CURSOR_PATH"]} -p --force "@../../todo/{project_name} {prompt}"',
             env_vars=env_vars,
         )
 
@@ -206,6 +153,7 @@ def code_professional(prompt: str) -> str:
 
 
 @tool
+@traced("tool:mkdir", "tool")
 def mkdir(path: str) -> str:
     """
     在项目目录下创建指定相对路径的目录的助手
@@ -219,7 +167,7 @@ def mkdir(path: str) -> str:
     """
     logger.info("use mkdir tool")
 
-    dir_path = os.path.join(project_path, "dist", config["PROJECT_NAME"], path)
+    dir_path = os.path.join(project_path, "dist", _config()["PROJECT_NAME"], path)
     try:
         os.makedirs(dir_path, exist_ok=True)
         return f"创建目录 {path} 成功"
@@ -229,6 +177,7 @@ def mkdir(path: str) -> str:
 
 
 @tool
+@traced("tool:list_files", "tool")
 def list_files(path: str) -> List[str] | str:
     """
     列出工作目录下指定相对路径下的所有文件的助手
@@ -242,31 +191,67 @@ def list_files(path: str) -> List[str] | str:
     """
     logger.info("use list_files tool")
 
-    dir_path = os.path.join(project_path, "dist", config["PROJECT_NAME"], path)
+    dir_path = os.path.join(project_path, "dist", _config()["PROJECT_NAME"], path)
     if not os.path.exists(dir_path):
         return "目录不存在"
     return os.listdir(dir_path)
 
 
 @tool
-def search_todo_dir(file_name: str) -> List[str] | str:
+@traced("tool:search_requirements", "tool")
+def search_requirements(query: str) -> str:
     """
-    可以浏览需求目录下所有文件的助手，告诉他文件名，他会在todo目录下搜索文件，如果文件存在，返回文件内容，否则返回文件不存在。
+    在需求目录中按关键词检索需求内容的助手，返回最相关的若干片段，每个片段带有文件名和行号
+
     Args:
-        file_name: 要搜索的文件名
+        query: 检索关键词，例如“用户登录 验证码”
 
     Returns:
-        如果文件存在，返回文件内容
-        如果文件不存在，返回需求目录下所有文件名的列表
+        按相关度排列的需求片段，格式为“[文件:起始行-结束行]”加片段内容
+        如果没有找到相关内容，返回需求目录下的文件列表
+    """
+    cfg = _config()
+
+    logger.info("use search_requirements tool")
+    index = get_requirement_index(cfg["PROJECT_NAME"])
+    result = format_search_results(index, query, cfg.get("REQUIREMENT_SEARCH_MAX_CHARS", 4000))
+    if not result:
+        return f"没有找到相关内容，需求目录下的文件有：{index.file_names()}"
+
+    return result
+
+
+@tool
+@traced("tool:read_requirement", "tool")
+def read_requirement(file_name: str, start_line: int = 1, end_line: int = 0) -> str:
     """
-    logger.info("use search_todo_dir tool")
-    todo_file_path = os.path.join(project_path, "todo", config["PROJECT_NAME"], file_name)
-    if not os.path.exists(todo_file_path):
-        todo_dir = os.path.join(project_path, "todo", config["PROJECT_NAME"])
-        return os.listdir(todo_dir)
+    读取需求目录下文件指定行的助手，文件名可以不完整，他会找到最接近的文件
+
+    Args:
+        file_name: 要读取的文件名或相对路径
+        start_line: 起始行号，从 1 开始
+        end_line: 结束行号（包含），为 0 时读到文件末尾
+
+    Returns:
+        如果找到文件，返回“[文件:起始行-结束行]”加文件内容，内容过长时会被截断
+        如果找不到文件，返回需求目录下的文件列表
+    """
+    cfg = _config()
+
+    logger.info("use read_requirement tool")
+    index = get_requirement_index(cfg["PROJECT_NAME"])
+    matches = index.find_files(file_name, limit=1)
+    if not matches:
+        return f"文件不存在，需求目录下的文件有：{index.file_names()}"
+
+    rel_path = matches[0]
+    content = index.read_lines(rel_path, start_line, end_line or sys.maxsize)
+    end = start_line + len(content.splitlines()) - 1
+    max_chars = cfg.get("REQUIREMENT_SEARCH_MAX_CHARS", 4000)
+    if len(content) > max_chars:
+        content = content[:max_chars] + "\n...（内容过长已截断，请指定行号继续读取）"
 
-    with open(todo_file_path, "r", encoding="utf-8") as f:
-        return f.read()
+    return f"[{rel_path}:{start_line}-{end}]\n{content}"
 
 
-tools = [code_professional, mkdir, list_files, rm, search_todo_dir]
+tools = [code_professional, mkdir, list_files, rm, search_requirements, read_requirement]
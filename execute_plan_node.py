@@ -1,10 +1,14 @@
 from execute_custom_type import PlanExecute
-from execute_plan_utils import convert_docx_to_markdown, convert_pdf_to_markdown, analyze_what_to_do
-from pathlib import Path
-from langchain_openai import ChatOpenAI
+from execute_plan_utils import analyze_what_to_do
+from requirement_ingest import ingest_requirements
+from approval_policy import ask
 from langchain_core.prompts import ChatPromptTemplate
 from constants import REQUIREMENT_FAIL_MESSAGE
 from execute_custom_type import Plan
+from run_context import current_config
+from typing import Dict
+from model_pool import get_model
+from functools import lru_cache
 
 import os
 import json
@@ -21,12 +25,10 @@ logger = logging.getLogger(__name__)
 
 config = json.load(open("config.json", "r", encoding="utf-8"))
 
-plan_model = ChatOpenAI(
-    model="qwen-max",
-    openai_api_key=config["QWEN_API_KEY"],
-    openai_api_base=config["QWEN_API_BASE"],
-    temperature=0.7,
-).with_structured_output(Plan)
+
+def _config() -> Dict:
+    return current_config(config)
+
 
 plan_prompt = ChatPromptTemplate.from_messages(
     [
@@ -49,14 +51,12 @@ plan_prompt = ChatPromptTemplate.from_messages(
     ]
 )
 
-agent = plan_prompt | plan_model
 
-improve_opinion_model = ChatOpenAI(
-    model="qwen-plus",
-    openai_api_key=config["QWEN_API_KEY"],
-    openai_api_base=config["QWEN_API_BASE"],
-    temperature=0.7,
-)
+# 模型客户端在第一次制定计划时才创建，见 model_pool
+@lru_cache(maxsize=None)
+def _init_agent():
+    return plan_prompt | get_model("qwen", "qwen-max", 0.7).with_structured_output(Plan)
+
 
 improve_opinion_prompt = ChatPromptTemplate.from_messages(
     [
@@ -70,97 +70,53 @@ improve_opinion_prompt = ChatPromptTemplate.from_messages(
     ]
 )
 
-improve_opinion_agent = improve_opinion_prompt | improve_opinion_model
+
+@lru_cache(maxsize=None)
+def _init_improve_opinion_agent():
+    return improve_opinion_prompt | get_model("qwen", "qwen-plus", 0.7)
+
+
+def _new_warning_file() -> str:
+    """返回一个尚不存在的警告文件路径：warning.md、warning_1.md、warning_2.md……"""
+    todo_dir = os.path.join(".", "todo", _config()["PROJECT_NAME"])
+    warning_file = os.path.join(todo_dir, "warning.md")
+    cnt = 0
+    while os.path.exists(warning_file):
+        cnt += 1
+        warning_file = os.path.join(todo_dir, f"warning_{cnt}.md")
+
+    return warning_file
 
 
 def check_and_convert_file():
+    cfg = _config()
     skip_dirs = []
     with open(f".spanignore", "r", encoding="utf-8") as f:
         skip_dirs = f.read().splitlines()
 
     skip_dirs = [dir.strip() for dir in skip_dirs if len(dir.strip()) > 0]
 
-    todo_dir = Path(os.path.join(".", "todo", config["PROJECT_NAME"]))
+    todo_dir = os.path.join(".", "todo", cfg["PROJECT_NAME"])
+    unreadable = ingest_requirements(
+        todo_dir,
+        os.path.join(".", ".cache", "ingest", f"{cfg['PROJECT_NAME']}.json"),
+        skip_dirs,
+        max_workers=cfg.get("INGEST_MAX_WORKERS"),
+    )
+
     warning_file = ""
-    for file in todo_dir.glob("**/*"):
-        if any(part in skip_dirs for part in file.parts):
-            continue
-
-        if file.is_file():
-            if file.suffix.lower() == ".docx":
-                try:
-                    convert_docx_to_markdown(str(file))
-                except Exception as e:
-                    if not len(warning_file):
-                        cnt = 0
-                        while True:
-                            warning_path = os.path.join(
-                                ".", "todo", config["PROJECT_NAME"], "warning.md"
-                            )
-                            if cnt == 0 and os.path.exists(warning_path):
-                                cnt += 1
-                            else:
-                                warning_path = os.path.join(
-                                    ".", "todo", config["PROJECT_NAME"], f"warning_{cnt}.md"
-                                )
-                                if os.path.exists(warning_path):
-                                    cnt += 1
-                                else:
-                                    break
-
-                        warning_file = (
-                            os.path.join(".", "todo", config["PROJECT_NAME"], "warning.md")
-                            if cnt == 0
-                            else os.path.join(
-                                ".", "todo", config["PROJECT_NAME"], f"warning_{cnt}.md"
-                            )
-                        )
-
-                    with open(warning_file, "a+", encoding="utf-8") as f:
-                        f.write(f"文件无法解析内容，请手动转换成markdown文件: {str(file)}\n\n")
-
-            elif file.suffix.lower() == ".pdf":
-                convert_pdf_to_markdown(str(file))
-
-            else:
-                try:
-                    file.read_text(encoding="utf-8")
-
-                except Exception as e:
-                    if not len(warning_file):
-                        cnt = 0
-
-                        while True:
-                            warning_path = os.path.join(
-                                ".", "todo", config["PROJECT_NAME"], "warning.md"
-                            )
-                            if cnt == 0 and os.path.exists(warning_path):
-                                cnt += 1
-                            else:
-                                warning_path = os.path.join(
-                                    ".", "todo", config["PROJECT_NAME"], f"warning_{cnt}.md"
-                                )
-                                if os.path.exists(warning_path):
-                                    cnt += 1
-                                else:
-                                    break
-
-                        warning_file = (
-                            os.path.join(".", "todo", config["PROJECT_NAME"], "warning.md")
-                            if cnt == 0
-                            else os.path.join(
-                                ".", "todo", config["PROJECT_NAME"], f"warning_{cnt}.md"
-                            )
-                        )
-
-                    with open(warning_file, "a+", encoding="utf-8") as f:
-                        f.write(f"文件无法解析内容，请手动转换成markdown文件: {file.name}\n\n")
+    if unreadable:
+        warning_file = _new_warning_file()
+        with open(warning_file, "a+", encoding="utf-8") as f:
+            for file in unreadable:
+                f.write(f"文件无法解析内容，请手动转换成markdown文件: {file}\n\n")
 
     return warning_file
 
 
 async def execute_plan_node(state: PlanExecute) -> PlanExecute:
-    dist_dir = os.path.join(".", "dist", config["PROJECT_NAME"])
+    cfg = _config()
+    dist_dir = os.path.join(".", "dist", cfg["PROJECT_NAME"])
     os.makedirs(dist_dir, exist_ok=True)
 
     try:
@@ -169,15 +125,15 @@ async def execute_plan_node(state: PlanExecute) -> PlanExecute:
         logger.info(f"解析input失败: {state.get('input', '')}, 错误: {e}")
         return {"response": "输入格式错误，无法解析开发轮数"}
 
-    todo_md_path = os.path.join(".", "todo", config["PROJECT_NAME"], "todo.md")
+    todo_md_path = os.path.join(".", "todo", cfg["PROJECT_NAME"], "todo.md")
     if os.path.exists(todo_md_path):
-        user_input = input(f"todo.md文件已存在，是否删除？(y/n): ")
+        user_input = ask("delete_todo", f"todo.md文件已存在，是否删除？(y/n): ")
         if user_input == "y":
             os.remove(todo_md_path)
 
-    todo_list_md_path = os.path.join(".", "todo", config["PROJECT_NAME"], "todo_list.md")
+    todo_list_md_path = os.path.join(".", "todo", cfg["PROJECT_NAME"], "todo_list.md")
     if count == 0 and os.path.exists(todo_list_md_path):
-        user_input = input(f"todo_list.md文件已存在，是否删除？(y/n): ")
+        user_input = ask("delete_todo_list", f"todo_list.md文件已存在，是否删除？(y/n): ")
         if user_input == "y":
             os.remove(todo_list_md_path)
     elif count > 0 and os.path.exists(todo_list_md_path):
@@ -187,24 +143,23 @@ async def execute_plan_node(state: PlanExecute) -> PlanExecute:
 
     warning_file = ""
     if count == 0:
-        warning_file = check_and_convert_file()
+        # 需求文件转换和解析是阻塞的磁盘与 CPU 操作，放到线程里执行，避免阻塞同时运行的其他项目
+        warning_file = await asyncio.to_thread(check_and_convert_file)
 
     if len(warning_file) and os.path.exists(warning_file):
-        while True:
-            user_input = input(
-                f"""
+        ask(
+            "unreadable_files",
+            f"""
             存在无法解析内容的文件，请手动转换成markdown文件。
             详见{warning_file}（无法解析的文件将被系统忽略）。
-            无疑问请输入pass继续执行："""
-            )
-            if user_input == "pass":
-                break
+            无疑问请输入pass继续执行：""",
+        )
 
-    result = analyze_what_to_do()
+    result = await analyze_what_to_do()
     if result == "执行失败！" or result == "分析失败！":
         return {"response": REQUIREMENT_FAIL_MESSAGE}
 
-    todo_md_path = os.path.join(".", "todo", config["PROJECT_NAME"], "todo.md")
+    todo_md_path = os.path.join(".", "todo", cfg["PROJECT_NAME"], "todo.md")
     with open(todo_md_path, "r", encoding="utf-8") as f:
         todo_content = f.read()
 
@@ -219,6 +174,7 @@ async def execute_plan_node(state: PlanExecute) -> PlanExecute:
 
     todo_list = []
     improve_opinion = ""
+    attempt = 0
     while True:
         user_prompt = user_input
         if len(improve_opinion) > 0:
@@ -226,24 +182,24 @@ async def execute_plan_node(state: PlanExecute) -> PlanExecute:
                 f"结合对原计划的改进意见，改进意见如下：\n{improve_opinion}\n\n{user_prompt}"
             )
 
-        todo_list_md_path = os.path.join(".", "todo", config["PROJECT_NAME"], "todo_list.md")
+        todo_list_md_path = os.path.join(".", "todo", cfg["PROJECT_NAME"], "todo_list.md")
         if os.path.exists(todo_list_md_path):
             with open(todo_list_md_path, "r", encoding="utf-8") as f:
                 user_prompt = (
                     f"结合原todo_list内容，todo_list内容如下：\n{f.read()}\n\n{user_prompt}"
                 )
 
-        result = await agent.ainvoke(user_prompt)
+        result = await _init_agent().ainvoke(user_prompt)
         steps_content = "\n\n".join(result.steps if result.steps else [])
         with open(todo_list_md_path, "w+", encoding="utf-8") as f:
             f.write(steps_content)
 
-        while True:
-            user_check_opinion = input(
-                f"请检查执行计划，执行计划内容详见{todo_list_md_path}。如果你认为没有必要继续修改，请输入pass。如果你认为有必要继续修改，请输入reject："
-            )
-            if user_check_opinion == "pass" or user_check_opinion == "reject":
-                break
+        user_check_opinion = ask(
+            "plan",
+            f"请检查执行计划，执行计划内容详见{todo_list_md_path}。如果你认为没有必要继续修改，请输入pass。如果你认为有必要继续修改，请输入reject：",
+            {"round": attempt, "content": steps_content, "steps": result.steps or []},
+        )
+        attempt += 1
 
         if user_check_opinion == "pass":
             with open(todo_list_md_path, "r", encoding="utf-8") as f:
@@ -252,6 +208,7 @@ async def execute_plan_node(state: PlanExecute) -> PlanExecute:
 
             break
 
+        improve_opinion_agent = _init_improve_opinion_agent()
         improve_opinion_wrapper = await improve_opinion_agent.ainvoke(
             f"""
             请根据原计划和需求，给出改进意见：
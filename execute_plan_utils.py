@@ -1,10 +1,16 @@
 from docx import Document
+from docx.table import Table
+from cursor_executor import execute_script_text, execute_sim_sdk_text
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Dict, List, Optional
+from run_context import current_config
 
+import io
 import json
 import os
+import hashlib
 import logging
 import shlex
-import subprocess
 import platform
 import tempfile
 
@@ -17,100 +23,112 @@ logger = logging.getLogger(__name__)
 
 config = json.load(open("config.json", "r", encoding="utf-8"))
 
+
+def _config() -> Dict:
+    return current_config(config)
+
+
 project_path = os.path.abspath(os.path.dirname(__file__))
 
+_RUN_TAG = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}r"
+_EMBED_ATTR = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}embed"
 
-def _get_drive_letter(path):
-    """
-    获取路径所在的卷（驱动器字母）
+# pdf 每页提取结果的缓存目录
+PDF_PAGE_CACHE_DIR = os.path.join(".", ".cache", "pdf_pages")
 
-    Args:
-        path: 文件或目录路径
+# pdf 页面缓存默认的总大小上限
+PDF_PAGE_CACHE_MAX_BYTES = 256 * 1024 * 1024
 
-    Returns:
-        在Windows上返回驱动器字母（如 'C:'），在Linux/Mac上返回空字符串
-    """
-    if platform.system() == "Windows":
-        drive, _ = os.path.splitdrive(os.path.abspath(path))
-        return drive
-    return ""
 
+def _write_image(blob: bytes, ext: str, img_dir: str) -> str:
+    """按内容哈希命名并写入图片，相同内容的图片只写一次，返回文件名"""
+    image_name = f"{hashlib.sha256(blob).hexdigest()[:16]}.{ext}"
+    image_path = os.path.join(img_dir, image_name)
+    if not os.path.exists(image_path):
+        fd, temp_path = tempfile.mkstemp(dir=img_dir, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(blob)
+        os.replace(temp_path, image_path)
+
+    return image_name
 
-def _revert_docx_to_md(doc: Document, md_project_name: str) -> str:
-    image_map = {}
-    image_count = 0
 
+def _extract_images(doc: Document, md_dir: str) -> Dict[str, str]:
+    """
+    把文档中的图片写入 md_dir/img，返回 rId -> markdown 中的图片路径
+
+    同一图片被多处引用或多张图片内容相同时只写一个文件，写文件在线程池中进行。
+    """
+    # 多个关系可能指向同一个图片部件，按部件去重
+    parts = {}
+    rel_parts = {}
     for rel in doc.part.rels.values():
-        if "image" in rel.reltype:
-            image_count += 1
-            image_data = rel.target_part.blob
-            ext = rel.target_part.partname.split("/")[-1].split(".")[-1].lower()
+        if "image" in rel.reltype and not rel.is_external:
+            partname = str(rel.target_part.partname)
+            parts[partname] = rel.target_part
+            rel_parts[rel.rId] = partname
+
+    if not parts:
+        return {}
+
+    img_dir = os.path.join(md_dir, "img")
+    os.makedirs(img_dir, exist_ok=True)
+    with ThreadPoolExecutor(max_workers=min(8, len(parts))) as executor:
+        futures = {}
+        for partname, part in parts.items():
+            ext = partname.split("/")[-1].split(".")[-1].lower()
             if ext not in ["png", "jpg", "jpeg", "gif", "bmp", "webp"]:
                 ext = "jpg"
+            futures[partname] = executor.submit(_write_image, part.blob, ext, img_dir)
+
+        names = {partname: future.result() for partname, future in futures.items()}
 
-            image_name = f"img_{image_count}.{ext}"
-            image_path = os.path.join(config["MD_DIR_PATH"], md_project_name, "img", image_name)
-            with open(image_path, "wb") as f:
-                f.write(image_data)
-            image_map[rel.rId] = f"./img/{image_name}"
+    return {rId: f"./img/{names[partname]}" for rId, partname in rel_parts.items()}
 
+
+def _revert_docx_to_md(doc: Document, md_dir: str) -> str:
+    image_map = _extract_images(doc, md_dir)
+
+    # 只遍历一次正文，按出现顺序输出段落、表格和图片引用
+    rel_ids = set(doc.part.rels.keys())
     image_count = 0
-    full_text = ""
+    out = io.StringIO()
 
     parent = doc.element.body if hasattr(doc, "element") else doc
-    markdown_struct = []
-    for child in parent.getchildren():
+    for child in parent.iterchildren():
         if child.tag.endswith("}p"):
-            markdown_struct.append("p")
-        elif child.tag.endswith("}tbl"):
-            markdown_struct.append("tb")
-
-    tables = []
-    for table in doc.tables:
-        rows = []
-        for row in table.rows:
-            cells = [cell.text.strip().replace("\n", "<br>") for cell in row.cells]
-            rows.append("| " + " | ".join(cells) + " |")
-
-        if len(rows) > 1:
-            sep = "|" + "|".join([" --- "] * len(table.columns)) + "|"
-            rows.insert(1, sep)
-        tables.append("\n".join(rows))
-
-    paras = []
-    for para in doc.paragraphs:
-        para_content = ""
-        for run in para.runs:
-            for child in run._element.getchildren():
-                if child.tag.endswith("}drawing") or child.tag.endswith("}pict"):
-                    blips = child.xpath(".//*[local-name()='blip']")
-
-                    if blips:
-                        rId = blips[0].get(
-                            "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}embed"
-                        )
-                        if rId:
-                            if rId in [r.rId for r in doc.part.rels.values()]:
+            for run in child.iterchildren(_RUN_TAG):
+                for run_child in run.iterchildren():
+                    if run_child.tag.endswith("}drawing") or run_child.tag.endswith("}pict"):
+                        blips = run_child.xpath(".//*[local-name()='blip']")
+
+                        if blips:
+                            rId = blips[0].get(_EMBED_ATTR)
+                            if rId and rId in rel_ids:
                                 image_count += 1
                                 image_path = image_map.get(rId, f"img_{image_count}.jpg")
-                                para_content += f"\n\n![图片{image_count}]({image_path})\n\n"
+                                out.write(f"\n\n![图片{image_count}]({image_path})\n\n")
 
-                elif child.tag.endswith("}t"):
-                    text = child.text or ""
-                    para_content += text
+                    elif run_child.tag.endswith("}t"):
+                        out.write(run_child.text or "")
 
-        paras.append(para_content)
+            out.write("\n\n")
 
-    for item in markdown_struct:
-        if item == "p":
-            full_text += paras.pop(0) + "\n\n"
-        elif item == "tb":
-            full_text += tables.pop(0) + "\n\n"
+        elif child.tag.endswith("}tbl"):
+            table = Table(child, doc)
+            rows = table.rows
+            for index, row in enumerate(rows):
+                cells = [cell.text.strip().replace("\n", "<br>") for cell in row.cells]
+                out.write("| " + " | ".join(cells) + " |\n")
+                if index == 0 and len(rows) > 1:
+                    out.write("|" + "|".join([" --- "] * len(table.columns)) + "|\n")
+
+            out.write("\n" if len(rows) else "\n\n")
 
-    return full_text.strip()
+    return out.getvalue().strip()
 
 
-def convert_docx_to_markdown(docx_path: str) -> str:
+def convert_docx_to_markdown(docx_path: str, todo_dir: Optional[str] = None) -> str:
     if not os.path.exists(docx_path):
         return "文件不存在"
 
@@ -119,124 +137,246 @@ def convert_docx_to_markdown(docx_path: str) -> str:
 
     docx_name = os.path.basename(docx_path).split(".")[0]
     doc = Document(docx_path)
-    todo_docx_dir = os.path.join(".", "todo", config["PROJECT_NAME"], docx_name)
+    todo_dir = todo_dir or os.path.join(".", "todo", _config()["PROJECT_NAME"])
+    todo_docx_dir = os.path.join(todo_dir, docx_name)
     os.makedirs(todo_docx_dir, exist_ok=True)
-    os.makedirs(os.path.join(todo_docx_dir, "img"), exist_ok=True)
     todo_md_path = os.path.join(todo_docx_dir, "todo.md")
     with open(todo_md_path, "w+", encoding="utf-8") as f:
         f.write(_revert_docx_to_md(doc, todo_docx_dir))
 
 
-def convert_pdf_to_markdown(pdf_path: str) -> str:
+# 字体程序和图片不影响文本提取，解码代价又高，计算页面缓存键时跳过
+_PDF_SKIPPED_KEYS = ("/FontFile", "/FontFile2", "/FontFile3")
+
+
+def _hash_pdf_object(obj, memo: Dict) -> str:
+    """
+    PDF 对象的哈希：递归解析间接引用，流按解码后的内容计算
+
+    memo 按间接对象编号缓存子对象的哈希，同一个文件中多页共用的字体只计算一次；
+    哈希只取决于内容，与对象编号无关。
+    """
+    from PyPDF2.generic import ArrayObject, DictionaryObject, IndirectObject
+
+    if isinstance(obj, IndirectObject):
+        ref = (obj.idnum, obj.generation)
+        if ref not in memo:
+            memo[ref] = "cycle"
+            memo[ref] = _hash_pdf_object(obj.get_object(), memo)
+        return memo[ref]
+
+    digest = hashlib.sha256(type(obj).__name__.encode("utf-8"))
+    if isinstance(obj, DictionaryObject):
+        for key in sorted(obj):
+            if key in _PDF_SKIPPED_KEYS or key == "/Parent":
+                continue
+            digest.update(f"{key}=".encode("utf-8"))
+            digest.update(_hash_pdf_object(obj.raw_get(key), memo).encode("utf-8"))
+
+        if hasattr(obj, "get_data") and obj.get("/Subtype") != "/Image":
+            digest.update(obj.get_data())
+    elif isinstance(obj, ArrayObject):
+        for item in obj:
+            digest.update(_hash_pdf_object(item, memo).encode("utf-8"))
+    else:
+        digest.update(repr(obj).encode("utf-8"))
+
+    return digest.hexdigest()
+
+
+def _pdf_page_key(page, memo: Optional[Dict] = None) -> str:
+    """
+    页面的缓存键：页面内容流和页面资源（字体的编码、ToUnicode 映射、表单对象等）的哈希
+
+    只按页面本身的内容计算，修改 PDF 中的部分页面后，其余页面仍能命中缓存。
+    """
+    import PyPDF2
+
+    memo = {} if memo is None else memo
+    digest = hashlib.sha256(PyPDF2.__version__.encode("utf-8"))
+    contents = page.get_contents()
+    if contents is not None:
+        digest.update(contents.get_data())
+
+    resources = page.raw_get("/Resources") if "/Resources" in page else None
+    if resources is not None:
+        digest.update(_hash_pdf_object(resources, memo).encode("utf-8"))
+
+    return digest.hexdigest()
+
+
+def _extract_pdf_pages(pdf_path: str, start: int, end: int, cache_dir: str) -> List[str]:
+    """
+    提取 [start, end) 页的文本，可以在工作进程中执行
+
+    每页的文本按页面内容哈希缓存在 cache_dir 下，命中缓存时不再解析页面。
+    """
     from PyPDF2 import PdfReader
 
-    import os
+    texts = []
+    memo: Dict = {}
+    with open(pdf_path, "rb") as f:
+        reader = PdfReader(f)
+        for page_num in range(start, end):
+            page = reader.pages[page_num]
+            key = _pdf_page_key(page, memo)
+            cache_path = os.path.join(cache_dir, key[:2], key[2:])
+            if os.path.exists(cache_path):
+                try:
+                    with open(cache_path, "r", encoding="utf-8") as cache_file:
+                        texts.append(cache_file.read())
+                    # 刷新修改时间，淘汰缓存时按修改时间从旧到新淘汰
+                    os.utime(cache_path)
+                    continue
+                except OSError:
+                    # 读取期间被其他进程淘汰，重新提取
+                    pass
+
+            text = page.extract_text()
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(cache_path), suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as cache_file:
+                cache_file.write(text)
+            os.replace(temp_path, cache_path)
+            texts.append(text)
+
+    return texts
+
+
+def _prune_pdf_page_cache(cache_dir: str, max_bytes: int) -> None:
+    """
+    pdf 页面缓存的总大小超过 max_bytes 时，按修改时间从旧到新淘汰（LRU）
+
+    页面在工作进程中提取并写入缓存，没有常驻的索引，每次转换完成后扫描一遍缓存目录。
+    """
+    entries = []
+    total = 0
+    if not os.path.isdir(cache_dir):
+        return
+
+    for prefix in os.listdir(cache_dir):
+        prefix_dir = os.path.join(cache_dir, prefix)
+        if not os.path.isdir(prefix_dir):
+            continue
+        for rest in os.listdir(prefix_dir):
+            if rest.endswith(".tmp"):
+                continue
+            path = os.path.join(prefix_dir, rest)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            entries.append((st.st_mtime_ns, path, st.st_size))
+            total += st.st_size
+
+    removed = 0
+    for _, path, size in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+        removed += 1
+
+    if removed:
+        logger.info(f"pdf页面缓存超过上限，淘汰{removed}个页面")
+
+
+def convert_pdf_to_markdown(
+    pdf_path: str, max_workers: Optional[int] = None, todo_dir: Optional[str] = None
+) -> str:
+    """
+    把 pdf 文件转换为 markdown，结果写入 todo/<项目>/<文件名>/todo.md
+
+    页面按 PDF_PAGES_PER_TASK 分段，页数较多时在进程池中并行提取，
+    并按页面顺序边提取边写入文件，不在内存中拼接全文。
+
+    Args:
+        pdf_path: pdf 文件路径
+        max_workers: 并行提取页面的进程数，默认为 CPU 核数；为 1 时在当前进程中提取
+        todo_dir: 需求目录，默认为当前项目的需求目录；在工作进程中转换时需要显式传入
+    """
+    cfg = _config()
+
+    from PyPDF2 import PdfReader
 
     if not os.path.exists(pdf_path) or not os.path.isfile(pdf_path):
         return "pdf文件不存在"
     elif not pdf_path.endswith(".pdf"):
         return "文件不是pdf文件"
-    else:
-        with open(pdf_path, "rb") as f:
-            reader = PdfReader(f)
-            content = ""
-            skipped_content_len = 0
-
-            # 读取所有页面内容
-            for page_num in range(len(reader.pages)):
-                page = reader.pages[page_num]
-                page_content = page.extract_text()
-                content += page_content + "\n\n"
-
-        pdf_name = os.path.basename(pdf_path).split(".")[0]
-        todo_pdf_dir = os.path.join(".", "todo", config["PROJECT_NAME"], pdf_name)
-        if not os.path.exists(todo_pdf_dir):
-            os.makedirs(todo_pdf_dir, exist_ok=True)
-
-        todo_md_path = os.path.join(todo_pdf_dir, "todo.md")
-        with open(todo_md_path, "w+", encoding="utf-8") as f:
-            f.write(content)
+
+    with open(pdf_path, "rb") as f:
+        page_count = len(PdfReader(f).pages)
+
+    pages_per_task = cfg.get("PDF_PAGES_PER_TASK", 32)
+    ranges = [
+        (start, min(start + pages_per_task, page_count))
+        for start in range(0, page_count, pages_per_task)
+    ]
+
+    pdf_name = os.path.basename(pdf_path).split(".")[0]
+    todo_dir = todo_dir or os.path.join(".", "todo", cfg["PROJECT_NAME"])
+    todo_pdf_dir = os.path.join(todo_dir, pdf_name)
+    os.makedirs(todo_pdf_dir, exist_ok=True)
+    todo_md_path = os.path.join(todo_pdf_dir, "todo.md")
+
+    fd, temp_path = tempfile.mkstemp(dir=todo_pdf_dir, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as out:
+            if len(ranges) > 1 and max_workers != 1:
+                with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                    futures = [
+                        executor.submit(
+                            _extract_pdf_pages, pdf_path, start, end, PDF_PAGE_CACHE_DIR
+                        )
+                        for start, end in ranges
+                    ]
+                    for future in futures:
+                        for text in future.result():
+                            out.write(text + "\n\n")
+            else:
+                for start, end in ranges:
+                    for text in _extract_pdf_pages(pdf_path, start, end, PDF_PAGE_CACHE_DIR):
+                        out.write(text + "\n\n")
+
+        os.replace(temp_path, todo_md_path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+    _prune_pdf_page_cache(
+        PDF_PAGE_CACHE_DIR, cfg.get("PDF_PAGE_CACHE_MAX_BYTES", PDF_PAGE_CACHE_MAX_BYTES)
+    )
 
     return "pdf文件转换为markdown文件成功"
 
 
-def _execute_script_subprocess(script_command, env_vars=None) -> str:
+async def _execute_script_subprocess(script_command, env_vars=None) -> str:
     """
-    使用 subprocess 模块执行脚本（推荐）
+    在项目的todo目录下异步执行脚本，不阻塞事件循环
 
     Args:
         script_command: 要执行的命令字符串
         env_vars: 要传递的环境变量字典，例如 {"CURSOR_API_KEY": "..."}
+
+    Returns:
+        如果执行成功，返回标准输出
+        如果执行失败或超时，返回“执行失败！”
     """
-    try:
-        # 检测操作系统
-        is_windows = platform.system() == "Windows"
+    cfg = _config()
 
-        # 如果需要在命令前设置环境变量，可以在命令中导出
-        todo_dir = os.path.join(project_path, "todo", config["PROJECT_NAME"])
+    todo_dir = os.path.join(project_path, "todo", cfg["PROJECT_NAME"])
 
-        if is_windows:
-            # Windows 使用 cmd /c
-            # 获取目标目录所在的卷
-            drive = _get_drive_letter(todo_dir)
+    return await execute_script_text(
+        script_command, todo_dir, env_vars=env_vars, timeout=cfg.get("CURSOR_TIMEOUT")
+    )
 
-            if drive:
-                # 如果目标目录在不同卷，需要先切换到该卷
-                base_command = rf"{drive} && cd {todo_dir}"
-            else:
-                base_command = rf"cd {todo_dir}"
-
-            full_command = ""
-            if env_vars:
-                env_exports = " && ".join(
-                    [f"set {k}={shlex.quote(str(v))}" for k, v in env_vars.items()]
-                )
-                full_command = f"{base_command} && {env_exports} && {script_command}"
-            else:
-                full_command = f"{base_command} && {script_command}"
-
-            result = subprocess.run(
-                ["cmd", "/c", full_command],
-                capture_output=True,
-                text=True,
-                encoding="utf-8",
-                errors="replace",
-                check=True,
-            )
-        else:
-            # Linux/Unix 使用 bash -c
-            base_command = f"cd {shlex.quote(todo_dir.replace(os.sep, '/'))}"
-            full_command = ""
-            if env_vars:
-                env_exports = " ".join(
-                    [f"export {k}={shlex.quote(str(v))}" for k, v in env_vars.items()]
-                )
-                full_command = f"{base_command} && {env_exports} && {script_command}"
-            else:
-                full_command = f"{base_command} && {script_command}"
-
-            result = subprocess.run(
-                ["bash", "-c", full_command],
-                capture_output=True,
-                text=True,
-                encoding="utf-8",
-                errors="replace",
-                check=True,
-            )
-        logger.info("执行成功！")
-        logger.info(f"输出: {result.stdout}")
-        return result.stdout
-    except subprocess.CalledProcessError as e:
-        logger.error("执行失败！")
-        logger.error(f"错误: {e.stderr}")
-        return "执行失败！"
-    except Exception as e:
-        logger.error(f"详细信息: {e}")
-        return "执行失败！"
-
-
-def analyze_what_to_do():
-    env_vars = {"CURSOR_API_KEY": config["CURSOR_API_KEY"]}
+
+async def analyze_what_to_do():
+    cfg = _config()
+    env_vars = {"CURSOR_API_KEY": cfg["CURSOR_API_KEY"]}
 
     prompt = """
     不要等待任何提示！直接开始分析！
@@ -246,7 +386,7 @@ def analyze_what_to_do():
     """
 
     opinion = ""
-    opinion_file = os.path.join(".", "opinion", f"{config['PROJECT_NAME']}.md")
+    opinion_file = os.path.join(".", "opinion", f"{cfg['PROJECT_NAME']}.md")
     if os.path.exists(opinion_file):
         opinion_file = os.path.abspath(opinion_file)
         prompt += f"""
@@ -255,7 +395,7 @@ def analyze_what_to_do():
         """
 
     development_log = ""
-    development_log_file = os.path.join(".", "dist", config["PROJECT_NAME"], "development_log.md")
+    development_log_file = os.path.join(".", "dist", cfg["PROJECT_NAME"], "development_log.md")
     if os.path.exists(development_log_file):
         development_log_file = os.path.abspath(development_log_file)
         prompt += f"""
@@ -265,25 +405,32 @@ def analyze_what_to_do():
 
     prompt += "\n\n注意！1. 分析中你必须并根据审核员意见和开发日志调整分析结果。\n2. 你不允许对所在目录的父目录进行写入操作！\n"
 
-    if config["MOCK"]:
-        execute_result = _execute_script_subprocess(
-            f'python {config["SIM_CURSOR_PATH"]} -p --force --output-format text "{prompt}"',
+    if cfg["MOCK"] and cfg.get("SIM_SDK_SERVER"):
+        execute_result = await execute_sim_sdk_text(
+            cfg["SIM_CURSOR_PATH"],
+            ["-p", "--force", "--output-format", "text", prompt],
+            env_vars=env_vars,
+            timeout=cfg.get("CURSOR_TIMEOUT"),
+        )
+    elif cfg["MOCK"]:
+        execute_result = await _execute_script_subprocess(
+            f'python {cfg["SIM_CURSOR_PATH"]} -p --force --output-format text "{prompt}"',
             env_vars=env_vars,
         )
-    elif platform.system() == "Windows" and "EXECUTE_PATH" in config:
+    elif platform.system() == "Windows" and "EXECUTE_PATH" in cfg:
         with tempfile.NamedTemporaryFile(
             mode="w", encoding="utf-8", delete=False, suffix=".prompt", dir="."
         ) as temp_file:
             temp_file.write(prompt)
             temp_file_path = os.path.abspath(os.path.join(".", temp_file.name))
-        execute_result = _execute_script_subprocess(
-            f'{config["EXECUTE_PATH"]} -p --force --output-format text --prompt-file {temp_file_path}',
+        execute_result = await _execute_script_subprocess(
+            f'{cfg["EXECUTE_PATH"]} -p --force --output-format text --prompt-file {temp_file_path}',
             env_vars=env_vars,
         )
     else:
         prompt = shlex.quote(prompt)
-        execute_result = _execute_script_subprocess(
-            f'{config["CURSOR_PATH"]} -p --force --output-format text "{prompt}"', env_vars=env_vars
+        execute_result = await _execute_script_subprocess(
+            f'{cfg["CURSOR_PATH"]} -p --force --output-format text "{prompt}"', env_vars=env_vars
         )
 
     return execute_result
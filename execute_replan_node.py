@@ -1,15 +1,20 @@
-﻿from langchain_openai import ChatOpenAI
-from langchain_core.prompts import ChatPromptTemplate
+﻿from langchain_core.prompts import ChatPromptTemplate
 from execute_custom_type import Plan, Response, Act, PlanExecute
 from execute_replan_utils import analyze_what_to_do
+from snapshot_store import snapshot_project
+from summary_service import asummarize
+from token_budget import count_tokens, get_budget
+from requirement_index import get_requirement_index, select_sections
 from constants import (
     UNKNOWN_ERROR_MESSAGE,
 )
+from run_context import current_config
+from typing import Dict
+from model_pool import get_model
+from functools import lru_cache
 
 import os
-import stat
 import json
-import shutil
 import logging
 import asyncio
 
@@ -22,28 +27,12 @@ logger = logging.getLogger(__name__)
 
 config = json.load(open("config.json", "r", encoding="utf-8"))
 
-_model = ChatOpenAI(
-    model="qwen-max",
-    openai_api_key=config["QWEN_API_KEY"],
-    openai_api_base=config["QWEN_API_BASE"],
-    temperature=0.7,
-)
 
-summary_prompt = ChatPromptTemplate.from_messages(
-    [
-        (
-            "system",
-            f"""
-        你是一位非常专业的总结专家，善于抓住项目日志中的重点内容。请把项目日志的字数控制在{config["SUMMARY_MAX_LENGTH"]}个token以内。
-        注意！
-        尽量保留日志中的重要信息，适当压缩其他信息，不要遗漏重要信息！
-        """,
-        ),
-        ("user", "{input}"),
-    ]
-)
+def _config() -> Dict:
+    return current_config(config)
+
 
-summary_pro = summary_prompt | _model
+MODEL_NAME = "qwen-max"
 
 _prompt = ChatPromptTemplate.from_messages(
     [
@@ -55,7 +44,7 @@ _prompt = ChatPromptTemplate.from_messages(
         我们的客户的需求是：
         {todo}
 
-        我们最近一次计划是：
+        我们最近一次计划是（其中的步骤已经全部执行完毕）：
         {plan}
 
         我们最近一次的开发成果是：
@@ -78,7 +67,7 @@ _prompt = ChatPromptTemplate.from_messages(
         9. 只有你通过项目的实际情况发现项目已经满足客户需求且已经修复完审核意见，你才能输出“开发完成”！
         10. 计划请以JSON格式输出，包含action字段，action字段应该包含steps字段，steps字段类型List[str]！
         11. 答案请以JSON格式输出，包含action字段，action字段应该包含response字段，response字段类型str！
-        12. 你只允许在计划中补充步骤，不要删除原有的步骤！
+        12. 最近一次计划中的步骤已经全部执行过了，新的计划只包含还需要补充执行的步骤！
         13. 已经执行的步骤不要再次执行！已经执行的步骤不要再次执行！已经执行的步骤不要再次执行！已经执行的步骤不要再次执行！已经执行的步骤不要再次执行！已经执行的步骤不要再次执行！已经执行的步骤不要再次执行！
         14. 项目实际状况中没有提到的问题，你必须默认项目没有这个问题！
         """,
@@ -86,31 +75,65 @@ _prompt = ChatPromptTemplate.from_messages(
     ]
 )
 
-agent = _prompt | _model.with_structured_output(Act)
 
+# 模型客户端在第一次调整计划时才创建，见 model_pool
+@lru_cache(maxsize=None)
+def _init_agent():
+    return _prompt | get_model("qwen", MODEL_NAME, 0.7).with_structured_output(Act)
+
+
+# 选取相关需求片段时至少参考的最近执行步骤数，刚执行完的一批步骤更多时参考整批
+RECENT_STEPS = 3
 
-def remove_readonly(func, path, _):
-    """用于处理只读文件的错误回调函数"""
-    os.chmod(path, stat.S_IWRITE)
-    func(path)
+# 需求、计划、开发成果和项目实际状况都会放进 _prompt，按模型的上下文窗口分配预算
+_budget = get_budget(MODEL_NAME)
 
 
 async def execute_replan_node(state: PlanExecute) -> PlanExecute:
+    cfg = _config()
     logger.info("正在根据当前开发结果调整计划...")
 
-    plan = state.get("plan", [])
-    plan = "\n".join(plan)
+    try:
+        count = int(state["input"].split("：")[1])
+    except (KeyError, IndexError, ValueError):
+        count = 0
+    step_count = len(state.get("past_steps", []))
+
+    # 执行节点一次执行完整个计划，这里的计划就是刚执行完的一批步骤
+    plan_steps = state.get("plan", [])
+    plan = "\n".join(plan_steps)
+
+    past_steps = state.get("past_steps", [])
 
     async def read_todo_content():
         todo = ""
         try:
-            todo_file_path = os.path.join(".", "todo", config["PROJECT_NAME"], "todo.md")
+            todo_file_path = os.path.join(".", "todo", cfg["PROJECT_NAME"], "todo.md")
             with open(todo_file_path, "r", encoding="utf-8") as f:
                 todo = f.read()
-                if len(todo) > config["SUMMARY_THRESHOLD"]:
-                    todo = summary_pro.invoke(
-                        f"请适当总结项目需求，项目需求内容如下：\n{todo}"
-                    ).content.strip()
+
+            todo_budget = _budget.section_budget("todo")
+            if count_tokens(todo) > todo_budget:
+                # 需求过长时只取与当前计划和最近几步相关的需求片段，找不到相关片段时才总结
+                query = (
+                    plan
+                    + "\n"
+                    + "\n".join(
+                        f"{step}\n{response}"
+                        for step, response in past_steps[-max(RECENT_STEPS, len(plan_steps)) :]
+                    )
+                )
+                index = await asyncio.to_thread(get_requirement_index, cfg["PROJECT_NAME"])
+                selected = await asyncio.to_thread(
+                    select_sections, index, "todo.md", query, todo_budget, count_tokens
+                )
+                if selected:
+                    todo = selected
+                else:
+                    target = _budget.summary_target(todo_budget)
+                    todo = await asummarize(
+                        f"请适当总结项目需求，总结后不超过{target}个token，项目需求内容如下：\n{todo}"
+                    )
 
         except Exception as e:
             logger.error(f"读取需求文档失败: {e}")
@@ -119,8 +142,6 @@ async def execute_replan_node(state: PlanExecute) -> PlanExecute:
 
         return ("todo", todo)
 
-    past_steps = state.get("past_steps", [])
-
     async def read_past_steps(past_steps):
         past_steps_content = ""
         for index, past_step in enumerate(past_steps):
@@ -130,10 +151,12 @@ async def execute_replan_node(state: PlanExecute) -> PlanExecute:
             step, response = past_step
             past_steps_content += f"步骤：\n{step}\n\n响应：\n{response}\n\n"
 
-        if len(past_steps_content) > config["SUMMARY_THRESHOLD"]:
-            past_steps_content = summary_pro.invoke(
-                f"请适当总结项目开发日志，项目开发日志内容如下：\n{past_steps_content}"
-            ).content.strip()
+        if count_tokens(past_steps_content) > _budget.section_budget("past_steps"):
+            target = _budget.summary_target(_budget.section_budget("past_steps"))
+            past_steps_content = await asummarize(
+                f"请适当总结项目开发日志，总结后不超过{target}个token，"
+                f"项目开发日志内容如下：\n{past_steps_content}"
+            )
             past_steps = [("过去一系列任务摘要", past_steps_content), past_steps[-1]]
             past_steps_content += "\n\n"
 
@@ -157,7 +180,7 @@ async def execute_replan_node(state: PlanExecute) -> PlanExecute:
     analysis_count = 0
     project_status = ""
     while analysis_count < 3:
-        project_status = analyze_what_to_do(
+        project_status = await analyze_what_to_do(
             count=0, past_steps_content=past_steps_content, plan=plan
         )
         if project_status != "分析失败！" and project_status != "执行失败！":
@@ -165,15 +188,26 @@ async def execute_replan_node(state: PlanExecute) -> PlanExecute:
 
         analysis_count += 1
 
-    if len(project_status) > config["SUMMARY_THRESHOLD"]:
-        project_status = summary_pro.invoke(
-            f"请适当总结项目实际状况，项目实际状况内容如下：\n{project_status}"
-        ).content.strip()
+    # 需求、计划和开发成果没有用完的预算可以留给项目实际状况
+    allocation = _budget.allocate(
+        {
+            "todo": count_tokens(todo),
+            "plan": count_tokens(plan),
+            "past_steps": count_tokens(past_steps_content),
+            "project_status": count_tokens(project_status),
+        }
+    )
+    if count_tokens(project_status) > allocation["project_status"]:
+        target = _budget.summary_target(allocation["project_status"])
+        project_status = await asummarize(
+            f"请适当总结项目实际状况，总结后不超过{target}个token，"
+            f"项目实际状况内容如下：\n{project_status}"
+        )
         logger.info("压缩开发日志成功")
 
     logger.info(f"项目实际状况: \n{project_status}")
 
-    result = await agent.ainvoke(
+    result = await _init_agent().ainvoke(
         {
             "todo": todo,
             "plan": plan,
@@ -187,11 +221,10 @@ async def execute_replan_node(state: PlanExecute) -> PlanExecute:
     if isinstance(result.action, Response):
         return {"response": result.action.response}
     elif isinstance(result.action, Plan):
-        history_dir = os.path.join(".", "history", config["PROJECT_NAME"])
-        if os.path.exists(history_dir):
-            shutil.rmtree(history_dir, onerror=remove_readonly)
-        dist_dir = os.path.join(".", "dist", config["PROJECT_NAME"])
-        shutil.copytree(dist_dir, history_dir, dirs_exist_ok=True)
+        # 每完成一批步骤打一次快照，执行失败时回滚到这里
+        await asyncio.to_thread(
+            snapshot_project, cfg["PROJECT_NAME"], f"round_{count}_step_{step_count}"
+        )
 
         return {"plan": result.action.steps, "past_steps": past_steps}
     else:
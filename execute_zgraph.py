@@ -3,9 +3,15 @@ from execute_custom_type import PlanExecute
 from custom_type import ActionReview
 from execute_plan_node import execute_plan_node
 from execute_replan_node import execute_replan_node
-from execute_execute_node import execute_node
-from langchain_openai import ChatOpenAI
-from langchain_core.prompts import ChatPromptTemplate
+from execute_execute_node import execute_node, release_session
+from snapshot_store import rollback_project
+from log_summarizer import summarize_log_incrementally
+from summary_service import asummarize
+from token_budget import count_tokens, get_budget
+from checkpoint_store import clear_step_results, open_checkpointer, thread_config, thread_id
+from run_context import current_config
+from tracing import traced
+from typing import Dict
 
 import asyncio
 import json
@@ -23,28 +29,15 @@ logger = logging.getLogger(__name__)
 
 config = json.load(open("./config.json", "r", encoding="utf-8"))
 
-dp_model = ChatOpenAI(
-    model="deepseek-chat",
-    openai_api_key=config["DEEPSEEK_API_KEY"],
-    openai_api_base=config["DEEPSEEK_API_BASE"],
-    temperature=0.4,
-)
 
-summary_prompt = ChatPromptTemplate.from_messages(
-    [
-        (
-            "system",
-            f"""
-        你是一位非常专业的总结专家，善于抓住项目日志中的重点内容。请把项目日志的字数控制在{config["SUMMARY_MAX_LENGTH"]}个token以内。
-        注意！
-        你只需要保留完成了哪些需求，遗留了哪些问题，重复出现的信息和除了需求和问题之外的其他信息都删除！
-        """,
-        ),
-        ("user", "{input}"),
-    ]
-)
+def _config() -> Dict:
+    return current_config(config)
+
 
-summary_pro = summary_prompt | dp_model
+async def _summarize_development_log(content: str) -> str:
+    return await asummarize(
+        f"请适当总结项目开发日志，项目开发日志内容如下：\n{content}", style="progress"
+    )
 
 
 def remove_readonly(func, path, _):
@@ -60,62 +53,77 @@ def _should_end(state: PlanExecute):
         return "execute_execute"
 
 
-def _init_graph():
+def _init_graph(checkpointer=None):
     workflow = StateGraph[PlanExecute, None, PlanExecute, PlanExecute](PlanExecute)
-    workflow.add_node("execute_plan", execute_plan_node)
-    workflow.add_node("execute_replan", execute_replan_node)
-    workflow.add_node("execute_execute", execute_node)
+    workflow.add_node("execute_plan", traced("execute_plan", "node")(execute_plan_node))
+    workflow.add_node("execute_replan", traced("execute_replan", "node")(execute_replan_node))
+    workflow.add_node("execute_execute", traced("execute_execute", "node")(execute_node))
 
     workflow.add_edge(START, "execute_plan")
     workflow.add_conditional_edges("execute_plan", _should_end, ["execute_execute", END])
     workflow.add_edge("execute_execute", "execute_replan")
     workflow.add_conditional_edges("execute_replan", _should_end, ["execute_execute", END])
 
-    app = workflow.compile()
+    app = workflow.compile(checkpointer=checkpointer)
 
     return app
 
 
 async def execute_zgraph(state: ActionReview) -> ActionReview:
+    cfg = _config()
     count = 0
     if "count" in state:
         count = state["count"]
 
     logger.info("正在开发项目...")
 
-    # 每次调用时重建图，避免recursion_limit累计
-    app = _init_graph()
-
-    recursion_limit = config.get("RECURSION_LIMIT", 50)
+    recursion_limit = cfg.get("RECURSION_LIMIT", 50)
     logger.info(f"迭代次数：{recursion_limit}")
 
+    # 每轮开发一个检查点线程，进程中断后重新进入本轮时从最后完成的节点继续
+    run_config = {
+        **thread_config(cfg["PROJECT_NAME"], count),
+        "recursion_limit": recursion_limit,
+    }
+
     try:
-        await app.ainvoke({"input": f"开发轮数：{count}"}, {"recursion_limit": recursion_limit})
+        async with open_checkpointer() as checkpointer:
+            # 每次调用时重建图，避免recursion_limit累计
+            app = _init_graph(checkpointer)
+
+            snapshot = await app.aget_state(run_config)
+            if snapshot.next:
+                logger.info(f"从上次中断的节点继续开发: {', '.join(snapshot.next)}")
+                await app.ainvoke(None, run_config)
+            elif snapshot.values:
+                logger.info("本轮开发已经完成，跳过")
+            else:
+                await app.ainvoke({"input": f"开发轮数：{count}"}, run_config)
+
+        # 本轮已经完成，不再需要逐步骤的完成记录
+        await asyncio.to_thread(clear_step_results, thread_id(cfg["PROJECT_NAME"], count))
 
     except Exception as e:
         logger.error(f"执行计划失败: {e}")
-        dist_dir = os.path.join(".", "dist", config["PROJECT_NAME"])
-        shutil.rmtree(dist_dir, onerror=remove_readonly)
-        history_dir = os.path.join(".", "history", config["PROJECT_NAME"])
-        if os.path.exists(history_dir):
-            shutil.copytree(history_dir, dist_dir)
+        # 回滚到最新快照，只重写发生变化的文件；没有快照时清空开发目录
+        restored = await asyncio.to_thread(rollback_project, cfg["PROJECT_NAME"])
+        # 回滚后已完成步骤写入的文件不复存在，继续执行时这些步骤需要重新执行
+        await asyncio.to_thread(clear_step_results, thread_id(cfg["PROJECT_NAME"], count))
+        dist_dir = os.path.join(".", "dist", cfg["PROJECT_NAME"])
+        if not restored and os.path.exists(dist_dir):
+            shutil.rmtree(dist_dir, onerror=remove_readonly)
 
     finally:
-        development_log_path = os.path.join(".", "dist", config["PROJECT_NAME"], "development.log")
+        release_session(thread_id(cfg["PROJECT_NAME"], count))
+        development_log_path = os.path.join(".", "dist", cfg["PROJECT_NAME"], "development.log")
         if os.path.exists(development_log_path):
-            content = ""
-            with open(development_log_path, "r", encoding="utf-8") as f:
-                content_parts = f.readlines()
-                for part in content_parts:
-                    content += part + "\n"
-                    if len(content) > config["SUMMARY_THRESHOLD"]:
-                        content = summary_pro.invoke(
-                            f"请适当总结项目开发日志，项目开发日志内容如下：\n{content}"
-                        ).content.strip()
-                        content += "\n"
-
-            with open(development_log_path, "w", encoding="utf-8") as f:
-                f.write(content)
+            # 开发日志最终由审核智能体（qwen-plus）读取
+            await summarize_log_incrementally(
+                development_log_path,
+                _summarize_development_log,
+                get_budget("qwen-plus").section_budget("development_log"),
+                measure=count_tokens,
+            )
 
     return {"count": count}
 
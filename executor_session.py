@@ -0,0 +1,237 @@
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+from langchain_core.messages import AIMessage, BaseMessage, ToolMessage
+from plan_scheduler import PROJECT_ROOT, infer_step_paths
+from token_budget import count_tokens
+
+import re
+import ast
+import logging
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    handlers=[logging.StreamHandler()],
+)
+logger = logging.getLogger(__name__)
+
+# 记忆默认占用的 token 上限，为 0 时不携带记忆
+MEMORY_MAX_TOKENS = 1000
+
+# 单条记录的长度上限
+STEP_MAX_CHARS = 80
+DECISION_MAX_CHARS = 160
+FILES_PER_STEP = 10
+ENTRIES_PER_LISTING = 30
+MAX_LISTINGS = 5
+MAX_REQUIREMENT_REFS = 12
+
+# 需求检索和读取结果中的位置，如 [docs/login.md:12-30]
+_REQUIREMENT_REF = re.compile(r"\[([^\[\]\n]+?):(\d+)-(\d+)\]")
+
+
+@dataclass
+class StepRecord:
+    """一个已完成步骤的摘要：做了什么、动了哪些文件、结论是什么"""
+
+    step: str
+    files: List[str] = field(default_factory=list)
+    decision: str = ""
+
+
+def _shorten(text: str, limit: int) -> str:
+    text = " ".join(str(text).split())
+    return text if len(text) <= limit else text[: limit - 1] + "…"
+
+
+def _listing_entries(content: Any) -> Optional[List[str]]:
+    """list_files 的结果是文件名列表，出错时是一句提示"""
+    if isinstance(content, list):
+        return [str(item) for item in content]
+
+    try:
+        value = ast.literal_eval(content)
+    except (ValueError, SyntaxError):
+        return None
+
+    return [str(item) for item in value] if isinstance(value, (list, tuple)) else None
+
+
+class StepMemory:
+    """
+    执行计划时各步骤共享的记忆
+
+    记录每个步骤涉及的文件和结论、列出过的目录内容以及查到过的需求位置，
+    在后续步骤的任务说明中附上，减少重复的 list_files 和需求检索。
+    渲染结果不超过 max_tokens，超出时依次丢弃目录内容、需求位置和最早完成的步骤。
+    """
+
+    def __init__(self, max_tokens: int = MEMORY_MAX_TOKENS, project_dir: Optional[str] = None):
+        self.max_tokens = max_tokens
+        self.project_dir = project_dir
+        self.steps: List[StepRecord] = []
+        self.listings: Dict[str, List[str]] = {}
+        self.requirement_refs: List[str] = []
+
+    def record(self, step: str, messages: List[BaseMessage]) -> StepRecord:
+        """
+        从智能体完成步骤时的消息中提取记忆
+
+        Args:
+            step: 步骤描述
+            messages: 智能体返回的全部消息
+
+        Returns:
+            这个步骤的记录
+        """
+        record = StepRecord(step=step)
+        files: List[str] = []
+        calls: Dict[str, Dict] = {}
+
+        for message in messages:
+            if isinstance(message, AIMessage):
+                for call in message.tool_calls:
+                    calls[call.get("id") or ""] = call
+                    files.extend(self._touched_files(call["name"], call["args"]))
+            elif isinstance(message, ToolMessage):
+                call = calls.get(message.tool_call_id)
+                if call is not None:
+                    self._remember_result(call["name"], call["args"], message.content)
+
+        record.files = list(dict.fromkeys(files))[:FILES_PER_STEP]
+        if messages and isinstance(messages[-1], AIMessage):
+            record.decision = _shorten(messages[-1].text, DECISION_MAX_CHARS)
+
+        self.steps.append(record)
+        return record
+
+    def _touched_files(self, name: str, args: Dict) -> List[str]:
+        if name == "code_professional":
+            paths = infer_step_paths(args.get("prompt", ""), self.project_dir)
+            return [f"编写 {path}" for path in sorted(paths) if path != PROJECT_ROOT]
+        if name == "mkdir":
+            return [f"创建目录 {args.get('path', '')}"]
+        if name == "rm":
+            return [f"删除 {args.get('path', '')}"]
+
+        return []
+
+    def _remember_result(self, name: str, args: Dict, content: Any) -> None:
+        if name == "list_files":
+            entries = _listing_entries(content)
+            if entries is not None:
+                path = args.get("path", "") or "."
+                self.listings.pop(path, None)
+                self.listings[path] = sorted(entries)
+                while len(self.listings) > MAX_LISTINGS:
+                    self.listings.pop(next(iter(self.listings)))
+        elif name in ("search_requirements", "read_requirement"):
+            for file_name, start, end in _REQUIREMENT_REF.findall(str(content)):
+                ref = f"{file_name}:{start}-{end}"
+                if ref in self.requirement_refs:
+                    self.requirement_refs.remove(ref)
+                self.requirement_refs.append(ref)
+            del self.requirement_refs[:-MAX_REQUIREMENT_REFS]
+
+    def _render_step(self, record: StepRecord) -> str:
+        line = f"- {_shorten(record.step, STEP_MAX_CHARS)}"
+        if record.files:
+            line += f"；{', '.join(record.files)}"
+        if record.decision:
+            line += f"；结果：{record.decision}"
+
+        return line
+
+    def render(self) -> str:
+        """
+        渲染为附在任务说明前的文本，没有记忆时返回空字符串
+        """
+        if self.max_tokens <= 0:
+            return ""
+
+        extras = []
+        if self.listings:
+            lines = []
+            for path, entries in self.listings.items():
+                shown = ", ".join(entries[:ENTRIES_PER_LISTING])
+                more = f" 等{len(entries)}项" if len(entries) > ENTRIES_PER_LISTING else ""
+                lines.append(f"- {path}：{shown or '（空）'}{more}")
+            extras.append("已经列出过的目录（之后的步骤可能又有改动）：\n" + "\n".join(lines))
+        if self.requirement_refs:
+            extras.append(
+                "已经查到的相关需求位置，可以直接按行号读取：" + ", ".join(self.requirement_refs)
+            )
+
+        # 超出预算时先丢弃目录内容，再丢弃需求位置，最后从最早的步骤开始丢弃
+        while extras and count_tokens("\n\n".join(extras)) > self.max_tokens:
+            extras.pop(0)
+
+        budget = self.max_tokens - count_tokens("\n\n".join(extras))
+        step_lines: List[str] = []
+        for record in reversed(self.steps):
+            line = self._render_step(record)
+            cost = count_tokens(line)
+            if cost > budget:
+                break
+            step_lines.insert(0, line)
+            budget -= cost
+
+        # 标题和分隔符也占 token，整体仍超出时继续丢弃最早的步骤
+        text = self._join(step_lines, extras)
+        while step_lines and count_tokens(text) > self.max_tokens:
+            step_lines.pop(0)
+            text = self._join(step_lines, extras)
+
+        return text
+
+    def _join(self, step_lines: List[str], extras: List[str]) -> str:
+        sections = extras
+        if step_lines:
+            header = "之前的步骤已经完成的工作"
+            omitted = len(self.steps) - len(step_lines)
+            if omitted:
+                header += f"（省略了更早完成的{omitted}个步骤）"
+            sections = [f"{header}：\n" + "\n".join(step_lines)] + extras
+
+        return "\n\n".join(sections)
+
+
+class ExecutorSession:
+    """
+    一轮计划执行的会话：所有步骤共用同一个编译好的智能体和同一份步骤记忆
+    """
+
+    def __init__(self, agent, recursion_limit: int, memory: Optional[StepMemory] = None):
+        self.agent = agent
+        self.recursion_limit = recursion_limit
+        self.memory = memory or StepMemory()
+
+    def format_task(self, task: str) -> str:
+        formatted_task = f"""
+        完成这个任务：{task}
+
+        注意！
+        不要做和任务无关的事情！
+        """
+
+        context = self.memory.render()
+        if context:
+            formatted_task = (
+                f"{context}\n\n以上是本轮已经确认过的信息，不需要重复查看。\n{formatted_task}"
+            )
+
+        return formatted_task
+
+    async def run_step(self, task: str) -> str:
+        """执行一个步骤，返回智能体的最终回复，并把这个步骤记入记忆"""
+        logger.info(f"开发团队正在完成任务：{task}...")
+
+        agent_response = await self.agent.ainvoke(
+            {"messages": [("user", self.format_task(task))]},
+            {"recursion_limit": self.recursion_limit},
+        )
+
+        messages = agent_response["messages"]
+        self.memory.record(task, messages)
+
+        return messages[-1].content
@@ -0,0 +1,582 @@
+from dataclasses import asdict, dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Awaitable, Callable, Dict, List, Optional
+from run_context import RunContext, get_context, make_context
+from approval_policy import APPROVAL_MODES, DEFAULT_MAX_ROUNDS, build_policy, set_policy
+from main import run_project
+from cursor_executor import close_sim_clients
+from model_pool import close_http_clients
+from tracing import TRACE_DIR, span, tracer
+
+import os
+import re
+import hmac
+import json
+import time
+import uuid
+import shutil
+import asyncio
+import logging
+import argparse
+import tempfile
+import threading
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    handlers=[logging.StreamHandler()],
+)
+logger = logging.getLogger(__name__)
+
+config = json.load(open("./config.json", "r", encoding="utf-8"))
+
+JOB_SPOOL_DIR = "./spool"
+JOB_LOG_DIR = "./logs"
+# 任务的需求目录必须位于这个目录下
+JOB_REQUIREMENTS_ROOT = "./incoming"
+
+# 项目名会用来拼接 todo、dist、投递目录和快照的路径
+PROJECT_NAME_PATTERN = re.compile(r"^[A-Za-z0-9_-]+$")
+
+# 任务可以覆盖的配置项。可执行文件路径、MOCK、API 密钥等会影响执行什么命令的配置只能在 config.json 中修改
+JOB_CONFIG_KEYS = (
+    "RECURSION_LIMIT",
+    "CURSOR_TIMEOUT",
+    "EXECUTE_MAX_WORKERS",
+    "EXECUTE_MEMORY_MAX_TOKENS",
+    "SNAPSHOT_KEEP",
+    "SUMMARY_MAX_LENGTH",
+    "SUMMARY_THRESHOLD",
+    "REQUIREMENT_SEARCH_MAX_CHARS",
+    "REQUIREMENT_SEARCH_LIMIT",
+)
+
+# HTTP 接口接受的请求体上限（字节）
+MAX_REQUEST_BYTES = 1024 * 1024
+
+# 任务状态
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+def _write_json(path: str, data) -> None:
+    """原子地写入 JSON 文件，避免读取到写了一半的任务或状态"""
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(temp_path, path)
+
+
+@dataclass
+class Job:
+    """
+    一个项目的开发任务
+
+    priority 越大越先执行；requirements 为需求目录（位于 JOB_REQUIREMENTS_ROOT 下），
+    执行前复制到 todo/<project>；config 为该任务的配置覆盖项，只能包含 JOB_CONFIG_KEYS 中的配置。
+    """
+
+    project: str
+    priority: int = 0
+    count: int = 0
+    resume: bool = False
+    requirements: Optional[str] = None
+    config: Dict = field(default_factory=dict)
+    id: str = ""
+    state: str = QUEUED
+    submitted_at: float = 0.0
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    result: Optional[str] = None
+    error: Optional[str] = None
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "Job":
+        if not isinstance(data, dict):
+            raise ValueError("任务必须是对象")
+        if not data.get("project"):
+            raise ValueError("任务缺少 project")
+        if not PROJECT_NAME_PATTERN.match(str(data["project"])):
+            raise ValueError(f"项目名只能包含字母、数字、下划线和连字符: {data['project']}")
+        if data.get("id") and not PROJECT_NAME_PATTERN.match(str(data["id"])):
+            raise ValueError(f"任务 id 只能包含字母、数字、下划线和连字符: {data['id']}")
+
+        overrides = data.get("config") or {}
+        if not isinstance(overrides, dict):
+            raise ValueError("任务的 config 必须是对象")
+        forbidden = sorted(set(overrides) - set(JOB_CONFIG_KEYS))
+        if forbidden:
+            raise ValueError(f"任务不能覆盖这些配置: {', '.join(forbidden)}")
+
+        if data.get("requirements") is not None and not isinstance(data["requirements"], str):
+            raise ValueError("任务的 requirements 必须是字符串")
+
+        names = cls.__dataclass_fields__.keys()
+        values = {key: value for key, value in data.items() if key in names}
+        # priority 参与队列排序，类型不对时到出队比较才出错，这里提前转换
+        for key, convert in (("priority", int), ("count", int), ("submitted_at", float)):
+            if key in values:
+                try:
+                    values[key] = convert(values[key])
+                except (TypeError, ValueError):
+                    raise ValueError(f"任务的 {key} 必须是数字: {values[key]!r}")
+        if not isinstance(values.get("resume", False), bool):
+            raise ValueError(f"任务的 resume 必须是布尔值: {values['resume']!r}")
+
+        return cls(**values)
+
+
+def submit_job(spool_dir: str, payload: Dict) -> Job:
+    """把任务写入投递目录，守护进程下次扫描时领取"""
+    job = Job.from_dict(payload)
+    job.id = job.id or f"{time.strftime('%Y%m%d%H%M%S')}_{job.project}_{uuid.uuid4().hex[:6]}"
+    job.submitted_at = job.submitted_at or time.time()
+    job.state = QUEUED
+    _write_json(os.path.join(spool_dir, f"{job.id}.json"), asdict(job))
+
+    return job
+
+
+def read_status(spool_dir: str, job_id: Optional[str] = None) -> List[Dict]:
+    """读取任务状态，job_id 为空时返回所有任务，按提交时间排序"""
+    status_dir = os.path.join(spool_dir, "status")
+    if not os.path.isdir(status_dir):
+        return []
+
+    names = [f"{job_id}.json"] if job_id else os.listdir(status_dir)
+    jobs = []
+    for name in names:
+        path = os.path.join(status_dir, name)
+        if not name.endswith(".json") or not os.path.exists(path):
+            continue
+        with open(path, "r", encoding="utf-8") as f:
+            jobs.append(json.load(f))
+
+    return sorted(jobs, key=lambda job: job["submitted_at"])
+
+
+def resolve_requirements(path: str, root: str) -> str:
+    """
+    解析任务的需求目录，相对路径相对于 root
+
+    Raises:
+        ValueError: 需求目录不在 root 下
+    """
+    root = os.path.realpath(root)
+    resolved = os.path.realpath(os.path.join(root, path))
+    if os.path.commonpath([root, resolved]) != root:
+        raise ValueError(f"需求目录必须位于 {root} 下: {path}")
+
+    return resolved
+
+
+def _ignore_symlinks(directory: str, names: List[str]) -> List[str]:
+    """复制需求目录时跳过符号链接，避免借此复制需求目录以外的文件"""
+    return [name for name in names if os.path.islink(os.path.join(directory, name))]
+
+
+class ProjectLogHandler(logging.Handler):
+    """按运行上下文把日志写入 <log_dir>/<项目>.log，没有运行上下文的日志不写入"""
+
+    def __init__(self, log_dir: str):
+        super().__init__()
+        self.log_dir = log_dir
+        self.setFormatter(logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s"))
+        os.makedirs(log_dir, exist_ok=True)
+
+    def emit(self, record: logging.LogRecord) -> None:
+        context = get_context()
+        if context is None:
+            return
+
+        try:
+            path = os.path.join(self.log_dir, f"{context.project_name}.log")
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(self.format(record) + "\n")
+        except Exception:
+            self.handleError(record)
+
+
+Runner = Callable[[RunContext, int, bool], Awaitable[Optional[Dict]]]
+
+
+class JobDaemon:
+    """
+    项目任务守护进程
+
+    定时扫描投递目录，领取的任务按优先级排队，最多同时执行 max_concurrency 个项目；
+    同一个项目的任务按顺序执行。任务状态写在 <spool_dir>/status 下，进程重启后
+    未完成的任务重新排队，正在执行的任务从检查点继续。
+
+    每个任务结束后，它的耗时片段导出到 <trace_dir>/trace_<任务>.json（trace_dir 为空时不导出）
+    并从内存中释放。
+    """
+
+    def __init__(
+        self,
+        spool_dir: str,
+        runner: Runner,
+        max_concurrency: int = 2,
+        poll_interval: float = 2.0,
+        requirements_root: str = JOB_REQUIREMENTS_ROOT,
+        trace_dir: Optional[str] = None,
+    ):
+        self.spool_dir = spool_dir
+        self.runner = runner
+        self.requirements_root = requirements_root
+        self.trace_dir = trace_dir
+        self.max_concurrency = max_concurrency
+        self.poll_interval = poll_interval
+        self.claimed_dir = os.path.join(spool_dir, "claimed")
+        self.status_dir = os.path.join(spool_dir, "status")
+        self._queue: asyncio.PriorityQueue = asyncio.PriorityQueue()
+        self._seq = 0
+        self._running_projects = set()
+        # 同一项目正在执行时，后来的任务在这里等待
+        self._waiting: Dict[str, List[Job]] = {}
+
+        os.makedirs(self.claimed_dir, exist_ok=True)
+        os.makedirs(self.status_dir, exist_ok=True)
+
+    def _save(self, job: Job) -> None:
+        _write_json(os.path.join(self.status_dir, f"{job.id}.json"), asdict(job))
+
+    def _enqueue(self, job: Job) -> None:
+        self._seq += 1
+        self._queue.put_nowait((-job.priority, self._seq, job))
+
+    def recover(self) -> int:
+        """重新排队上次进程退出时没有完成的任务"""
+        recovered = 0
+        for name in sorted(os.listdir(self.claimed_dir)):
+            if not name.endswith(".json"):
+                continue
+            status_path = os.path.join(self.status_dir, name)
+            if not os.path.exists(status_path):
+                continue
+
+            try:
+                with open(status_path, "r", encoding="utf-8") as f:
+                    job = Job.from_dict(json.load(f))
+            except (OSError, ValueError, TypeError) as e:
+                # 一个损坏的状态文件不影响恢复其他任务
+                logger.error(f"无法恢复任务 {name}: {e}")
+                continue
+            if job.state not in (QUEUED, RUNNING):
+                continue
+
+            if job.state == RUNNING:
+                job.resume = True
+                job.state = QUEUED
+                self._save(job)
+            self._enqueue(job)
+            recovered += 1
+
+        if recovered:
+            logger.info(f"重新排队{recovered}个未完成的任务")
+
+        return recovered
+
+    def scan(self) -> int:
+        """领取投递目录中的新任务"""
+        claimed = 0
+        for name in sorted(os.listdir(self.spool_dir)):
+            path = os.path.join(self.spool_dir, name)
+            if not name.endswith(".json") or not os.path.isfile(path):
+                continue
+
+            claimed_path = os.path.join(self.claimed_dir, name)
+            try:
+                os.replace(path, claimed_path)
+                with open(claimed_path, "r", encoding="utf-8") as f:
+                    job = Job.from_dict(json.load(f))
+
+                # 状态文件与领取的任务文件同名，重启后据此恢复
+                job.id = name[: -len(".json")]
+                job.submitted_at = job.submitted_at or time.time()
+                job.state = QUEUED
+                self._save(job)
+                self._enqueue(job)
+            except (OSError, ValueError, TypeError, AttributeError) as e:
+                logger.error(f"无法领取任务 {name}: {e}")
+                continue
+
+            claimed += 1
+            logger.info(f"领取任务 {job.id}，项目 {job.project}，优先级 {job.priority}")
+
+        return claimed
+
+    def _prepare(self, job: Job) -> RunContext:
+        base = make_context(config, job.project)
+        context = RunContext({**base.config, **job.config, "PROJECT_NAME": job.project})
+        if job.requirements:
+            requirements = resolve_requirements(job.requirements, self.requirements_root)
+            shutil.copytree(
+                requirements, context.todo_dir, ignore=_ignore_symlinks, dirs_exist_ok=True
+            )
+        if not os.path.exists(context.todo_dir):
+            raise FileNotFoundError(f"项目{job.project}需求不存在")
+
+        return context
+
+    def _export_trace(self, job: Job, job_span) -> None:
+        try:
+            if self.trace_dir:
+                chrome_path, _ = tracer.export(
+                    self.trace_dir, root=job_span.id, name=f"trace_{job.id}"
+                )
+                logger.info(f"任务 {job.id} 的耗时记录已写入 {chrome_path}")
+        except OSError as e:
+            logger.warning(f"写入任务 {job.id} 的耗时记录失败: {e}")
+        finally:
+            tracer.discard(job_span.id)
+
+    async def _run_job(self, job: Job) -> None:
+        job.state = RUNNING
+        job.started_at = time.time()
+        job.error = None
+        self._save(job)
+        logger.info(f"开始执行任务 {job.id}，项目 {job.project}")
+
+        job_span = None
+        try:
+            with span("job", "job", project=job.project, job=job.id) as job_span:
+                context = await asyncio.to_thread(self._prepare, job)
+                result = await self.runner(context, job.count, job.resume)
+            job.result = (result or {}).get("response")
+            job.state = DONE
+        except Exception as e:
+            logger.error(f"任务 {job.id} 执行失败: {e}")
+            job.error = str(e)
+            job.state = FAILED
+        finally:
+            job.finished_at = time.time()
+            self._save(job)
+            if job_span is not None:
+                await asyncio.to_thread(self._export_trace, job, job_span)
+
+        logger.info(f"任务 {job.id} 结束，状态 {job.state}")
+
+    async def _worker(self) -> None:
+        while True:
+            _, _, job = await self._queue.get()
+            try:
+                if job.project in self._running_projects:
+                    self._waiting.setdefault(job.project, []).append(job)
+                    continue
+
+                self._running_projects.add(job.project)
+                try:
+                    await self._run_job(job)
+                finally:
+                    self._running_projects.discard(job.project)
+                    for waiting in self._waiting.pop(job.project, []):
+                        self._enqueue(waiting)
+            finally:
+                self._queue.task_done()
+
+    async def run(self, stop_event: Optional[asyncio.Event] = None) -> None:
+        """扫描投递目录并执行任务，直到 stop_event 被设置"""
+        stop_event = stop_event or asyncio.Event()
+        self.recover()
+        workers = [asyncio.create_task(self._worker()) for _ in range(self.max_concurrency)]
+        try:
+            while not stop_event.is_set():
+                self.scan()
+                try:
+                    await asyncio.wait_for(stop_event.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+    async def drain(self) -> None:
+        """执行完已经领取的所有任务"""
+        await self._queue.join()
+
+
+def _make_handler(spool_dir: str, token: str, requirements_root: str):
+    class JobRequestHandler(BaseHTTPRequestHandler):
+        """
+        POST /jobs 投递任务，GET /jobs 和 GET /jobs/<id> 查询任务状态
+
+        所有请求都需要 Authorization: Bearer <JOB_HTTP_TOKEN>；投递任务只接受 application/json，
+        浏览器不经预检无法跨站发送这种请求。
+        """
+
+        def _reply(self, status: int, data) -> None:
+            body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _authorized(self) -> bool:
+            expected = f"Bearer {token}".encode("utf-8")
+            received = self.headers.get("Authorization", "").encode("utf-8")
+            if hmac.compare_digest(received, expected):
+                return True
+
+            self._reply(401, {"error": "unauthorized"})
+            return False
+
+        def do_POST(self):
+            if not self._authorized():
+                return
+            if self.path.rstrip("/") != "/jobs":
+                return self._reply(404, {"error": "not found"})
+
+            content_type = self.headers.get("Content-Type", "").split(";")[0].strip().lower()
+            if content_type != "application/json":
+                return self._reply(415, {"error": "Content-Type must be application/json"})
+
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+                if length > MAX_REQUEST_BYTES:
+                    return self._reply(413, {"error": "request too large"})
+                payload = json.loads(self.rfile.read(length) or b"{}")
+                if not isinstance(payload, dict):
+                    raise ValueError("任务必须是 JSON 对象")
+                if payload.get("requirements"):
+                    resolve_requirements(payload["requirements"], requirements_root)
+                job = submit_job(spool_dir, payload)
+            except (ValueError, TypeError) as e:
+                return self._reply(400, {"error": str(e)})
+            self._reply(201, asdict(job))
+
+        def do_GET(self):
+            if not self._authorized():
+                return
+            parts = [part for part in self.path.split("/") if part]
+            if parts == ["jobs"]:
+                return self._reply(200, read_status(spool_dir))
+            if len(parts) == 2 and parts[0] == "jobs":
+                jobs = read_status(spool_dir, parts[1])
+                return (
+                    self._reply(200, jobs[0]) if jobs else self._reply(404, {"error": "not found"})
+                )
+            self._reply(404, {"error": "not found"})
+
+        def log_message(self, format, *args):
+            logger.info(format % args)
+
+    return JobRequestHandler
+
+
+def start_http_server(
+    spool_dir: str,
+    port: int,
+    token: str,
+    host: str = "127.0.0.1",
+    requirements_root: str = JOB_REQUIREMENTS_ROOT,
+) -> ThreadingHTTPServer:
+    """
+    在后台线程中启动本地 HTTP 接口
+
+    Raises:
+        ValueError: 没有配置访问令牌
+    """
+    if not token:
+        raise ValueError("启用任务 HTTP 接口需要配置 JOB_HTTP_TOKEN")
+
+    server = ThreadingHTTPServer((host, port), _make_handler(spool_dir, token, requirements_root))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    logger.info(f"任务接口已启动: http://{host}:{server.server_address[1]}/jobs")
+
+    return server
+
+
+async def serve(
+    spool_dir: str, max_concurrency: int, poll_interval: float, port: Optional[int]
+) -> None:
+    logging.getLogger().addHandler(ProjectLogHandler(config.get("JOB_LOG_DIR", JOB_LOG_DIR)))
+    os.makedirs(os.path.join(".", "todo"), exist_ok=True)
+
+    requirements_root = config.get("JOB_REQUIREMENTS_ROOT", JOB_REQUIREMENTS_ROOT)
+    daemon = JobDaemon(
+        spool_dir,
+        run_project,
+        max_concurrency,
+        poll_interval,
+        requirements_root,
+        config.get("TRACE_DIR", TRACE_DIR),
+    )
+    server = (
+        start_http_server(
+            spool_dir, port, config.get("JOB_HTTP_TOKEN", ""), requirements_root=requirements_root
+        )
+        if port
+        else None
+    )
+    try:
+        await daemon.run()
+    finally:
+        if server:
+            server.shutdown()
+        await close_sim_clients()
+        await close_http_clients()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="项目任务守护进程")
+    parser.add_argument("--spool-dir", default=config.get("JOB_SPOOL_DIR", JOB_SPOOL_DIR))
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    serve_parser = subparsers.add_parser("serve", help="启动守护进程")
+    serve_parser.add_argument(
+        "--max-concurrency", type=int, default=config.get("JOB_MAX_CONCURRENCY", 2)
+    )
+    serve_parser.add_argument(
+        "--poll-interval", type=float, default=config.get("JOB_POLL_INTERVAL", 2)
+    )
+    serve_parser.add_argument(
+        "--port", type=int, default=config.get("JOB_HTTP_PORT"), help="本地 HTTP 接口端口"
+    )
+    serve_parser.add_argument("--approval", choices=APPROVAL_MODES, default="auto-pass")
+    serve_parser.add_argument("--max-rounds", type=int, default=DEFAULT_MAX_ROUNDS)
+    serve_parser.add_argument("--approval-file", default="")
+
+    submit_parser = subparsers.add_parser("submit", help="投递任务")
+    submit_parser.add_argument("project")
+    submit_parser.add_argument("--priority", type=int, default=0)
+    submit_parser.add_argument("--count", type=int, default=0)
+    submit_parser.add_argument(
+        "--requirements", default=None, help="需求目录，必须位于 JOB_REQUIREMENTS_ROOT 下"
+    )
+
+    status_parser = subparsers.add_parser("status", help="查询任务状态")
+    status_parser.add_argument("job_id", nargs="?", default=None)
+
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        # 守护进程无人值守，默认自动通过所有确认
+        policy = build_policy(args.approval, args.max_rounds, args.approval_file)
+        if policy.is_interactive():
+            serve_parser.error("守护进程无人值守，审批策略不能包含需要终端确认的审批点")
+        set_policy(policy)
+        asyncio.run(serve(args.spool_dir, args.max_concurrency, args.poll_interval, args.port))
+    elif args.command == "submit":
+        requirements = args.requirements and resolve_requirements(
+            os.path.abspath(args.requirements),
+            config.get("JOB_REQUIREMENTS_ROOT", JOB_REQUIREMENTS_ROOT),
+        )
+        job = submit_job(
+            args.spool_dir,
+            {
+                "project": args.project,
+                "priority": args.priority,
+                "count": args.count,
+                "requirements": requirements,
+            },
+        )
+        print(job.id)
+    else:
+        print(json.dumps(read_status(args.spool_dir, args.job_id), ensure_ascii=False, indent=4))
@@ -0,0 +1,404 @@
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, List, Optional, Tuple
+from uuid import UUID
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+from run_context import get_context
+
+import os
+import json
+import time
+import logging
+import tempfile
+import threading
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    handlers=[logging.StreamHandler()],
+)
+logger = logging.getLogger(__name__)
+
+config = json.load(open("./config.json", "r", encoding="utf-8"))
+
+METRICS_DIR = "./metrics"
+
+# 各模型每千 token 的价格（元），可以在 config.json 的 MODEL_PRICES 中覆盖
+MODEL_PRICES = {
+    "qwen-max": {"prompt": 0.0024, "completion": 0.0096},
+    "qwen-plus": {"prompt": 0.0008, "completion": 0.002},
+    "deepseek-chat": {"prompt": 0.002, "completion": 0.003},
+}
+
+# create_agent 创建的智能体内部的节点，统计时归到调用智能体的工作流节点
+AGENT_NODES = {"model", "tools", "agent"}
+
+# 最多记录这么多个父运行的失败次数，超过时淘汰最久没有失败的父运行
+MAX_TRACKED_FAILURES = 1024
+
+
+@dataclass
+class LLMCall:
+    """一次 LLM 调用的记录"""
+
+    project: str
+    node: str
+    model: str
+    prompt_tokens: int
+    completion_tokens: int
+    latency: float
+    attempt: int
+    cost: float
+    status: str
+    timestamp: float
+    error: Optional[str] = None
+
+
+def _node_name(metadata: Dict) -> str:
+    """从 LangGraph 的元数据中找出发起调用的工作流节点"""
+    namespace = metadata.get("langgraph_checkpoint_ns", "")
+    names = [segment.split(":")[0] for segment in namespace.split("|") if segment]
+    for name in reversed(names):
+        # 同一个节点中多次调用子图时，LangGraph 会在命名空间中插入调用序号
+        if name not in AGENT_NODES and not name.isdigit():
+            return name
+
+    return metadata.get("langgraph_node") or "unknown"
+
+
+def _token_usage(response: LLMResult) -> Tuple[int, int]:
+    for generations in response.generations:
+        for generation in generations:
+            usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+            if usage:
+                return usage.get("input_tokens", 0), usage.get("output_tokens", 0)
+
+    usage = (response.llm_output or {}).get("token_usage") or {}
+
+    return usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0)
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+# 耗时直方图的桶上限（秒）
+LATENCY_BUCKETS = (0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+def _new_rollup_item() -> Dict:
+    return {
+        "calls": 0,
+        "errors": 0,
+        "prompt_tokens": 0,
+        "completion_tokens": 0,
+        "latency": 0.0,
+        "retries": 0,
+        "cost": 0.0,
+    }
+
+
+def _add_to_rollup(item: Dict, call: LLMCall) -> None:
+    item["calls"] += 1
+    item["errors"] += call.status != "ok"
+    item["prompt_tokens"] += call.prompt_tokens
+    item["completion_tokens"] += call.completion_tokens
+    item["latency"] += call.latency
+    item["retries"] += call.attempt > 1
+    item["cost"] += call.cost
+
+
+def _current_project() -> str:
+    context = get_context()
+    return context.project_name if context else config.get("PROJECT_NAME", "")
+
+
+class MetricsRecorder:
+    """
+    保存 LLM 调用记录
+
+    每次调用追加一行到 <metrics_dir>/llm_calls.jsonl，并按项目、节点、模型累加计数和耗时直方图后
+    重写 Prometheus 文本格式的 <metrics_dir>/llm.prom。内存中只保留累计值，不保留每次调用的记录，
+    在常驻的任务守护进程中占用的内存只和项目、节点、模型的组合数有关。
+    """
+
+    def __init__(self, metrics_dir: str, prices: Optional[Dict[str, Dict]] = None):
+        self.metrics_dir = metrics_dir
+        self.prices = prices if prices is not None else MODEL_PRICES
+        # (项目, 节点, 模型) -> 累计值
+        self._totals: Dict[Tuple[str, str, str], Dict] = {}
+        # (项目, 模型) -> 模型客户端内部的 HTTP 重试次数
+        self._http_retries: Dict[Tuple[str, str], int] = {}
+        # 运行编号 -> 这次运行按 (节点, 模型) 的汇总，见 start_run
+        self._runs: Dict[int, Dict[Tuple[str, str], Dict]] = {}
+        self._next_run = 0
+        self._lock = threading.Lock()
+
+    @property
+    def jsonl_path(self) -> str:
+        return os.path.join(self.metrics_dir, "llm_calls.jsonl")
+
+    @property
+    def prometheus_path(self) -> str:
+        return os.path.join(self.metrics_dir, "llm.prom")
+
+    def cost(self, model: str, prompt_tokens: int, completion_tokens: int) -> float:
+        price = self.prices.get(model)
+        if not price:
+            return 0.0
+
+        return (prompt_tokens * price["prompt"] + completion_tokens * price["completion"]) / 1000
+
+    def record(self, call: LLMCall) -> None:
+        with self._lock:
+            item = self._totals.get((call.project, call.node, call.model))
+            if item is None:
+                item = self._totals[(call.project, call.node, call.model)] = {
+                    **_new_rollup_item(),
+                    "buckets": [0] * len(LATENCY_BUCKETS),
+                }
+            _add_to_rollup(item, call)
+            for index, bound in enumerate(LATENCY_BUCKETS):
+                if call.latency <= bound:
+                    item["buckets"][index] += 1
+
+            for summary in self._runs.values():
+                _add_to_rollup(
+                    summary.setdefault((call.node, call.model), _new_rollup_item()), call
+                )
+
+            try:
+                os.makedirs(self.metrics_dir, exist_ok=True)
+                with open(self.jsonl_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(asdict(call), ensure_ascii=False) + "\n")
+                self._write_prometheus()
+            except OSError as e:
+                logger.warning(f"写入 LLM 调用指标失败: {e}")
+
+    def record_http_retry(self, model: str) -> None:
+        """记录一次模型客户端（openai）内部的 HTTP 重试，这类重试不会触发 LangChain 的回调"""
+        with self._lock:
+            key = (_current_project(), model)
+            self._http_retries[key] = self._http_retries.get(key, 0) + 1
+            try:
+                os.makedirs(self.metrics_dir, exist_ok=True)
+                self._write_prometheus()
+            except OSError as e:
+                logger.warning(f"写入 LLM 调用指标失败: {e}")
+
+    def start_run(self) -> int:
+        """开始汇总一次运行的调用，返回运行编号，用完后调用 end_run"""
+        with self._lock:
+            self._next_run += 1
+            self._runs[self._next_run] = {}
+            return self._next_run
+
+    def end_run(self, run: int) -> None:
+        with self._lock:
+            self._runs.pop(run, None)
+
+    def rollup(self, run: Optional[int] = None) -> Dict[Tuple[str, str], Dict]:
+        """按节点和模型汇总调用：run 为 start_run 返回的编号，为空时汇总进程启动以来的所有调用"""
+        with self._lock:
+            if run is not None:
+                return {key: dict(item) for key, item in self._runs.get(run, {}).items()}
+
+            summary: Dict[Tuple[str, str], Dict] = {}
+            for (_, node, model), item in self._totals.items():
+                total = summary.setdefault((node, model), _new_rollup_item())
+                for field_name in total:
+                    total[field_name] += item[field_name]
+
+            return summary
+
+    def format_rollup(self, run: Optional[int] = None) -> str:
+        summary = self.rollup(run)
+        if not summary:
+            return "本次运行没有 LLM 调用"
+
+        lines = [
+            "节点 | 模型 | 调用 | 失败 | 输入 token | 输出 token | 平均耗时(秒) | 重试 | 费用(元)"
+        ]
+        total_calls = total_cost = total_tokens = 0
+        for (node, model), item in sorted(summary.items()):
+            lines.append(
+                f"{node} | {model} | {item['calls']} | {item['errors']} | "
+                f"{item['prompt_tokens']} | {item['completion_tokens']} | "
+                f"{item['latency'] / item['calls']:.2f} | {item['retries']} | {item['cost']:.4f}"
+            )
+            total_calls += item["calls"]
+            total_cost += item["cost"]
+            total_tokens += item["prompt_tokens"] + item["completion_tokens"]
+        lines.append(f"合计：{total_calls} 次调用，{total_tokens} 个 token，{total_cost:.4f} 元")
+
+        return "\n".join(lines)
+
+    def _write_prometheus(self) -> None:
+        lines = []
+
+        def _header(name: str, metric_type: str, description: str) -> None:
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} {metric_type}")
+
+        def _labels(project: str, node: str, model: str) -> str:
+            return (
+                f'project="{_escape_label(project)}",node="{_escape_label(node)}",'
+                f'model="{_escape_label(model)}"'
+            )
+
+        totals = sorted(self._totals.items())
+
+        _header("llm_calls_total", "counter", "LLM 调用次数")
+        for key, item in totals:
+            labels = _labels(*key)
+            lines.append(
+                f'llm_calls_total{{{labels},status="ok"}} {item["calls"] - item["errors"]}'
+            )
+            lines.append(f'llm_calls_total{{{labels},status="error"}} {item["errors"]}')
+
+        counters = [
+            ("llm_prompt_tokens_total", "prompt_tokens", "输入 token 数"),
+            ("llm_completion_tokens_total", "completion_tokens", "输出 token 数"),
+            ("llm_retries_total", "retries", "失败后重新发起的调用次数"),
+            ("llm_cost_total", "cost", "估算费用（元）"),
+        ]
+        for name, field_name, description in counters:
+            _header(name, "counter", description)
+            for key, item in totals:
+                lines.append(f"{name}{{{_labels(*key)}}} {item[field_name]}")
+
+        _header("llm_latency_seconds", "histogram", "调用耗时（秒）")
+        for key, item in totals:
+            labels = _labels(*key)
+            for bound, count in zip(LATENCY_BUCKETS, item["buckets"]):
+                lines.append(f'llm_latency_seconds_bucket{{{labels},le="{bound}"}} {count}')
+            lines.append(f'llm_latency_seconds_bucket{{{labels},le="+Inf"}} {item["calls"]}')
+            lines.append(f"llm_latency_seconds_sum{{{labels}}} {item['latency']}")
+            lines.append(f"llm_latency_seconds_count{{{labels}}} {item['calls']}")
+
+        _header("llm_http_retries_total", "counter", "模型客户端内部的 HTTP 重试次数")
+        for (project, model), count in sorted(self._http_retries.items()):
+            lines.append(
+                f'llm_http_retries_total{{project="{_escape_label(project)}",'
+                f'model="{_escape_label(model)}"}} {count}'
+            )
+
+        fd, temp_path = tempfile.mkstemp(dir=self.metrics_dir, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(temp_path, self.prometheus_path)
+
+
+class LLMMetricsHandler(BaseCallbackHandler):
+    """
+    记录每次 LLM 调用的节点、模型、token 数、耗时、重试次数和估算费用
+
+    同一个父运行下失败后再次发起的调用算作重试，attempt 为第几次尝试。
+    openai 客户端内部的重试（max_retries）不经过回调，由 model_pool 的 HTTP 客户端
+    通过 record_http_retry 另外统计。
+    """
+
+    def __init__(self, recorder: MetricsRecorder):
+        self.recorder = recorder
+        self._runs: Dict[UUID, Dict] = {}
+        # 父运行 -> 连续失败次数。回调挂在模型上，收不到父运行结束的事件，
+        # 最终失败的父运行不会被清理，用有上限的 LRU 字典保存
+        self._failures: "OrderedDict[UUID, int]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _start(
+        self,
+        serialized: Optional[Dict],
+        run_id: UUID,
+        parent_run_id: Optional[UUID],
+        metadata: Optional[Dict],
+        kwargs: Dict,
+    ) -> None:
+        metadata = metadata or {}
+        params = kwargs.get("invocation_params") or {}
+        model = (
+            metadata.get("ls_model_name")
+            or params.get("model_name")
+            or params.get("model")
+            or (serialized or {}).get("name")
+            or "unknown"
+        )
+        with self._lock:
+            self._runs[run_id] = {
+                "project": _current_project(),
+                "node": _node_name(metadata),
+                "model": model,
+                "parent": parent_run_id,
+                "attempt": self._failures.get(parent_run_id, 0) + 1 if parent_run_id else 1,
+                "start": time.monotonic(),
+            }
+
+    def on_chat_model_start(
+        self,
+        serialized: Dict[str, Any],
+        messages: List,
+        *,
+        run_id: UUID,
+        parent_run_id: Optional[UUID] = None,
+        metadata: Optional[Dict[str, Any]] = None,
+        **kwargs: Any,
+    ) -> None:
+        self._start(serialized, run_id, parent_run_id, metadata, kwargs)
+
+    def on_llm_start(
+        self,
+        serialized: Dict[str, Any],
+        prompts: List[str],
+        *,
+        run_id: UUID,
+        parent_run_id: Optional[UUID] = None,
+        metadata: Optional[Dict[str, Any]] = None,
+        **kwargs: Any,
+    ) -> None:
+        self._start(serialized, run_id, parent_run_id, metadata, kwargs)
+
+    def _finish(self, run_id: UUID, status: str, usage=(0, 0), error=None) -> None:
+        with self._lock:
+            run = self._runs.pop(run_id, None)
+            if run is None:
+                return
+            parent = run["parent"]
+            if parent:
+                if status == "ok":
+                    self._failures.pop(parent, None)
+                else:
+                    self._failures[parent] = self._failures.get(parent, 0) + 1
+                    self._failures.move_to_end(parent)
+                    while len(self._failures) > MAX_TRACKED_FAILURES:
+                        self._failures.popitem(last=False)
+
+        prompt_tokens, completion_tokens = usage
+        self.recorder.record(
+            LLMCall(
+                project=run["project"],
+                node=run["node"],
+                model=run["model"],
+                prompt_tokens=prompt_tokens,
+                completion_tokens=completion_tokens,
+                latency=time.monotonic() - run["start"],
+                attempt=run["attempt"],
+                cost=self.recorder.cost(run["model"], prompt_tokens, completion_tokens),
+                status=status,
+                timestamp=time.time(),
+                error=error,
+            )
+        )
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        self._finish(run_id, "ok", _token_usage(response))
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._finish(run_id, "error", error=str(error))
+
+
+metrics_recorder = MetricsRecorder(
+    config.get("METRICS_DIR", METRICS_DIR),
+    {**MODEL_PRICES, **config.get("MODEL_PRICES", {})},
+)
+metrics_handler = LLMMetricsHandler(metrics_recorder)
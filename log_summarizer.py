@@ -0,0 +1,102 @@
+from typing import Awaitable, Callable
+
+import os
+import json
+import logging
+import tempfile
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    handlers=[logging.StreamHandler()],
+)
+logger = logging.getLogger(__name__)
+
+
+def _checkpoint_path(log_path: str) -> str:
+    directory, name = os.path.split(log_path)
+    return os.path.join(directory, f".{name}.summary.json")
+
+
+def _load_checkpoint(log_path: str) -> dict:
+    checkpoint_path = _checkpoint_path(log_path)
+    if not os.path.exists(checkpoint_path):
+        return {"offset": 0, "summary": ""}
+
+    try:
+        with open(checkpoint_path, "r", encoding="utf-8") as f:
+            checkpoint = json.load(f)
+        return {"offset": int(checkpoint["offset"]), "summary": str(checkpoint["summary"])}
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        logger.warning(f"读取日志总结检查点失败，将重新总结: {e}")
+        return {"offset": 0, "summary": ""}
+
+
+def _atomic_write(path: str, content: str) -> None:
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8", newline="") as f:
+        f.write(content)
+    os.replace(temp_path, path)
+
+
+async def summarize_log_incrementally(
+    log_path: str,
+    summarize: Callable[[str], Awaitable[str]],
+    threshold: int,
+    measure: Callable[[str], int] = len,
+) -> str:
+    """
+    增量总结日志文件
+
+    检查点文件（日志同目录下的 .<日志文件名>.summary.json）记录上次总结后日志的字节偏移和内容，
+    每次只读取偏移之后新追加的行，和上次的结果合并后再按需总结，耗时只和新增日志的大小有关。
+
+    Args:
+        log_path: 日志文件路径
+        summarize: 总结文本的协程函数
+        threshold: 待总结内容的长度超过该值时触发总结
+        measure: 计算文本长度的函数，默认按字符数计算
+
+    Returns:
+        压缩后的日志内容，日志文件会被改写为该内容
+    """
+    checkpoint = _load_checkpoint(log_path)
+    offset = checkpoint["offset"]
+    summary = checkpoint["summary"]
+
+    with open(log_path, "rb") as f:
+        # 日志被截断或被外部改写时，检查点失效，从头开始
+        prefix = f.read(offset)
+        if len(prefix) != offset or prefix != summary.encode("utf-8"):
+            logger.info("开发日志与检查点不一致，从头开始总结")
+            f.seek(0)
+            offset = 0
+            summary = ""
+
+        new_content = f.read().decode("utf-8", errors="replace")
+
+    if not new_content:
+        return summary
+
+    parts = [summary.rstrip("\n")] if summary else []
+    size = measure(parts[0]) if parts else 0
+    for line in new_content.splitlines():
+        parts.append(line)
+        size += measure(line) + 1
+        if size > threshold:
+            summary = await summarize("\n".join(parts))
+            parts = [summary]
+            size = measure(summary)
+
+    content = "\n".join(parts) + "\n"
+    _atomic_write(log_path, content)
+    _atomic_write(
+        _checkpoint_path(log_path),
+        json.dumps(
+            {"offset": len(content.encode("utf-8")), "summary": content}, ensure_ascii=False
+        ),
+    )
+
+    logger.info(f"开发日志增量总结完成，新增{len(new_content)}个字符")
+
+    return content
@@ -3,6 +3,13 @@ from langgraph.graph import StateGraph, START, END
 from count_node import counter_node
 from review_node import review_node
 from execute_zgraph import execute_zgraph
+from approval_policy import APPROVAL_MODES, DEFAULT_MAX_ROUNDS, build_policy, set_policy
+from checkpoint_store import can_resume, clear_project, open_checkpointer, thread_config
+from run_context import RunContext, make_context, use_context
+from llm_metrics import metrics_recorder
+from tracing import export_trace, span, traced, tracer
+from cursor_executor import close_sim_clients
+from model_pool import close_http_clients
 
 import os
 import json
@@ -19,9 +26,23 @@ config = json.load(open("./config.json", "r", encoding="utf-8"))
 
 parser = argparse.ArgumentParser()
 parser.add_argument("--count", type=int, default=0)
-args = parser.parse_args()
-
-count = args.count
+parser.add_argument("--resume", action="store_true", help="从上次中断的位置继续执行")
+parser.add_argument(
+    "--approval",
+    choices=APPROVAL_MODES,
+    default="interactive",
+    help="审批策略：interactive 在终端确认，auto-pass 自动通过，auto-reject 自动驳回审核意见，file 使用策略文件",
+)
+parser.add_argument(
+    "--max-rounds", type=int, default=DEFAULT_MAX_ROUNDS, help="auto-reject 策略驳回的轮数"
+)
+parser.add_argument("--approval-file", default="", help="file 策略使用的 JSON 策略文件")
+parser.add_argument(
+    "--projects",
+    nargs="+",
+    default=None,
+    help="同时开发的项目，默认为 config.json 中的 PROJECT_NAME",
+)
 
 
 def _init_project_structure():
@@ -39,18 +60,18 @@ def _should_end(state: ActionReview):
         return "execute_graph"
 
 
-def _init_graph():
+def _init_graph(checkpointer=None):
     workflow = StateGraph[ActionReview, None, ActionReview, ActionReview](ActionReview)
-    workflow.add_node("counter", counter_node)
-    workflow.add_node("review", review_node)
-    workflow.add_node("execute_graph", execute_zgraph)
+    workflow.add_node("counter", traced("counter", "node")(counter_node))
+    workflow.add_node("review", traced("review", "node")(review_node))
+    workflow.add_node("execute_graph", traced("execute_graph", "node")(execute_zgraph))
 
     workflow.add_edge(START, "counter")
     workflow.add_conditional_edges("counter", _should_end, ["execute_graph", END])
     workflow.add_edge("execute_graph", "review")
     workflow.add_edge("review", "counter")
 
-    app = workflow.compile()
+    app = workflow.compile(checkpointer=checkpointer)
 
     return app
 
@@ -58,23 +79,77 @@ def _init_graph():
 app = _init_graph()
 
 
-async def main(count=0):
-    _init_project_structure()
+async def run_project(context: RunContext, count=0, resume=False):
+    """在项目的运行上下文中执行主工作流"""
+    with use_context(context), span(f"project:{context.project_name}", "project"):
+        return await _run_project(context, count, resume)
 
-    if not os.path.exists(f"./todo/{config['PROJECT_NAME']}"):
-        print("项目需求不存在")
+
+async def _run_project(context: RunContext, count=0, resume=False):
+    project = context.project_name
+    if not os.path.exists(context.todo_dir):
+        print(f"项目{project}需求不存在")
         return
 
-    recursion_limit = config.get("RECURSION_LIMIT", 50)
-    result = await app.ainvoke(
-        {
-            "count": count,
-        },
-        {"recursion_limit": recursion_limit},
+    recursion_limit = context.config.get("RECURSION_LIMIT", 50)
+    run_config = {**thread_config(project), "recursion_limit": recursion_limit}
+
+    async with open_checkpointer() as checkpointer:
+        app = _init_graph(checkpointer)
+
+        if resume and await can_resume(app, run_config):
+            print("从上次中断的位置继续执行")
+            result = await app.ainvoke(None, run_config)
+        else:
+            if resume:
+                print("没有可以继续执行的检查点，重新开始")
+            # 重新开始时清除上次运行留下的检查点，避免各轮开发流程误从旧检查点继续
+            await clear_project(checkpointer, project)
+            result = await app.ainvoke(
+                {
+                    "count": count,
+                },
+                run_config,
+            )
+
+    print(f"{project} result: ", result.get("response", "响应为空"))
+
+    return result
+
+
+async def main(count=0, resume=False, projects=None):
+    _init_project_structure()
+    metrics_run = metrics_recorder.start_run()
+    trace_start = tracer.start_run()
+
+    # 多个项目在同一个事件循环中并发执行，共享模型客户端、总结缓存和检查点数据库
+    projects = projects or [config["PROJECT_NAME"]]
+    results = await asyncio.gather(
+        *(run_project(make_context(config, project), count, resume) for project in projects),
+        return_exceptions=True,
     )
 
-    print("result: ", result.get("response", "响应为空"))
+    for project, result in zip(projects, results):
+        if isinstance(result, Exception):
+            print(f"项目{project}执行失败: {result}")
+
+    await close_sim_clients()
+    await close_http_clients()
+
+    print(metrics_recorder.format_rollup(metrics_run))
+    metrics_recorder.end_run(metrics_run)
+
+    chrome_path, folded_path = export_trace(trace_start)
+    print(f"耗时记录已写入 {chrome_path}（Chrome trace）和 {folded_path}（火焰图）")
 
 
 if __name__ == "__main__":
-    asyncio.run(main(count))
+    args = parser.parse_args()
+    policy = build_policy(args.approval, args.max_rounds, args.approval_file)
+    if args.projects and len(args.projects) > 1 and policy.is_interactive():
+        parser.error(
+            "同时开发多个项目时终端确认会互相阻塞，请通过 --approval 指定无需终端确认的审批策略"
+        )
+    set_policy(policy)
+
+    asyncio.run(main(args.count, args.resume, args.projects))
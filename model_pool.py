@@ -0,0 +1,160 @@
+from langchain_openai import ChatOpenAI
+from llm_metrics import metrics_handler, metrics_recorder
+from typing import Dict, Tuple
+from weakref import WeakKeyDictionary
+
+import json
+import httpx
+import openai
+import asyncio
+import logging
+import threading
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    handlers=[logging.StreamHandler()],
+)
+logger = logging.getLogger(__name__)
+
+config = json.load(open("./config.json", "r", encoding="utf-8"))
+
+# 各模型服务在配置文件中的 API 密钥和地址
+PROVIDERS = {
+    "qwen": ("QWEN_API_KEY", "QWEN_API_BASE"),
+    "deepseek": ("DEEPSEEK_API_KEY", "DEEPSEEK_API_BASE"),
+}
+
+# 空闲连接保留的时间（秒）。模型调用之间常常隔着几十秒的 cursor-agent 执行，
+# httpx 默认的 5 秒会让几乎每次调用都重新建立 TLS 连接
+HTTP_KEEPALIVE_EXPIRY = 120
+HTTP_MAX_CONNECTIONS = 100
+
+_models: Dict[Tuple, ChatOpenAI] = {}
+_http_clients: Dict[str, object] = {}
+_lock = threading.Lock()
+
+
+def _limits() -> httpx.Limits:
+    max_connections = config.get("HTTP_MAX_CONNECTIONS", HTTP_MAX_CONNECTIONS)
+    return httpx.Limits(
+        max_connections=max_connections,
+        max_keepalive_connections=max_connections,
+        keepalive_expiry=config.get("HTTP_KEEPALIVE_EXPIRY", HTTP_KEEPALIVE_EXPIRY),
+    )
+
+
+def _record_retry(request: httpx.Request) -> None:
+    """openai 客户端重试时请求头中的 x-stainless-retry-count 大于 0，记录到 llm_metrics"""
+    retries = request.headers.get("x-stainless-retry-count", "0")
+    if not retries.isdigit() or int(retries) == 0:
+        return
+
+    try:
+        model = json.loads(request.content).get("model", "unknown")
+    except (ValueError, AttributeError, httpx.RequestNotRead):
+        model = "unknown"
+    metrics_recorder.record_http_retry(model)
+
+
+async def _arecord_retry(request: httpx.Request) -> None:
+    _record_retry(request)
+
+
+class _LoopLocalTransport(httpx.AsyncBaseTransport):
+    """
+    每个事件循环各用一个连接池的异步传输层
+
+    异步连接属于建立连接时的事件循环，不能在其他事件循环中使用；模型客户端在进程中共享，
+    依次运行的 asyncio.run（例如测试、基准测试）各自使用自己的连接池。
+    """
+
+    def __init__(self, limits: httpx.Limits):
+        self._limits = limits
+        # 事件循环 -> 连接池，事件循环被回收后对应的项随之删除
+        self._transports = WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def _transport(self) -> httpx.AsyncHTTPTransport:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            transport = self._transports.get(loop)
+            if transport is None:
+                transport = self._transports[loop] = httpx.AsyncHTTPTransport(limits=self._limits)
+
+        return transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        return await self._transport().handle_async_request(request)
+
+    async def aclose(self) -> None:
+        """关闭当前事件循环的连接池，之后在这个事件循环中发起的请求会建立新的连接池"""
+        with self._lock:
+            transport = self._transports.pop(asyncio.get_running_loop(), None)
+        if transport is not None:
+            await transport.aclose()
+
+
+def _shared_http_clients() -> Tuple[httpx.Client, httpx.AsyncClient]:
+    """
+    所有模型客户端共用的 HTTP 客户端，连接按服务地址放在连接池中复用。
+
+    异步客户端按事件循环分别保留连接池，见 _LoopLocalTransport。
+    """
+    if not _http_clients:
+        _http_clients["sync"] = httpx.Client(
+            limits=_limits(),
+            timeout=openai.DEFAULT_TIMEOUT,
+            event_hooks={"request": [_record_retry]},
+        )
+        _http_clients["async_transport"] = _LoopLocalTransport(_limits())
+        _http_clients["async"] = httpx.AsyncClient(
+            transport=_http_clients["async_transport"],
+            timeout=openai.DEFAULT_TIMEOUT,
+            event_hooks={"request": [_arecord_retry]},
+        )
+
+    return _http_clients["sync"], _http_clients["async"]
+
+
+async def close_http_clients() -> None:
+    """运行结束时关闭当前事件循环中的模型连接，避免连接随事件循环关闭而泄漏"""
+    transport = _http_clients.get("async_transport")
+    if transport is not None:
+        await transport.aclose()
+
+
+def get_model(provider: str, model: str, temperature: float, **kwargs) -> ChatOpenAI:
+    """
+    取得模型客户端，同一个 (provider, model, temperature) 和其他参数只在第一次使用时创建一次
+
+    Args:
+        provider: 模型服务，见 PROVIDERS
+        model: 模型名
+        temperature: 温度
+        **kwargs: 传给 ChatOpenAI 的其他参数，例如 max_tokens
+
+    Returns:
+        共用连接池的 ChatOpenAI 客户端，调用记录到 llm_metrics
+    """
+    if provider not in PROVIDERS:
+        raise ValueError(f"未知的模型服务: {provider}，可选 {', '.join(PROVIDERS)}")
+
+    key = (provider, model, temperature, tuple(sorted(kwargs.items())))
+    with _lock:
+        if key not in _models:
+            api_key, api_base = PROVIDERS[provider]
+            http_client, http_async_client = _shared_http_clients()
+            _models[key] = ChatOpenAI(
+                model=model,
+                openai_api_key=config[api_key],
+                openai_api_base=config[api_base],
+                temperature=temperature,
+                callbacks=[metrics_handler],
+                http_client=http_client,
+                http_async_client=http_async_client,
+                **kwargs,
+            )
+            logger.info(f"创建模型客户端: {provider}/{model}，温度 {temperature}")
+
+        return _models[key]
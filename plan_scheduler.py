@@ -0,0 +1,202 @@
+from constants import CODE_EXTENSIONS
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+import os
+import re
+import asyncio
+import logging
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    handlers=[logging.StreamHandler()],
+)
+logger = logging.getLogger(__name__)
+
+# 同时执行的相互独立步骤数上限的默认值，对应配置 EXECUTE_MAX_WORKERS；默认按顺序执行
+DEFAULT_MAX_WORKERS = 1
+
+# 无法确定路径的步骤视为涉及整个项目目录，会与所有步骤串行
+PROJECT_ROOT = "."
+
+# 除代码文件外，计划中常见的文件扩展名
+_EXTRA_EXTENSIONS = [".md", ".txt", ".ini", ".cfg", ".env", ".lock", ".csv", ".vue", ".svelte"]
+
+_FILE_EXTENSIONS = tuple(sorted(set(CODE_EXTENSIONS + _EXTRA_EXTENSIONS), key=len, reverse=True))
+
+# 路径形式的片段，如 src/app/main.py、./docs、tests\\test_main.py
+_PATH_PATTERN = re.compile(r"[A-Za-z0-9_\-.]+(?:[/\\][A-Za-z0-9_\-.]+)*[/\\]?")
+
+# 以“目录”“文件夹”等词结尾的目录名，如 “在src目录下”
+_DIR_PATTERN = re.compile(
+    r"([A-Za-z0-9_\-.]+(?:[/\\][A-Za-z0-9_\-.]+)*)\s*(?:目录|文件夹|directory|folder|dir)",
+    re.IGNORECASE,
+)
+
+
+def _normalize_path(path: str) -> str:
+    path = path.replace("\\", "/").strip().strip("`'\"")
+    while path.startswith("./"):
+        path = path[2:]
+
+    return path.strip("/")
+
+
+def _is_known_path(path: str, token: str, project_dir: Optional[str]) -> bool:
+    """
+    片段是否可以确定是路径：在项目目录下存在，或者带目录分隔符且以已知的文件扩展名结尾
+
+    Vue.js、Node.js、TCP/IP、HTTP/2 这类名称只满足其中一半，不算路径。
+    """
+    if ".." in path.split("/"):
+        return False
+    if project_dir and os.path.exists(os.path.join(project_dir, path)):
+        return True
+
+    has_separator = "/" in token.replace("\\", "/").strip("/")
+    return has_separator and path.lower().endswith(_FILE_EXTENSIONS)
+
+
+def infer_step_paths(step: str, project_dir: Optional[str] = None) -> Set[str]:
+    """
+    从计划步骤的描述中推断该步骤会涉及的文件和目录
+
+    只有能确定是路径的片段才算（见 _is_known_path），否则两个实际改动同一文件的步骤
+    可能被误判为相互独立而并发执行。
+
+    Args:
+        step: 计划步骤描述
+        project_dir: 项目目录，用于确认只给出文件名或目录名的片段确实存在
+
+    Returns:
+        相对项目目录的路径集合；无法确定时返回 {"."}，表示涉及整个项目，与所有步骤串行
+    """
+    paths = set()
+
+    for match in _DIR_PATTERN.finditer(step):
+        path = _normalize_path(match.group(1))
+        if path and path != "." and _is_known_path(path, match.group(1), project_dir):
+            paths.add(path)
+
+    for match in _PATH_PATTERN.finditer(step):
+        token = match.group(0)
+        path = _normalize_path(token)
+        if path and path != "." and _is_known_path(path, token, project_dir):
+            paths.add(path)
+
+    return paths or {PROJECT_ROOT}
+
+
+def _paths_conflict(left: Set[str], right: Set[str]) -> bool:
+    for a in left:
+        for b in right:
+            if a == PROJECT_ROOT or b == PROJECT_ROOT or a == b:
+                return True
+
+            if a.startswith(b + "/") or b.startswith(a + "/"):
+                return True
+
+            # 只给出文件名的步骤无法确定目录，文件名相同即视为冲突
+            if ("/" not in a or "/" not in b) and a.split("/")[-1] == b.split("/")[-1]:
+                return True
+
+    return False
+
+
+def build_dependencies(steps: List[str], project_dir: Optional[str] = None) -> List[Set[int]]:
+    """
+    根据步骤涉及的路径构建依赖关系：后面的步骤依赖所有和它路径冲突的前序步骤
+
+    Args:
+        steps: 计划步骤列表
+        project_dir: 项目目录，见 infer_step_paths
+        completed: 已经完成的步骤：步骤下标 -> 执行结果，这些步骤不再执行
+        on_step_done: 每个步骤完成后调用，参数为步骤下标和执行结果
+
+    Returns:
+        与 steps 等长的列表，第 i 项为步骤 i 依赖的步骤下标集合
+    """
+    step_paths = [infer_step_paths(step, project_dir) for step in steps]
+    dependencies = []
+    for index, paths in enumerate(step_paths):
+        dependencies.append(
+            {prev for prev in range(index) if _paths_conflict(step_paths[prev], paths)}
+        )
+
+    return dependencies
+
+
+def critical_path_length(dependencies: List[Set[int]]) -> int:
+    """计算依赖图中最长链上的步骤数"""
+    depth = []
+    for deps in dependencies:
+        depth.append(max((depth[dep] for dep in deps), default=0) + 1)
+
+    return max(depth, default=0)
+
+
+async def run_plan(
+    steps: List[str],
+    run_step: Callable[[str], Awaitable[Any]],
+    max_workers: int = DEFAULT_MAX_WORKERS,
+    project_dir: Optional[str] = None,
+    completed: Optional[Dict[int, Any]] = None,
+    on_step_done: Optional[Callable[[int, Any], Awaitable[None]]] = None,
+) -> List[Tuple[str, Any]]:
+    """
+    按依赖关系执行计划：相互独立的步骤并发执行，涉及相同路径的步骤按计划顺序串行执行
+
+    Args:
+        steps: 计划步骤列表
+        run_step: 执行单个步骤的协程函数，参数为步骤描述
+        max_workers: 同时执行的步骤数上限
+        project_dir: 项目目录，见 infer_step_paths
+        completed: 已经完成的步骤：步骤下标 -> 执行结果，这些步骤不再执行
+        on_step_done: 每个步骤完成后调用，参数为步骤下标和执行结果
+
+    Returns:
+        按计划顺序排列的 (步骤, 执行结果) 列表
+
+    Raises:
+        任意步骤抛出的异常，此时其他尚未完成的步骤会被取消
+    """
+    dependencies = build_dependencies(steps, project_dir)
+    logger.info(
+        f"计划共{len(steps)}个步骤，关键路径{critical_path_length(dependencies)}个步骤，"
+        f"最多同时执行{max_workers}个步骤"
+    )
+
+    completed = completed or {}
+    if completed:
+        logger.info(f"跳过已经完成的{len(completed)}个步骤")
+
+    semaphore = asyncio.Semaphore(max(1, max_workers))
+    finished = [asyncio.Event() for _ in steps]
+    results: List[Any] = [None] * len(steps)
+
+    async def _run(index: int):
+        if index in completed:
+            results[index] = completed[index]
+            finished[index].set()
+            return
+
+        for dep in dependencies[index]:
+            await finished[dep].wait()
+
+        async with semaphore:
+            results[index] = await run_step(steps[index])
+            if on_step_done is not None:
+                await on_step_done(index, results[index])
+
+        finished[index].set()
+
+    tasks = [asyncio.create_task(_run(index)) for index in range(len(steps))]
+    try:
+        await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+    return list(zip(steps, results))
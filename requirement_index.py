@@ -0,0 +1,426 @@
+from collections import Counter
+from difflib import SequenceMatcher
+from typing import Callable, Dict, List, Optional, Set, Tuple
+from run_context import current_config
+
+import os
+import re
+import json
+import math
+import logging
+import tempfile
+import threading
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    handlers=[logging.StreamHandler()],
+)
+logger = logging.getLogger(__name__)
+
+config = json.load(open("./config.json", "r", encoding="utf-8"))
+
+
+def _config() -> Dict:
+    return current_config(config)
+
+
+# 索引格式变化时递增，旧索引会被整体重建
+INDEX_VERSION = 1
+
+# 单个片段的最大行数，超过后按行切分
+CHUNK_MAX_LINES = 40
+
+# 超过该大小的文件不建立索引
+MAX_FILE_BYTES = 5 * 1024 * 1024
+
+# BM25 参数
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+_HEADING_PATTERN = re.compile(r"^#{1,6}\s")
+_WORD_PATTERN = re.compile(r"[a-z0-9_]+|[\u3400-\u4dbf\u4e00-\u9fff]+")
+_CJK_PATTERN = re.compile(r"[\u3400-\u4dbf\u4e00-\u9fff]")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    分词：英文和数字按单词切分，中文按相邻两字切分（单字成词时保留单字）
+    """
+    tokens = []
+    for word in _WORD_PATTERN.findall(text.lower()):
+        if _CJK_PATTERN.match(word):
+            if len(word) == 1:
+                tokens.append(word)
+            else:
+                tokens.extend(word[i : i + 2] for i in range(len(word) - 1))
+        else:
+            tokens.append(word)
+
+    return tokens
+
+
+def split_sections(lines: List[str]) -> List[Tuple[int, int]]:
+    """
+    按 markdown 标题把文件切分为片段，过长的片段再按 CHUNK_MAX_LINES 切分
+
+    Returns:
+        (起始行, 结束行) 列表，行号从 1 开始，包含结束行
+    """
+    starts = [0] + [
+        index for index, line in enumerate(lines) if index > 0 and _HEADING_PATTERN.match(line)
+    ]
+    sections = []
+    for position, start in enumerate(starts):
+        end = starts[position + 1] if position + 1 < len(starts) else len(lines)
+        for chunk_start in range(start, end, CHUNK_MAX_LINES):
+            chunk_end = min(chunk_start + CHUNK_MAX_LINES, end)
+            sections.append((chunk_start + 1, chunk_end))
+
+    return [section for section in sections if section[0] <= section[1]]
+
+
+def _read_text(path: str) -> Optional[str]:
+    try:
+        if os.path.getsize(path) > MAX_FILE_BYTES:
+            return None
+        with open(path, "rb") as f:
+            data = f.read()
+    except OSError:
+        return None
+
+    if b"\0" in data:
+        return None
+
+    try:
+        return data.decode("utf-8")
+    except UnicodeDecodeError:
+        return None
+
+
+class RequirementIndex:
+    """
+    需求目录的检索索引
+
+    把需求目录下的文本文件按 markdown 标题切分成片段，建立倒排索引，用 BM25 对片段打分。
+    每个文件记录大小和修改时间，refresh 时只重新索引发生变化的文件，索引保存在 index_path。
+    """
+
+    def __init__(self, root: str, index_path: str, skip_dirs: Optional[List[str]] = None):
+        self.root = root
+        self.index_path = index_path
+        self.skip_dirs = set(skip_dirs or [])
+        self._lock = threading.Lock()
+        # 相对路径 -> {"size", "mtime_ns", "chunks": [{"start", "end", "tf", "length"}]}
+        self._files: Dict[str, Dict] = {}
+        # 词 -> {(相对路径, 片段下标): 词频}
+        self._postings: Dict[str, Dict[Tuple[str, int], int]] = {}
+        self._total_length = 0
+        self._chunk_count = 0
+        self._load()
+
+    def _load(self) -> None:
+        if not os.path.exists(self.index_path):
+            return
+
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"读取需求索引失败，将重建索引: {e}")
+            return
+
+        if data.get("version") != INDEX_VERSION:
+            return
+
+        for rel_path, entry in data.get("files", {}).items():
+            self._add_file(rel_path, entry)
+
+    def _save(self) -> None:
+        directory = os.path.dirname(self.index_path)
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"version": INDEX_VERSION, "files": self._files}, f, ensure_ascii=False)
+        os.replace(temp_path, self.index_path)
+
+    def _add_file(self, rel_path: str, entry: Dict) -> None:
+        self._files[rel_path] = entry
+        for chunk_index, chunk in enumerate(entry["chunks"]):
+            for term, tf in chunk["tf"].items():
+                self._postings.setdefault(term, {})[(rel_path, chunk_index)] = tf
+            self._total_length += chunk["length"]
+            self._chunk_count += 1
+
+    def _remove_file(self, rel_path: str) -> None:
+        entry = self._files.pop(rel_path)
+        for chunk_index, chunk in enumerate(entry["chunks"]):
+            for term in chunk["tf"]:
+                postings = self._postings.get(term)
+                if postings is None:
+                    continue
+                postings.pop((rel_path, chunk_index), None)
+                if not postings:
+                    del self._postings[term]
+            self._total_length -= chunk["length"]
+            self._chunk_count -= 1
+
+    def _scan(self) -> Dict[str, os.stat_result]:
+        files = {}
+        for current, dir_names, file_names in os.walk(self.root):
+            dir_names[:] = [
+                name
+                for name in dir_names
+                if name not in self.skip_dirs and not name.startswith(".")
+            ]
+            for file_name in file_names:
+                if file_name in self.skip_dirs or file_name.startswith("."):
+                    continue
+                path = os.path.join(current, file_name)
+                rel_path = os.path.relpath(path, self.root).replace(os.sep, "/")
+                files[rel_path] = os.stat(path)
+
+        return files
+
+    def refresh(self) -> int:
+        """
+        增量更新索引
+
+        Returns:
+            重新索引的文件数
+        """
+        with self._lock:
+            files = self._scan() if os.path.isdir(self.root) else {}
+
+            changed = 0
+            for rel_path in list(self._files):
+                if rel_path not in files:
+                    self._remove_file(rel_path)
+                    changed += 1
+
+            for rel_path, st in files.items():
+                entry = self._files.get(rel_path)
+                if entry and entry["size"] == st.st_size and entry["mtime_ns"] == st.st_mtime_ns:
+                    continue
+
+                if entry:
+                    self._remove_file(rel_path)
+
+                text = _read_text(os.path.join(self.root, rel_path))
+                lines = text.splitlines() if text is not None else []
+                chunks = []
+                for start, end in split_sections(lines):
+                    tokens = tokenize("\n".join(lines[start - 1 : end]))
+                    if tokens:
+                        chunks.append(
+                            {
+                                "start": start,
+                                "end": end,
+                                "tf": Counter(tokens),
+                                "length": len(tokens),
+                            }
+                        )
+
+                self._add_file(
+                    rel_path, {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "chunks": chunks}
+                )
+                changed += 1
+
+            if changed:
+                self._save()
+                logger.info(f"需求索引更新完成，重新索引{changed}个文件")
+
+            return changed
+
+    def file_names(self) -> List[str]:
+        with self._lock:
+            return sorted(self._files)
+
+    def find_files(self, name: str, limit: int = 5) -> List[str]:
+        """
+        按文件名模糊查找
+
+        Returns:
+            按相似度从高到低排列的相对路径
+        """
+        query = name.replace("\\", "/").strip().strip("/").lower()
+        if not query:
+            return []
+
+        with self._lock:
+            rel_paths = list(self._files)
+
+        scored = []
+        for rel_path in rel_paths:
+            candidate = rel_path.lower()
+            base_name = candidate.split("/")[-1]
+            if candidate == query:
+                score = 3.0
+            elif base_name == query.split("/")[-1]:
+                score = 2.0
+            elif query in candidate:
+                score = 1.0 + len(query) / len(candidate)
+            else:
+                score = max(
+                    SequenceMatcher(None, query, candidate).ratio(),
+                    SequenceMatcher(None, query.split("/")[-1], base_name).ratio(),
+                )
+            if score >= 0.5:
+                scored.append((score, rel_path))
+
+        scored.sort(key=lambda item: (-item[0], item[1]))
+        return [rel_path for _, rel_path in scored[:limit]]
+
+    def search(
+        self, query: str, limit: Optional[int] = 5, files: Optional[Set[str]] = None
+    ) -> List[Dict]:
+        """
+        用 BM25 检索与查询相关的片段
+
+        Args:
+            query: 查询内容
+            limit: 返回的片段数上限，为 None 时返回所有相关片段
+            files: 只在这些文件（相对路径）中检索，为 None 时检索所有文件
+
+        Returns:
+            按得分从高到低排列的 {"file", "start", "end", "score"} 列表
+        """
+        with self._lock:
+            return self._search(set(tokenize(query)), limit, files)
+
+    def _search(self, terms, limit: Optional[int], files: Optional[Set[str]]) -> List[Dict]:
+        if not terms or not self._chunk_count:
+            return []
+
+        average_length = self._total_length / self._chunk_count
+        scores: Dict[Tuple[str, int], float] = {}
+        for term in terms:
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+
+            idf = math.log(1 + (self._chunk_count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for key, tf in postings.items():
+                if files is not None and key[0] not in files:
+                    continue
+                length = self._files[key[0]]["chunks"][key[1]]["length"]
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * length / average_length)
+                scores[key] = scores.get(key, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + norm)
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:limit]
+        return [
+            {
+                "file": rel_path,
+                "start": self._files[rel_path]["chunks"][chunk_index]["start"],
+                "end": self._files[rel_path]["chunks"][chunk_index]["end"],
+                "score": score,
+            }
+            for (rel_path, chunk_index), score in ranked
+        ]
+
+    def read_lines(self, rel_path: str, start: int, end: int) -> str:
+        text = _read_text(os.path.join(self.root, rel_path)) or ""
+        return "\n".join(text.splitlines()[max(start, 1) - 1 : end])
+
+
+_indexes: Dict[str, RequirementIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def _load_skip_dirs(ignore_path: str = ".spanignore") -> List[str]:
+    """读取需要跳过的目录名，与需求文档转换时跳过的目录保持一致"""
+    if not os.path.exists(ignore_path):
+        return []
+
+    with open(ignore_path, "r", encoding="utf-8") as f:
+        return [line.strip() for line in f.read().splitlines() if len(line.strip()) > 0]
+
+
+def get_requirement_index(project: str) -> RequirementIndex:
+    """返回项目需求目录的索引，并增量更新到最新状态"""
+    with _indexes_lock:
+        index = _indexes.get(project)
+        if index is None:
+            index = RequirementIndex(
+                os.path.join(".", "todo", project),
+                os.path.join(".", ".cache", "requirement_index", f"{project}.json"),
+                _load_skip_dirs(),
+            )
+            _indexes[project] = index
+
+    index.refresh()
+    return index
+
+
+_TRUNCATED = "\n...（内容过长已截断）"
+
+
+def _truncate(text: str, max_chars: int) -> str:
+    if len(text) <= max_chars:
+        return text
+    return text[: max(max_chars - len(_TRUNCATED), 0)] + _TRUNCATED
+
+
+def format_search_results(index: RequirementIndex, query: str, max_chars: int) -> str:
+    """把检索结果格式化为带文件和行号的片段，总长度不超过 max_chars"""
+    results = index.search(query, limit=_config().get("REQUIREMENT_SEARCH_LIMIT", 5))
+    parts = []
+    remaining = max_chars
+    for result in results:
+        header = f"[{result['file']}:{result['start']}-{result['end']}]"
+        if remaining <= len(header) + 1 + len(_TRUNCATED):
+            break
+
+        body = _truncate(
+            index.read_lines(result["file"], result["start"], result["end"]),
+            max(remaining - len(header) - 1, 0),
+        )
+        parts.append(f"{header}\n{body}")
+        # 片段之间还有两个换行
+        remaining -= len(parts[-1]) + 2
+
+    return "\n\n".join(parts)
+
+
+def select_sections(
+    index: RequirementIndex,
+    rel_path: str,
+    query: str,
+    budget: int,
+    measure: Callable[[str], int] = len,
+) -> str:
+    """
+    从文件中选出与 query 最相关的片段
+
+    按相关度从高到低选取片段，直到用完预算，再按片段在文件中的顺序拼接。
+
+    Args:
+        index: 需求索引
+        rel_path: 文件的相对路径
+        query: 查询内容，例如当前计划和最近的执行步骤
+        budget: 选出内容的长度上限
+        measure: 计算文本长度的函数，默认按字符数计算
+
+    Returns:
+        带“[文件:起始行-结束行]”标记的片段，没有相关片段时返回空字符串
+    """
+    results = index.search(query, limit=None, files={rel_path})
+    if not results:
+        return ""
+
+    text = _read_text(os.path.join(index.root, rel_path)) or ""
+    lines = text.splitlines()
+
+    selected = []
+    used = 0
+    for result in results:
+        section = f"[{rel_path}:{result['start']}-{result['end']}]\n" + "\n".join(
+            lines[result["start"] - 1 : result["end"]]
+        )
+        cost = measure(section)
+        if used + cost > budget:
+            continue
+        selected.append((result["start"], section))
+        used += cost
+
+    return "\n\n".join(section for _, section in sorted(selected))
@@ -0,0 +1,221 @@
+from concurrent.futures import ProcessPoolExecutor
+from execute_plan_utils import convert_docx_to_markdown, convert_pdf_to_markdown
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import os
+import json
+import hashlib
+import logging
+import tempfile
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    handlers=[logging.StreamHandler()],
+)
+logger = logging.getLogger(__name__)
+
+_CHUNK_SIZE = 1024 * 1024
+
+# 需要转换成 markdown 的需求文档
+DOCUMENT_SUFFIXES = (".docx", ".pdf")
+
+
+def _hash_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_CHUNK_SIZE), b""):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+def _output_dir(todo_dir: str, file: Path) -> str:
+    """转换结果所在的目录，与 convert_docx_to_markdown / convert_pdf_to_markdown 保持一致"""
+    return os.path.join(todo_dir, file.name.split(".")[0])
+
+
+def _convert_document(
+    path: str, pdf_workers: Optional[int] = None, todo_dir: Optional[str] = None
+) -> Optional[str]:
+    """
+    在工作进程中转换单个需求文档
+
+    Args:
+        path: 文档路径
+        pdf_workers: pdf 按页并行提取的进程数，已经在进程池中按文档并行时传 1，避免进程过多
+        todo_dir: 需求目录，工作进程中没有运行上下文，需要显式传入
+
+    Returns:
+        转换成功返回 None，失败返回错误信息
+    """
+    try:
+        if path.lower().endswith(".docx"):
+            result = convert_docx_to_markdown(path, todo_dir)
+            return result if result else None
+
+        result = convert_pdf_to_markdown(path, max_workers=pdf_workers, todo_dir=todo_dir)
+        return None if result == "pdf文件转换为markdown文件成功" else result
+    except Exception as e:
+        return str(e)
+
+
+def _load_manifest(manifest_path: str) -> Dict:
+    if not os.path.exists(manifest_path):
+        return {"files": {}, "texts": {}}
+
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        manifest.setdefault("files", {})
+        manifest.setdefault("texts", {})
+        return manifest
+    except (OSError, ValueError) as e:
+        logger.warning(f"读取需求文档转换清单失败，将重新转换: {e}")
+        return {"files": {}, "texts": {}}
+
+
+def _save_manifest(manifest_path: str, manifest: Dict) -> None:
+    directory = os.path.dirname(manifest_path)
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False)
+    os.replace(temp_path, manifest_path)
+
+
+def _is_readable_text(file: Path) -> bool:
+    try:
+        file.read_text(encoding="utf-8")
+        return True
+    except Exception:
+        return False
+
+
+def ingest_requirements(
+    todo_dir: str,
+    manifest_path: str,
+    skip_dirs: List[str],
+    max_workers: Optional[int] = None,
+) -> List[str]:
+    """
+    把需求目录下的 docx、pdf 文档转换成 markdown
+
+    清单记录每个文档的路径、大小、修改时间、内容哈希和转换结果所在目录：
+    大小和修改时间都没变且转换结果仍在的文档直接跳过；内容哈希相同的文档只转换一次；
+    需要转换的文档在进程池中并行转换。其他文件按大小和修改时间记录是否为可读的文本，
+    没有变化的文件不再重新读取。
+
+    Args:
+        todo_dir: 需求目录
+        manifest_path: 转换清单的路径
+        skip_dirs: 需要跳过的目录名
+        max_workers: 进程池大小，默认为 CPU 核数
+
+    Returns:
+        无法解析内容的文件列表
+    """
+    manifest = _load_manifest(manifest_path)
+    previous_files = manifest["files"]
+    previous_texts = manifest["texts"]
+    files = {}
+    texts = {}
+    unreadable = []
+
+    root = Path(todo_dir)
+    candidates = sorted(
+        file
+        for file in root.glob("**/*")
+        if file.is_file() and not any(part in skip_dirs for part in file.parts)
+    )
+
+    # 上次转换生成的目录（markdown 和图片）不是用户提供的需求，不再检查
+    output_dirs = {
+        os.path.normpath(os.path.join(todo_dir, entry["output"]))
+        for entry in previous_files.values()
+        if entry.get("output")
+    }
+
+    jobs: Dict[str, List[str]] = {}
+    for file in candidates:
+        rel_path = file.relative_to(root).as_posix()
+        if file.suffix.lower() not in DOCUMENT_SUFFIXES:
+            if any(os.path.normpath(str(parent)) in output_dirs for parent in file.parents):
+                continue
+
+            st = file.stat()
+            entry = previous_texts.get(rel_path)
+            if entry and entry["size"] == st.st_size and entry["mtime_ns"] == st.st_mtime_ns:
+                readable = entry["readable"]
+            else:
+                readable = _is_readable_text(file)
+            texts[rel_path] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "readable": readable}
+            if not readable:
+                unreadable.append(str(file))
+            continue
+
+        st = file.stat()
+        entry = previous_files.get(rel_path)
+        if (
+            entry
+            and entry["size"] == st.st_size
+            and entry["mtime_ns"] == st.st_mtime_ns
+            and entry.get("output")
+            and os.path.exists(os.path.join(todo_dir, entry["output"], "todo.md"))
+        ):
+            files[rel_path] = entry
+            continue
+
+        digest = _hash_file(str(file))
+        files[rel_path] = {
+            "size": st.st_size,
+            "mtime_ns": st.st_mtime_ns,
+            "hash": digest,
+            "output": None,
+        }
+        jobs.setdefault(digest, []).append(rel_path)
+
+    # 内容相同的文档已经转换过（可能换了文件名），直接复用转换结果
+    converted_outputs = {
+        entry["hash"]: entry["output"]
+        for entry in list(previous_files.values()) + list(files.values())
+        if entry.get("output")
+        and os.path.exists(os.path.join(todo_dir, entry["output"], "todo.md"))
+    }
+
+    pending: List[Tuple[str, List[str]]] = []
+    for digest, rel_paths in jobs.items():
+        if digest in converted_outputs:
+            for rel_path in rel_paths:
+                files[rel_path]["output"] = converted_outputs[digest]
+        else:
+            pending.append((digest, rel_paths))
+
+    paths = [os.path.join(todo_dir, rel_paths[0]) for _, rel_paths in pending]
+    if len(paths) > 1:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            errors = list(
+                executor.map(_convert_document, paths, [1] * len(paths), [todo_dir] * len(paths))
+            )
+    else:
+        # 只有一个文档需要转换时，让 pdf 按页并行
+        errors = [_convert_document(path, max_workers, todo_dir) for path in paths]
+
+    for (digest, rel_paths), path, error in zip(pending, paths, errors):
+        if error:
+            logger.error(f"需求文档转换失败: {path}, 错误: {error}")
+            unreadable.append(path)
+            for rel_path in rel_paths:
+                files.pop(rel_path)
+            continue
+
+        output = os.path.relpath(_output_dir(todo_dir, Path(path)), todo_dir).replace(os.sep, "/")
+        for rel_path in rel_paths:
+            files[rel_path]["output"] = output
+
+    _save_manifest(manifest_path, {"files": files, "texts": texts})
+
+    logger.info(f"需求文档共{len(files)}个，本次转换{len(pending)}个，其余未变化或内容重复")
+
+    return unreadable
@@ -1,7 +1,8 @@
 from langchain.agents import create_agent
-from langchain_openai import ChatOpenAI
 from custom_type import ActionReview, Action, Response, Act
 from review_tool import tools
+from model_pool import get_model
+from functools import lru_cache
 
 import json
 import logging
@@ -16,14 +17,11 @@ logger = logging.getLogger(__name__)
 config = json.load(open("./config.json", "r", encoding="utf-8"))
 
 
+# 模型客户端和智能体在第一次审核时才创建，之后各轮审核共用
+@lru_cache(maxsize=None)
 def init_agent():
 
-    _model = ChatOpenAI(
-        model="qwen-plus",
-        openai_api_key=config["QWEN_API_KEY"],
-        openai_api_base=config["QWEN_API_BASE"],
-        temperature=0.7,
-    )
+    _model = get_model("qwen", "qwen-plus", 0.7)
 
     _prompt = f"""
         你是一位非常负责的审核员，我需要你根据需求文档和项目开发日志，检查项目是否实现了需求文档中的所有功能。
@@ -34,9 +32,6 @@ def init_agent():
     return agent
 
 
-agent = init_agent()
-
-
 async def review_node(state: ActionReview) -> ActionReview:
     count = 0
     if "count" in state:
@@ -56,7 +51,7 @@ async def review_node(state: ActionReview) -> ActionReview:
         2. 适当根据项目开发日志和需求文档，提出改进意见。
         3. 你输出的意见中不要包括图片文件或是图片的base64编码，不要包括任何与项目无关的内容。
         """
-        response = await agent.ainvoke({"messages": [("user", user_prompt)]})
+        response = await init_agent().ainvoke({"messages": [("user", user_prompt)]})
 
         response = response.get("structured_response", None)
 
@@ -93,7 +88,7 @@ async def review_node(state: ActionReview) -> ActionReview:
 。      3. 可以容忍优先级低的改进建议不被实现，但是中高优先级的改进建议必须被实现。
         4. 你输出的意见中不要包括图片文件或是图片的base64编码，不要包括任何与项目无关的内容。
         """
-        response = await agent.ainvoke({"messages": [("user", user_prompt)]})
+        response = await init_agent().ainvoke({"messages": [("user", user_prompt)]})
 
         response = response.get("structured_response", None)
         if response is None:
@@ -1,7 +1,10 @@
 from langchain.tools import tool
-from langchain_openai import ChatOpenAI
-from langchain_core.prompts import ChatPromptTemplate
 from constants import CODE_EXTENSIONS
+from summary_service import summarize
+from token_budget import count_tokens, get_budget
+from run_context import current_config
+from tracing import traced
+from typing import Dict
 
 import json
 import os
@@ -17,31 +20,13 @@ logger = logging.getLogger(__name__)
 
 config = json.load(open("./config.json", "r", encoding="utf-8"))
 
-dp_model = ChatOpenAI(
-    model="deepseek-chat",
-    openai_api_key=config["DEEPSEEK_API_KEY"],
-    openai_api_base=config["DEEPSEEK_API_BASE"],
-    temperature=0.4,
-)
-
-summary_prompt = ChatPromptTemplate.from_messages(
-    [
-        (
-            "system",
-            f"""
-        你是一位非常专业的总结专家，善于抓住项目日志中的重点内容。请把项目日志的字数控制在{config["SUMMARY_MAX_LENGTH"]}个token以内。
-        注意！
-        尽量保留日志中的重要信息，适当压缩其他信息，不要遗漏重要信息！
-        """,
-        ),
-        ("user", "{input}"),
-    ]
-)
 
-summary_pro = summary_prompt | dp_model
+def _config() -> Dict:
+    return current_config(config)
 
 
 @tool
+@traced("tool:write_opinion_file", "tool")
 def write_opinion_file(content: str) -> str:
     """
     写入审核员意见文件的内容
@@ -53,7 +38,7 @@ def write_opinion_file(content: str) -> str:
         返回字符串“文件写入成功”
     """
     logger.info("use write_opinion_file tool")
-    opinion_file_path = os.path.join(".", "opinion", f"{config['PROJECT_NAME']}.md")
+    opinion_file_path = os.path.join(".", "opinion", f"{_config()['PROJECT_NAME']}.md")
     with open(opinion_file_path, "w+", encoding="utf-8") as f:
         f.write(content)
 
@@ -61,6 +46,7 @@ def write_opinion_file(content: str) -> str:
 
 
 @tool
+@traced("tool:read_opinion_file", "tool")
 def read_opinion_file() -> str:
     """
     读取审核员意见文件的内容
@@ -73,7 +59,7 @@ def read_opinion_file() -> str:
         如果文件存在，返回文件的内容
     """
     logger.info("use read_opinion_file tool")
-    opinion_file_path = os.path.join(".", "opinion", f"{config['PROJECT_NAME']}.md")
+    opinion_file_path = os.path.join(".", "opinion", f"{_config()['PROJECT_NAME']}.md")
     if not os.path.exists(opinion_file_path):
         return "文件不存在"
 
@@ -82,6 +68,7 @@ def read_opinion_file() -> str:
 
 
 @tool
+@traced("tool:read_todo_content", "tool")
 def read_todo_content() -> str:
     """
     读取项目的需求文档内容
@@ -94,7 +81,7 @@ def read_todo_content() -> str:
         如果文件存在，返回文件的内容
     """
     logger.info("use read_todo_content tool")
-    todo_file_path = os.path.join(".", "todo", config["PROJECT_NAME"], "todo.md")
+    todo_file_path = os.path.join(".", "todo", _config()["PROJECT_NAME"], "todo.md")
     if not os.path.exists(todo_file_path):
         return "文件不存在"
 
@@ -103,6 +90,7 @@ def read_todo_content() -> str:
 
 
 @tool
+@traced("tool:read_development_log", "tool")
 def read_development_log() -> str:
     """
     读取项目开发日志内容
@@ -115,22 +103,32 @@ def read_development_log() -> str:
         如果文件存在，返回文件的内容
     """
     logger.info("use read_development_log tool")
-    development_log_path = os.path.join(".", "dist", config["PROJECT_NAME"], "development_log.md")
+    development_log_path = os.path.join(
+        ".", "dist", _config()["PROJECT_NAME"], "development_log.md"
+    )
     if not os.path.exists(development_log_path):
         return "文件不存在"
 
     with open(development_log_path, "r", encoding="utf-8") as f:
         development_log = f.read()
         development_log_parts = development_log.split("\n")
+        # 开发日志由审核智能体（qwen-plus）读取
+        budget = get_budget("qwen-plus")
+        threshold = budget.section_budget("development_log")
+        target = budget.summary_target(threshold)
         compressed_development_log = ""
+        compressed_tokens = 0
         for part in development_log_parts:
-            if len(compressed_development_log) + len(part) > config["SUMMARY_THRESHOLD"]:
-                compressed_development_log = summary_pro.invoke(
-                    f"请适当总结项目开发日志，只保留完成了哪些需求，项目开发日志内容如下：\n{compressed_development_log}"
-                ).content.strip()
+            part_tokens = count_tokens(part) + 1
+            if compressed_tokens + part_tokens > threshold:
+                compressed_development_log = summarize(
+                    f"请适当总结项目开发日志，只保留完成了哪些需求，总结后不超过{target}个token，项目开发日志内容如下：\n{compressed_development_log}"
+                )
                 compressed_development_log += "\n"
+                compressed_tokens = count_tokens(compressed_development_log)
 
             compressed_development_log += part + "\n"
+            compressed_tokens += part_tokens
 
     with open(development_log_path, "w", encoding="utf-8") as f:
         f.write(compressed_development_log)
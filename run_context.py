@@ -0,0 +1,63 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Dict, Iterator, Optional
+
+import os
+
+
+@dataclass(frozen=True)
+class RunContext:
+    """
+    一个项目一次运行的上下文
+
+    config 是该项目的配置：config.json 加上 PROJECTS 中该项目的覆盖项，包括项目名、
+    各种限制（RECURSION_LIMIT、CURSOR_TIMEOUT 等）和模拟、cursor-agent 的路径。
+    模型客户端、总结缓存和检查点数据库在各项目之间共享，不放在上下文中。
+    """
+
+    config: Dict
+
+    @property
+    def project_name(self) -> str:
+        return self.config["PROJECT_NAME"]
+
+    @property
+    def todo_dir(self) -> str:
+        return os.path.join(".", "todo", self.project_name)
+
+
+_current: ContextVar[Optional[RunContext]] = ContextVar("run_context", default=None)
+
+
+def make_context(base_config: Dict, project_name: str) -> RunContext:
+    """用 config.json 和 PROJECTS 中的项目覆盖项创建项目的运行上下文"""
+    overrides = base_config.get("PROJECTS", {}).get(project_name, {})
+
+    return RunContext({**base_config, **overrides, "PROJECT_NAME": project_name})
+
+
+def get_context() -> Optional[RunContext]:
+    return _current.get()
+
+
+@contextmanager
+def use_context(context: RunContext) -> Iterator[RunContext]:
+    """
+    在当前任务中使用运行上下文
+
+    上下文保存在 contextvars 中，图的节点、工具调用、asyncio.to_thread 和 create_task
+    都会继承，同一个事件循环中的不同任务可以使用不同的上下文。
+    """
+    token = _current.set(context)
+    try:
+        yield context
+    finally:
+        _current.reset(token)
+
+
+def current_config(default: Dict) -> Dict:
+    """当前运行的项目配置，没有运行上下文时返回 default（模块加载时读取的 config.json）"""
+    context = _current.get()
+
+    return context.config if context is not None else default
@@ -22,24 +22,245 @@
 #   4. 修复事件ID一致性问题：每个事件有独立event_id，tool_call拥有独立id字段
 #   5. 调整默认text格式输出为纯字符串而非字典，更贴近CLI实际行为
 #   6. 所有命令行输出均通过标准输出/错误流打印，exit_code由main函数统一控制
+# - 负载模拟：
+#   1. 新增 LoadProfile，通过命令行参数或环境变量 SIM_SDK_PROFILE 配置延迟分布（fixed、normal、long-tail）
+#   2. 按概率注入故障：非零退出码、挂起超时、截断输出和无法解析的输出
+# - 常驻服务：
+#   1. 新增 --serve 模式，通过标准输入或 Unix socket 接收按行分隔的 JSON 请求，避免每次调用启动解释器
+#   2. 命令行逻辑抽取为 run 函数，服务模式中各请求并发执行、互不影响
+# - 异步接口：
+#   1. 新增 acursor_agent、astream_analysis 和 CursorAgent 的异步方法，延迟使用 asyncio.sleep
+#   2. 批处理支持并发数：同时处理 concurrency 个文件，按完成顺序输出进度事件
+# - 增量流式输出：
+#   1. --stream-partial-output 的 assistant 事件只包含新增的文本，最后输出一个包含完整文本的事件
+#   2. 流式输出的文本长度、每个事件的字符数和事件间隔可以配置，用于测试消费方处理数 MB 输出的性能
 
 import json
 import time
+import asyncio
+import itertools
 import os
 import sys
+import io
+import random
+import threading
+import hashlib
 import argparse
 import fnmatch
-from typing import Optional, Dict, Any, Generator, List, Union
+from dataclasses import dataclass, fields, replace
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, AsyncGenerator, Generator, List, TextIO, Tuple, Union
 
+# 通过环境变量配置负载：JSON 字符串或 JSON 文件路径
+PROFILE_ENV = "SIM_SDK_PROFILE"
 
-def _simulate_delay():
-    """模拟网络延迟"""
-    time.sleep(0.5)
+LATENCY_MODES = ["fixed", "normal", "long-tail"]
+
+# 注入的故障的错误信息前缀
+FAULT_MESSAGE = "错误：模拟的 cursor-agent 故障"
+
+# 异步批处理默认同时处理的文件数
+DEFAULT_BATCH_CONCURRENCY = 8
+
+
+class SimulatedFailure(Exception):
+    """负载配置注入的故障"""
+
+    def __init__(self, exit_code: int):
+        super().__init__(f"{FAULT_MESSAGE}（退出码 {exit_code}）")
+        self.exit_code = exit_code
+
+
+@dataclass(frozen=True)
+class LoadProfile:
+    """
+    模拟 cursor-agent 的负载配置，默认与原来一样固定等待 0.5 秒且总是成功。
+
+    延迟分布 latency：
+    - fixed：固定 latency_mean 秒
+    - normal：均值 latency_mean、标准差 latency_spread 的正态分布
+    - long-tail：中位数 latency_mean、对数标准差 latency_spread 的对数正态分布，少数调用会慢很多倍
+    延迟不超过 latency_max 秒。
+
+    故障按概率互斥地注入：
+    - failure_rate：以 exit_code 退出
+    - timeout_rate：挂起 hang_seconds 秒后失败，用于触发调用方的超时
+    - truncate_rate：只输出一半内容
+    - garbage_rate：输出无法解析的内容
+
+    seed 不为空时，同一提示语的延迟和故障是确定的，不同提示语各不相同。
+
+    流式分析的输出：
+    - output_chars：文本长度（字符），为 0 时使用默认的短文本
+    - stream_chunk_chars：每个 assistant 事件新增的字符数
+    - stream_interval：事件之间的间隔（秒）
+    """
+
+    latency: str = "fixed"
+    latency_mean: float = 0.5
+    latency_spread: float = 0.0
+    latency_max: float = 600.0
+    failure_rate: float = 0.0
+    timeout_rate: float = 0.0
+    truncate_rate: float = 0.0
+    garbage_rate: float = 0.0
+    exit_code: int = 1
+    hang_seconds: float = 3600.0
+    seed: Optional[int] = None
+    output_chars: int = 0
+    stream_chunk_chars: int = 1
+    stream_interval: float = 0.01
+
+    def __post_init__(self):
+        if self.latency not in LATENCY_MODES:
+            raise ValueError(f"未知的延迟分布: {self.latency}，可选 {', '.join(LATENCY_MODES)}")
+
+        rates = [self.failure_rate, self.timeout_rate, self.truncate_rate, self.garbage_rate]
+        if any(rate < 0 or rate > 1 for rate in rates) or sum(rates) > 1:
+            raise ValueError("故障概率必须在 0 到 1 之间，且总和不超过 1")
+
+        if self.latency_mean < 0 or self.latency_spread < 0:
+            raise ValueError("延迟和延迟波动不能为负数")
+
+        if self.exit_code == 0:
+            raise ValueError("注入故障的退出码不能为 0")
+
+        if self.output_chars < 0 or self.stream_chunk_chars < 1 or self.stream_interval < 0:
+            raise ValueError("输出长度和事件间隔不能为负数，每个事件至少包含 1 个字符")
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "LoadProfile":
+        names = {field.name for field in fields(cls)}
+        unknown = set(data) - names
+        if unknown:
+            raise ValueError(f"未知的负载配置项: {', '.join(sorted(unknown))}")
+
+        return cls(**data)
+
+    def _rng(self, key: str) -> random.Random:
+        if self.seed is None:
+            return random.Random()
+
+        digest = hashlib.sha256(f"{self.seed}:{key}".encode("utf-8")).hexdigest()
+        return random.Random(int(digest[:16], 16))
+
+    def sample_latency(self, rng: random.Random) -> float:
+        if self.latency == "normal":
+            delay = rng.gauss(self.latency_mean, self.latency_spread)
+        elif self.latency == "long-tail":
+            delay = self.latency_mean * rng.lognormvariate(0, self.latency_spread)
+        else:
+            delay = self.latency_mean
+
+        return min(max(delay, 0.0), self.latency_max)
+
+    def draw(self, key: str = "") -> Tuple[float, str]:
+        """
+        抽取一次调用的延迟和结果
+
+        Returns:
+            (延迟秒数, 结果)，结果为 ok、failure、timeout、truncated 或 garbage
+        """
+        rng = self._rng(key)
+        delay = self.sample_latency(rng)
+
+        point = rng.random()
+        for outcome, rate in (
+            ("failure", self.failure_rate),
+            ("timeout", self.timeout_rate),
+            ("truncated", self.truncate_rate),
+            ("garbage", self.garbage_rate),
+        ):
+            if point < rate:
+                return delay, outcome
+            point -= rate
+
+        return delay, "ok"
+
+
+def load_profile(spec: Optional[str] = None) -> LoadProfile:
+    """从 JSON 字符串或 JSON 文件加载负载配置，spec 为空时返回默认配置"""
+    if not spec:
+        return LoadProfile()
+
+    if spec.lstrip().startswith("{"):
+        data = json.loads(spec)
+    else:
+        with open(spec, "r", encoding="utf-8") as f:
+            data = json.load(f)
+
+    return LoadProfile.from_dict(data)
+
+
+_profile = load_profile(os.getenv(PROFILE_ENV))
+
+
+def set_profile(profile: LoadProfile) -> None:
+    global _profile
+    _profile = profile
+
+
+def get_profile() -> LoadProfile:
+    return _profile
+
+
+def _simulate_delay(key: str = "", profile: Optional[LoadProfile] = None) -> str:
+    """
+    按负载配置模拟网络延迟和故障，profile 为空时使用 set_profile 设置的配置
+
+    Returns:
+        ok、truncated 或 garbage，表示输出是否需要损坏
+
+    Raises:
+        SimulatedFailure: 注入了失败或超时
+    """
+    delay, outcome, exit_code = _draw(key, profile)
+    time.sleep(delay)
+
+    if outcome in ("failure", "timeout"):
+        raise SimulatedFailure(exit_code)
+
+    return outcome
+
+
+async def _asimulate_delay(key: str = "", profile: Optional[LoadProfile] = None) -> str:
+    """_simulate_delay 的异步版本，等待时不阻塞事件循环"""
+    delay, outcome, exit_code = _draw(key, profile)
+    await asyncio.sleep(delay)
+
+    if outcome in ("failure", "timeout"):
+        raise SimulatedFailure(exit_code)
+
+    return outcome
+
+
+def _draw(key: str, profile: Optional[LoadProfile]) -> Tuple[float, str, int]:
+    """抽取等待时间、结果和失败时的退出码，注入超时时等待 hang_seconds"""
+    profile = profile or _profile
+    delay, outcome = profile.draw(key)
+    if outcome == "timeout":
+        delay = profile.hang_seconds
+
+    return delay, outcome, profile.exit_code
+
+
+def _corrupt(text: str, outcome: str) -> str:
+    """按注入的故障损坏输出：截断为一半，或换成无法解析的内容"""
+    if outcome == "truncated":
+        return text[: len(text) // 2]
+    if outcome == "garbage":
+        digest = hashlib.sha256(text.encode("utf-8")).digest()
+        return "\ufffd" + "".join(chr(0x2580 + byte % 32) for byte in digest) + '{"unterminated'
+
+    return text
+
+
+_event_counter = itertools.count()
 
 
 def _generate_event_id() -> str:
-    """生成唯一的事件ID"""
-    return f"evt_{int(time.time() * 1000)}_{os.getpid()}_{id(object()) % 10000}"
+    """生成唯一的事件ID，并发处理时同一毫秒内的事件也不重复"""
+    return f"evt_{int(time.time() * 1000)}_{os.getpid()}_{next(_event_counter)}"
 
 
 def _generate_tool_call_id() -> str:
@@ -59,6 +280,7 @@ def cursor_agent(
     output_format: str = "text",
     stream_partial_output: bool = False,
     api_key: Optional[str] = None,
+    profile: Optional[LoadProfile] = None,
 ) -> Union[str, Dict[str, Any]]:
     """
     模拟 cursor-agent CLI 命令的行为。
@@ -70,6 +292,7 @@ def cursor_agent(
         output_format (str): 输出格式，可选 'text', 'json', 'stream-json'。默认为 'text'。
         stream_partial_output (bool): 是否增量流式输出变更。默认为 False。
         api_key (str, optional): API 密钥，默认从环境变量 CURSOR_API_KEY 读取。
+        profile (LoadProfile, optional): 负载配置，默认使用 set_profile 设置的配置。
 
     返回:
         根据 output_format 返回不同类型的响应：
@@ -77,32 +300,76 @@ def cursor_agent(
         - json: 返回结构化字典
         - stream-json: 应使用 stream_analysis 获取流式输出，此处返回空字符串
     """
-    if not prompt:
-        if output_format == "text":
-            return "错误：缺少必要的 prompt 参数"
-        else:
-            return {"error": "缺少必要的 prompt 参数", "exit_code": 1}
+    effective_api_key = api_key or os.getenv("CURSOR_API_KEY")
+    error = _request_error(prompt, print_mode, output_format, effective_api_key)
+    if error is not None:
+        return error
 
-    if not print_mode:
-        if output_format == "text":
-            return "错误：非打印模式下不执行操作，请设置 print_mode=True"
-        else:
-            return {"error": "非打印模式下不执行操作，请设置 print_mode=True", "exit_code": 1}
+    # 模拟网络延迟和故障
+    try:
+        outcome = _simulate_delay(prompt, profile)
+    except SimulatedFailure as e:
+        return _failure_response(e, output_format)
 
-    # 使用传入的api_key或从环境变量读取
+    return _agent_response(prompt, print_mode, force, output_format, effective_api_key, outcome)
+
+
+async def acursor_agent(
+    prompt: str,
+    print_mode: bool = False,
+    force: bool = False,
+    output_format: str = "text",
+    stream_partial_output: bool = False,
+    api_key: Optional[str] = None,
+    profile: Optional[LoadProfile] = None,
+) -> Union[str, Dict[str, Any]]:
+    """
+    cursor_agent 的异步版本，参数和返回值相同，模拟的延迟不阻塞事件循环。
+    """
     effective_api_key = api_key or os.getenv("CURSOR_API_KEY")
-    if not effective_api_key:
-        if output_format == "text":
-            return "错误：API密钥未设置，请设置环境变量 CURSOR_API_KEY"
-        else:
-            return {"error": "API密钥未设置，请设置环境变量 CURSOR_API_KEY", "exit_code": 1}
+    error = _request_error(prompt, print_mode, output_format, effective_api_key)
+    if error is not None:
+        return error
+
+    try:
+        outcome = await _asimulate_delay(prompt, profile)
+    except SimulatedFailure as e:
+        return _failure_response(e, output_format)
+
+    return _agent_response(prompt, print_mode, force, output_format, effective_api_key, outcome)
+
+
+def _request_error(
+    prompt: str, print_mode: bool, output_format: str, api_key: Optional[str]
+) -> Optional[Union[str, Dict[str, Any]]]:
+    """检查调用参数，有错误时返回错误响应"""
+    if not prompt:
+        message = "缺少必要的 prompt 参数"
+    elif not print_mode:
+        message = "非打印模式下不执行操作，请设置 print_mode=True"
+    elif not api_key:
+        message = "API密钥未设置，请设置环境变量 CURSOR_API_KEY"
+    else:
+        return None
+
+    if output_format == "text":
+        return f"错误：{message}"
+    return {"error": message, "exit_code": 1}
+
 
-    # 模拟网络延迟
-    _simulate_delay()
+def _failure_response(error: SimulatedFailure, output_format: str) -> Union[str, Dict[str, Any]]:
+    if output_format == "text":
+        return str(error)
+    return {"error": str(error), "exit_code": error.exit_code}
 
+
+def _agent_response(
+    prompt: str, print_mode: bool, force: bool, output_format: str, api_key: str, outcome: str
+) -> Union[str, Dict[str, Any]]:
+    """按 output_format 生成模拟的响应，outcome 不是 ok 时损坏输出"""
     # 根据 output_format 返回不同格式的数据
     if output_format == "json":
-        return {
+        result = {
             "result": "代码审查已完成，未发现严重问题。",
             "recommendations": [
                 "添加 JSDoc 注释以提高可读性",
@@ -115,9 +382,13 @@ def cursor_agent(
             "print_mode": print_mode,
             "force": force,
             "output_format": output_format,
-            "api_key_set": bool(effective_api_key),
+            "api_key_set": bool(api_key),
             "exit_code": 0,
         }
+        if outcome != "ok":
+            return _corrupt(json.dumps(result, indent=2, ensure_ascii=False), outcome)
+
+        return result
 
     elif output_format == "stream-json":
         # 在此模式下应使用 stream_analysis 函数进行流式输出
@@ -125,20 +396,74 @@ def cursor_agent(
         return ""
 
     else:  # 默认 text 格式
-        return "这个代码库是一个前端应用，使用 React 和 TypeScript 构建，包含用户认证、数据可视化等功能。"
+        return _corrupt(
+            "这个代码库是一个前端应用，使用 React 和 TypeScript 构建，包含用户认证、数据可视化等功能。",
+            outcome,
+        )
 
 
-def stream_analysis(prompt: str, output_file: str = "analysis.txt") -> Generator[Dict, None, None]:
+def stream_analysis(
+    prompt: str,
+    output_file: str = "analysis.txt",
+    profile: Optional[LoadProfile] = None,
+    delta: bool = False,
+) -> Generator[Dict, None, None]:
     """
     流式分析项目结构，模拟真正的逐行输出行为。
 
     参数:
         prompt (str): 分析提示。
         output_file (str): 输出文件路径。
+        profile (LoadProfile, optional): 负载配置，默认使用 set_profile 设置的配置。
+        delta (bool): 增量模式。为 False 时每个 assistant 事件包含到目前为止的全部文本；
+            为 True 时只包含新增的文本（subtype 为 delta），最后输出一个包含完整文本的事件
+            （subtype 为 complete），总输出量与文本长度成正比。
 
     Yields:
-        dict: 单个流事件对象，每个事件都有唯一 event_id
+        dict: 单个流事件对象，每个事件都有唯一 event_id；注入无法解析的输出时为字符串
+
+    Raises:
+        SimulatedFailure: 负载配置注入了失败或超时
     """
+    profile = profile or _profile
+    # 负载配置的延迟作为首个事件前的等待
+    outcome = _simulate_delay(prompt, profile)
+    for event, pause in _analysis_steps(output_file, outcome, profile, delta):
+        yield event
+        if pause:
+            time.sleep(pause)
+
+
+async def astream_analysis(
+    prompt: str,
+    output_file: str = "analysis.txt",
+    profile: Optional[LoadProfile] = None,
+    delta: bool = False,
+) -> AsyncGenerator[Union[Dict, str], None]:
+    """stream_analysis 的异步版本，事件相同，等待时不阻塞事件循环"""
+    profile = profile or _profile
+    outcome = await _asimulate_delay(prompt, profile)
+    for event, pause in _analysis_steps(output_file, outcome, profile, delta):
+        yield event
+        if pause:
+            await asyncio.sleep(pause)
+
+
+ANALYSIS_TEXT = "正在分析项目结构...生成报告摘要...完成文件扫描..."
+
+
+def _analysis_text(output_chars: int) -> str:
+    """流式分析输出的文本，output_chars 为 0 时使用默认文本，否则重复默认文本到指定长度"""
+    if not output_chars:
+        return ANALYSIS_TEXT
+
+    return (ANALYSIS_TEXT * (output_chars // len(ANALYSIS_TEXT) + 1))[:output_chars]
+
+
+def _analysis_steps(
+    output_file: str, outcome: str, profile: LoadProfile, delta: bool = False
+) -> Generator[Tuple[Union[Dict, str], float], None, None]:
+    """流式分析的事件，以及每个事件之后的等待时间（秒）"""
     event_id = _generate_event_id()
 
     yield {
@@ -147,19 +472,37 @@ def stream_analysis(prompt: str, output_file: str = "analysis.txt") -> Generator
         "model": "cursor-large-v1",
         "event_id": event_id,
         "timestamp": _get_current_timestamp(),
-    }
+    }, 0
+
+    text = _analysis_text(profile.output_chars)
+    chunk = profile.stream_chunk_chars
+    for end in range(chunk, len(text) + chunk, chunk):
+        # 模拟字符级流式输出
+        event = {"type": "assistant"}
+        if delta:
+            event["subtype"] = "delta"
+            event["message"] = {"content": [{"text": text[end - chunk : end]}]}
+        else:
+            event["message"] = {"content": [{"text": text[:end]}]}
+        event["event_id"] = event_id
+        event["timestamp"] = _get_current_timestamp()
+        yield event, profile.stream_interval
+
+    # 截断时缺少完整文本、工具调用和 result 事件，无法解析的输出是一行非 JSON 内容
+    if outcome == "truncated":
+        return
+    if outcome == "garbage":
+        yield _corrupt(text, outcome), 0
+        return
 
-    accumulated = ""
-    partial_text = "正在分析项目结构...生成报告摘要...完成文件扫描..."
-    for char in partial_text:
-        accumulated += char
+    if delta:
         yield {
             "type": "assistant",
-            "message": {"content": [{"text": accumulated}]},
+            "subtype": "complete",
+            "message": {"content": [{"text": text}]},
             "event_id": event_id,
             "timestamp": _get_current_timestamp(),
-        }
-        time.sleep(0.01)  # 模拟字符级流式输出
+        }, 0
 
     # 模拟工具调用 - readToolCall
     tool_call_id = _generate_tool_call_id()
@@ -169,15 +512,14 @@ def stream_analysis(prompt: str, output_file: str = "analysis.txt") -> Generator
         "tool_call": {"readToolCall": {"args": {"path": "src/"}, "id": tool_call_id}},
         "event_id": event_id,
         "timestamp": _get_current_timestamp(),
-    }
-    time.sleep(0.2)
+    }, 0.2
     yield {
         "type": "tool_call",
         "subtype": "completed",
         "tool_call": {"readToolCall": {"result": {"success": {"totalLines": 450}}}},
         "event_id": event_id,
         "timestamp": _get_current_timestamp(),
-    }
+    }, 0
 
     # 模拟工具调用 - writeToolCall
     write_tool_id = _generate_tool_call_id()
@@ -187,8 +529,7 @@ def stream_analysis(prompt: str, output_file: str = "analysis.txt") -> Generator
         "tool_call": {"writeToolCall": {"args": {"path": output_file}, "id": write_tool_id}},
         "event_id": event_id,
         "timestamp": _get_current_timestamp(),
-    }
-    time.sleep(0.2)
+    }, 0.2
     yield {
         "type": "tool_call",
         "subtype": "completed",
@@ -197,95 +538,259 @@ def stream_analysis(prompt: str, output_file: str = "analysis.txt") -> Generator
         },
         "event_id": event_id,
         "timestamp": _get_current_timestamp(),
-    }
+    }, 0
 
     yield {
         "type": "result",
         "duration_ms": 1250,
         "event_id": event_id,
         "timestamp": _get_current_timestamp(),
-    }
+    }, 0
 
 
-def process_files_glob(pattern: str, prompt_template: str) -> List[Dict[str, Any]]:
+def _match_files(pattern: str) -> List[str]:
+    import glob
+
+    return glob.glob(pattern, recursive=True)
+
+
+def _file_result(result: Union[str, Dict[str, Any]], file_path: str) -> Dict[str, Any]:
+    """批处理中单个文件的结果，输出被损坏时记为错误"""
+    if isinstance(result, str):
+        result = {"error": "输出无法解析", "output": result, "exit_code": 1}
+    result["processed_file"] = file_path
+
+    return result
+
+
+def process_files_glob(
+    pattern: str,
+    prompt_template: str,
+    concurrency: int = 1,
+    api_key: Optional[str] = None,
+    profile: Optional[LoadProfile] = None,
+) -> List[Dict[str, Any]]:
     """
     批量处理符合 glob 模式的文件。
 
     参数:
         pattern (str): 文件路径模式，如 "src/**/*.js"
         prompt_template (str): 提示模板，其中 `{file}` 会被替换为文件名
+        concurrency (int): 同时处理的文件数，默认逐个处理
+        api_key (str, optional): API 密钥，默认从环境变量 CURSOR_API_KEY 读取
+        profile (LoadProfile, optional): 负载配置，默认使用 set_profile 设置的配置
 
     返回:
-        list: 每个文件的处理结果列表
+        list: 每个文件的处理结果列表，顺序与匹配的文件相同
     """
-    import glob
+    matched_files = _match_files(pattern)
+
+    if not matched_files:
+        return [{"error": f"未找到匹配 '{pattern}' 的文件", "exit_code": 1}]
+
+    def process(file_path: str) -> Dict[str, Any]:
+        result = cursor_agent(
+            prompt=prompt_template.format(file=file_path),
+            print_mode=True,
+            force=True,
+            output_format="json",
+            api_key=api_key,
+            profile=profile,
+        )
+        return _file_result(result, file_path)
+
+    if concurrency <= 1:
+        return [process(file_path) for file_path in matched_files]
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        return list(pool.map(process, matched_files))
+
+
+async def aprocess_files_glob(
+    pattern: str,
+    prompt_template: str,
+    concurrency: int = DEFAULT_BATCH_CONCURRENCY,
+    api_key: Optional[str] = None,
+    profile: Optional[LoadProfile] = None,
+) -> List[Dict[str, Any]]:
+    """
+    process_files_glob 的异步版本，最多同时处理 concurrency 个文件，
+    总耗时约为文件数除以并发数乘以单次延迟。
 
-    results = []
-    matched_files = glob.glob(pattern, recursive=True)
+    返回:
+        list: 每个文件的处理结果列表，顺序与匹配的文件相同
+    """
+    matched_files = _match_files(pattern)
 
     if not matched_files:
         return [{"error": f"未找到匹配 '{pattern}' 的文件", "exit_code": 1}]
 
-    for file_path in matched_files:
-        prompt = prompt_template.format(file=file_path)
-        result = cursor_agent(prompt=prompt, print_mode=True, force=True, output_format="json")
-        result["processed_file"] = file_path
-        results.append(result)
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def process(file_path: str) -> Dict[str, Any]:
+        async with semaphore:
+            result = await acursor_agent(
+                prompt=prompt_template.format(file=file_path),
+                print_mode=True,
+                force=True,
+                output_format="json",
+                api_key=api_key,
+                profile=profile,
+            )
+        return _file_result(result, file_path)
+
+    return list(await asyncio.gather(*(process(file_path) for file_path in matched_files)))
+
+
+def _no_match_event(pattern: str) -> Dict[str, Any]:
+    return {
+        "type": "error",
+        "message": f"未找到匹配 '{pattern}' 的文件",
+        "event_id": _generate_event_id(),
+        "timestamp": _get_current_timestamp(),
+    }
+
+
+def _file_started_event(file_path: str, progress: str, event_id: str) -> Dict[str, Any]:
+    return {
+        "type": "file_processing",
+        "status": "started",
+        "file": file_path,
+        "progress": progress,
+        "event_id": event_id,
+        "timestamp": _get_current_timestamp(),
+    }
+
+
+def _file_processed_event(
+    file_path: str, progress: str, event_id: str, error: Optional[SimulatedFailure] = None
+) -> Dict[str, Any]:
+    event = {"type": "file_processed", "file": file_path, "progress": progress}
+    if error is None:
+        # 模拟成功结果
+        event["status"] = "completed"
+        event["result"] = {"recommendations": ["添加 JSDoc 注释", "优化函数结构"], "lines_added": 8}
+    else:
+        event["status"] = "failed"
+        event["error"] = str(error)
+
+    event["event_id"] = event_id
+    event["timestamp"] = _get_current_timestamp()
 
-    return results
+    return event
 
 
-def stream_process_files_glob(pattern: str, prompt_template: str) -> Generator[Dict, None, None]:
+def stream_process_files_glob(
+    pattern: str,
+    prompt_template: str,
+    concurrency: int = 1,
+    profile: Optional[LoadProfile] = None,
+) -> Generator[Dict, None, None]:
     """
     流式批处理符合 glob 模式的文件，支持实时进度跟踪。
 
     参数:
         pattern (str): 文件路径模式
         prompt_template (str): 提示模板
+        concurrency (int): 同时处理的文件数，默认逐个处理；大于 1 时与 astream_process_files_glob 相同，
+            不能在运行中的事件循环里调用
+        profile (LoadProfile, optional): 负载配置，默认使用 set_profile 设置的配置
 
     Yields:
         dict: 包含处理状态的事件对象
     """
-    import glob
+    if concurrency > 1:
+        yield from _iterate_async(
+            astream_process_files_glob(pattern, prompt_template, concurrency, profile)
+        )
+        return
 
-    matched_files = glob.glob(pattern, recursive=True)
+    matched_files = _match_files(pattern)
     total = len(matched_files)
-    current = 0
 
     if total == 0:
-        yield {
-            "type": "error",
-            "message": f"未找到匹配 '{pattern}' 的文件",
-            "event_id": _generate_event_id(),
-            "timestamp": _get_current_timestamp(),
-        }
+        yield _no_match_event(pattern)
         return
 
-    for file_path in matched_files:
-        current += 1
+    for current, file_path in enumerate(matched_files, 1):
         event_id = _generate_event_id()
+        yield _file_started_event(file_path, f"{current}/{total}", event_id)
 
-        yield {
-            "type": "file_processing",
-            "status": "started",
-            "file": file_path,
-            "progress": f"{current}/{total}",
-            "event_id": event_id,
-            "timestamp": _get_current_timestamp(),
-        }
+        # 模拟处理延迟和故障
+        try:
+            _simulate_delay(file_path, profile)
+        except SimulatedFailure as e:
+            yield _file_processed_event(file_path, f"{current}/{total}", event_id, e)
+            continue
 
-        # 模拟处理延迟
-        _simulate_delay()
+        yield _file_processed_event(file_path, f"{current}/{total}", event_id)
 
-        # 模拟成功结果
-        yield {
-            "type": "file_processed",
-            "status": "completed",
-            "file": file_path,
-            "result": {"recommendations": ["添加 JSDoc 注释", "优化函数结构"], "lines_added": 8},
-            "event_id": event_id,
-            "timestamp": _get_current_timestamp(),
-        }
+
+async def astream_process_files_glob(
+    pattern: str,
+    prompt_template: str,
+    concurrency: int = DEFAULT_BATCH_CONCURRENCY,
+    profile: Optional[LoadProfile] = None,
+) -> AsyncGenerator[Dict, None]:
+    """
+    异步流式批处理，最多同时处理 concurrency 个文件，事件按发生顺序输出。
+
+    每个文件有一个 started 事件和一个 file_processed 事件（completed 或 failed），两者的 event_id 相同。
+    started 事件的 progress 是已开始的文件数，file_processed 事件的 progress 是已完成的文件数。
+    """
+    matched_files = _match_files(pattern)
+    total = len(matched_files)
+
+    if total == 0:
+        yield _no_match_event(pattern)
+        return
+
+    events: asyncio.Queue = asyncio.Queue()
+    pending = iter(matched_files)
+    counts = {"started": 0, "processed": 0}
+
+    async def worker() -> None:
+        # 各协程共用同一个迭代器，处理完一个文件再取下一个
+        for file_path in pending:
+            counts["started"] += 1
+            event_id = _generate_event_id()
+            events.put_nowait(
+                _file_started_event(file_path, f"{counts['started']}/{total}", event_id)
+            )
+
+            error = None
+            try:
+                await _asimulate_delay(file_path, profile)
+            except SimulatedFailure as e:
+                error = e
+
+            counts["processed"] += 1
+            events.put_nowait(
+                _file_processed_event(file_path, f"{counts['processed']}/{total}", event_id, error)
+            )
+
+    workers = [asyncio.create_task(worker()) for _ in range(min(max(1, concurrency), total))]
+    try:
+        for _ in range(2 * total):
+            yield await events.get()
+    finally:
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+
+def _iterate_async(generator: AsyncGenerator) -> Generator:
+    """在新的事件循环中逐个取出异步生成器的元素"""
+    loop = asyncio.new_event_loop()
+    try:
+        while True:
+            try:
+                yield loop.run_until_complete(generator.__anext__())
+            except StopAsyncIteration:
+                return
+    finally:
+        loop.run_until_complete(generator.aclose())
+        loop.close()
 
 
 class CursorAgent:
@@ -319,6 +824,12 @@ class CursorAgent:
             prompt=prompt, print_mode=True, force=force, output_format="text", api_key=self.api_key
         )
 
+    async def aanalyze(self, prompt: str, force: bool = False) -> Union[str, Dict[str, Any]]:
+        """analyze 的异步版本"""
+        return await acursor_agent(
+            prompt=prompt, print_mode=True, force=force, output_format="text", api_key=self.api_key
+        )
+
     def review(self, target: str = "recent changes") -> Dict[str, Any]:
         """
         执行代码审查。
@@ -329,41 +840,96 @@ class CursorAgent:
         返回:
             dict: 审查结果（JSON格式）。
         """
-        prompt = f"审查 {target} 并提供反馈：\n  - 代码质量和可读性\n  - 潜在的错误或问题\n  - 安全考虑\n  - 最佳实践合规性\n\n提供具体的改进建议。"
         return cursor_agent(
-            prompt=prompt, print_mode=True, force=True, output_format="json", api_key=self.api_key
+            prompt=self._review_prompt(target),
+            print_mode=True,
+            force=True,
+            output_format="json",
+            api_key=self.api_key,
+        )
+
+    async def areview(self, target: str = "recent changes") -> Dict[str, Any]:
+        """review 的异步版本"""
+        return await acursor_agent(
+            prompt=self._review_prompt(target),
+            print_mode=True,
+            force=True,
+            output_format="json",
+            api_key=self.api_key,
         )
 
-    def stream_analysis(self, output_file: str = "analysis.txt") -> Generator[Dict, None, None]:
+    @staticmethod
+    def _review_prompt(target: str) -> str:
+        return f"审查 {target} 并提供反馈：\n  - 代码质量和可读性\n  - 潜在的错误或问题\n  - 安全考虑\n  - 最佳实践合规性\n\n提供具体的改进建议。"
+
+    def stream_analysis(
+        self, output_file: str = "analysis.txt", delta: bool = False
+    ) -> Generator[Dict, None, None]:
         """
         流式分析项目结构。
 
         参数:
             output_file (str): 输出文件路径。
+            delta (bool): 是否只输出新增的文本，见 stream_analysis。
 
         Yields:
             dict: 单个流事件。
         """
         prompt = f"分析此项目结构并在 {output_file} 中创建摘要报告"
-        yield from stream_analysis(prompt, output_file)
+        yield from stream_analysis(prompt, output_file, delta=delta)
 
-    def stream_batch_process(self, pattern: str, instruction: str) -> Generator[Dict, None, None]:
+    async def astream_analysis(
+        self, output_file: str = "analysis.txt", delta: bool = False
+    ) -> AsyncGenerator[Union[Dict, str], None]:
+        """stream_analysis 的异步版本"""
+        prompt = f"分析此项目结构并在 {output_file} 中创建摘要报告"
+        async for event in astream_analysis(prompt, output_file, delta=delta):
+            yield event
+
+    def stream_batch_process(
+        self, pattern: str, instruction: str, concurrency: int = 1
+    ) -> Generator[Dict, None, None]:
         """
         流式批处理文件。
 
         参数:
             pattern (str): 文件匹配模式
             instruction (str): 处理指令
+            concurrency (int): 同时处理的文件数
 
         Yields:
             dict: 流式事件
         """
         template = f"{{file}}: {instruction}"
-        yield from stream_process_files_glob(pattern, template)
+        yield from stream_process_files_glob(pattern, template, concurrency)
+
+    async def astream_batch_process(
+        self, pattern: str, instruction: str, concurrency: int = DEFAULT_BATCH_CONCURRENCY
+    ) -> AsyncGenerator[Dict, None]:
+        """stream_batch_process 的异步版本，事件按完成顺序输出"""
+        template = f"{{file}}: {instruction}"
+        async for event in astream_process_files_glob(pattern, template, concurrency):
+            yield event
 
+    async def abatch(
+        self, pattern: str, instruction: str, concurrency: int = DEFAULT_BATCH_CONCURRENCY
+    ) -> List[Dict[str, Any]]:
+        """
+        并发批处理文件，返回每个文件的结果。
 
-def main():
-    """命令行主入口"""
+        参数:
+            pattern (str): 文件匹配模式
+            instruction (str): 处理指令
+            concurrency (int): 同时处理的文件数
+
+        返回:
+            list: 每个文件的处理结果，顺序与匹配的文件相同
+        """
+        template = f"{{file}}: {instruction}"
+        return await aprocess_files_glob(pattern, template, concurrency, api_key=self.api_key)
+
+
+def _build_parser() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser(description="模拟 cursor-agent CLI 工具")
     parser.add_argument("prompt", nargs="?", help="要执行的提示语")
     parser.add_argument("-p", "--print", action="store_true", help="启用打印模式")
@@ -373,31 +939,88 @@ def main():
     )
     parser.add_argument("--stream-partial-output", action="store_true", help="启用部分输出流")
     parser.add_argument("--api-key", help="显式指定API密钥")
+    parser.add_argument(
+        "--profile", help=f"负载配置，JSON 字符串或 JSON 文件路径，默认读取环境变量 {PROFILE_ENV}"
+    )
+    parser.add_argument("--latency", choices=LATENCY_MODES, help="延迟分布")
+    parser.add_argument("--latency-mean", type=float, help="延迟（秒），long-tail 为中位数")
+    parser.add_argument(
+        "--latency-spread", type=float, help="normal 的标准差或 long-tail 的对数标准差"
+    )
+    parser.add_argument("--failure-rate", type=float, help="以非零退出码失败的概率")
+    parser.add_argument("--timeout-rate", type=float, help="挂起不返回的概率")
+    parser.add_argument("--truncate-rate", type=float, help="输出被截断的概率")
+    parser.add_argument("--garbage-rate", type=float, help="输出无法解析的内容的概率")
+    parser.add_argument("--exit-code", type=int, help="注入失败时的退出码")
+    parser.add_argument("--seed", type=int, help="随机种子，同一提示语的延迟和故障固定")
+    parser.add_argument("--output-chars", type=int, help="流式输出的文本长度（字符）")
+    parser.add_argument("--stream-chunk-chars", type=int, help="流式输出每个事件的字符数")
+    parser.add_argument("--stream-interval", type=float, help="流式输出的事件间隔（秒）")
+
+    return parser
+
+
+def run(
+    argv: List[str],
+    env: Optional[Dict[str, str]] = None,
+    stdin: Optional[TextIO] = None,
+    stdout: Optional[TextIO] = None,
+    stderr: Optional[TextIO] = None,
+) -> int:
+    """
+    执行一次命令行调用，返回退出码
 
-    args = parser.parse_args()
+    参数:
+        argv (list): 命令行参数，不包括程序名
+        env (dict, optional): 环境变量，默认为当前进程的环境变量
+        stdin: 没有提供 prompt 时读取提示语的输入流，为 None 时不读取
+        stdout, stderr: 输出流，默认为 sys.stdout 和 sys.stderr
+    """
+    env = os.environ if env is None else env
+    stdout = stdout or sys.stdout
+    stderr = stderr or sys.stderr
+
+    try:
+        args = _build_parser().parse_args(argv)
+    except SystemExit as e:
+        return e.code if isinstance(e.code, int) else 2
+
+    try:
+        profile = load_profile(args.profile or env.get(PROFILE_ENV))
+        overrides = {
+            field.name: getattr(args, field.name)
+            for field in fields(LoadProfile)
+            if getattr(args, field.name, None) is not None
+        }
+        profile = replace(profile, **overrides)
+    except (OSError, ValueError) as e:
+        print(f"错误：负载配置无效: {e}", file=stderr)
+        return 2
 
     # 如果没有提供 prompt，则尝试从标准输入读取
-    if not args.prompt:
+    if not args.prompt and stdin is not None:
         try:
-            args.prompt = sys.stdin.read().strip()
-            if not args.prompt:
-                raise ValueError
+            args.prompt = stdin.read().strip()
         except Exception:
-            print("错误：必须提供提示语作为参数或标准输入", file=sys.stderr)
-            sys.exit(1)
+            args.prompt = ""
+    if not args.prompt:
+        print("错误：必须提供提示语作为参数或标准输入", file=stderr)
+        return 1
 
     # 验证API密钥
-    api_key = args.api_key or os.getenv("CURSOR_API_KEY")
+    api_key = args.api_key or env.get("CURSOR_API_KEY")
     if not api_key:
-        print("错误：API密钥未设置，请设置环境变量 CURSOR_API_KEY", file=sys.stderr)
-        sys.exit(1)
+        print("错误：API密钥未设置，请设置环境变量 CURSOR_API_KEY", file=stderr)
+        return 1
 
     if args.output_format == "stream-json" and args.stream_partial_output:
         # 特殊处理流式输出：逐行打印每个事件
         try:
-            for event in stream_analysis(args.prompt):
-                print(json.dumps(event), flush=True)
-            sys.exit(0)
+            for event in stream_analysis(args.prompt, profile=profile, delta=True):
+                print(
+                    event if isinstance(event, str) else json.dumps(event), file=stdout, flush=True
+                )
+            return 0
         except Exception as e:
             error_event = {
                 "type": "error",
@@ -405,32 +1028,175 @@ def main():
                 "event_id": _generate_event_id(),
                 "timestamp": _get_current_timestamp(),
             }
-            print(json.dumps(error_event), file=sys.stderr, flush=True)
-            sys.exit(1)
-    else:
-        # 其他模式统一处理
-        result = cursor_agent(
-            prompt=args.prompt,
-            print_mode=args.print,
-            force=args.force,
-            output_format=args.output_format,
-            stream_partial_output=args.stream_partial_output,
-            api_key=api_key,
+            print(json.dumps(error_event), file=stderr, flush=True)
+            return getattr(e, "exit_code", 1)
+
+    # 其他模式统一处理
+    result = cursor_agent(
+        prompt=args.prompt,
+        print_mode=args.print,
+        force=args.force,
+        output_format=args.output_format,
+        stream_partial_output=args.stream_partial_output,
+        api_key=api_key,
+        profile=profile,
+    )
+    if isinstance(result, dict):
+        if result.get("error"):
+            print(json.dumps(result, ensure_ascii=False), file=stderr)
+            return result.get("exit_code", 1)
+
+        print(json.dumps(result, indent=2, ensure_ascii=False), file=stdout)
+        return 0
+
+    # 字符串输出（text模式）
+    if "错误：" in result:
+        print(result, file=stderr)
+        return profile.exit_code if result.startswith(FAULT_MESSAGE) else 1
+
+    print(result, file=stdout)
+    return 0
+
+
+# 常驻服务每个连接同时执行的请求数上限
+SERVE_MAX_WORKERS = 16
+
+
+def _handle_request(line: str, write_response) -> None:
+    """执行一个请求并写回应答，请求格式见 serve"""
+    request_id = None
+    try:
+        request = json.loads(line)
+        request_id = request.get("id")
+        env = {**os.environ, **request.get("env", {})}
+        out, err = io.StringIO(), io.StringIO()
+        exit_code = run(request.get("argv", []), env=env, stdout=out, stderr=err)
+        response = {
+            "id": request_id,
+            "exit_code": exit_code,
+            "stdout": out.getvalue(),
+            "stderr": err.getvalue(),
+        }
+    except Exception as e:
+        response = {
+            "id": request_id,
+            "exit_code": 1,
+            "stdout": "",
+            "stderr": f"错误：无效的请求: {e}",
+        }
+
+    write_response(response)
+
+
+def _serve_stream(reader: TextIO, writer: TextIO, max_workers: int = SERVE_MAX_WORKERS) -> None:
+    """
+    从 reader 逐行读取请求，在最多 max_workers 个线程中执行，应答按完成顺序写入 writer。
+    {"cancel": id} 取消还在排队的请求，被取消的请求不再写回应答；已经开始执行的请求无法中断。
+    reader 关闭后等待进行中的请求完成。
+    """
+    lock = threading.Lock()
+    queued: Dict[Union[int, str], Any] = {}
+
+    def write_response(response: Dict[str, Any]) -> None:
+        with lock:
+            writer.write(json.dumps(response, ensure_ascii=False) + "\n")
+            writer.flush()
+
+    def forget(request_id, future) -> None:
+        if queued.get(request_id) is future:
+            queued.pop(request_id, None)
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        for line in reader:
+            if not line.strip():
+                continue
+
+            try:
+                message = json.loads(line)
+            except ValueError:
+                message = None
+
+            if isinstance(message, dict) and "cancel" in message:
+                future = queued.pop(message["cancel"], None)
+                if future is not None:
+                    future.cancel()
+                continue
+
+            # 无效的请求同样交给 _handle_request，由它写回错误应答
+            future = pool.submit(_handle_request, line, write_response)
+            request_id = message.get("id") if isinstance(message, dict) else None
+            if isinstance(request_id, (int, str)):
+                queued[request_id] = future
+                future.add_done_callback(lambda f, request_id=request_id: forget(request_id, f))
+
+
+def serve(socket_path: Optional[str] = None, max_workers: int = SERVE_MAX_WORKERS) -> int:
+    """
+    常驻服务模式，避免每次调用都启动 shell 和 Python 解释器。
+
+    请求和应答都是按行分隔的 JSON：
+    - 请求：{"id": 1, "argv": ["-p", "--force", "提示语"], "env": {"CURSOR_API_KEY": "..."}}
+    - 应答：{"id": 1, "exit_code": 0, "stdout": "...", "stderr": ""}
+    - 取消：{"cancel": 1}，客户端等待超时后发送，请求还在排队时不再执行
+    argv 与命令行参数相同，env 会覆盖服务进程的环境变量（包括 SIM_SDK_PROFILE）。
+    多个请求可以同时进行，应答按完成顺序返回，用 id 对应请求。
+
+    参数:
+        socket_path (str, optional): Unix socket 路径；为空时从标准输入读取请求、向标准输出写应答，
+            标准输入关闭后退出
+        max_workers (int): 每个连接同时执行的请求数上限，超出的请求排队
+    """
+    if not socket_path:
+        # 标准输出只用于应答，其他输出改到标准错误；请求和应答固定使用 UTF-8
+        reader = io.TextIOWrapper(sys.stdin.buffer, encoding="utf-8")
+        writer = io.TextIOWrapper(sys.stdout.buffer, encoding="utf-8", write_through=True)
+        sys.stdout = sys.stderr
+        _serve_stream(reader, writer, max_workers)
+        return 0
+
+    import socketserver
+
+    if not hasattr(socketserver, "ThreadingUnixStreamServer"):
+        print("错误：当前平台不支持 Unix socket，请使用标准输入模式", file=sys.stderr)
+        return 1
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            reader = io.TextIOWrapper(self.rfile, encoding="utf-8")
+            writer = io.TextIOWrapper(self.wfile, encoding="utf-8", write_through=True)
+            _serve_stream(reader, writer, max_workers)
+
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+
+    with socketserver.ThreadingUnixStreamServer(socket_path, Handler) as server:
+        print(f"sim_sdk 服务已启动: {socket_path}", file=sys.stderr)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            os.remove(socket_path)
+
+    return 0
+
+
+def main():
+    """命令行主入口"""
+    if sys.argv[1:2] == ["--serve"]:
+        parser = argparse.ArgumentParser(description="模拟 cursor-agent 常驻服务")
+        parser.add_argument("--serve", action="store_true", help="以常驻服务模式运行")
+        parser.add_argument("--socket", help="Unix socket 路径，默认使用标准输入和标准输出")
+        parser.add_argument(
+            "--max-workers",
+            type=int,
+            default=SERVE_MAX_WORKERS,
+            help="每个连接同时执行的请求数上限",
         )
-        if isinstance(result, dict):
-            if result.get("error"):
-                print(json.dumps(result), file=sys.stderr, ensure_ascii=False)
-                sys.exit(result.get("exit_code", 1))
-            else:
-                print(json.dumps(result, indent=2, ensure_ascii=False))
-                sys.exit(0)
-        else:  # 字符串输出（text模式）
-            if "错误：" in result:
-                print(result, file=sys.stderr)
-                sys.exit(1)
-            else:
-                print(result)
-                sys.exit(0)
+        args = parser.parse_args()
+        sys.exit(serve(args.socket, args.max_workers))
+
+    sys.exit(run(sys.argv[1:], stdin=sys.stdin))
 
 
 def example_usage():
@@ -452,6 +1218,10 @@ def example_usage():
     for event in stream_process_files_glob("src/**/*.js", "为 {file} 添加全面的 JSDoc 注释"):
         print(json.dumps(event))
 
+    print("\n=== 示例 5：异步并发批处理 ===")
+    results = asyncio.run(agent.abatch("src/**/*.js", "添加全面的 JSDoc 注释", concurrency=4))
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+
 
 if __name__ == "__main__":
     # 判断是否以模块方式运行还是直接执行
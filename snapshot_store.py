@@ -0,0 +1,394 @@
+from typing import Dict, List, Optional
+from contextlib import contextmanager
+from run_context import current_config
+from tracing import traced
+
+import os
+import json
+import stat
+import time
+import shutil
+import hashlib
+import logging
+import tempfile
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows 下没有 fcntl，只能在进程内加锁
+    fcntl = None
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    handlers=[logging.StreamHandler()],
+)
+logger = logging.getLogger(__name__)
+
+config = json.load(open("./config.json", "r", encoding="utf-8"))
+
+
+def _config() -> Dict:
+    return current_config(config)
+
+
+_CHUNK_SIZE = 1024 * 1024
+
+
+def remove_readonly(func, path, _):
+    """用于处理只读文件的错误回调函数"""
+    os.chmod(path, stat.S_IWRITE)
+    func(path)
+
+
+def _hash_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_CHUNK_SIZE), b""):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+def _write_json(path: str, data) -> None:
+    """原子地写入 JSON 文件，避免中断时留下损坏的清单"""
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(temp_path, path)
+
+
+def _remove_path(path: str) -> None:
+    if os.path.isdir(path) and not os.path.islink(path):
+        shutil.rmtree(path, onerror=remove_readonly)
+    elif os.path.lexists(path):
+        try:
+            os.remove(path)
+        except PermissionError:
+            os.chmod(path, stat.S_IWRITE)
+            os.remove(path)
+
+
+def _scan_tree(root: str):
+    """遍历目录，返回 (文件相对路径 -> stat 结果, 目录相对路径列表)"""
+    files = {}
+    dirs = []
+    for current, dir_names, file_names in os.walk(root):
+        rel_dir = os.path.relpath(current, root)
+        if rel_dir != ".":
+            dirs.append(rel_dir.replace(os.sep, "/"))
+
+        for file_name in file_names:
+            path = os.path.join(current, file_name)
+            if os.path.islink(path):
+                continue
+            rel_path = os.path.relpath(path, root).replace(os.sep, "/")
+            files[rel_path] = os.stat(path)
+
+    return files, dirs
+
+
+class SnapshotStore:
+    """
+    内容寻址的快照存储
+
+    文件内容按 sha256 存放在 objects 目录下，每个快照只是一份“相对路径 -> 内容哈希”的清单。
+    打快照时只读取大小或修改时间发生变化的文件；回滚时只重写和目标快照不一致的文件。
+
+    打快照时先存文件内容、最后才写清单，清理时会删除没有被任何清单引用的内容，
+    所以两者通过存储目录下的锁文件互斥：打快照持有共享锁，可以同时进行；清理持有排他锁。
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self.objects_dir = os.path.join(root, "objects")
+        self.snapshots_dir = os.path.join(root, "snapshots")
+        self._thread_lock = threading.Lock()
+
+    @contextmanager
+    def _locked(self, exclusive: bool):
+        """
+        持有存储的锁
+
+        多个项目并发运行时，快照在线程池中执行，任务守护进程还可能和其他进程共用同一个存储，
+        所以使用 flock 锁文件；没有 fcntl 时退化为进程内的互斥锁。
+        """
+        if fcntl is None:
+            with self._thread_lock:
+                yield
+            return
+
+        os.makedirs(self.root, exist_ok=True)
+        with open(os.path.join(self.root, "lock"), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _object_path(self, digest: str) -> str:
+        return os.path.join(self.objects_dir, digest[:2], digest[2:])
+
+    def _project_dir(self, project: str) -> str:
+        return os.path.join(self.snapshots_dir, project)
+
+    def _index_path(self, project: str) -> str:
+        return os.path.join(self._project_dir(project), "index.json")
+
+    def _manifest_path(self, project: str, name: str) -> str:
+        return os.path.join(self._project_dir(project), f"{name}.json")
+
+    def list_snapshots(self, project: str) -> List[str]:
+        """按创建顺序返回项目的快照名称"""
+        index_path = self._index_path(project)
+        if not os.path.exists(index_path):
+            return []
+
+        with open(index_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def latest_snapshot(self, project: str) -> Optional[str]:
+        snapshots = self.list_snapshots(project)
+        return snapshots[-1] if snapshots else None
+
+    def load_manifest(self, project: str, name: Optional[str] = None) -> Optional[Dict]:
+        name = name or self.latest_snapshot(project)
+        if name is None:
+            return None
+
+        manifest_path = self._manifest_path(project, name)
+        if not os.path.exists(manifest_path):
+            return None
+
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _store_blob(self, path: str, digest: str) -> None:
+        object_path = self._object_path(digest)
+        if os.path.exists(object_path):
+            return
+
+        os.makedirs(os.path.dirname(object_path), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(object_path), suffix=".tmp")
+        os.close(fd)
+        shutil.copyfile(path, temp_path)
+        os.chmod(temp_path, stat.S_IREAD)
+        os.replace(temp_path, object_path)
+
+    def take_snapshot(self, project: str, src_dir: str, name: str) -> Dict:
+        """
+        为 src_dir 打快照
+
+        Args:
+            project: 项目名称
+            src_dir: 要打快照的目录
+            name: 快照名称，同名快照会被覆盖
+
+        Returns:
+            快照清单
+        """
+        with self._locked(exclusive=False):
+            previous = self.load_manifest(project) or {"files": {}}
+            previous_files = previous["files"]
+
+            files, dirs = _scan_tree(src_dir)
+            manifest_files = {}
+            changed = 0
+            for rel_path, st in files.items():
+                entry = previous_files.get(rel_path)
+                if entry and entry["size"] == st.st_size and entry["mtime_ns"] == st.st_mtime_ns:
+                    manifest_files[rel_path] = entry
+                    continue
+
+                path = os.path.join(src_dir, rel_path)
+                digest = _hash_file(path)
+                self._store_blob(path, digest)
+                manifest_files[rel_path] = {
+                    "hash": digest,
+                    "size": st.st_size,
+                    "mtime_ns": st.st_mtime_ns,
+                    "mode": stat.S_IMODE(st.st_mode),
+                }
+                changed += 1
+
+            manifest = {
+                "name": name,
+                "created": time.time(),
+                "files": manifest_files,
+                "dirs": sorted(dirs),
+            }
+            _write_json(self._manifest_path(project, name), manifest)
+
+            snapshots = [snapshot for snapshot in self.list_snapshots(project) if snapshot != name]
+            snapshots.append(name)
+            _write_json(self._index_path(project), snapshots)
+
+        logger.info(f"快照 {project}/{name} 完成，共{len(manifest_files)}个文件，变化{changed}个")
+
+        return manifest
+
+    def restore_snapshot(self, project: str, dest_dir: str, name: Optional[str] = None) -> bool:
+        """
+        把 dest_dir 回滚到指定快照（默认最新快照），只重写内容不一致的文件
+
+        Returns:
+            如果快照不存在，返回 False
+        """
+        manifest = self.load_manifest(project, name)
+        if manifest is None:
+            return False
+
+        os.makedirs(dest_dir, exist_ok=True)
+        files, dirs = _scan_tree(dest_dir)
+        target_files = manifest["files"]
+
+        for rel_path in files:
+            if rel_path not in target_files:
+                _remove_path(os.path.join(dest_dir, rel_path))
+
+        for rel_dir in sorted(set(dirs) - set(manifest["dirs"]), key=len, reverse=True):
+            _remove_path(os.path.join(dest_dir, rel_dir))
+
+        for rel_dir in manifest["dirs"]:
+            os.makedirs(os.path.join(dest_dir, rel_dir), exist_ok=True)
+
+        restored = 0
+        for rel_path, entry in target_files.items():
+            st = files.get(rel_path)
+            if st and st.st_size == entry["size"] and st.st_mtime_ns == entry["mtime_ns"]:
+                continue
+
+            path = os.path.join(dest_dir, rel_path)
+            if os.path.lexists(path):
+                _remove_path(path)
+            # 回滚到工作目录时必须复制，硬链接会让后续修改污染快照内容
+            shutil.copyfile(self._object_path(entry["hash"]), path)
+            os.chmod(path, entry["mode"])
+            os.utime(path, ns=(entry["mtime_ns"], entry["mtime_ns"]))
+            restored += 1
+
+        logger.info(f"已回滚到快照 {project}/{manifest['name']}，重写{restored}个文件")
+
+        return True
+
+    def materialize(self, project: str, dest_dir: str, name: Optional[str] = None) -> bool:
+        """
+        以硬链接的形式把快照展开到 dest_dir，作为只读的备份视图
+
+        与上一次展开的快照比较，只更新发生变化的文件。
+        """
+        manifest = self.load_manifest(project, name)
+        if manifest is None:
+            return False
+
+        state_path = os.path.join(self._project_dir(project), "materialized.json")
+        previous = {}
+        if os.path.exists(state_path) and os.path.isdir(dest_dir):
+            with open(state_path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+            if state.get("dest_dir") == os.path.abspath(dest_dir):
+                previous = self.load_manifest(project, state.get("name")) or {}
+
+        if not previous and os.path.exists(dest_dir):
+            # 没有可比较的上一次展开结果（例如旧版本复制出的备份目录），整体重建
+            _remove_path(dest_dir)
+
+        previous_files = previous.get("files", {})
+        target_files = manifest["files"]
+
+        for rel_path in set(previous_files) - set(target_files):
+            _remove_path(os.path.join(dest_dir, rel_path))
+
+        for rel_dir in sorted(
+            set(previous.get("dirs", [])) - set(manifest["dirs"]), key=len, reverse=True
+        ):
+            _remove_path(os.path.join(dest_dir, rel_dir))
+
+        os.makedirs(dest_dir, exist_ok=True)
+        for rel_dir in manifest["dirs"]:
+            os.makedirs(os.path.join(dest_dir, rel_dir), exist_ok=True)
+
+        for rel_path, entry in target_files.items():
+            path = os.path.join(dest_dir, rel_path)
+            previous_entry = previous_files.get(rel_path)
+            if previous_entry and previous_entry["hash"] == entry["hash"] and os.path.exists(path):
+                continue
+
+            if os.path.lexists(path):
+                _remove_path(path)
+
+            object_path = self._object_path(entry["hash"])
+            try:
+                os.link(object_path, path)
+            except OSError:
+                # 跨文件系统等不支持硬链接的情况下退化为复制
+                shutil.copyfile(object_path, path)
+
+        _write_json(state_path, {"name": manifest["name"], "dest_dir": os.path.abspath(dest_dir)})
+
+        return True
+
+    def prune(self, project: str, keep: int) -> None:
+        """只保留项目最近的 keep 个快照，并清理不再被任何快照引用的文件内容"""
+        if keep <= 0 or len(self.list_snapshots(project)) <= keep:
+            return
+
+        with self._locked(exclusive=True):
+            snapshots = self.list_snapshots(project)
+            for name in snapshots[:-keep]:
+                manifest_path = self._manifest_path(project, name)
+                if os.path.exists(manifest_path):
+                    os.remove(manifest_path)
+            _write_json(self._index_path(project), snapshots[-keep:])
+
+            if not os.path.isdir(self.objects_dir):
+                return
+
+            referenced = set()
+            for other_project in os.listdir(self.snapshots_dir):
+                for name in self.list_snapshots(other_project):
+                    manifest = self.load_manifest(other_project, name)
+                    if manifest:
+                        referenced.update(entry["hash"] for entry in manifest["files"].values())
+
+            removed = 0
+            for prefix in os.listdir(self.objects_dir):
+                prefix_dir = os.path.join(self.objects_dir, prefix)
+                for rest in os.listdir(prefix_dir):
+                    if prefix + rest not in referenced:
+                        _remove_path(os.path.join(prefix_dir, rest))
+                        removed += 1
+
+        logger.info(f"清理快照 {project}：保留{keep}个快照，删除{removed}个不再引用的文件")
+
+
+snapshot_store = SnapshotStore(os.path.join(".", "history", ".store"))
+
+
+@traced("snapshot", "snapshot")
+def snapshot_project(project: str, name: str) -> None:
+    """为 dist/<project> 打快照，并把 history/<project> 更新为该快照的硬链接视图"""
+    dist_dir = os.path.join(".", "dist", project)
+    if not os.path.exists(dist_dir):
+        return
+
+    snapshot_store.take_snapshot(project, dist_dir, name)
+    snapshot_store.materialize(project, os.path.join(".", "history", project))
+
+
+@traced("rollback", "snapshot")
+def rollback_project(project: str) -> bool:
+    """
+    把 dist/<project> 回滚到最新快照
+
+    Returns:
+        如果没有可用的快照，返回 False
+    """
+    dist_dir = os.path.join(".", "dist", project)
+    return snapshot_store.restore_snapshot(project, dist_dir)
+
+
+def prune_project_snapshots(project: str) -> None:
+    snapshot_store.prune(project, _config().get("SNAPSHOT_KEEP", 50))
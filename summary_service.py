@@ -0,0 +1,278 @@
+from collections import OrderedDict
+from typing import Dict, Optional
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.runnables import Runnable
+from model_pool import get_model
+from tracing import span
+
+import os
+import json
+import time
+import asyncio
+import hashlib
+import logging
+import tempfile
+import threading
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    handlers=[logging.StreamHandler()],
+)
+logger = logging.getLogger(__name__)
+
+config = json.load(open("./config.json", "r", encoding="utf-8"))
+
+# 尽量保留重要信息的总结，用于需求文档、开发成果和项目实际状况
+detail_prompt = ChatPromptTemplate.from_messages(
+    [
+        (
+            "system",
+            f"""
+        你是一位非常专业的总结专家，善于抓住项目日志中的重点内容。请把项目日志的字数控制在{config["SUMMARY_MAX_LENGTH"]}个token以内。
+        注意！
+        尽量保留日志中的重要信息，适当压缩其他信息，不要遗漏重要信息！
+        """,
+        ),
+        ("user", "{input}"),
+    ]
+)
+
+# 只保留需求完成情况和遗留问题的总结，用于开发日志
+progress_prompt = ChatPromptTemplate.from_messages(
+    [
+        (
+            "system",
+            f"""
+        你是一位非常专业的总结专家，善于抓住项目日志中的重点内容。请把项目日志的字数控制在{config["SUMMARY_MAX_LENGTH"]}个token以内。
+        注意！
+        你只需要保留完成了哪些需求，遗留了哪些问题，重复出现的信息和除了需求和问题之外的其他信息都删除！
+        """,
+        ),
+        ("user", "{input}"),
+    ]
+)
+
+
+class SummaryCache:
+    """
+    磁盘上的总结缓存
+
+    每条缓存是 cache_dir 下的一个文件，文件名为缓存键。命中时刷新文件的修改时间，
+    总大小超过 max_bytes 时按修改时间从旧到新淘汰（LRU）。
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._index: Optional["OrderedDict[str, int]"] = None
+        self._total = 0
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], key[2:])
+
+    def _load_index(self) -> "OrderedDict[str, int]":
+        if self._index is not None:
+            return self._index
+
+        entries = []
+        if os.path.isdir(self.cache_dir):
+            for prefix in os.listdir(self.cache_dir):
+                prefix_dir = os.path.join(self.cache_dir, prefix)
+                if not os.path.isdir(prefix_dir):
+                    continue
+                for rest in os.listdir(prefix_dir):
+                    if rest.endswith(".tmp"):
+                        continue
+                    st = os.stat(os.path.join(prefix_dir, rest))
+                    entries.append((st.st_mtime_ns, prefix + rest, st.st_size))
+
+        self._index = OrderedDict()
+        self._total = 0
+        for _, key, size in sorted(entries):
+            self._index[key] = size
+            self._total += size
+
+        return self._index
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            index = self._load_index()
+            if key not in index:
+                return None
+
+            path = self._path(key)
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    value = f.read()
+                os.utime(path)
+            except OSError:
+                self._total -= index.pop(key)
+                return None
+
+            index.move_to_end(key)
+            return value
+
+    def put(self, key: str, value: str) -> None:
+        with self._lock:
+            index = self._load_index()
+            path = self._path(key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(value)
+            os.replace(temp_path, path)
+
+            if key in index:
+                self._total -= index.pop(key)
+            index[key] = os.path.getsize(path)
+            self._total += index[key]
+
+            self._evict(index)
+
+    def _evict(self, index: "OrderedDict[str, int]") -> None:
+        while self._total > self.max_bytes and len(index) > 1:
+            key, size = index.popitem(last=False)
+            self._total -= size
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+            logger.info(f"总结缓存超过上限，淘汰缓存 {key[:12]}")
+
+
+class SummaryService:
+    """
+    统一的总结服务
+
+    缓存键由提示词、模型和输入内容的哈希组成，内容不变时直接返回缓存的总结，不再调用模型；
+    同时发起的相同请求只会调用一次模型。
+
+    model 可以是模型，也可以是第一次总结时才创建模型的函数。
+    """
+
+    def __init__(self, model, prompts: Dict[str, ChatPromptTemplate], cache: SummaryCache):
+        self._model = model
+        self.prompts = prompts
+        self.cache = cache
+        self._chain_cache: Dict[str, Runnable] = {}
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        # 同步调用按 key 加锁：key -> [锁, 正在使用这把锁的调用数]
+        self._key_locks: Dict[str, list] = {}
+        self._key_locks_lock = threading.Lock()
+
+    @property
+    def model(self):
+        if not isinstance(self._model, Runnable):
+            self._model = self._model()
+
+        return self._model
+
+    @property
+    def _chains(self) -> Dict[str, Runnable]:
+        if not self._chain_cache:
+            self._chain_cache = {
+                style: prompt | self.model for style, prompt in self.prompts.items()
+            }
+
+        return self._chain_cache
+
+    def _model_fingerprint(self) -> str:
+        name = getattr(self.model, "model_name", None) or getattr(self.model, "model", "")
+        temperature = getattr(self.model, "temperature", "")
+        return f"{type(self.model).__name__}:{name}:{temperature}"
+
+    def cache_key(self, text: str, style: str) -> str:
+        digest = hashlib.sha256()
+        for part in (self.prompts[style].pretty_repr(), self._model_fingerprint(), text):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+
+        return digest.hexdigest()
+
+    async def asummarize(self, text: str, style: str = "detail") -> str:
+        """
+        总结文本
+
+        Args:
+            text: 发给总结模型的完整输入
+            style: 总结方式，detail 尽量保留重要信息，progress 只保留需求完成情况和遗留问题
+
+        Returns:
+            总结后的内容
+        """
+        key = self.cache_key(text, style)
+        # 先登记再读缓存：读缓存期间到达的相同请求会等待这次调用，而不是各自再调用一次模型
+        future = self._in_flight.get(key)
+        if future is not None:
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            cached = await asyncio.to_thread(self.cache.get, key)
+            if cached is not None:
+                logger.info("命中总结缓存，跳过模型调用")
+                future.set_result(cached)
+                return cached
+
+            start = time.monotonic()
+            result = await self._chains[style].ainvoke(text)
+            summary = result.content.strip()
+            logger.info(f"总结完成，耗时{time.monotonic() - start:.1f}秒")
+            await asyncio.to_thread(self.cache.put, key, summary)
+            future.set_result(summary)
+            return summary
+        except BaseException as e:
+            future.set_exception(e)
+            # 没有等待者时避免 “Future exception was never retrieved” 警告
+            future.exception()
+            raise
+        finally:
+            self._in_flight.pop(key, None)
+
+    def summarize(self, text: str, style: str = "detail") -> str:
+        """同步版本的 asummarize，供同步的工具函数使用"""
+        key = self.cache_key(text, style)
+        with self._key_locks_lock:
+            entry = self._key_locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+
+        try:
+            with entry[0]:
+                cached = self.cache.get(key)
+                if cached is not None:
+                    logger.info("命中总结缓存，跳过模型调用")
+                    return cached
+
+                summary = self._chains[style].invoke(text).content.strip()
+                self.cache.put(key, summary)
+
+                return summary
+        finally:
+            # 最后一个使用这把锁的调用才移除它，否则之后到达的调用会拿到新锁，和正在等待的调用重复调用模型
+            with self._key_locks_lock:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    self._key_locks.pop(key, None)
+
+
+summary_service = SummaryService(
+    lambda: get_model("deepseek", "deepseek-chat", 0.4),
+    {"detail": detail_prompt, "progress": progress_prompt},
+    SummaryCache(
+        config.get("SUMMARY_CACHE_DIR", os.path.join(".", ".cache", "summary")),
+        config.get("SUMMARY_CACHE_MAX_BYTES", 64 * 1024 * 1024),
+    ),
+)
+
+
+async def asummarize(text: str, style: str = "detail") -> str:
+    with span("summarize", "summary", style=style):
+        return await summary_service.asummarize(text, style)
+
+
+def summarize(text: str, style: str = "detail") -> str:
+    with span("summarize", "summary", style=style):
+        return summary_service.summarize(text, style)
@@ -35,6 +35,8 @@ def sample_config():
         "SUMMARY_MAX_LENGTH": 2000,
         "SUMMARY_THRESHOLD": 6000,
         "RECURSION_LIMIT": 100,
+        "CURSOR_TIMEOUT": 1800,
+        "EXECUTE_MAX_WORKERS": 1,
     }
 
 
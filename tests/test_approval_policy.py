@@ -0,0 +1,122 @@
+"""
+测试 approval_policy.py 模块
+"""
+
+import pytest
+import os
+import json
+from unittest.mock import patch
+
+from approval_policy import (
+    ApprovalPolicy,
+    auto_pass_policy,
+    auto_reject_policy,
+    build_policy,
+    load_policy_file,
+)
+
+
+class TestApprovalPolicy:
+    """测试 ApprovalPolicy 类"""
+
+    def test_interactive_asks_human(self):
+        """测试默认策略在终端询问，直到输入有效的回答"""
+        with patch("builtins.input", side_effect=["ok", "reject"]) as mock_input:
+            assert ApprovalPolicy().ask("plan", "请输入：") == "reject"
+
+        assert mock_input.call_count == 2
+
+    def test_interactive_delete_gate(self):
+        """测试删除类审批点只有输入 y 才删除"""
+        with patch("builtins.input", return_value="yes"):
+            assert ApprovalPolicy().ask("delete_todo", "是否删除？") == "n"
+
+    def test_auto_pass(self):
+        """测试自动通过策略不询问，且保留已有文件"""
+        policy = auto_pass_policy()
+
+        with patch("builtins.input") as mock_input:
+            assert policy.ask("review", "") == "pass"
+            assert policy.ask("plan", "") == "pass"
+            assert policy.ask("delete_todo_list", "") == "n"
+            assert policy.ask("unreadable_files", "") == "pass"
+
+        mock_input.assert_not_called()
+
+    def test_auto_reject_after_rounds(self):
+        """测试自动驳回审核意见，达到轮数后通过"""
+        policy = auto_reject_policy(2)
+
+        assert policy.decide("review", {"round": 1}) == "reject"
+        assert policy.decide("review", {"round": 2}) == "pass"
+        assert policy.decide("plan", {"round": 0}) == "pass"
+
+    def test_rule_checks(self):
+        """测试按规则检查执行计划"""
+        policy = ApprovalPolicy(
+            rules={"plan": {"max_steps": 2, "reject_keywords": ["rm -rf"], "max_rounds": 1}}
+        )
+
+        assert policy.decide("plan", {"round": 0, "content": "a\n\nb", "steps": ["a", "b"]}) == (
+            "pass"
+        )
+        assert policy.decide("plan", {"round": 0, "steps": ["a", "b", "c"]}) == "reject"
+        assert policy.decide("plan", {"round": 0, "content": "执行 rm -rf /"}) == "reject"
+        # 驳回次数用完后自动通过，避免一直循环
+        assert policy.decide("plan", {"round": 1, "steps": ["a", "b", "c"]}) == "pass"
+
+    def test_gate_without_rule_uses_default(self):
+        """测试没有规则的审批点使用默认规则"""
+        policy = ApprovalPolicy(rules={"plan": {"answer": "pass"}})
+
+        assert policy.decide("plan") == "pass"
+        assert policy.decide("review") is None
+
+    def test_is_interactive(self):
+        """测试策略中是否有需要终端确认的审批点"""
+        assert ApprovalPolicy().is_interactive()
+        assert ApprovalPolicy(rules={"plan": {"answer": "pass"}}).is_interactive()
+        assert not build_policy("auto-pass").is_interactive()
+        assert not build_policy("auto-reject", 1).is_interactive()
+        assert ApprovalPolicy(
+            rules={"review": {"answer": "interactive"}}, default={"answer": "pass"}
+        ).is_interactive()
+
+    def test_invalid_rule(self):
+        """测试未知的审批点和无效的回答"""
+        with pytest.raises(ValueError):
+            ApprovalPolicy(rules={"deploy": {"answer": "pass"}})
+        with pytest.raises(ValueError):
+            ApprovalPolicy(rules={"plan": {"answer": "maybe"}})
+
+
+class TestBuildPolicy:
+    """测试 build_policy 和 load_policy_file 函数"""
+
+    def test_load_policy_file(self, temp_dir):
+        """测试从策略文件加载"""
+        policy_path = os.path.join(temp_dir, "policy.json")
+        with open(policy_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "default": {"answer": "pass"},
+                    "gates": {"review": {"reject_keywords": ["未实现"], "max_rounds": 5}},
+                },
+                f,
+                ensure_ascii=False,
+            )
+
+        policy = load_policy_file(policy_path)
+
+        assert policy.decide("review", {"round": 1, "content": "登录功能未实现"}) == "reject"
+        assert policy.decide("review", {"round": 1, "content": "全部完成"}) == "pass"
+        assert policy.decide("delete_todo") == "n"
+
+    def test_build_policy(self):
+        """测试根据命令行参数创建策略"""
+        assert build_policy("auto-pass").decide("review") == "pass"
+        assert build_policy("auto-reject", 1).decide("review", {"round": 0}) == "reject"
+        assert build_policy("interactive").decide("review") is None
+
+        with pytest.raises(ValueError):
+            build_policy("file")
@@ -0,0 +1,153 @@
+"""
+测试 checkpoint_store.py 模块
+"""
+
+import pytest
+import os
+import operator
+from typing import Annotated, List
+from typing_extensions import TypedDict
+from unittest.mock import patch
+
+from langgraph.graph import StateGraph, START, END
+
+from checkpoint_store import (
+    can_resume,
+    clear_project,
+    clear_step_results,
+    load_step_results,
+    open_checkpointer,
+    save_step_result,
+    thread_config,
+    thread_id,
+)
+
+
+class _State(TypedDict):
+    steps: Annotated[List[str], operator.add]
+
+
+class _Interrupted(BaseException):
+    """模拟进程被中断"""
+
+
+def _build_graph(checkpointer, calls, fail_on=None):
+    def node(name):
+        def run(state):
+            calls.append(name)
+            if name == fail_on:
+                raise _Interrupted()
+            return {"steps": [name]}
+
+        return run
+
+    workflow = StateGraph(_State)
+    workflow.add_node("plan", node("plan"))
+    workflow.add_node("execute", node("execute"))
+    workflow.add_edge(START, "plan")
+    workflow.add_edge("plan", "execute")
+    workflow.add_edge("execute", END)
+
+    return workflow.compile(checkpointer=checkpointer)
+
+
+class TestThreadId:
+    """测试 thread_id 函数"""
+
+    def test_thread_id(self):
+        """测试主流程和每轮开发流程使用不同的线程"""
+        assert thread_id("demo") == "demo"
+        assert thread_id("demo", 2) == "demo/round_2"
+        assert thread_config("demo", 0) == {"configurable": {"thread_id": "demo/round_0"}}
+
+
+class TestCheckpointer:
+    """测试检查点的保存、继续执行和清除"""
+
+    @pytest.fixture(autouse=True)
+    def db_path(self, temp_dir):
+        path = os.path.join(temp_dir, "cache", "checkpoints.sqlite")
+        with patch("checkpoint_store.config", {"CHECKPOINT_DB": path}):
+            yield path
+
+    @pytest.mark.asyncio
+    async def test_resume_from_last_completed_node(self):
+        """测试中断后只重新执行未完成的节点"""
+        run_config = thread_config("demo", 0)
+
+        calls = []
+        async with open_checkpointer() as checkpointer:
+            app = _build_graph(checkpointer, calls, fail_on="execute")
+            with pytest.raises(_Interrupted):
+                await app.ainvoke({"steps": []}, run_config)
+
+        calls.clear()
+        async with open_checkpointer() as checkpointer:
+            app = _build_graph(checkpointer, calls)
+            assert await can_resume(app, run_config)
+            result = await app.ainvoke(None, run_config)
+
+        assert calls == ["execute"]
+        assert result["steps"] == ["plan", "execute"]
+
+    @pytest.mark.asyncio
+    async def test_finished_thread_not_resumable(self):
+        """测试已经执行完成的线程不能继续执行"""
+        run_config = thread_config("demo")
+
+        async with open_checkpointer() as checkpointer:
+            app = _build_graph(checkpointer, [])
+            assert not await can_resume(app, run_config)
+
+            await app.ainvoke({"steps": []}, run_config)
+            assert not await can_resume(app, run_config)
+
+    @pytest.mark.asyncio
+    async def test_clear_project(self):
+        """测试只清除指定项目的检查点"""
+        async with open_checkpointer() as checkpointer:
+            app = _build_graph(checkpointer, [])
+            for run_config in (
+                thread_config("demo"),
+                thread_config("demo", 1),
+                thread_config("demo-v2"),
+            ):
+                await app.ainvoke({"steps": []}, run_config)
+
+            await clear_project(checkpointer, "demo")
+
+            assert not (await app.aget_state(thread_config("demo"))).values
+            assert not (await app.aget_state(thread_config("demo", 1))).values
+            assert (await app.aget_state(thread_config("demo-v2"))).values
+
+    def test_step_results(self):
+        """测试按线程和批次记录已经完成的步骤"""
+        save_step_result("demo/round_0", 0, 1, "创建 api/user.py", "完成")
+        save_step_result("demo/round_0", 2, 0, "修改 api/user.py", "完成")
+
+        assert load_step_results("demo/round_0", 0) == {1: ("创建 api/user.py", "完成")}
+        assert load_step_results("demo/round_0", 1) == {}
+        assert load_step_results("demo/round_1", 0) == {}
+
+    def test_clear_step_results(self):
+        """测试清除线程的步骤记录，项目线程包括各轮开发线程，不影响名称相近的项目"""
+        for thread in ("demo/round_0", "demo/round_1", "demo_v2/round_0"):
+            save_step_result(thread, 0, 0, "创建 api/user.py", "完成")
+
+        clear_step_results("demo/round_0")
+        assert load_step_results("demo/round_0", 0) == {}
+        assert load_step_results("demo/round_1", 0)
+
+        clear_step_results("demo")
+        assert load_step_results("demo/round_1", 0) == {}
+        assert load_step_results("demo_v2/round_0", 0)
+
+    @pytest.mark.asyncio
+    async def test_clear_project_clears_step_results(self):
+        """测试清除项目检查点时一并清除步骤记录"""
+        save_step_result("demo/round_0", 0, 0, "创建 api/user.py", "完成")
+
+        async with open_checkpointer() as checkpointer:
+            await clear_project(checkpointer, "demo")
+
+        assert load_step_results("demo/round_0", 0) == {}
@@ -74,16 +74,13 @@ class TestCounterNode:
 
     @pytest.mark.asyncio
     async def test_counter_node_backup_dist_to_history(self, temp_project_structure, sample_config):
-        """测试备份 dist 到 history"""
+        """测试每轮开始时为 dist 打快照"""
         with patch("count_node.config", sample_config), patch(
-            "shutil.copytree"
-        ) as mock_copytree, patch("shutil.rmtree") as mock_rmtree, patch(
+            "count_node.snapshot_project"
+        ) as mock_snapshot, patch("count_node.prune_project_snapshots") as mock_prune, patch(
             "os.path.exists"
-        ) as mock_exists, patch(
-            "os.path.join"
-        ) as mock_join:
+        ) as mock_exists:
 
-            mock_join.side_effect = lambda *args: os.path.join(*args)
             mock_exists.side_effect = lambda path: "dist" in path
 
             from count_node import counter_node
@@ -91,8 +88,9 @@ class TestCounterNode:
             state = ActionReview(count=1, response="")
             result = await counter_node(state)
 
-            # 验证备份操作被调用
-            assert "count" in result
+            assert result["count"] == 1
+            mock_snapshot.assert_called_once_with(sample_config["PROJECT_NAME"], "round_1")
+            mock_prune.assert_called_once_with(sample_config["PROJECT_NAME"])
 
     def test_remove_readonly(self):
         """测试 remove_readonly 函数"""
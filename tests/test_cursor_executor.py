@@ -0,0 +1,200 @@
+"""
+测试 cursor_executor.py 模块
+"""
+
+import pytest
+import os
+import time
+import asyncio
+import platform
+from unittest.mock import patch, AsyncMock
+
+from cursor_executor import (
+    ExecuteResult,
+    close_sim_clients,
+    execute_script,
+    execute_script_text,
+    execute_sim_sdk,
+    execute_sim_sdk_text,
+)
+
+pytestmark = pytest.mark.skipif(platform.system() == "Windows", reason="测试命令依赖 bash")
+
+SIM_PATH = os.path.join(os.path.dirname(__file__), "..", "sim_sdk", "sim_sdk.py")
+SIM_ENV = {"CURSOR_API_KEY": "test", "SIM_SDK_PROFILE": '{"latency_mean": 0.3}'}
+
+
+class TestExecuteResult:
+    """测试 ExecuteResult 数据类"""
+
+    def test_ok_when_exit_code_zero(self):
+        """测试退出码为0时执行成功"""
+        result = ExecuteResult(exit_code=0, duration=0.1, stdout="ok", stderr="")
+        assert result.ok
+
+    def test_not_ok_when_timed_out(self):
+        """测试超时时执行失败"""
+        result = ExecuteResult(exit_code=0, duration=1.0, stdout="", stderr="", timed_out=True)
+        assert not result.ok
+
+
+class TestExecuteScript:
+    """测试 execute_script 函数"""
+
+    @pytest.mark.asyncio
+    async def test_execute_script_success(self, temp_dir):
+        """测试成功执行时返回结构化结果"""
+        result = await execute_script("echo hello", temp_dir)
+
+        assert result.exit_code == 0
+        assert result.stdout.strip() == "hello"
+        assert result.duration >= 0
+        assert result.ok
+
+    @pytest.mark.asyncio
+    async def test_execute_script_cwd_and_env(self, temp_dir):
+        """测试工作目录和环境变量"""
+        result = await execute_script(
+            'pwd && echo "$CURSOR_API_KEY"', temp_dir, env_vars={"CURSOR_API_KEY": "a b'c"}
+        )
+
+        lines = result.stdout.splitlines()
+        assert lines[0].endswith(temp_dir.rstrip("/").split("/")[-1])
+        assert lines[1] == "a b'c"
+
+    @pytest.mark.asyncio
+    async def test_execute_script_failure(self, temp_dir):
+        """测试非零退出码"""
+        result = await execute_script("echo oops >&2; exit 3", temp_dir)
+
+        assert result.exit_code == 3
+        assert "oops" in result.stderr
+        assert not result.ok
+
+    @pytest.mark.asyncio
+    async def test_execute_script_timeout(self, temp_dir):
+        """测试超时后终止子进程"""
+        start = time.monotonic()
+        result = await execute_script("sleep 10", temp_dir, timeout=0.2)
+
+        assert result.timed_out
+        assert not result.ok
+        assert time.monotonic() - start < 5
+
+    @pytest.mark.asyncio
+    async def test_execute_script_cancel(self, temp_dir):
+        """测试取消调用时子进程被终止"""
+        task = asyncio.create_task(execute_script("sleep 10", temp_dir))
+        await asyncio.sleep(0.2)
+        task.cancel()
+
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    @pytest.mark.asyncio
+    async def test_execute_script_concurrent(self, temp_dir):
+        """测试多个调用可以在同一个事件循环上并发"""
+        start = time.monotonic()
+        results = await asyncio.gather(*[execute_script("sleep 0.5", temp_dir) for _ in range(4)])
+
+        assert all(result.ok for result in results)
+        assert time.monotonic() - start < 1.5
+
+
+class TestExecuteScriptText:
+    """测试 execute_script_text 函数"""
+
+    @pytest.mark.asyncio
+    async def test_execute_script_text_success(self, temp_dir):
+        """测试成功时返回标准输出"""
+        result = await execute_script_text("echo hello", temp_dir)
+        assert result.strip() == "hello"
+
+    @pytest.mark.asyncio
+    async def test_execute_script_text_failure(self, temp_dir):
+        """测试失败时返回执行失败"""
+        result = await execute_script_text("exit 1", temp_dir)
+        assert result == "执行失败！"
+
+    @pytest.mark.asyncio
+    async def test_execute_script_text_cwd_not_exists(self, temp_dir):
+        """测试工作目录不存在时返回执行失败"""
+        result = await execute_script_text("echo hello", f"{temp_dir}/nonexistent")
+        assert result == "执行失败！"
+
+    @pytest.mark.asyncio
+    async def test_execute_script_text_passes_timeout(self, temp_dir):
+        """测试超时参数被传递"""
+        with patch("cursor_executor.execute_script", new_callable=AsyncMock) as mock_execute:
+            mock_execute.return_value = ExecuteResult(
+                exit_code=0, duration=0.1, stdout="ok", stderr=""
+            )
+
+            result = await execute_script_text("echo ok", temp_dir, timeout=5)
+
+            assert result == "ok"
+            assert mock_execute.call_args.kwargs["timeout"] == 5
+
+
+class TestExecuteSimSdk:
+    """测试通过常驻 sim_sdk 服务执行"""
+
+    @pytest.mark.asyncio
+    async def test_reuses_server_process(self):
+        """测试多次调用复用同一个服务进程，并发调用同时进行"""
+        try:
+            first = await execute_sim_sdk(SIM_PATH, ["-p", "你好"], env_vars=SIM_ENV)
+            start = time.monotonic()
+            results = await asyncio.gather(
+                *[execute_sim_sdk(SIM_PATH, ["-p", f"请求{i}"], env_vars=SIM_ENV) for i in range(4)]
+            )
+            elapsed = time.monotonic() - start
+        finally:
+            await close_sim_clients()
+
+        assert first.ok
+        assert "代码库" in first.stdout
+        assert all(result.ok for result in results)
+        assert elapsed < 1.0
+
+    @pytest.mark.asyncio
+    async def test_failure_and_timeout(self):
+        """测试失败时返回执行失败，超时时不再等待应答"""
+        failing = {**SIM_ENV, "SIM_SDK_PROFILE": '{"latency_mean": 0, "failure_rate": 1}'}
+        try:
+            text = await execute_sim_sdk_text(SIM_PATH, ["-p", "你好"], env_vars=failing)
+            result = await execute_sim_sdk(
+                SIM_PATH, ["-p", "--latency-mean", "2", "你好"], env_vars=SIM_ENV, timeout=0.2
+            )
+            after = await execute_sim_sdk_text(SIM_PATH, ["-p", "你好"], env_vars=SIM_ENV)
+        finally:
+            await close_sim_clients()
+
+        assert text == "执行失败！"
+        assert result.timed_out
+        assert not result.ok
+        assert "代码库" in after
+
+    @pytest.mark.asyncio
+    async def test_invalid_response_lines_ignored(self, temp_dir):
+        """测试服务进程输出的无效应答行被忽略，不影响之后的调用"""
+        sim_path = os.path.join(temp_dir, "noisy_sim.py")
+        with open(sim_path, "w", encoding="utf-8") as f:
+            f.write(
+                "import json, sys\n"
+                "for line in sys.stdin:\n"
+                "    request = json.loads(line)\n"
+                "    if 'cancel' in request:\n"
+                "        continue\n"
+                "    print('not json')\n"
+                "    print('[1, 2]')\n"
+                "    print(json.dumps({'id': request['id'], 'exit_code': 0,"
+                " 'stdout': 'ok', 'stderr': ''}), flush=True)\n"
+            )
+
+        try:
+            results = [await execute_sim_sdk(sim_path, ["-p", "你好"]) for _ in range(2)]
+        finally:
+            await close_sim_clients()
+
+        assert [result.stdout for result in results] == ["ok", "ok"]
@@ -6,31 +6,8 @@ import pytest
 import os
 import tempfile
 import shutil
-from unittest.mock import patch, MagicMock
-from subprocess import CalledProcessError
-
-
-class TestGetDriveLetter:
-    """测试 _get_drive_letter 函数"""
-
-    def test_get_drive_letter_windows(self):
-        """测试 Windows 系统获取驱动器字母"""
-        with patch("execute_execute_tool.platform.system", return_value="Windows"), patch(
-            "os.path.splitdrive", return_value=("C:", "\\path\\to\\file")
-        ):
-
-            from execute_execute_tool import _get_drive_letter
-
-            result = _get_drive_letter("C:\\path\\to\\file")
-            assert result == "C:"
-
-    def test_get_drive_letter_linux(self):
-        """测试 Linux 系统返回空字符串"""
-        with patch("execute_execute_tool.platform.system", return_value="Linux"):
-            from execute_execute_tool import _get_drive_letter
-
-            result = _get_drive_letter("/path/to/file")
-            assert result == ""
+from unittest.mock import patch, MagicMock, AsyncMock
+from cursor_executor import ExecuteResult
 
 
 class TestRemoveReadonly:
@@ -203,70 +180,77 @@ class TestListFilesTool:
             assert len(result) >= 2
 
 
-class TestSearchTodoDirTool:
-    """测试 search_todo_dir 工具"""
+class TestRequirementTools:
+    """测试 search_requirements 和 read_requirement 工具"""
 
     @pytest.fixture
     def mock_config(self):
         return {
             "PROJECT_NAME": "test-project",
+            "REQUIREMENT_SEARCH_MAX_CHARS": 4000,
         }
 
-    def test_search_todo_dir_file_exists(self, mock_config, temp_dir):
-        """测试搜索存在的文件"""
-        todo_dir = os.path.join(temp_dir, "todo", mock_config["PROJECT_NAME"])
+    @pytest.fixture
+    def index(self, temp_dir):
+        from requirement_index import RequirementIndex
+
+        todo_dir = os.path.join(temp_dir, "todo")
         os.makedirs(todo_dir, exist_ok=True)
-        todo_file = os.path.join(todo_dir, "todo.md")
+        with open(os.path.join(todo_dir, "todo.md"), "w", encoding="utf-8") as f:
+            f.write("# 用户登录\n支持手机验证码登录\n\n# 订单管理\n支持订单导出\n")
 
-        test_content = "# 需求文档"
-        with open(todo_file, "w", encoding="utf-8") as f:
-            f.write(test_content)
+        return RequirementIndex(todo_dir, os.path.join(temp_dir, "index.json"))
 
+    def test_search_requirements(self, mock_config, index):
+        """测试检索返回带文件和行号的片段"""
         with patch("execute_execute_tool.config", mock_config), patch(
-            "execute_execute_tool.project_path", temp_dir
-        ), patch("execute_execute_tool.os.path.join") as mock_join:
-
-            def join_side_effect(*args):
-                if "todo" in args:
-                    return os.path.join(temp_dir, "todo", mock_config["PROJECT_NAME"], args[-1])
-                return os.path.join(*args)
-
-            mock_join.side_effect = join_side_effect
+            "execute_execute_tool.get_requirement_index", return_value=index
+        ):
+            from execute_execute_tool import search_requirements
 
-            from execute_execute_tool import search_todo_dir
+            index.refresh()
+            result = search_requirements.invoke({"query": "验证码登录"})
 
-            result = search_todo_dir("todo.md")
+            assert result.startswith("[todo.md:1-3]")
+            assert "支持手机验证码登录" in result
+            assert "订单导出" not in result
 
-            assert result == test_content
+    def test_search_requirements_no_result(self, mock_config, index):
+        """测试没有相关内容时返回文件列表"""
+        with patch("execute_execute_tool.config", mock_config), patch(
+            "execute_execute_tool.get_requirement_index", return_value=index
+        ):
+            from execute_execute_tool import search_requirements
 
-    def test_search_todo_dir_file_not_exists(self, mock_config, temp_dir):
-        """测试搜索不存在的文件，返回文件列表"""
-        todo_dir = os.path.join(temp_dir, "todo", mock_config["PROJECT_NAME"])
-        os.makedirs(todo_dir, exist_ok=True)
+            index.refresh()
+            result = search_requirements.invoke({"query": "支付宝"})
 
-        # 创建一些文件
-        with open(os.path.join(todo_dir, "file1.txt"), "w") as f:
-            f.write("content1")
-        with open(os.path.join(todo_dir, "file2.txt"), "w") as f:
-            f.write("content2")
+            assert "没有找到相关内容" in result
+            assert "todo.md" in result
 
+    def test_read_requirement_fuzzy_name(self, mock_config, index):
+        """测试文件名不完整时读取最接近的文件的指定行"""
         with patch("execute_execute_tool.config", mock_config), patch(
-            "execute_execute_tool.project_path", temp_dir
-        ), patch("execute_execute_tool.os.path.join") as mock_join:
+            "execute_execute_tool.get_requirement_index", return_value=index
+        ):
+            from execute_execute_tool import read_requirement
 
-            def join_side_effect(*args):
-                if "todo" in args:
-                    return os.path.join(temp_dir, "todo", mock_config["PROJECT_NAME"], args[-1])
-                return os.path.join(*args)
+            index.refresh()
+            result = read_requirement.invoke({"file_name": "todo", "start_line": 4, "end_line": 5})
 
-            mock_join.side_effect = join_side_effect
+            assert result == "[todo.md:4-5]\n# 订单管理\n支持订单导出"
 
-            from execute_execute_tool import search_todo_dir
+    def test_read_requirement_not_exists(self, mock_config, index):
+        """测试找不到文件时返回文件列表"""
+        with patch("execute_execute_tool.config", mock_config), patch(
+            "execute_execute_tool.get_requirement_index", return_value=index
+        ):
+            from execute_execute_tool import read_requirement
 
-            result = search_todo_dir("nonexistent.md")
+            index.refresh()
+            result = read_requirement.invoke({"file_name": "payment.xlsx"})
 
-            assert isinstance(result, list)
-            assert len(result) >= 2
+            assert "文件不存在" in result
 
 
 class TestCodeProfessionalTool:
@@ -281,29 +265,33 @@ class TestCodeProfessionalTool:
             "CURSOR_API_KEY": "test-key",
         }
 
-    def test_code_professional_mock_mode(self, mock_config):
+    @pytest.mark.asyncio
+    async def test_code_professional_mock_mode(self, mock_config):
         """测试 MOCK 模式下的代码专家"""
         with patch("execute_execute_tool.config", mock_config), patch(
-            "execute_execute_tool._execute_script_subprocess"
+            "execute_execute_tool._execute_script_subprocess", new_callable=AsyncMock
         ) as mock_execute:
 
             mock_execute.return_value = "代码生成完成"
 
             from execute_execute_tool import code_professional
 
-            result = code_professional("创建一个Python文件")
+            result = await code_professional.ainvoke({"prompt": "创建一个Python文件"})
 
             assert mock_execute.called
             assert "执行结果" in result
 
-    def test_code_professional_windows_execute_path(self, mock_config):
+    @pytest.mark.asyncio
+    async def test_code_professional_windows_execute_path(self, mock_config):
         """测试 Windows 下使用 EXECUTE_PATH"""
         mock_config["MOCK"] = False
         mock_config["EXECUTE_PATH"] = "execute-agent.bat"
 
         with patch("execute_execute_tool.platform.system", return_value="Windows"), patch(
             "execute_execute_tool.config", mock_config
-        ), patch("execute_execute_tool._execute_script_subprocess") as mock_execute, patch(
+        ), patch(
+            "execute_execute_tool._execute_script_subprocess", new_callable=AsyncMock
+        ) as mock_execute, patch(
             "execute_execute_tool.tempfile.NamedTemporaryFile"
         ) as mock_temp:
 
@@ -312,7 +300,7 @@ class TestCodeProfessionalTool:
 
             from execute_execute_tool import code_professional
 
-            result = code_professional("创建一个Python文件")
+            result = await code_professional.ainvoke({"prompt": "创建一个Python文件"})
 
             assert mock_execute.called
 
@@ -324,36 +312,43 @@ class TestExecuteScriptSubprocess:
     def mock_config(self):
         return {
             "PROJECT_NAME": "test-project",
+            "CURSOR_TIMEOUT": 30,
         }
 
-    def test_execute_script_success(self, mock_config):
-        """测试成功执行脚本"""
+    @pytest.mark.asyncio
+    async def test_execute_script_success(self, mock_config):
+        """测试成功执行脚本时返回标准输出"""
         with patch("execute_execute_tool.config", mock_config), patch(
-            "execute_execute_tool.platform.system", return_value="Linux"
-        ), patch("subprocess.run") as mock_run:
+            "execute_execute_tool.execute_script_text", new_callable=AsyncMock
+        ) as mock_execute:
 
-            mock_result = MagicMock()
-            mock_result.stdout = "执行成功"
-            mock_result.returncode = 0
-            mock_run.return_value = mock_result
+            mock_execute.return_value = "执行成功"
 
             from execute_execute_tool import _execute_script_subprocess
 
-            result = _execute_script_subprocess("echo test")
+            result = await _execute_script_subprocess("echo test", env_vars={"KEY": "value"})
 
-            assert "执行成功" in result or result == "执行成功"
+            assert result == "执行成功"
+            args, kwargs = mock_execute.call_args
+            assert args[0] == "echo test"
+            assert args[1].endswith(os.path.join("dist", "test-project"))
+            assert kwargs["env_vars"] == {"KEY": "value"}
+            assert kwargs["timeout"] == 30
 
-    def test_execute_script_failure(self, mock_config):
-        """测试执行失败"""
+    @pytest.mark.asyncio
+    async def test_execute_script_failure(self, mock_config):
+        """测试执行失败的情况"""
         with patch("execute_execute_tool.config", mock_config), patch(
-            "execute_execute_tool.platform.system", return_value="Linux"
-        ), patch("subprocess.run") as mock_run:
+            "cursor_executor.execute_script", new_callable=AsyncMock
+        ) as mock_execute:
 
-            mock_run.side_effect = CalledProcessError(1, "cmd", stderr="错误信息")
+            mock_execute.return_value = ExecuteResult(
+                exit_code=1, duration=0.1, stdout="", stderr="错误信息"
+            )
 
             from execute_execute_tool import _execute_script_subprocess
 
-            result = _execute_script_subprocess("invalid command")
+            result = await _execute_script_subprocess("invalid command")
 
             assert result == "执行失败！"
 
@@ -375,10 +370,18 @@ class TestToolsList:
             mkdir,
             list_files,
             rm,
-            search_todo_dir,
+            search_requirements,
+            read_requirement,
         )
 
-        expected_tools = [code_professional, mkdir, list_files, rm, search_todo_dir]
+        expected_tools = [
+            code_professional,
+            mkdir,
+            list_files,
+            rm,
+            search_requirements,
+            read_requirement,
+        ]
 
         for tool in expected_tools:
             assert tool in tools, f"{tool.__name__} 应该在工具列表中"
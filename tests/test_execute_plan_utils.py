@@ -6,31 +6,30 @@ import pytest
 import os
 import tempfile
 import shutil
-from unittest.mock import patch, MagicMock, mock_open
+import struct
+import zlib
+from unittest.mock import patch, MagicMock, AsyncMock, mock_open
+from cursor_executor import ExecuteResult
 from docx import Document
 
 
-class TestGetDriveLetter:
-    """测试 _get_drive_letter 函数"""
+def _png_bytes():
+    """生成一个 1x1 的 PNG 图片"""
 
-    def test_get_drive_letter_windows(self):
-        """测试 Windows 系统获取驱动器字母"""
-        with patch("execute_plan_utils.platform.system", return_value="Windows"), patch(
-            "os.path.splitdrive", return_value=("C:", "\\path\\to\\file")
-        ):
-
-            from execute_plan_utils import _get_drive_letter
-
-            result = _get_drive_letter("C:\\path\\to\\file")
-            assert result == "C:"
+    def chunk(tag, data):
+        return (
+            struct.pack(">I", len(data))
+            + tag
+            + data
+            + struct.pack(">I", zlib.crc32(tag + data) & 0xFFFFFFFF)
+        )
 
-    def test_get_drive_letter_linux(self):
-        """测试 Linux 系统返回空字符串"""
-        with patch("execute_plan_utils.platform.system", return_value="Linux"):
-            from execute_plan_utils import _get_drive_letter
-
-            result = _get_drive_letter("/path/to/file")
-            assert result == ""
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", struct.pack(">IIBBBBB", 1, 1, 8, 2, 0, 0, 0))
+        + chunk(b"IDAT", zlib.compress(b"\x00\xff\x00\x00"))
+        + chunk(b"IEND", b"")
+    )
 
 
 class TestConvertDocxToMarkdown:
@@ -63,6 +62,88 @@ class TestConvertDocxToMarkdown:
         pass
 
 
+class TestRevertDocxToMd:
+    """测试 _revert_docx_to_md 函数"""
+
+    def test_blocks_in_document_order(self, temp_dir):
+        """测试段落和表格按文档中的顺序输出"""
+        doc = Document()
+        doc.add_paragraph("第一段")
+        table = doc.add_table(rows=2, cols=2)
+        table.cell(0, 0).text = "名称"
+        table.cell(0, 1).text = "说明"
+        table.cell(1, 0).text = "登录"
+        table.cell(1, 1).text = "第一行\n第二行"
+        doc.add_paragraph("第二段")
+
+        from execute_plan_utils import _revert_docx_to_md
+
+        result = _revert_docx_to_md(doc, temp_dir)
+
+        assert result == (
+            "第一段\n\n"
+            "| 名称 | 说明 |\n"
+            "| --- | --- |\n"
+            "| 登录 | 第一行<br>第二行 |\n\n"
+            "第二段"
+        )
+
+    def test_images_written_once(self, temp_dir):
+        """测试重复引用的图片只写一次，markdown 引用去重后的文件"""
+        image_path = os.path.join(temp_dir, "logo.png")
+        with open(image_path, "wb") as f:
+            f.write(_png_bytes())
+
+        doc = Document()
+        for _ in range(3):
+            doc.add_picture(image_path)
+
+        from execute_plan_utils import _revert_docx_to_md
+
+        result = _revert_docx_to_md(doc, temp_dir)
+
+        images = os.listdir(os.path.join(temp_dir, "img"))
+        assert len(images) == 1
+        assert result.count(f"](./img/{images[0]})") == 3
+
+
+class TestExtractImages:
+    """测试 _extract_images 函数"""
+
+    def _rel(self, rId, partname, blob):
+        rel = MagicMock()
+        rel.rId = rId
+        rel.reltype = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/image"
+        rel.is_external = False
+        rel.target_part.partname = partname
+        rel.target_part.blob = blob
+        return rel
+
+    def test_same_content_different_parts(self, temp_dir):
+        """测试内容相同的不同图片部件只写一个文件"""
+        doc = MagicMock()
+        doc.part.rels = {
+            "rId1": self._rel("rId1", "/word/media/image1.png", b"same"),
+            "rId2": self._rel("rId2", "/word/media/image2.png", b"same"),
+            "rId3": self._rel("rId3", "/word/media/image3.emf", b"other"),
+        }
+
+        from execute_plan_utils import _extract_images
+
+        image_map = _extract_images(doc, temp_dir)
+
+        assert image_map["rId1"] == image_map["rId2"]
+        assert image_map["rId3"].endswith(".jpg")
+        assert len(os.listdir(os.path.join(temp_dir, "img"))) == 2
+
+    def test_no_images(self, temp_dir):
+        """测试没有图片时不创建 img 目录"""
+        from execute_plan_utils import _extract_images
+
+        assert _extract_images(Document(), temp_dir) == {}
+        assert not os.path.exists(os.path.join(temp_dir, "img"))
+
+
 class TestConvertPdfToMarkdown:
     """测试 convert_pdf_to_markdown 函数"""
 
@@ -86,6 +167,113 @@ class TestConvertPdfToMarkdown:
         finally:
             os.unlink(temp_path)
 
+    def _make_pdf(self, path, pages, encoding=None):
+        from PyPDF2 import PdfWriter, PageObject
+        from PyPDF2.generic import DecodedStreamObject, DictionaryObject, NameObject
+
+        font = DictionaryObject(
+            {
+                NameObject("/Type"): NameObject("/Font"),
+                NameObject("/Subtype"): NameObject("/Type1"),
+                NameObject("/BaseFont"): NameObject("/Helvetica"),
+            }
+        )
+        if encoding:
+            font[NameObject("/Encoding")] = NameObject(encoding)
+        writer = PdfWriter()
+        for text in pages:
+            page = PageObject.create_blank_page(width=612, height=792)
+            stream = DecodedStreamObject()
+            stream.set_data(f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET".encode("latin-1"))
+            page[NameObject("/Contents")] = stream
+            page[NameObject("/Resources")] = DictionaryObject(
+                {NameObject("/Font"): DictionaryObject({NameObject("/F1"): font})}
+            )
+            writer.add_page(page)
+        writer.write(path)
+
+    def test_convert_pdf_pages_in_order(self, temp_dir, monkeypatch):
+        """测试多段页面并行提取后按页面顺序写入"""
+        pdf_path = os.path.join(temp_dir, "spec.pdf")
+        self._make_pdf(pdf_path, [f"Page {i}" for i in range(5)])
+        monkeypatch.chdir(temp_dir)
+
+        with patch("execute_plan_utils.config", {"PROJECT_NAME": "demo", "PDF_PAGES_PER_TASK": 2}):
+            from execute_plan_utils import convert_pdf_to_markdown
+
+            result = convert_pdf_to_markdown(pdf_path, max_workers=2)
+
+        assert result == "pdf文件转换为markdown文件成功"
+        with open(os.path.join("todo", "demo", "spec", "todo.md"), encoding="utf-8") as f:
+            content = f.read()
+        assert content == "".join(f"Page {i}\n\n" for i in range(5))
+
+    def test_convert_pdf_page_cache(self, temp_dir):
+        """测试只重新提取内容发生变化的页面"""
+        from execute_plan_utils import _extract_pdf_pages
+
+        cache_dir = os.path.join(temp_dir, "cache")
+        pdf_path = os.path.join(temp_dir, "spec.pdf")
+        self._make_pdf(pdf_path, ["Page 0", "Page 1", "Page 2"])
+        _extract_pdf_pages(pdf_path, 0, 3, cache_dir)
+
+        self._make_pdf(pdf_path, ["Page 0", "Changed", "Page 2"])
+        from PyPDF2 import PageObject
+
+        with patch.object(
+            PageObject, "extract_text", autospec=True, side_effect=lambda page: "Changed"
+        ) as mock_extract:
+            texts = _extract_pdf_pages(pdf_path, 0, 3, cache_dir)
+
+        assert texts == ["Page 0", "Changed", "Page 2"]
+        assert mock_extract.call_count == 1
+
+    def test_prune_pdf_page_cache_evicts_least_recently_used(self, temp_dir):
+        """测试页面缓存超过上限时淘汰最久未使用的页面，命中缓存会刷新页面的使用时间"""
+        from execute_plan_utils import _extract_pdf_pages, _prune_pdf_page_cache
+
+        cache_dir = os.path.join(temp_dir, "cache")
+        pdf_path = os.path.join(temp_dir, "spec.pdf")
+        self._make_pdf(pdf_path, ["Page 0", "Page 1", "Page 2"])
+        _extract_pdf_pages(pdf_path, 0, 3, cache_dir)
+
+        files = sorted(
+            os.path.join(root, name) for root, _, names in os.walk(cache_dir) for name in names
+        )
+        assert len(files) == 3
+        for path in files:
+            index = int(open(path, encoding="utf-8").read().split()[-1])
+            os.utime(path, ns=(index * 10**9, index * 10**9))
+
+        # 第一页最旧，命中缓存后变成最新
+        self._make_pdf(pdf_path, ["Page 0"])
+        _extract_pdf_pages(pdf_path, 0, 1, cache_dir)
+
+        size = os.path.getsize(files[0])
+        _prune_pdf_page_cache(cache_dir, size * 2)
+
+        remaining = sorted(
+            os.path.join(root, name) for root, _, names in os.walk(cache_dir) for name in names
+        )
+        assert len(remaining) == 2
+        page0 = [path for path in remaining if open(path, encoding="utf-8").read() == "Page 0"]
+        assert len(page0) == 1
+
+    def test_pdf_page_key_depends_on_font_encoding(self, temp_dir):
+        """测试内容流和字体名相同、字体编码不同的页面不会共用缓存"""
+        from PyPDF2 import PdfReader
+        from execute_plan_utils import _pdf_page_key
+
+        keys = []
+        for index, encoding in enumerate([None, "/WinAnsiEncoding", "/MacRomanEncoding"]):
+            pdf_path = os.path.join(temp_dir, f"spec_{index}.pdf")
+            self._make_pdf(pdf_path, ["Page 0", "Page 0"], encoding)
+            pages = PdfReader(pdf_path).pages
+            keys.append(_pdf_page_key(pages[0]))
+            assert _pdf_page_key(pages[1]) == keys[-1]
+
+        assert len(set(keys)) == 3
+
 
 class TestExecuteScriptSubprocess:
     """测试 _execute_script_subprocess 函数"""
@@ -94,59 +282,43 @@ class TestExecuteScriptSubprocess:
     def mock_config(self):
         return {
             "PROJECT_NAME": "test-project",
-            "MOCK": False,
-            "CURSOR_PATH": "/usr/bin/cursor-agent",
+            "CURSOR_TIMEOUT": 30,
         }
 
-    def test_execute_script_windows_success(self, mock_config):
-        """测试 Windows 系统成功执行"""
-        with patch("execute_plan_utils.platform.system", return_value="Windows"), patch(
-            "execute_plan_utils.config", mock_config
-        ), patch("execute_plan_utils.os.path.exists", return_value=True), patch(
-            "subprocess.run"
-        ) as mock_run:
-
-            mock_result = MagicMock()
-            mock_result.stdout = "执行成功"
-            mock_result.returncode = 0
-            mock_run.return_value = mock_result
-
-            from execute_plan_utils import _execute_script_subprocess
-
-            result = _execute_script_subprocess("echo test")
-
-            assert "执行成功" in result or result == "执行成功"
-
-    def test_execute_script_linux_success(self, mock_config):
-        """测试 Linux 系统成功执行"""
-        with patch("execute_plan_utils.platform.system", return_value="Linux"), patch(
-            "execute_plan_utils.config", mock_config
-        ), patch("subprocess.run") as mock_run:
+    @pytest.mark.asyncio
+    async def test_execute_script_success(self, mock_config):
+        """测试成功执行脚本时返回标准输出"""
+        with patch("execute_plan_utils.config", mock_config), patch(
+            "execute_plan_utils.execute_script_text", new_callable=AsyncMock
+        ) as mock_execute:
 
-            mock_result = MagicMock()
-            mock_result.stdout = "执行成功"
-            mock_result.returncode = 0
-            mock_run.return_value = mock_result
+            mock_execute.return_value = "执行成功"
 
             from execute_plan_utils import _execute_script_subprocess
 
-            result = _execute_script_subprocess("echo test")
+            result = await _execute_script_subprocess("echo test", env_vars={"KEY": "value"})
 
-            assert "执行成功" in result or result == "执行成功"
+            assert result == "执行成功"
+            args, kwargs = mock_execute.call_args
+            assert args[0] == "echo test"
+            assert args[1].endswith(os.path.join("todo", "test-project"))
+            assert kwargs["env_vars"] == {"KEY": "value"}
+            assert kwargs["timeout"] == 30
 
-    def test_execute_script_failure(self, mock_config):
+    @pytest.mark.asyncio
+    async def test_execute_script_failure(self, mock_config):
         """测试执行失败的情况"""
-        with patch("execute_plan_utils.platform.system", return_value="Linux"), patch(
-            "execute_plan_utils.config", mock_config
-        ), patch("subprocess.run") as mock_run:
-
-            from subprocess import CalledProcessError
+        with patch("execute_plan_utils.config", mock_config), patch(
+            "cursor_executor.execute_script", new_callable=AsyncMock
+        ) as mock_execute:
 
-            mock_run.side_effect = CalledProcessError(1, "cmd", stderr="错误信息")
+            mock_execute.return_value = ExecuteResult(
+                exit_code=1, duration=0.1, stdout="", stderr="错误信息"
+            )
 
             from execute_plan_utils import _execute_script_subprocess
 
-            result = _execute_script_subprocess("invalid command")
+            result = await _execute_script_subprocess("invalid command")
 
             assert result == "执行失败！"
 
@@ -163,25 +335,27 @@ class TestAnalyzeWhatToDo:
             "CURSOR_API_KEY": "test-key",
         }
 
-    def test_analyze_what_to_do_mock_mode(self, mock_config):
+    @pytest.mark.asyncio
+    async def test_analyze_what_to_do_mock_mode(self, mock_config):
         """测试 MOCK 模式下的分析"""
         with patch("execute_plan_utils.config", mock_config), patch(
-            "execute_plan_utils._execute_script_subprocess"
+            "execute_plan_utils._execute_script_subprocess", new_callable=AsyncMock
         ) as mock_execute, patch("os.path.exists", return_value=False):
 
             mock_execute.return_value = "分析完成"
 
             from execute_plan_utils import analyze_what_to_do
 
-            result = analyze_what_to_do()
+            result = await analyze_what_to_do()
 
             assert mock_execute.called
             assert "分析完成" in result or result == "分析完成"
 
-    def test_analyze_what_to_do_with_opinion(self, mock_config):
+    @pytest.mark.asyncio
+    async def test_analyze_what_to_do_with_opinion(self, mock_config):
         """测试包含审核意见的分析"""
         with patch("execute_plan_utils.config", mock_config), patch(
-            "execute_plan_utils._execute_script_subprocess"
+            "execute_plan_utils._execute_script_subprocess", new_callable=AsyncMock
         ) as mock_execute, patch("os.path.exists") as mock_exists, patch(
             "os.path.abspath", return_value="/path/to/opinion.md"
         ):
@@ -194,6 +368,6 @@ class TestAnalyzeWhatToDo:
 
             from execute_plan_utils import analyze_what_to_do
 
-            result = analyze_what_to_do()
+            result = await analyze_what_to_do()
 
             assert mock_execute.called
@@ -0,0 +1,114 @@
+"""
+测试 executor_session.py 模块
+"""
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+from executor_session import ExecutorSession, StepMemory
+from token_budget import count_tokens
+
+
+def _call(name, args, call_id):
+    return AIMessage(content="", tool_calls=[{"name": name, "args": args, "id": call_id}])
+
+
+def _step_messages():
+    return [
+        HumanMessage(content="完成这个任务：实现登录"),
+        _call("list_files", {"path": "src"}, "c1"),
+        ToolMessage(content=["main.py", "utils.py"], tool_call_id="c1"),
+        _call("search_requirements", {"query": "登录"}, "c2"),
+        ToolMessage(content="[docs/login.md:12-30]\n用户使用手机号登录", tool_call_id="c2"),
+        _call("mkdir", {"path": "src/auth"}, "c3"),
+        ToolMessage(content="创建目录 src/auth 成功", tool_call_id="c3"),
+        _call("code_professional", {"prompt": "在 src/auth/login.py 中实现登录"}, "c4"),
+        ToolMessage(content="完成", tool_call_id="c4"),
+        AIMessage(content="已在 src/auth/login.py 中实现手机号登录"),
+    ]
+
+
+class TestStepMemory:
+    """测试 StepMemory 类"""
+
+    def test_record_extracts_files_listings_and_requirements(self):
+        """测试从消息中提取涉及的文件、目录内容、需求位置和结果"""
+        memory = StepMemory()
+        record = memory.record("实现登录", _step_messages())
+
+        assert record.files == ["创建目录 src/auth", "编写 src/auth/login.py"]
+        assert record.decision == "已在 src/auth/login.py 中实现手机号登录"
+        assert memory.listings == {"src": ["main.py", "utils.py"]}
+        assert memory.requirement_refs == ["docs/login.md:12-30"]
+
+        text = memory.render()
+        assert "实现登录" in text
+        assert "src：main.py, utils.py" in text
+        assert "docs/login.md:12-30" in text
+
+    def test_listing_as_string_and_error(self):
+        """测试目录内容为字符串形式的列表，以及目录不存在的情况"""
+        memory = StepMemory()
+        memory.record(
+            "查看目录",
+            [
+                _call("list_files", {"path": "docs"}, "a"),
+                ToolMessage(content="['a.md']", tool_call_id="a"),
+                _call("list_files", {"path": "missing"}, "b"),
+                ToolMessage(content="目录不存在", tool_call_id="b"),
+            ],
+        )
+
+        assert memory.listings == {"docs": ["a.md"]}
+
+    def test_render_is_bounded(self):
+        """测试渲染结果不超过预算，超出时丢弃最早完成的步骤"""
+        memory = StepMemory(max_tokens=120)
+        for i in range(50):
+            memory.record(f"在 module_{i}.py 中实现需求点 {i}", [AIMessage(content=f"完成 {i}")])
+
+        text = memory.render()
+        assert count_tokens(text) <= 120
+        assert "module_49.py" in text
+        assert "module_0.py" not in text
+        assert "省略了更早完成的" in text
+
+    def test_disabled(self):
+        """测试预算为 0 时不携带记忆"""
+        memory = StepMemory(max_tokens=0)
+        memory.record("实现登录", _step_messages())
+        assert memory.render() == ""
+
+
+class _FakeAgent:
+    """记录收到的任务说明的假智能体"""
+
+    def __init__(self):
+        self.prompts = []
+        self.configs = []
+
+    async def ainvoke(self, inputs, config):
+        prompt = inputs["messages"][0][1]
+        self.prompts.append(prompt)
+        self.configs.append(config)
+        return {"messages": [HumanMessage(content=prompt), *_step_messages()[1:]]}
+
+
+class TestExecutorSession:
+    """测试 ExecutorSession 类"""
+
+    @pytest.mark.asyncio
+    async def test_later_steps_receive_memory(self):
+        """测试后面的步骤带上前面步骤的记忆，所有步骤共用同一个智能体"""
+        agent = _FakeAgent()
+        session = ExecutorSession(agent, recursion_limit=42)
+
+        first = await session.run_step("实现登录")
+        await session.run_step("实现注册")
+
+        assert first == "已在 src/auth/login.py 中实现手机号登录"
+        assert "之前的步骤" not in agent.prompts[0]
+        assert "实现登录" in agent.prompts[1]
+        assert "docs/login.md:12-30" in agent.prompts[1]
+        assert "完成这个任务：实现注册" in agent.prompts[1]
+        assert agent.configs == [{"recursion_limit": 42}] * 2
@@ -0,0 +1,382 @@
+"""
+测试 job_daemon.py 模块
+"""
+
+import pytest
+import os
+import json
+import asyncio
+import logging
+import urllib.error
+import urllib.request
+
+from job_daemon import (
+    DONE,
+    FAILED,
+    RUNNING,
+    Job,
+    JobDaemon,
+    ProjectLogHandler,
+    read_status,
+    start_http_server,
+    submit_job,
+)
+from run_context import make_context, use_context
+from tracing import span, tracer
+
+
+def _make_todo(root, project):
+    os.makedirs(os.path.join(root, "todo", project), exist_ok=True)
+
+
+class TestJobDaemon:
+    """测试 JobDaemon 类"""
+
+    @pytest.fixture
+    def spool_dir(self, temp_dir, monkeypatch):
+        monkeypatch.chdir(temp_dir)
+        return os.path.join(temp_dir, "spool")
+
+    def _daemon(self, spool_dir, runner, max_concurrency=1):
+        return JobDaemon(spool_dir, runner, max_concurrency=max_concurrency, poll_interval=0.01)
+
+    @pytest.mark.asyncio
+    async def test_jobs_run_by_priority(self, spool_dir, temp_dir):
+        """测试任务按优先级从高到低执行"""
+        order = []
+
+        async def runner(context, count, resume):
+            order.append(context.project_name)
+            return {"response": "pass"}
+
+        for project, priority in (("low", 0), ("high", 9), ("mid", 5)):
+            _make_todo(temp_dir, project)
+            submit_job(spool_dir, {"project": project, "priority": priority})
+
+        daemon = self._daemon(spool_dir, runner)
+        assert daemon.scan() == 3
+        worker = asyncio.create_task(daemon._worker())
+        await daemon.drain()
+        worker.cancel()
+
+        assert order == ["high", "mid", "low"]
+        assert {job["state"] for job in read_status(spool_dir)} == {DONE}
+        assert sorted(os.listdir(spool_dir)) == ["claimed", "status"]
+
+    @pytest.mark.asyncio
+    async def test_concurrency_limit_and_same_project(self, spool_dir, temp_dir):
+        """测试最多同时执行 max_concurrency 个任务，同一项目的任务不并发"""
+        running = []
+        peak = {"all": 0, "shop": 0}
+
+        async def runner(context, count, resume):
+            running.append(context.project_name)
+            peak["all"] = max(peak["all"], len(running))
+            peak["shop"] = max(peak["shop"], running.count("shop"))
+            await asyncio.sleep(0.01)
+            running.remove(context.project_name)
+
+        for project in ("shop", "shop", "blog", "wiki"):
+            _make_todo(temp_dir, project)
+            submit_job(spool_dir, {"project": project})
+
+        daemon = self._daemon(spool_dir, runner, max_concurrency=2)
+        daemon.scan()
+        workers = [asyncio.create_task(daemon._worker()) for _ in range(2)]
+        await daemon.drain()
+        for worker in workers:
+            worker.cancel()
+
+        assert peak == {"all": 2, "shop": 1}
+        assert len(read_status(spool_dir)) == 4
+
+    @pytest.mark.asyncio
+    async def test_failed_job(self, spool_dir, temp_dir):
+        """测试任务失败和需求不存在时记录错误"""
+
+        async def runner(context, count, resume):
+            raise RuntimeError("模型服务不可用")
+
+        _make_todo(temp_dir, "shop")
+        failed = submit_job(spool_dir, {"project": "shop"})
+        missing = submit_job(spool_dir, {"project": "missing"})
+
+        daemon = self._daemon(spool_dir, runner)
+        daemon.scan()
+        worker = asyncio.create_task(daemon._worker())
+        await daemon.drain()
+        worker.cancel()
+
+        assert read_status(spool_dir, failed.id)[0]["error"] == "模型服务不可用"
+        assert read_status(spool_dir, missing.id)[0]["state"] == FAILED
+
+    @pytest.mark.asyncio
+    async def test_requirements_copied_and_overrides(self, spool_dir, temp_dir):
+        """测试需求目录复制到 todo 下，任务的配置覆盖项生效"""
+        received = {}
+
+        async def runner(context, count, resume):
+            received.update(context.config)
+            received["count"] = count
+
+        requirements = os.path.join(temp_dir, "incoming", "shop")
+        os.makedirs(requirements)
+        with open(os.path.join(requirements, "需求.md"), "w", encoding="utf-8") as f:
+            f.write("# 需求")
+
+        submit_job(
+            spool_dir,
+            {
+                "project": "shop",
+                "count": 2,
+                "requirements": requirements,
+                "config": {"RECURSION_LIMIT": 7},
+            },
+        )
+        daemon = self._daemon(spool_dir, runner)
+        daemon.scan()
+        worker = asyncio.create_task(daemon._worker())
+        await daemon.drain()
+        worker.cancel()
+
+        assert os.path.exists(os.path.join(temp_dir, "todo", "shop", "需求.md"))
+        assert received["PROJECT_NAME"] == "shop"
+        assert received["RECURSION_LIMIT"] == 7
+        assert received["count"] == 2
+
+    @pytest.mark.asyncio
+    async def test_requirements_outside_root_rejected(self, spool_dir, temp_dir):
+        """测试需求目录不在 JOB_REQUIREMENTS_ROOT 下时任务失败，不会复制"""
+        outside = os.path.join(temp_dir, "secrets")
+        os.makedirs(outside)
+        with open(os.path.join(outside, "key.txt"), "w", encoding="utf-8") as f:
+            f.write("secret")
+        os.makedirs(os.path.join(temp_dir, "incoming"))
+
+        async def runner(context, count, resume):
+            pass
+
+        job = submit_job(spool_dir, {"project": "shop", "requirements": "../secrets"})
+        daemon = self._daemon(spool_dir, runner)
+        daemon.scan()
+        worker = asyncio.create_task(daemon._worker())
+        await daemon.drain()
+        worker.cancel()
+
+        assert read_status(spool_dir, job.id)[0]["state"] == FAILED
+        assert not os.path.exists(os.path.join(temp_dir, "todo", "shop", "key.txt"))
+
+    @pytest.mark.asyncio
+    async def test_trace_exported_and_released_per_job(self, spool_dir, temp_dir):
+        """测试每个任务结束后导出它的耗时片段并从内存中释放"""
+
+        async def runner(context, count, resume):
+            with span("execute_plan", "node"):
+                await asyncio.sleep(0)
+
+        _make_todo(temp_dir, "shop")
+        job = submit_job(spool_dir, {"project": "shop"})
+        trace_dir = os.path.join(temp_dir, "traces")
+        daemon = JobDaemon(spool_dir, runner, poll_interval=0.01, trace_dir=trace_dir)
+        daemon.scan()
+        worker = asyncio.create_task(daemon._worker())
+        await daemon.drain()
+        worker.cancel()
+
+        with open(os.path.join(trace_dir, f"trace_{job.id}.json"), "r", encoding="utf-8") as f:
+            events = json.load(f)["traceEvents"]
+        assert {event["name"] for event in events} == {"job", "execute_plan"}
+        assert all(span.args.get("job") != job.id for span in tracer._by_id.values())
+
+    def test_recover_running_job_resumes(self, spool_dir, temp_dir):
+        """测试重启后重新排队未完成的任务，正在执行的任务从检查点继续"""
+        job = submit_job(spool_dir, {"project": "shop"})
+        daemon = self._daemon(spool_dir, None)
+        daemon.scan()
+
+        status_path = os.path.join(spool_dir, "status", f"{job.id}.json")
+        with open(status_path, "r", encoding="utf-8") as f:
+            status = json.load(f)
+        status["state"] = RUNNING
+        with open(status_path, "w", encoding="utf-8") as f:
+            json.dump(status, f)
+
+        restarted = self._daemon(spool_dir, None)
+        assert restarted.recover() == 1
+        _, _, recovered = restarted._queue.get_nowait()
+        assert recovered.resume is True
+
+    def test_scan_skips_malformed_jobs(self, spool_dir, temp_dir):
+        """测试格式错误的任务文件不影响领取其他任务"""
+        submit_job(spool_dir, {"project": "shop"})
+        for name, content in (
+            ("a_list.json", []),
+            ("b_priority.json", {"project": "shop", "priority": "high"}),
+            ("c_resume.json", {"project": "shop", "resume": "false"}),
+        ):
+            with open(os.path.join(spool_dir, name), "w", encoding="utf-8") as f:
+                json.dump(content, f)
+
+        daemon = self._daemon(spool_dir, None)
+        assert daemon.scan() == 1
+        assert daemon._queue.qsize() == 1
+
+    def test_recover_skips_corrupt_status(self, spool_dir, temp_dir):
+        """测试损坏的状态文件不影响恢复其他任务"""
+        jobs = [submit_job(spool_dir, {"project": "shop"}) for _ in range(2)]
+        self._daemon(spool_dir, None).scan()
+        with open(
+            os.path.join(spool_dir, "status", f"{jobs[0].id}.json"), "w", encoding="utf-8"
+        ) as f:
+            f.write("{")
+
+        restarted = self._daemon(spool_dir, None)
+        assert restarted.recover() == 1
+        _, _, recovered = restarted._queue.get_nowait()
+        assert recovered.id == jobs[1].id
+
+    @pytest.mark.asyncio
+    async def test_run_until_stopped(self, spool_dir, temp_dir):
+        """测试守护进程持续领取新投递的任务，直到停止"""
+        done = asyncio.Event()
+
+        async def runner(context, count, resume):
+            done.set()
+
+        _make_todo(temp_dir, "shop")
+        stop_event = asyncio.Event()
+        daemon = self._daemon(spool_dir, runner)
+        task = asyncio.create_task(daemon.run(stop_event))
+
+        submit_job(spool_dir, {"project": "shop"})
+        await asyncio.wait_for(done.wait(), timeout=5)
+        stop_event.set()
+        await asyncio.wait_for(task, timeout=5)
+
+
+class TestJob:
+    """测试 Job 类"""
+
+    @pytest.mark.parametrize("project", ["../etc", "shop/../../x", "", "商店"])
+    def test_invalid_project_rejected(self, project):
+        """测试项目名只能包含字母、数字、下划线和连字符"""
+        with pytest.raises(ValueError):
+            Job.from_dict({"project": project})
+
+    @pytest.mark.parametrize(
+        "data",
+        [
+            ["shop"],
+            {"project": "shop", "priority": "high"},
+            {"project": "shop", "count": None},
+            {"project": "shop", "resume": "false"},
+            {"project": "shop", "requirements": ["incoming"]},
+        ],
+    )
+    def test_invalid_fields_rejected(self, data):
+        """测试任务不是对象或字段类型不对时抛出 ValueError"""
+        with pytest.raises(ValueError):
+            Job.from_dict(data)
+
+    def test_numeric_fields_converted(self):
+        """测试数字字段统一转换成数字，保证队列排序可以比较"""
+        job = Job.from_dict({"project": "shop", "priority": "3", "count": 1.0})
+        assert (job.priority, job.count) == (3, 1)
+
+    def test_config_overrides_whitelisted(self):
+        """测试任务不能覆盖可执行文件路径、MOCK 等配置"""
+        assert Job.from_dict({"project": "shop", "config": {"RECURSION_LIMIT": 7}}).config == {
+            "RECURSION_LIMIT": 7
+        }
+        for key in ("CURSOR_PATH", "SIM_CURSOR_PATH", "MOCK"):
+            with pytest.raises(ValueError):
+                Job.from_dict({"project": "shop", "config": {key: "/bin/sh"}})
+
+
+TOKEN = "test-token"
+
+
+class TestHttpServer:
+    """测试本地 HTTP 接口"""
+
+    @pytest.fixture
+    def server(self, temp_dir, monkeypatch):
+        monkeypatch.chdir(temp_dir)
+        server = start_http_server(os.path.join(temp_dir, "spool"), 0, TOKEN)
+        yield server
+        server.shutdown()
+
+    def _request(self, server, path="", payload=None, token=TOKEN, content_type="application/json"):
+        headers = {"Content-Type": content_type}
+        if token:
+            headers["Authorization"] = f"Bearer {token}"
+        request = urllib.request.Request(
+            f"http://127.0.0.1:{server.server_address[1]}/jobs{path}",
+            data=None if payload is None else json.dumps(payload).encode("utf-8"),
+            headers=headers,
+            method="GET" if payload is None else "POST",
+        )
+        try:
+            with urllib.request.urlopen(request) as response:
+                return response.status, json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            return e.code, json.loads(e.read())
+
+    def test_submit_and_query(self, server, temp_dir):
+        """测试通过 HTTP 投递任务并查询状态"""
+        spool_dir = os.path.join(temp_dir, "spool")
+        status, job = self._request(server, payload={"project": "shop", "priority": 3})
+        assert status == 201
+        assert os.path.exists(os.path.join(spool_dir, f"{job['id']}.json"))
+
+        JobDaemon(spool_dir, None).scan()
+        status, queried = self._request(server, f"/{job['id']}")
+        assert queried["priority"] == 3
+
+    def test_token_required(self, server):
+        """测试没有或带错访问令牌的请求被拒绝"""
+        assert self._request(server, payload={"project": "shop"}, token=None)[0] == 401
+        assert self._request(server, payload={"project": "shop"}, token="wrong")[0] == 401
+        assert self._request(server, token=None)[0] == 401
+
+    def test_json_content_type_required(self, server):
+        """测试投递任务只接受 application/json，浏览器跨站的 text/plain 请求被拒绝"""
+        status, _ = self._request(server, payload={"project": "shop"}, content_type="text/plain")
+        assert status == 415
+
+    def test_invalid_jobs_rejected(self, server):
+        """测试非法的项目名、配置覆盖项和需求目录返回 400"""
+        for payload in (
+            {"project": "../shop"},
+            {"project": "shop", "config": {"CURSOR_PATH": "/bin/sh"}},
+            {"project": "shop", "requirements": "/etc"},
+        ):
+            assert self._request(server, payload=payload)[0] == 400
+
+    def test_token_must_be_configured(self, temp_dir):
+        """测试没有配置访问令牌时不启动 HTTP 接口"""
+        with pytest.raises(ValueError):
+            start_http_server(os.path.join(temp_dir, "spool"), 0, "")
+
+
+class TestProjectLogHandler:
+    """测试 ProjectLogHandler 类"""
+
+    def test_logs_written_per_project(self, temp_dir):
+        """测试日志按运行上下文写入各项目的日志文件"""
+        log_dir = os.path.join(temp_dir, "logs")
+        test_logger = logging.getLogger("test_job_daemon")
+        handler = ProjectLogHandler(log_dir)
+        test_logger.addHandler(handler)
+        try:
+            test_logger.warning("无上下文")
+            for project in ("shop", "blog"):
+                with use_context(make_context({}, project)):
+                    test_logger.warning(f"{project}日志")
+        finally:
+            test_logger.removeHandler(handler)
+
+        assert sorted(os.listdir(log_dir)) == ["blog.log", "shop.log"]
+        with open(os.path.join(log_dir, "shop.log"), "r", encoding="utf-8") as f:
+            content = f.read()
+        assert "shop日志" in content and "blog日志" not in content
@@ -0,0 +1,190 @@
+"""
+测试 llm_metrics.py 模块
+"""
+
+import pytest
+import os
+import json
+from typing import Any, List, Optional
+from typing_extensions import TypedDict
+from unittest.mock import patch
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langgraph.graph import StateGraph, START, END
+
+from llm_metrics import LLMMetricsHandler, MetricsRecorder, _node_name
+
+
+class _FakeChatModel(BaseChatModel):
+    """返回固定 token 用量的模型，前 failures 次调用失败"""
+
+    failures: int = 0
+    model_name: str = "qwen-max"
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake"
+
+    def _generate(
+        self, messages: List, stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any
+    ):
+        if self.failures > 0:
+            self.failures -= 1
+            raise RuntimeError("模型服务不可用")
+
+        message = AIMessage(
+            content="ok",
+            usage_metadata={"input_tokens": 1000, "output_tokens": 500, "total_tokens": 1500},
+        )
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    @property
+    def _identifying_params(self):
+        return {"model_name": self.model_name}
+
+
+class _State(TypedDict):
+    value: str
+
+
+@pytest.fixture
+def recorder(temp_dir):
+    return MetricsRecorder(
+        os.path.join(temp_dir, "metrics"), {"qwen-max": {"prompt": 0.002, "completion": 0.006}}
+    )
+
+
+class TestNodeName:
+    """测试 _node_name 函数"""
+
+    def test_node_from_namespace(self):
+        """测试智能体内部的节点归到调用智能体的工作流节点"""
+        metadata = {
+            "langgraph_node": "model",
+            "langgraph_checkpoint_ns": "execute_graph:1|execute_execute:2|model:3",
+        }
+        assert _node_name(metadata) == "execute_execute"
+
+    def test_node_skips_call_index(self):
+        """测试跳过同一节点多次调用智能体时的调用序号"""
+        metadata = {
+            "langgraph_node": "model",
+            "langgraph_checkpoint_ns": "execute_execute:2|1|model:3",
+        }
+        assert _node_name(metadata) == "execute_execute"
+
+    def test_node_unknown(self):
+        """测试不在工作流中的调用"""
+        assert _node_name({}) == "unknown"
+
+
+class TestLLMMetricsHandler:
+    """测试 LLMMetricsHandler 类"""
+
+    @pytest.mark.asyncio
+    async def test_records_call_in_graph_node(self, recorder):
+        """测试记录工作流节点中的调用：节点、模型、token、费用"""
+        model = _FakeChatModel(callbacks=[LLMMetricsHandler(recorder)])
+
+        async def replan(state):
+            await model.ainvoke("hi")
+            return {"value": "done"}
+
+        workflow = StateGraph(_State)
+        workflow.add_node("execute_replan", replan)
+        workflow.add_edge(START, "execute_replan")
+        workflow.add_edge("execute_replan", END)
+        await workflow.compile().ainvoke({"value": ""})
+
+        with open(recorder.jsonl_path, "r", encoding="utf-8") as f:
+            calls = [json.loads(line) for line in f]
+
+        assert len(calls) == 1
+        assert calls[0]["node"] == "execute_replan"
+        assert calls[0]["model"] == "qwen-max"
+        assert (calls[0]["prompt_tokens"], calls[0]["completion_tokens"]) == (1000, 500)
+        assert calls[0]["cost"] == pytest.approx(0.005)
+        assert calls[0]["status"] == "ok"
+
+    def test_retries_counted(self, recorder):
+        """测试失败后重新调用算作重试"""
+        model = _FakeChatModel(failures=2, callbacks=[LLMMetricsHandler(recorder)])
+
+        model.with_retry(stop_after_attempt=3, wait_exponential_jitter=False).invoke("hi")
+
+        summary = recorder.rollup()
+        assert summary[("unknown", "qwen-max")]["calls"] == 3
+        assert summary[("unknown", "qwen-max")]["errors"] == 2
+        assert summary[("unknown", "qwen-max")]["retries"] == 2
+
+    def test_failures_of_abandoned_runs_bounded(self, recorder):
+        """测试最终失败的父运行不会一直占用内存"""
+        handler = LLMMetricsHandler(recorder)
+        with patch("llm_metrics.MAX_TRACKED_FAILURES", 3):
+            for _ in range(5):
+                model = _FakeChatModel(failures=2, callbacks=[handler])
+                with pytest.raises(RuntimeError):
+                    model.with_retry(stop_after_attempt=2, wait_exponential_jitter=False).invoke(
+                        "hi"
+                    )
+
+        assert len(handler._failures) == 3
+        assert handler._runs == {}
+
+
+class TestMetricsRecorder:
+    """测试 MetricsRecorder 类"""
+
+    def test_prometheus_file(self, recorder):
+        """测试写入 Prometheus 文本格式的汇总"""
+        model = _FakeChatModel(callbacks=[LLMMetricsHandler(recorder)])
+        model.invoke("hi")
+        model.invoke("hi")
+
+        with open(recorder.prometheus_path, "r", encoding="utf-8") as f:
+            content = f.read()
+
+        assert "# TYPE llm_calls_total counter" in content
+        assert 'node="unknown",model="qwen-max",status="ok"} 2' in content
+        assert 'llm_prompt_tokens_total{project="' in content
+        assert 'model="qwen-max"} 2000' in content
+        assert "# TYPE llm_latency_seconds histogram" in content
+        assert 'model="qwen-max",le="+Inf"} 2' in content
+
+    def test_only_totals_kept_in_memory(self, recorder):
+        """测试内存中只保留按项目、节点、模型的累计值，不随调用次数增长"""
+        model = _FakeChatModel(callbacks=[LLMMetricsHandler(recorder)])
+        for _ in range(20):
+            model.invoke("hi")
+
+        assert len(recorder._totals) == 1
+        assert recorder.rollup()[("unknown", "qwen-max")]["calls"] == 20
+        with open(recorder.jsonl_path, "r", encoding="utf-8") as f:
+            assert len(f.readlines()) == 20
+
+    def test_http_retries(self, recorder):
+        """测试记录模型客户端内部的 HTTP 重试"""
+        recorder.record_http_retry("qwen-max")
+        recorder.record_http_retry("qwen-max")
+
+        with open(recorder.prometheus_path, "r", encoding="utf-8") as f:
+            content = f.read()
+        assert 'llm_http_retries_total{project="' in content
+        assert 'model="qwen-max"} 2' in content
+
+    def test_rollup_since_run_start(self, recorder):
+        """测试只汇总本次运行的调用"""
+        model = _FakeChatModel(callbacks=[LLMMetricsHandler(recorder)])
+        model.invoke("hi")
+
+        run = recorder.start_run()
+        model.invoke("hi")
+
+        assert recorder.rollup(run)[("unknown", "qwen-max")]["calls"] == 1
+        assert "合计：1 次调用，1500 个 token" in recorder.format_rollup(run)
+        assert recorder.format_rollup(recorder.start_run()) == "本次运行没有 LLM 调用"
+
+        recorder.end_run(run)
+        assert run not in recorder._runs
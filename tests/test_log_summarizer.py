@@ -0,0 +1,108 @@
+"""
+测试 log_summarizer.py 模块
+"""
+
+import pytest
+import os
+import json
+from unittest.mock import AsyncMock
+
+from log_summarizer import summarize_log_incrementally, _checkpoint_path
+
+
+def _append(path, content):
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(content)
+
+
+def _read(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read()
+
+
+class TestSummarizeLogIncrementally:
+    """测试 summarize_log_incrementally 函数"""
+
+    @pytest.fixture
+    def log_path(self, temp_dir):
+        return os.path.join(temp_dir, "development.log")
+
+    @pytest.mark.asyncio
+    async def test_short_log_not_summarized(self, log_path):
+        """测试日志未超过阈值时不调用总结"""
+        _append(log_path, "第一行\n第二行\n")
+        summarize = AsyncMock(return_value="摘要")
+
+        result = await summarize_log_incrementally(log_path, summarize, threshold=100)
+
+        assert result == "第一行\n第二行\n"
+        assert _read(log_path) == "第一行\n第二行\n"
+        summarize.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_long_log_summarized(self, log_path):
+        """测试日志超过阈值时总结并改写日志文件"""
+        _append(log_path, "".join(f"日志{i}\n" for i in range(10)))
+        summarize = AsyncMock(return_value="摘要")
+
+        result = await summarize_log_incrementally(log_path, summarize, threshold=20)
+
+        assert summarize.await_count >= 1
+        assert result.startswith("摘要")
+        assert _read(log_path) == result
+
+    @pytest.mark.asyncio
+    async def test_only_new_lines_summarized(self, log_path):
+        """测试第二次只处理新追加的日志"""
+        _append(log_path, "a" * 30 + "\n")
+        summarize = AsyncMock(return_value="摘要")
+        await summarize_log_incrementally(log_path, summarize, threshold=20)
+
+        _append(log_path, "新增\n")
+        summarize.reset_mock()
+
+        result = await summarize_log_incrementally(log_path, summarize, threshold=20)
+
+        assert result == "摘要\n新增\n"
+        summarize.assert_not_called()
+
+        checkpoint = json.loads(_read(_checkpoint_path(log_path)))
+        assert checkpoint["offset"] == len("摘要\n新增\n".encode("utf-8"))
+
+    @pytest.mark.asyncio
+    async def test_no_new_content(self, log_path):
+        """测试没有新日志时直接返回上次结果"""
+        _append(log_path, "第一行\n")
+        summarize = AsyncMock(return_value="摘要")
+        await summarize_log_incrementally(log_path, summarize, threshold=100)
+
+        result = await summarize_log_incrementally(log_path, summarize, threshold=100)
+
+        assert result == "第一行\n"
+        summarize.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_rewritten_log_resets_checkpoint(self, log_path):
+        """测试日志被外部改写时从头开始"""
+        _append(log_path, "旧内容\n")
+        summarize = AsyncMock(return_value="摘要")
+        await summarize_log_incrementally(log_path, summarize, threshold=100)
+
+        with open(log_path, "w", encoding="utf-8") as f:
+            f.write("全新的内容\n")
+
+        result = await summarize_log_incrementally(log_path, summarize, threshold=100)
+
+        assert result == "全新的内容\n"
+
+    @pytest.mark.asyncio
+    async def test_custom_measure(self, log_path):
+        """测试使用自定义长度函数判断是否需要总结"""
+        _append(log_path, "短\n")
+        summarize = AsyncMock(return_value="摘要")
+
+        await summarize_log_incrementally(
+            log_path, summarize, threshold=10, measure=lambda text: 100
+        )
+
+        summarize.assert_awaited_once()
@@ -0,0 +1,116 @@
+"""
+测试 model_pool.py 模块
+"""
+
+import pytest
+import json
+import httpx
+import asyncio
+from unittest.mock import patch
+
+import model_pool
+from model_pool import get_model
+
+
+@pytest.fixture
+def empty_pool():
+    with patch.object(model_pool, "_models", {}), patch.object(model_pool, "_http_clients", {}):
+        yield
+
+
+class TestGetModel:
+    """测试 get_model 函数"""
+
+    def test_same_key_returns_same_client(self, empty_pool):
+        """测试相同的服务、模型和温度只创建一次客户端"""
+        first = get_model("qwen", "qwen-plus", 0.7)
+
+        assert get_model("qwen", "qwen-plus", 0.7) is first
+        assert get_model("qwen", "qwen-plus", 0.4) is not first
+        assert get_model("qwen", "qwen-plus", 0.7, max_tokens=100) is not first
+        assert len(model_pool._models) == 3
+
+    def test_clients_share_http_pool(self, empty_pool):
+        """测试不同服务的模型客户端共用同一个连接池"""
+        qwen = get_model("qwen", "qwen-max", 0.7)
+        deepseek = get_model("deepseek", "deepseek-chat", 0.4)
+
+        assert qwen.http_async_client is deepseek.http_async_client
+        assert qwen.http_client is deepseek.http_client
+        assert qwen.openai_api_base == model_pool.config["QWEN_API_BASE"]
+        assert deepseek.openai_api_base == model_pool.config["DEEPSEEK_API_BASE"]
+
+    def test_keepalive_from_config(self, empty_pool):
+        """测试空闲连接保留时间和连接数可以配置"""
+        config = {**model_pool.config, "HTTP_KEEPALIVE_EXPIRY": 30, "HTTP_MAX_CONNECTIONS": 4}
+        with patch.object(model_pool, "config", config):
+            limits = model_pool._limits()
+
+        assert limits.keepalive_expiry == 30
+        assert limits.max_connections == 4
+
+    def test_unknown_provider(self, empty_pool):
+        """测试未知的模型服务"""
+        with pytest.raises(ValueError):
+            get_model("openrouter", "gpt", 0.7)
+
+
+class TestRecordRetry:
+    """测试记录 openai 客户端内部的 HTTP 重试"""
+
+    def _request(self, retry_count):
+        return httpx.Request(
+            "POST",
+            "https://example.com/v1/chat/completions",
+            headers={"x-stainless-retry-count": retry_count},
+            content=json.dumps({"model": "qwen-max"}).encode("utf-8"),
+        )
+
+    def test_retry_recorded(self):
+        """测试重试的请求按模型记录，第一次请求不记录"""
+        with patch.object(model_pool.metrics_recorder, "record_http_retry") as mock_record:
+            model_pool._record_retry(self._request("0"))
+            model_pool._record_retry(self._request("2"))
+
+        mock_record.assert_called_once_with("qwen-max")
+
+    def test_hooks_installed(self, empty_pool):
+        """测试共用的 HTTP 客户端安装了记录重试的钩子"""
+        http_client, http_async_client = model_pool._shared_http_clients()
+
+        assert http_client.event_hooks["request"] == [model_pool._record_retry]
+        assert http_async_client.event_hooks["request"] == [model_pool._arecord_retry]
+
+
+class TestLoopLocalTransport:
+    """测试异步客户端按事件循环分别保留连接池"""
+
+    def test_pool_per_event_loop(self, empty_pool):
+        """测试不同事件循环使用不同的连接池，同一事件循环复用连接池"""
+        _, http_async_client = model_pool._shared_http_clients()
+        transport = model_pool._http_clients["async_transport"]
+
+        async def pools():
+            return transport._transport(), transport._transport()
+
+        first, again = asyncio.run(pools())
+        second, _ = asyncio.run(pools())
+
+        assert first is again
+        assert first is not second
+        assert http_async_client._transport is transport
+
+    def test_close_current_loop_pool(self, empty_pool):
+        """测试运行结束时关闭当前事件循环的连接池"""
+        model_pool._shared_http_clients()
+        transport = model_pool._http_clients["async_transport"]
+
+        async def run():
+            pool = transport._transport()
+            await model_pool.close_http_clients()
+            return pool, transport._transport(), len(transport._transports)
+
+        closed, reopened, count = asyncio.run(run())
+
+        assert closed is not reopened
+        assert count == 1
@@ -0,0 +1,210 @@
+"""
+测试 plan_scheduler.py 模块
+"""
+
+import pytest
+import time
+import asyncio
+
+from plan_scheduler import (
+    PROJECT_ROOT,
+    infer_step_paths,
+    build_dependencies,
+    critical_path_length,
+    run_plan,
+)
+
+
+class TestInferStepPaths:
+    """测试 infer_step_paths 函数"""
+
+    def test_infer_file_path(self):
+        """测试识别带目录的文件路径"""
+        paths = infer_step_paths("创建 docs/README.md 说明文档")
+        assert paths == {"docs/README.md"}
+
+    def test_infer_directory_name(self, tmp_path):
+        """测试识别项目目录下已存在的“xx目录”和文件名"""
+        (tmp_path / "src").mkdir()
+        (tmp_path / "main.py").write_text("", encoding="utf-8")
+        paths = infer_step_paths("在src目录下创建main.py文件", str(tmp_path))
+        assert paths == {"src", "main.py"}
+
+    def test_unconfirmed_bare_name_is_not_path(self):
+        """测试项目目录下不存在、又不带目录分隔符的名称不算路径"""
+        paths = infer_step_paths("在src目录下创建main.py文件")
+        assert paths == {PROJECT_ROOT}
+
+    def test_technology_names_are_not_paths(self):
+        """测试 Vue.js、Node.js、TCP/IP、HTTP/2 这类技术名称不算路径"""
+        paths = infer_step_paths("使用 Vue.js 和 Node.js 实现基于 TCP/IP 与 HTTP/2 的通信")
+        assert paths == {PROJECT_ROOT}
+
+    def test_infer_windows_path(self):
+        """测试反斜杠路径被规范化"""
+        paths = infer_step_paths("修改 .\\src\\app\\models.py 中的模型")
+        assert paths == {"src/app/models.py"}
+
+    def test_infer_no_path(self):
+        """测试无法推断路径时视为涉及整个项目"""
+        paths = infer_step_paths("实现用户认证功能")
+        assert paths == {PROJECT_ROOT}
+
+
+class TestBuildDependencies:
+    """测试 build_dependencies 函数"""
+
+    def test_independent_steps(self):
+        """测试涉及不同路径的步骤相互独立"""
+        steps = ["创建 api/user.py", "创建 web/index.html", "创建 docs/guide.md"]
+        assert build_dependencies(steps) == [set(), set(), set()]
+
+    def test_same_path_serialized(self):
+        """测试涉及相同路径的步骤串行"""
+        steps = ["创建 api/user.py", "创建 web/index.html", "修改 api/user.py 添加校验"]
+        assert build_dependencies(steps) == [set(), set(), {0}]
+
+    def test_parent_directory_conflict(self, tmp_path):
+        """测试目录与其下的文件冲突"""
+        (tmp_path / "api").mkdir()
+        steps = ["在api目录下初始化模块", "创建 api/user.py", "创建 web/index.html"]
+        assert build_dependencies(steps, str(tmp_path)) == [set(), {0}, set()]
+
+    def test_same_file_name_conflict(self, tmp_path):
+        """测试只给出文件名时，同名文件视为冲突"""
+        (tmp_path / "main.py").write_text("", encoding="utf-8")
+        steps = ["创建 src/main.py", "修改 main.py 的入口函数", "创建 web/index.html"]
+        assert build_dependencies(steps, str(tmp_path)) == [set(), {0}, set()]
+
+    def test_step_without_path_is_barrier(self):
+        """测试无法推断路径的步骤与其他步骤串行"""
+        steps = ["创建 api/user.py", "运行所有测试", "创建 docs/guide.md"]
+        assert build_dependencies(steps) == [set(), {0}, {1}]
+
+
+class TestCriticalPathLength:
+    """测试 critical_path_length 函数"""
+
+    def test_critical_path_length(self):
+        """测试关键路径长度"""
+        assert critical_path_length([set(), set(), {0}, {2}]) == 3
+
+    def test_critical_path_length_empty(self):
+        """测试空计划"""
+        assert critical_path_length([]) == 0
+
+
+class TestRunPlan:
+    """测试 run_plan 函数"""
+
+    @pytest.mark.asyncio
+    async def test_run_plan_keeps_plan_order(self):
+        """测试结果按计划顺序返回"""
+        steps = ["创建 a/1.py", "创建 b/2.py", "创建 c/3.py"]
+
+        async def run_step(step):
+            await asyncio.sleep(0.01 * (3 - steps.index(step)))
+            return f"完成：{step}"
+
+        result = await run_plan(steps, run_step, max_workers=3)
+
+        assert result == [(step, f"完成：{step}") for step in steps]
+
+    @pytest.mark.asyncio
+    async def test_run_plan_independent_steps_concurrent(self):
+        """测试相互独立的步骤并发执行，耗时接近关键路径长度"""
+        steps = [f"创建 module_{i}/main.py" for i in range(10)]
+
+        async def run_step(step):
+            await asyncio.sleep(0.2)
+            return step
+
+        start = time.monotonic()
+        await run_plan(steps, run_step, max_workers=10)
+
+        assert time.monotonic() - start < 1.0
+
+    @pytest.mark.asyncio
+    async def test_run_plan_respects_dependencies(self):
+        """测试冲突步骤按顺序执行"""
+        steps = ["创建 api/user.py", "创建 web/index.html", "修改 api/user.py"]
+        order = []
+
+        async def run_step(step):
+            order.append(("start", step))
+            await asyncio.sleep(0.05)
+            order.append(("end", step))
+            return step
+
+        await run_plan(steps, run_step, max_workers=3)
+
+        assert order.index(("end", steps[0])) < order.index(("start", steps[2]))
+
+    @pytest.mark.asyncio
+    async def test_run_plan_respects_max_workers(self):
+        """测试同时执行的步骤数不超过上限"""
+        steps = [f"创建 module_{i}/main.py" for i in range(6)]
+        running = 0
+        peak = 0
+
+        async def run_step(step):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.02)
+            running -= 1
+            return step
+
+        await run_plan(steps, run_step, max_workers=2)
+
+        assert peak == 2
+
+    @pytest.mark.asyncio
+    async def test_run_plan_failure_cancels_others(self):
+        """测试某个步骤失败时取消其他步骤并抛出异常"""
+        steps = ["创建 a/1.py", "创建 b/2.py"]
+        cancelled = []
+
+        async def run_step(step):
+            if step == steps[0]:
+                raise RuntimeError("失败")
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.append(step)
+                raise
+
+        with pytest.raises(RuntimeError):
+            await run_plan(steps, run_step, max_workers=2)
+
+        assert cancelled == [steps[1]]
+
+    @pytest.mark.asyncio
+    async def test_run_plan_skips_completed_steps(self):
+        """测试已经完成的步骤不再执行，结果按计划顺序返回，其余步骤完成后逐个回调"""
+        steps = ["创建 api/user.py", "修改 api/user.py", "创建 web/index.html"]
+        executed = []
+        recorded = []
+
+        async def run_step(step):
+            executed.append(step)
+            return f"完成：{step}"
+
+        async def on_step_done(index, result):
+            recorded.append((index, result))
+
+        result = await run_plan(
+            steps,
+            run_step,
+            max_workers=2,
+            completed={0: "上次的结果"},
+            on_step_done=on_step_done,
+        )
+
+        assert result == [
+            (steps[0], "上次的结果"),
+            (steps[1], f"完成：{steps[1]}"),
+            (steps[2], f"完成：{steps[2]}"),
+        ]
+        assert steps[0] not in executed
+        assert sorted(recorded) == [(1, f"完成：{steps[1]}"), (2, f"完成：{steps[2]}")]
@@ -0,0 +1,199 @@
+"""
+测试 requirement_index.py 模块
+"""
+
+import pytest
+import os
+from unittest.mock import patch
+
+from requirement_index import (
+    CHUNK_MAX_LINES,
+    RequirementIndex,
+    format_search_results,
+    get_requirement_index,
+    select_sections,
+    split_sections,
+    tokenize,
+)
+
+
+def _write(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(content)
+
+
+class TestTokenize:
+    """测试 tokenize 函数"""
+
+    def test_tokenize_mixed_text(self):
+        """测试中英文混合文本的分词"""
+        assert tokenize("用户登录 API_v2") == ["用户", "户登", "登录", "api_v2"]
+
+    def test_tokenize_single_cjk_char(self):
+        """测试单个汉字成词"""
+        assert tokenize("表 table") == ["表", "table"]
+
+
+class TestSplitSections:
+    """测试 split_sections 函数"""
+
+    def test_split_by_heading(self):
+        """测试按标题切分"""
+        lines = ["# 概述", "内容", "## 登录", "内容"]
+        assert split_sections(lines) == [(1, 2), (3, 4)]
+
+    def test_split_long_section(self):
+        """测试过长的片段按行切分"""
+        lines = ["内容"] * (CHUNK_MAX_LINES + 5)
+        assert split_sections(lines) == [
+            (1, CHUNK_MAX_LINES),
+            (CHUNK_MAX_LINES + 1, CHUNK_MAX_LINES + 5),
+        ]
+
+
+class TestRequirementIndex:
+    """测试 RequirementIndex 类"""
+
+    @pytest.fixture
+    def todo_dir(self, temp_dir):
+        todo_dir = os.path.join(temp_dir, "todo")
+        _write(
+            os.path.join(todo_dir, "todo.md"),
+            "# 用户登录\n支持手机验证码登录\n\n# 订单管理\n支持订单导出为 Excel\n",
+        )
+        _write(os.path.join(todo_dir, "spec", "todo.md"), "# 接口\n登录接口返回 token\n")
+        return todo_dir
+
+    @pytest.fixture
+    def index(self, todo_dir, temp_dir):
+        index = RequirementIndex(todo_dir, os.path.join(temp_dir, "index", "todo.json"))
+        index.refresh()
+        return index
+
+    def test_search_ranks_relevant_section_first(self, index):
+        """测试检索结果按相关度排序，并给出行号"""
+        results = index.search("验证码登录")
+
+        assert results[0]["file"] == "todo.md"
+        assert (results[0]["start"], results[0]["end"]) == (1, 3)
+        assert all(result["file"] != "todo.md" or result["start"] != 4 for result in results)
+
+    def test_search_english_term(self, index):
+        """测试检索英文词"""
+        results = index.search("excel")
+
+        assert [(result["file"], result["start"]) for result in results] == [("todo.md", 4)]
+
+    def test_refresh_only_changed_files(self, index, todo_dir):
+        """测试只重新索引发生变化的文件"""
+        assert index.refresh() == 0
+
+        _write(os.path.join(todo_dir, "spec", "todo.md"), "# 接口\n支付接口\n")
+        assert index.refresh() == 1
+
+        assert index.search("token") == []
+        assert index.search("支付")[0]["file"] == "spec/todo.md"
+
+    def test_refresh_removed_file(self, index, todo_dir):
+        """测试删除的文件从索引中移除"""
+        os.remove(os.path.join(todo_dir, "spec", "todo.md"))
+        index.refresh()
+
+        assert index.search("token") == []
+        assert index.file_names() == ["todo.md"]
+
+    def test_index_persisted(self, index, todo_dir, temp_dir):
+        """测试索引保存到磁盘，重新加载后无需重新索引"""
+        reloaded = RequirementIndex(todo_dir, index.index_path)
+
+        assert reloaded.refresh() == 0
+        assert reloaded.search("token")[0]["file"] == "spec/todo.md"
+
+    def test_binary_file_not_indexed(self, index, todo_dir):
+        """测试二进制文件不建立索引，但仍出现在文件列表中"""
+        with open(os.path.join(todo_dir, "logo.png"), "wb") as f:
+            f.write(b"\x89PNG\x00\x01")
+        index.refresh()
+
+        assert "logo.png" in index.file_names()
+        assert all(result["file"] != "logo.png" for result in index.search("png"))
+
+    def test_search_in_files(self, index):
+        """测试只在指定文件中检索"""
+        results = index.search("登录", files={"spec/todo.md"})
+
+        assert [result["file"] for result in results] == ["spec/todo.md"]
+
+    def test_get_requirement_index_honors_spanignore(self, temp_dir, monkeypatch):
+        """测试项目索引跳过 .spanignore 中列出的目录和文件"""
+        monkeypatch.chdir(temp_dir)
+        monkeypatch.setattr("requirement_index._indexes", {})
+        with open(".spanignore", "w", encoding="utf-8") as f:
+            f.write("node_modules\n\nnotes.md\n")
+        _write(os.path.join("todo", "demo", "todo.md"), "# 用户登录\n支持手机验证码登录\n")
+        _write(os.path.join("todo", "demo", "node_modules", "pkg", "README.md"), "# 登录\n")
+        _write(os.path.join("todo", "demo", "notes.md"), "# 登录\n")
+
+        index = get_requirement_index("demo")
+
+        assert index.file_names() == ["todo.md"]
+
+    def test_find_files_fuzzy(self, index):
+        """测试按文件名模糊查找"""
+        assert index.find_files("spec/todo.md")[0] == "spec/todo.md"
+        assert index.find_files("spec")[0] == "spec/todo.md"
+        assert index.find_files("payment.xlsx") == []
+
+
+class TestFormatSearchResults:
+    """测试 format_search_results 函数"""
+
+    def test_results_capped(self, temp_dir):
+        """测试结果总长度不超过上限"""
+        todo_dir = os.path.join(temp_dir, "todo")
+        for i in range(5):
+            _write(os.path.join(todo_dir, f"part_{i}.md"), f"# 登录 {i}\n" + "登录说明" * 200)
+
+        index = RequirementIndex(todo_dir, os.path.join(temp_dir, "index.json"))
+        index.refresh()
+
+        with patch("requirement_index.config", {"REQUIREMENT_SEARCH_LIMIT": 5}):
+            result = format_search_results(index, "登录", 1000)
+
+        assert result.startswith("[part_")
+        assert len(result) <= 1000
+
+
+class TestSelectSections:
+    """测试 select_sections 函数"""
+
+    @pytest.fixture
+    def index(self, temp_dir):
+        todo_dir = os.path.join(temp_dir, "todo")
+        _write(
+            os.path.join(todo_dir, "todo.md"),
+            "# 用户登录\n支持手机验证码登录\n"
+            "# 订单管理\n支持订单导出\n"
+            "# 登录日志\n记录每次登录的时间\n",
+        )
+        index = RequirementIndex(todo_dir, os.path.join(temp_dir, "index.json"))
+        index.refresh()
+        return index
+
+    def test_sections_in_document_order(self, index):
+        """测试选出的片段按文件中的顺序拼接，并带行号标记"""
+        result = select_sections(index, "todo.md", "登录", 1000)
+
+        assert result.index("[todo.md:1-2]") < result.index("[todo.md:5-6]")
+        assert "订单" not in result
+
+    def test_budget_keeps_most_relevant(self, index):
+        """测试预算不足时只保留最相关的片段"""
+        result = select_sections(index, "todo.md", "验证码登录", 30)
+
+        assert result == "[todo.md:1-2]\n# 用户登录\n支持手机验证码登录"
+
+    def test_no_relevant_sections(self, index):
+        """测试没有相关片段时返回空字符串"""
+        assert select_sections(index, "todo.md", "支付", 1000) == ""
@@ -0,0 +1,135 @@
+"""
+测试 requirement_ingest.py 模块
+"""
+
+import pytest
+import os
+import json
+from unittest.mock import patch
+
+from requirement_ingest import ingest_requirements
+
+
+def _write(path, content, mode="w"):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, mode, **({} if "b" in mode else {"encoding": "utf-8"})) as f:
+        f.write(content)
+
+
+def _fake_convert(path, pdf_workers=None, todo_dir=None):
+    """模拟转换：在 todo 目录下生成 <文件名>/todo.md"""
+    output_dir = os.path.join(os.path.dirname(path), os.path.basename(path).split(".")[0])
+    _write(os.path.join(output_dir, "todo.md"), f"转换自 {os.path.basename(path)}")
+    return None
+
+
+class TestIngestRequirements:
+    """测试 ingest_requirements 函数"""
+
+    @pytest.fixture
+    def todo_dir(self, temp_dir):
+        todo_dir = os.path.join(temp_dir, "todo")
+        _write(os.path.join(todo_dir, "spec.docx"), b"docx content", "wb")
+        _write(os.path.join(todo_dir, "api.pdf"), b"pdf content", "wb")
+        _write(os.path.join(todo_dir, "readme.md"), "# 需求")
+        return todo_dir
+
+    @pytest.fixture
+    def manifest_path(self, temp_dir):
+        return os.path.join(temp_dir, "cache", "manifest.json")
+
+    def _ingest(self, todo_dir, manifest_path, skip_dirs=None, convert=_fake_convert):
+        with patch("requirement_ingest._convert_document", side_effect=convert) as mock_convert:
+            # 用内置 map 代替进程池，在当前进程中转换，便于统计调用
+            with patch("requirement_ingest.ProcessPoolExecutor") as mock_pool:
+                mock_pool.return_value.__enter__.return_value.map = map
+                unreadable = ingest_requirements(todo_dir, manifest_path, skip_dirs or [])
+
+        converted = sorted(os.path.basename(call.args[0]) for call in mock_convert.call_args_list)
+        return unreadable, converted
+
+    def test_first_ingest_converts_all_documents(self, todo_dir, manifest_path):
+        """测试首次转换所有文档并写入清单"""
+        unreadable, converted = self._ingest(todo_dir, manifest_path)
+
+        assert unreadable == []
+        assert converted == ["api.pdf", "spec.docx"]
+
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        assert manifest["files"]["spec.docx"]["output"] == "spec"
+
+    def test_unchanged_documents_skipped(self, todo_dir, manifest_path):
+        """测试未变化的文档不再转换"""
+        self._ingest(todo_dir, manifest_path)
+        _write(os.path.join(todo_dir, "api.pdf"), b"pdf content v2", "wb")
+
+        _, converted = self._ingest(todo_dir, manifest_path)
+
+        assert converted == ["api.pdf"]
+
+    def test_missing_output_reconverted(self, todo_dir, manifest_path):
+        """测试转换结果被删除后重新转换"""
+        self._ingest(todo_dir, manifest_path)
+        os.remove(os.path.join(todo_dir, "spec", "todo.md"))
+
+        _, converted = self._ingest(todo_dir, manifest_path)
+
+        assert converted == ["spec.docx"]
+
+    def test_duplicate_documents_converted_once(self, todo_dir, manifest_path):
+        """测试内容相同、文件名不同的文档只转换一次"""
+        _write(os.path.join(todo_dir, "copy", "spec_copy.docx"), b"docx content", "wb")
+
+        _, converted = self._ingest(todo_dir, manifest_path)
+
+        assert len(converted) == 2
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        outputs = {
+            manifest["files"]["spec.docx"]["output"],
+            manifest["files"]["copy/spec_copy.docx"]["output"],
+        }
+        assert len(outputs) == 1
+
+    def test_unreadable_files_reported(self, todo_dir, manifest_path):
+        """测试无法解析的文件和转换失败的文档被报告"""
+        _write(os.path.join(todo_dir, "image.bin"), b"\xff\xfe\x00\x80", "wb")
+
+        unreadable, _ = self._ingest(
+            todo_dir, manifest_path, convert=lambda path, pdf_workers, todo_dir: "文件不是pdf文件"
+        )
+
+        names = sorted(os.path.basename(path) for path in unreadable)
+        assert names == ["api.pdf", "image.bin", "spec.docx"]
+
+    def test_unchanged_text_files_not_reread(self, todo_dir, manifest_path):
+        """测试其他文件按大小和修改时间记录在清单中，没有变化时不再重新读取"""
+        _write(os.path.join(todo_dir, "image.bin"), b"\xff\xfe\x00\x80", "wb")
+        self._ingest(todo_dir, manifest_path)
+
+        with patch("requirement_ingest._is_readable_text") as mock_readable:
+            unreadable, _ = self._ingest(todo_dir, manifest_path)
+        assert mock_readable.call_count == 0
+        assert [os.path.basename(path) for path in unreadable] == ["image.bin"]
+
+        _write(os.path.join(todo_dir, "image.bin"), "现在是文本")
+        unreadable, _ = self._ingest(todo_dir, manifest_path)
+        assert unreadable == []
+
+    def test_conversion_outputs_not_checked(self, todo_dir, manifest_path):
+        """测试转换生成的图片等文件不会被当作无法解析的需求文件"""
+        self._ingest(todo_dir, manifest_path)
+        _write(os.path.join(todo_dir, "spec", "img", "logo.png"), b"\x89PNG\xff", "wb")
+
+        unreadable, _ = self._ingest(todo_dir, manifest_path)
+
+        assert unreadable == []
+
+    def test_skip_dirs(self, todo_dir, manifest_path):
+        """测试跳过 .spanignore 中的目录"""
+        _write(os.path.join(todo_dir, "node_modules", "lib.pdf"), b"lib", "wb")
+
+        _, converted = self._ingest(todo_dir, manifest_path, ["node_modules"])
+
+        assert "lib.pdf" not in converted
@@ -8,6 +8,8 @@ import tempfile
 import shutil
 from unittest.mock import patch, MagicMock, mock_open
 
+from token_budget import ContextBudget
+
 
 class TestWriteOpinionFile:
     """测试 write_opinion_file 工具"""
@@ -208,8 +210,13 @@ class TestReadDevelopmentLog:
             f.write(long_content)
 
         with patch("review_tool.config", mock_config), patch(
-            "review_tool.summary_pro"
-        ) as mock_summary, patch("review_tool.os.path.join") as mock_join:
+            "review_tool.summarize", return_value="压缩后的日志"
+        ) as mock_summary, patch(
+            "review_tool.get_budget",
+            return_value=ContextBudget(1000, shares={"development_log": 1.0}, reserved=0),
+        ), patch(
+            "review_tool.os.path.join"
+        ) as mock_join:
 
             def join_side_effect(*args):
                 if "dist" in args and "development_log.md" in args:
@@ -218,16 +225,12 @@ class TestReadDevelopmentLog:
 
             mock_join.side_effect = join_side_effect
 
-            # Mock summary 返回
-            mock_summary_result = MagicMock()
-            mock_summary_result.content = "压缩后的日志"
-            mock_summary.invoke.return_value = mock_summary_result
-
             from review_tool import read_development_log
 
             result = read_development_log()
 
             # 验证压缩功能被调用（如果内容超过阈值）
+            assert mock_summary.called
             assert len(result) > 0
 
 
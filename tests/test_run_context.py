@@ -0,0 +1,90 @@
+"""
+测试 run_context.py 模块
+"""
+
+import pytest
+import os
+import asyncio
+
+from run_context import current_config, get_context, make_context, use_context
+
+
+class TestMakeContext:
+    """测试 make_context 函数"""
+
+    def test_project_overrides(self):
+        """测试项目配置覆盖 config.json 中的配置"""
+        base_config = {
+            "PROJECT_NAME": "default",
+            "RECURSION_LIMIT": 50,
+            "PROJECTS": {"shop": {"RECURSION_LIMIT": 100}},
+        }
+
+        shop = make_context(base_config, "shop")
+        blog = make_context(base_config, "blog")
+
+        assert shop.project_name == "shop"
+        assert shop.config["RECURSION_LIMIT"] == 100
+        assert blog.config["RECURSION_LIMIT"] == 50
+        assert blog.todo_dir == os.path.join(".", "todo", "blog")
+        assert base_config["PROJECT_NAME"] == "default"
+
+
+class TestUseContext:
+    """测试 use_context 和 current_config 函数"""
+
+    def test_fallback_without_context(self):
+        """测试没有运行上下文时使用默认配置"""
+        default = {"PROJECT_NAME": "default"}
+
+        assert get_context() is None
+        assert current_config(default) is default
+
+    def test_context_reset(self):
+        """测试离开 use_context 后恢复原来的上下文"""
+        default = {"PROJECT_NAME": "default"}
+        outer = make_context(default, "outer")
+
+        with use_context(outer):
+            with use_context(make_context(default, "inner")):
+                assert current_config(default)["PROJECT_NAME"] == "inner"
+            assert current_config(default)["PROJECT_NAME"] == "outer"
+
+        assert get_context() is None
+
+    @pytest.mark.asyncio
+    async def test_concurrent_projects_isolated(self):
+        """测试并发执行的项目各自使用自己的上下文，线程中也能读取"""
+        default = {"PROJECT_NAME": "default"}
+
+        async def read_project():
+            return current_config(default)["PROJECT_NAME"]
+
+        async def run(project):
+            with use_context(make_context(default, project)):
+                await asyncio.sleep(0)
+                in_thread = await asyncio.to_thread(lambda: current_config(default))
+                in_task = await asyncio.create_task(read_project())
+                return await read_project(), in_thread["PROJECT_NAME"], in_task
+
+        results = await asyncio.gather(run("shop"), run("blog"))
+
+        assert results == [("shop",) * 3, ("blog",) * 3]
+
+
+class TestToolsUseContext:
+    """测试工具按运行上下文读取当前项目的文件"""
+
+    def test_read_opinion_file(self, temp_dir, monkeypatch):
+        """测试同一进程中不同项目读取各自的审核意见"""
+        from review_tool import read_opinion_file
+
+        monkeypatch.chdir(temp_dir)
+        os.makedirs("opinion")
+        for project in ("shop", "blog"):
+            with open(os.path.join("opinion", f"{project}.md"), "w", encoding="utf-8") as f:
+                f.write(f"{project}的审核意见")
+
+        for project in ("shop", "blog"):
+            with use_context(make_context({}, project)):
+                assert read_opinion_file.invoke({}) == f"{project}的审核意见"
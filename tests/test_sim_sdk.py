@@ -0,0 +1,410 @@
+"""
+测试 sim_sdk/sim_sdk.py 模块
+"""
+
+import pytest
+import os
+import sys
+import io
+import json
+import time
+import socket
+import asyncio
+import statistics
+import subprocess
+from unittest.mock import patch
+
+from sim_sdk import sim_sdk
+from sim_sdk.sim_sdk import (
+    FAULT_MESSAGE,
+    LoadProfile,
+    CursorAgent,
+    SimulatedFailure,
+    acursor_agent,
+    astream_process_files_glob,
+    cursor_agent,
+    load_profile,
+    run,
+    stream_process_files_glob,
+)
+
+SIM_PATH = os.path.join(os.path.dirname(__file__), "..", "sim_sdk", "sim_sdk.py")
+
+
+def _run_cli(*args, env=None):
+    return subprocess.run(
+        [sys.executable, SIM_PATH, *args],
+        capture_output=True,
+        text=True,
+        encoding="utf-8",
+        env={**os.environ, "CURSOR_API_KEY": "test", **(env or {})},
+    )
+
+
+class TestLoadProfile:
+    """测试负载配置"""
+
+    def test_default_profile(self):
+        """测试默认配置固定等待 0.5 秒且总是成功"""
+        profile = LoadProfile()
+        assert profile.draw("任意提示语") == (0.5, "ok")
+
+    def test_invalid_profile(self):
+        """测试无效的负载配置"""
+        with pytest.raises(ValueError):
+            LoadProfile(latency="uniform")
+        with pytest.raises(ValueError):
+            LoadProfile(failure_rate=0.6, garbage_rate=0.6)
+        with pytest.raises(ValueError):
+            LoadProfile(exit_code=0)
+        with pytest.raises(ValueError):
+            LoadProfile(stream_chunk_chars=0)
+        with pytest.raises(ValueError):
+            LoadProfile.from_dict({"latency_p99": 3})
+
+    def test_seed_is_deterministic_per_prompt(self):
+        """测试指定种子时同一提示语的结果固定"""
+        profile = LoadProfile(latency="long-tail", latency_spread=1.0, failure_rate=0.5, seed=1)
+        assert profile.draw("a") == profile.draw("a")
+        draws = {profile.draw(str(i)) for i in range(20)}
+        assert len(draws) > 1
+
+    def test_latency_distributions(self):
+        """测试正态分布和长尾分布的延迟"""
+        normal = LoadProfile(latency="normal", latency_mean=1.0, latency_spread=0.1, seed=0)
+        delays = [normal.draw(str(i))[0] for i in range(500)]
+        assert abs(statistics.mean(delays) - 1.0) < 0.05
+
+        tail = LoadProfile(
+            latency="long-tail", latency_mean=1.0, latency_spread=1.0, latency_max=50, seed=0
+        )
+        delays = sorted(tail.draw(str(i))[0] for i in range(500))
+        assert abs(statistics.median(delays) - 1.0) < 0.2
+        assert delays[-1] > 5
+        assert delays[-1] <= 50
+
+    def test_fault_rates(self):
+        """测试各种故障的比例"""
+        profile = LoadProfile(failure_rate=0.2, timeout_rate=0.1, garbage_rate=0.3, seed=0)
+        outcomes = [profile.draw(str(i))[1] for i in range(2000)]
+        assert abs(outcomes.count("failure") / 2000 - 0.2) < 0.04
+        assert abs(outcomes.count("timeout") / 2000 - 0.1) < 0.04
+        assert abs(outcomes.count("garbage") / 2000 - 0.3) < 0.04
+        assert outcomes.count("truncated") == 0
+
+    def test_load_profile_from_json_and_file(self, temp_dir):
+        """测试从 JSON 字符串和文件加载"""
+        assert load_profile('{"failure_rate": 0.5}').failure_rate == 0.5
+
+        path = os.path.join(temp_dir, "profile.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"latency": "normal", "latency_spread": 0.2}, f)
+        assert load_profile(path).latency == "normal"
+        assert load_profile(None) == LoadProfile()
+
+
+class TestFaultInjection:
+    """测试故障注入"""
+
+    def test_failure(self):
+        """测试注入失败时返回错误和退出码"""
+        with patch.object(
+            sim_sdk, "_profile", LoadProfile(latency_mean=0, failure_rate=1, exit_code=3)
+        ):
+            text = cursor_agent("提示语", print_mode=True, api_key="key")
+            result = cursor_agent("提示语", print_mode=True, output_format="json", api_key="key")
+
+        assert text.startswith(FAULT_MESSAGE)
+        assert result["exit_code"] == 3
+
+    def test_timeout_hangs(self):
+        """测试注入超时时挂起 hang_seconds 秒后失败"""
+        profile = LoadProfile(latency_mean=0, timeout_rate=1, hang_seconds=7)
+        with patch.object(sim_sdk, "_profile", profile), patch("time.sleep") as sleep:
+            with pytest.raises(SimulatedFailure):
+                sim_sdk._simulate_delay("提示语")
+
+        sleep.assert_called_once_with(7)
+
+    def test_truncated_and_garbage_output(self):
+        """测试截断和无法解析的输出"""
+        with patch.object(sim_sdk, "_profile", LoadProfile(latency_mean=0, truncate_rate=1)):
+            result = cursor_agent("提示语", print_mode=True, output_format="json", api_key="key")
+        with pytest.raises(json.JSONDecodeError):
+            json.loads(result)
+
+        with patch.object(sim_sdk, "_profile", LoadProfile(latency_mean=0, garbage_rate=1)):
+            events = list(sim_sdk.stream_analysis("提示语"))
+        assert isinstance(events[-1], str)
+        assert not any(isinstance(e, dict) and e["type"] == "result" for e in events)
+
+
+def _make_files(directory, count):
+    for i in range(count):
+        open(os.path.join(directory, f"file_{i}.js"), "w").close()
+    return os.path.join(directory, "*.js")
+
+
+class TestAsyncApi:
+    """测试异步接口和并发批处理"""
+
+    @pytest.mark.asyncio
+    async def test_acursor_agent_matches_sync(self):
+        """测试异步调用的结果与同步调用相同"""
+        profile = LoadProfile(latency_mean=0)
+        sync = cursor_agent("提示语", print_mode=True, api_key="key", profile=profile)
+        assert (
+            await acursor_agent("提示语", print_mode=True, api_key="key", profile=profile) == sync
+        )
+        assert (await acursor_agent("", output_format="json"))["exit_code"] == 1
+
+    @pytest.mark.asyncio
+    async def test_astream_analysis(self):
+        """测试异步流式分析的事件与同步版本相同"""
+        with patch.object(sim_sdk, "_profile", LoadProfile(latency_mean=0)):
+            events = [event async for event in CursorAgent("key").astream_analysis()]
+
+        assert events[0]["subtype"] == "init"
+        assert events[-1]["type"] == "result"
+        assert len({event["event_id"] for event in events}) == 1
+
+    @pytest.mark.asyncio
+    async def test_abatch_is_concurrent(self, temp_dir):
+        """测试并发批处理的耗时约为文件数除以并发数"""
+        pattern = _make_files(temp_dir, 40)
+        with patch.object(sim_sdk, "_profile", LoadProfile(latency_mean=0.2)):
+            start = asyncio.get_running_loop().time()
+            results = await CursorAgent("key").abatch(pattern, "添加注释", concurrency=20)
+            elapsed = asyncio.get_running_loop().time() - start
+
+        # 结果顺序与匹配的文件相同
+        assert [r["processed_file"] for r in results] == sim_sdk._match_files(pattern)
+        assert all(r["success"] for r in results)
+        assert elapsed < 1.5
+
+    @pytest.mark.asyncio
+    async def test_astream_progress_events(self, temp_dir):
+        """测试每个文件有开始和完成事件，进度按完成顺序递增"""
+        pattern = _make_files(temp_dir, 10)
+        profile = LoadProfile(latency="normal", latency_mean=0.05, latency_spread=0.02, seed=0)
+        events = [
+            event
+            async for event in astream_process_files_glob(pattern, "{file}", 4, profile=profile)
+        ]
+
+        started = [e for e in events if e["status"] == "started"]
+        processed = [e for e in events if e["type"] == "file_processed"]
+        assert len(started) == len(processed) == 10
+        assert [e["progress"] for e in processed] == [f"{i}/10" for i in range(1, 11)]
+        assert {e["event_id"] for e in started} == {e["event_id"] for e in processed}
+
+    def test_sync_stream_with_concurrency(self, temp_dir):
+        """测试同步流式批处理的并发模式和故障事件"""
+        pattern = _make_files(temp_dir, 6)
+        profile = LoadProfile(latency_mean=0, failure_rate=1)
+        events = list(stream_process_files_glob(pattern, "{file}", 3, profile=profile))
+
+        assert len(events) == 12
+        assert all(e["status"] == "failed" for e in events if e["type"] == "file_processed")
+
+    def test_corrupted_output_in_batch(self, temp_dir):
+        """测试批处理中无法解析的输出记为错误"""
+        pattern = _make_files(temp_dir, 2)
+        profile = LoadProfile(latency_mean=0, garbage_rate=1)
+        results = sim_sdk.process_files_glob(pattern, "{file}", 2, api_key="key", profile=profile)
+
+        assert all(r["exit_code"] == 1 and "processed_file" in r for r in results)
+
+
+class TestDeltaStreaming:
+    """测试增量流式输出"""
+
+    def _assistant_events(self, profile, **kwargs):
+        events = list(sim_sdk.stream_analysis("提示语", profile=profile, **kwargs))
+        return [e for e in events if isinstance(e, dict) and e["type"] == "assistant"]
+
+    def test_cumulative_mode_unchanged(self):
+        """测试默认模式每个事件包含全部已输出的文本"""
+        events = self._assistant_events(LoadProfile(latency_mean=0, stream_interval=0))
+
+        assert events[-1]["message"]["content"][0]["text"] == sim_sdk.ANALYSIS_TEXT
+        assert len(events) == len(sim_sdk.ANALYSIS_TEXT)
+        assert not any("subtype" in e for e in events)
+
+    def test_delta_mode(self):
+        """测试增量模式只输出新增的文本，最后输出完整文本，总输出量与文本长度成正比"""
+        profile = LoadProfile(
+            latency_mean=0, stream_interval=0, output_chars=100000, stream_chunk_chars=1000
+        )
+        events = self._assistant_events(profile, delta=True)
+
+        deltas = [e["message"]["content"][0]["text"] for e in events if e["subtype"] == "delta"]
+        complete = [e for e in events if e["subtype"] == "complete"]
+        assert len(deltas) == 100
+        assert len(complete) == 1
+        assert "".join(deltas) == complete[0]["message"]["content"][0]["text"]
+        assert len("".join(deltas)) == 100000
+        assert sum(len(json.dumps(e)) for e in events) < 2 * len(json.dumps(complete[0])) + 50000
+
+    def test_truncated_delta_has_no_complete_event(self):
+        """测试截断时没有完整文本事件"""
+        profile = LoadProfile(latency_mean=0, stream_interval=0, truncate_rate=1)
+        events = self._assistant_events(profile, delta=True)
+
+        assert events
+        assert all(e["subtype"] == "delta" for e in events)
+
+    def test_cli_stream_partial_output(self):
+        """测试命令行 --stream-partial-output 使用增量模式"""
+        result = _run_cli(
+            "-p",
+            "--output-format",
+            "stream-json",
+            "--stream-partial-output",
+            "--latency-mean",
+            "0",
+            "--stream-interval",
+            "0",
+            "--output-chars",
+            "5000",
+            "--stream-chunk-chars",
+            "100",
+            "hi",
+        )
+        events = [json.loads(line) for line in result.stdout.splitlines()]
+        subtypes = [e.get("subtype") for e in events if e["type"] == "assistant"]
+
+        assert result.returncode == 0
+        assert subtypes == ["delta"] * 50 + ["complete"]
+        assert events[-1]["type"] == "result"
+
+
+class TestCommandLine:
+    """测试命令行参数"""
+
+    def test_exit_code_from_flags(self):
+        """测试命令行参数注入失败"""
+        result = _run_cli(
+            "-p", "--latency-mean", "0", "--failure-rate", "1", "--exit-code", "7", "hi"
+        )
+        assert result.returncode == 7
+        assert FAULT_MESSAGE in result.stderr
+
+    def test_profile_from_env(self):
+        """测试环境变量配置负载，命令行参数优先"""
+        env = {"SIM_SDK_PROFILE": '{"latency_mean": 0, "failure_rate": 1, "exit_code": 5}'}
+        assert _run_cli("-p", "hi", env=env).returncode == 5
+        assert _run_cli("-p", "--failure-rate", "0", "hi", env=env).returncode == 0
+
+    def test_invalid_profile(self):
+        """测试无效的负载配置"""
+        result = _run_cli("-p", "--failure-rate", "2", "hi")
+        assert result.returncode == 2
+
+
+def _serve(*args):
+    return subprocess.Popen(
+        [sys.executable, SIM_PATH, "--serve", *args],
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        env={**os.environ, "CURSOR_API_KEY": "test"},
+    )
+
+
+def _request(request_id, *argv, env=None):
+    request = {"id": request_id, "argv": list(argv), "env": env or {}}
+    return (json.dumps(request, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+class TestRun:
+    """测试 run 函数"""
+
+    def test_run_writes_to_streams(self):
+        """测试输出写入给定的流，返回退出码"""
+        out, err = io.StringIO(), io.StringIO()
+        env = {"CURSOR_API_KEY": "key", "SIM_SDK_PROFILE": '{"latency_mean": 0}'}
+        assert run(["-p", "你好"], env=env, stdout=out, stderr=err) == 0
+        assert "代码库" in out.getvalue()
+
+        assert run(["-p", "你好"], env={}, stdout=out, stderr=err) == 1
+        assert "API密钥" in err.getvalue()
+
+    def test_run_invalid_arguments(self):
+        """测试无效的参数返回退出码 2 而不是退出进程"""
+        err = io.StringIO()
+        with patch("sys.stderr", err):
+            assert run(["--output-format", "xml", "hi"], env={}) == 2
+
+
+class TestServe:
+    """测试常驻服务模式"""
+
+    def test_stdin_server(self):
+        """测试标准输入模式：并发请求、环境变量和无效请求"""
+        server = _serve()
+        fast = {"SIM_SDK_PROFILE": '{"latency_mean": 0}'}
+        failing = {"SIM_SDK_PROFILE": '{"latency_mean": 0, "failure_rate": 1, "exit_code": 4}'}
+        payload = (
+            _request(1, "-p", "慢请求")
+            + _request(2, "-p", "快请求", env=fast)
+            + _request(3, "-p", "失败", env=failing)
+            + b"not json\n"
+        )
+        stdout, _ = server.communicate(payload, timeout=30)
+        responses = [json.loads(line) for line in stdout.decode("utf-8").splitlines()]
+
+        assert server.returncode == 0
+        by_id = {response["id"]: response for response in responses}
+        assert by_id[1]["exit_code"] == 0
+        assert "代码库" in by_id[1]["stdout"]
+        assert by_id[3]["exit_code"] == 4
+        assert by_id[None]["exit_code"] == 1
+        # 请求同时执行，快的请求先返回
+        assert [r["id"] for r in responses].index(2) < [r["id"] for r in responses].index(1)
+
+    def test_stream_bounded_workers_and_cancel(self):
+        """测试同时执行的请求数不超过上限，还在排队的请求可以取消"""
+        running = []
+        peak = []
+
+        def fake_run(argv, env=None, stdout=None, stderr=None):
+            running.append(argv)
+            peak.append(len(running))
+            time.sleep(0.1)
+            running.pop()
+            return 0
+
+        lines = [_request(i, "-p", f"请求{i}").decode("utf-8") for i in range(1, 6)]
+        # 读取请求比执行快，读到取消时第 5 个请求还在排队
+        lines.append(json.dumps({"cancel": 5}) + "\n")
+        writer = io.StringIO()
+        with patch.object(sim_sdk, "run", fake_run):
+            sim_sdk._serve_stream(io.StringIO("".join(lines)), writer, max_workers=2)
+
+        responses = [json.loads(line) for line in writer.getvalue().splitlines()]
+        assert sorted(response["id"] for response in responses) == [1, 2, 3, 4]
+        assert max(peak) == 2
+
+    @pytest.mark.skipif(not hasattr(socket, "AF_UNIX"), reason="需要 Unix socket")
+    def test_socket_server(self, temp_dir):
+        """测试 Unix socket 模式"""
+        path = os.path.join(temp_dir, "sim.sock")
+        server = _serve("--socket", path)
+        try:
+            deadline = time.time() + 10
+            while not os.path.exists(path) and time.time() < deadline:
+                time.sleep(0.05)
+
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+                client.connect(path)
+                client.sendall(_request(7, "-p", "--latency-mean", "0", "你好"))
+                with client.makefile("r", encoding="utf-8") as reader:
+                    response = json.loads(reader.readline())
+        finally:
+            server.terminate()
+            server.wait(timeout=10)
+
+        assert response["id"] == 7
+        assert response["exit_code"] == 0
+        assert "代码库" in response["stdout"]
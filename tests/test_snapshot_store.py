@@ -0,0 +1,187 @@
+"""
+测试 snapshot_store.py 模块
+"""
+
+import pytest
+import os
+import shutil
+import threading
+from unittest.mock import patch
+
+from snapshot_store import SnapshotStore, _hash_file
+
+
+def _write(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(content)
+
+
+def _read(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read()
+
+
+class TestSnapshotStore:
+    """测试 SnapshotStore 类"""
+
+    @pytest.fixture
+    def store(self, temp_dir):
+        return SnapshotStore(os.path.join(temp_dir, "store"))
+
+    @pytest.fixture
+    def dist_dir(self, temp_dir):
+        dist_dir = os.path.join(temp_dir, "dist")
+        _write(os.path.join(dist_dir, "main.py"), "print('hello')")
+        _write(os.path.join(dist_dir, "src", "utils.py"), "def f(): pass")
+        os.makedirs(os.path.join(dist_dir, "empty"))
+        return dist_dir
+
+    def test_take_snapshot(self, store, dist_dir):
+        """测试打快照生成清单并按内容存储文件"""
+        manifest = store.take_snapshot("demo", dist_dir, "round_0")
+
+        assert set(manifest["files"]) == {"main.py", "src/utils.py"}
+        assert set(manifest["dirs"]) == {"src", "empty"}
+        assert store.latest_snapshot("demo") == "round_0"
+
+        digest = manifest["files"]["main.py"]["hash"]
+        assert _hash_file(store._object_path(digest)) == digest
+
+    def test_take_snapshot_only_hashes_changed_files(self, store, dist_dir):
+        """测试第二次打快照只读取发生变化的文件"""
+        store.take_snapshot("demo", dist_dir, "round_0")
+        _write(os.path.join(dist_dir, "main.py"), "print('changed')")
+
+        with patch("snapshot_store._hash_file", wraps=_hash_file) as mock_hash:
+            store.take_snapshot("demo", dist_dir, "round_0_step_1")
+
+            hashed = [os.path.relpath(call.args[0], dist_dir) for call in mock_hash.call_args_list]
+            assert hashed == ["main.py"]
+
+        assert store.list_snapshots("demo") == ["round_0", "round_0_step_1"]
+
+    def test_identical_content_stored_once(self, store, dist_dir):
+        """测试相同内容的文件只存储一份"""
+        _write(os.path.join(dist_dir, "copy.py"), "print('hello')")
+        manifest = store.take_snapshot("demo", dist_dir, "round_0")
+
+        assert manifest["files"]["copy.py"]["hash"] == manifest["files"]["main.py"]["hash"]
+        objects = [
+            name
+            for prefix in os.listdir(store.objects_dir)
+            for name in os.listdir(os.path.join(store.objects_dir, prefix))
+        ]
+        assert len(objects) == 2
+
+    def test_restore_snapshot(self, store, dist_dir):
+        """测试回滚修改、新增和删除的文件"""
+        store.take_snapshot("demo", dist_dir, "round_0")
+
+        _write(os.path.join(dist_dir, "main.py"), "broken")
+        _write(os.path.join(dist_dir, "new", "extra.py"), "extra")
+        os.remove(os.path.join(dist_dir, "src", "utils.py"))
+
+        assert store.restore_snapshot("demo", dist_dir)
+
+        assert _read(os.path.join(dist_dir, "main.py")) == "print('hello')"
+        assert _read(os.path.join(dist_dir, "src", "utils.py")) == "def f(): pass"
+        assert not os.path.exists(os.path.join(dist_dir, "new"))
+        assert os.path.isdir(os.path.join(dist_dir, "empty"))
+
+    def test_restore_snapshot_skips_unchanged_files(self, store, dist_dir):
+        """测试回滚时不重写未变化的文件"""
+        store.take_snapshot("demo", dist_dir, "round_0")
+        _write(os.path.join(dist_dir, "main.py"), "broken")
+
+        with patch("snapshot_store.shutil.copyfile", wraps=shutil.copyfile) as mock_copy:
+            store.restore_snapshot("demo", dist_dir)
+
+            assert mock_copy.call_count == 1
+            assert mock_copy.call_args.args[1].endswith("main.py")
+
+    def test_restore_snapshot_not_exists(self, store, dist_dir):
+        """测试没有快照时返回 False"""
+        assert not store.restore_snapshot("demo", dist_dir)
+
+    def test_restored_file_does_not_alias_store(self, store, dist_dir):
+        """测试回滚后修改工作目录不会影响快照内容"""
+        manifest = store.take_snapshot("demo", dist_dir, "round_0")
+        os.remove(os.path.join(dist_dir, "main.py"))
+        store.restore_snapshot("demo", dist_dir)
+
+        _write(os.path.join(dist_dir, "main.py"), "modified")
+
+        digest = manifest["files"]["main.py"]["hash"]
+        assert _read(store._object_path(digest)) == "print('hello')"
+
+    def test_materialize_hard_links(self, store, dist_dir, temp_dir):
+        """测试以硬链接展开快照"""
+        manifest = store.take_snapshot("demo", dist_dir, "round_0")
+        history_dir = os.path.join(temp_dir, "history", "demo")
+
+        assert store.materialize("demo", history_dir)
+
+        digest = manifest["files"]["main.py"]["hash"]
+        assert os.path.samefile(os.path.join(history_dir, "main.py"), store._object_path(digest))
+        assert _read(os.path.join(history_dir, "src", "utils.py")) == "def f(): pass"
+
+    def test_materialize_incremental(self, store, dist_dir, temp_dir):
+        """测试再次展开时只更新变化的文件"""
+        history_dir = os.path.join(temp_dir, "history", "demo")
+        store.take_snapshot("demo", dist_dir, "round_0")
+        store.materialize("demo", history_dir)
+
+        _write(os.path.join(dist_dir, "main.py"), "print('changed')")
+        os.remove(os.path.join(dist_dir, "src", "utils.py"))
+        store.take_snapshot("demo", dist_dir, "round_1")
+
+        with patch("snapshot_store.os.link", wraps=os.link) as mock_link:
+            store.materialize("demo", history_dir)
+            assert mock_link.call_count == 1
+
+        assert _read(os.path.join(history_dir, "main.py")) == "print('changed')"
+        assert not os.path.exists(os.path.join(history_dir, "src", "utils.py"))
+
+    def test_prune(self, store, dist_dir):
+        """测试清理旧快照和不再引用的内容"""
+        store.take_snapshot("demo", dist_dir, "round_0")
+        _write(os.path.join(dist_dir, "main.py"), "print('changed')")
+        manifest = store.take_snapshot("demo", dist_dir, "round_1")
+
+        store.prune("demo", keep=1)
+
+        assert store.list_snapshots("demo") == ["round_1"]
+        objects = {
+            prefix + name
+            for prefix in os.listdir(store.objects_dir)
+            for name in os.listdir(os.path.join(store.objects_dir, prefix))
+        }
+        assert objects == {entry["hash"] for entry in manifest["files"].values()}
+
+    def test_prune_waits_for_snapshot_in_progress(self, store, dist_dir, temp_dir):
+        """测试清理等待其他项目正在进行的快照，不会删除已存入但清单还没写入的内容"""
+        store.take_snapshot("a", dist_dir, "round_0")
+        _write(os.path.join(dist_dir, "main.py"), "print('changed')")
+        store.take_snapshot("a", dist_dir, "round_1")
+
+        other_dir = os.path.join(temp_dir, "other")
+        _write(os.path.join(other_dir, "app.py"), "print('other')")
+
+        store_blob = store._store_blob
+        pruner = threading.Thread(target=store.prune, args=("a", 1))
+
+        def _store_blob_then_prune(path, digest):
+            store_blob(path, digest)
+            pruner.start()
+            pruner.join(timeout=0.2)
+            assert pruner.is_alive()
+
+        with patch.object(store, "_store_blob", side_effect=_store_blob_then_prune):
+            store.take_snapshot("b", other_dir, "round_0")
+        pruner.join()
+
+        assert store.list_snapshots("a") == ["round_1"]
+        shutil.rmtree(other_dir)
+        assert store.restore_snapshot("b", other_dir)
+        assert _read(os.path.join(other_dir, "app.py")) == "print('other')"
@@ -0,0 +1,221 @@
+"""
+测试 summary_service.py 模块
+"""
+
+import pytest
+import os
+import time
+import asyncio
+import threading
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableLambda
+
+from summary_service import SummaryCache, SummaryService, detail_prompt, progress_prompt
+
+
+class _FakeModel:
+    """记录调用次数的假模型"""
+
+    def __init__(self, delay=0.0, error=None, sync_delay=0.0):
+        self.calls = 0
+        self.delay = delay
+        self.error = error
+        self.sync_delay = sync_delay
+
+    def _reply(self, prompt_value):
+        self.calls += 1
+        time.sleep(self.sync_delay)
+        if self.error:
+            raise self.error
+        text = prompt_value.to_messages()[-1].content
+        return AIMessage(content=f"  总结：{text[-10:]}  ")
+
+    async def _areply(self, prompt_value):
+        await asyncio.sleep(self.delay)
+        return self._reply(prompt_value)
+
+    def runnable(self):
+        return RunnableLambda(self._reply, afunc=self._areply)
+
+
+def _service(temp_dir, fake, max_bytes=1024 * 1024):
+    cache = SummaryCache(os.path.join(temp_dir, "cache"), max_bytes)
+    return SummaryService(
+        fake.runnable(), {"detail": detail_prompt, "progress": progress_prompt}, cache
+    )
+
+
+class TestSummaryCache:
+    """测试 SummaryCache 类"""
+
+    def test_put_and_get(self, temp_dir):
+        """测试写入后可以读取，且重新加载后仍然存在"""
+        cache = SummaryCache(os.path.join(temp_dir, "cache"), 1024)
+        cache.put("ab" * 32, "总结内容")
+
+        assert cache.get("ab" * 32) == "总结内容"
+        assert SummaryCache(cache.cache_dir, 1024).get("ab" * 32) == "总结内容"
+
+    def test_get_missing(self, temp_dir):
+        """测试读取不存在的缓存"""
+        cache = SummaryCache(os.path.join(temp_dir, "cache"), 1024)
+        assert cache.get("cd" * 32) is None
+
+    def test_lru_eviction(self, temp_dir):
+        """测试超过大小上限时淘汰最久未使用的缓存"""
+        cache = SummaryCache(os.path.join(temp_dir, "cache"), 25)
+        cache.put("aa" * 32, "x" * 10)
+        cache.put("bb" * 32, "x" * 10)
+        # 访问第一条，使第二条成为最久未使用的缓存
+        cache.get("aa" * 32)
+        cache.put("cc" * 32, "x" * 10)
+
+        assert cache.get("aa" * 32) is not None
+        assert cache.get("bb" * 32) is None
+        assert cache.get("cc" * 32) is not None
+
+
+class TestSummaryService:
+    """测试 SummaryService 类"""
+
+    @pytest.mark.asyncio
+    async def test_asummarize_uses_cache(self, temp_dir):
+        """测试相同内容第二次总结时不再调用模型"""
+        fake = _FakeModel()
+        service = _service(temp_dir, fake)
+
+        first = await service.asummarize("需求内容")
+        second = await service.asummarize("需求内容")
+
+        assert first == second == "总结：需求内容"
+        assert fake.calls == 1
+
+    @pytest.mark.asyncio
+    async def test_cache_shared_across_instances(self, temp_dir):
+        """测试缓存保存在磁盘上，新的服务实例可以复用"""
+        await _service(temp_dir, _FakeModel()).asummarize("需求内容")
+
+        fake = _FakeModel()
+        await _service(temp_dir, fake).asummarize("需求内容")
+
+        assert fake.calls == 0
+
+    @pytest.mark.asyncio
+    async def test_cache_key_depends_on_style(self, temp_dir):
+        """测试不同提示词的总结互不复用"""
+        fake = _FakeModel()
+        service = _service(temp_dir, fake)
+
+        await service.asummarize("开发日志", style="detail")
+        await service.asummarize("开发日志", style="progress")
+
+        assert fake.calls == 2
+
+    @pytest.mark.asyncio
+    async def test_concurrent_requests_collapse(self, temp_dir):
+        """测试同时发起的相同请求只调用一次模型"""
+        fake = _FakeModel(delay=0.05)
+        service = _service(temp_dir, fake)
+
+        results = await asyncio.gather(*[service.asummarize("开发日志") for _ in range(5)])
+
+        assert len(set(results)) == 1
+        assert fake.calls == 1
+
+    @pytest.mark.asyncio
+    async def test_concurrent_requests_collapse_during_cache_read(self, temp_dir):
+        """测试读缓存期间到达的相同请求也只读一次缓存、调用一次模型"""
+        fake = _FakeModel()
+        service = _service(temp_dir, fake)
+        reads = []
+        cache_get = service.cache.get
+
+        def slow_get(key):
+            reads.append(key)
+            time.sleep(0.05)
+            return cache_get(key)
+
+        service.cache.get = slow_get
+
+        results = await asyncio.gather(*[service.asummarize("开发日志") for _ in range(5)])
+        assert len(set(results)) == 1
+        assert fake.calls == 1
+        assert len(reads) == 1
+
+        # 命中缓存时同样由第一个请求取回结果，其他请求等待它
+        reads.clear()
+        results = await asyncio.gather(*[service.asummarize("开发日志") for _ in range(5)])
+        assert results == ["总结：开发日志"] * 5
+        assert fake.calls == 1
+        assert len(reads) == 1
+        assert service._in_flight == {}
+
+    @pytest.mark.asyncio
+    async def test_failure_not_cached(self, temp_dir):
+        """测试模型调用失败时抛出异常且不写入缓存"""
+        fake = _FakeModel(error=RuntimeError("请求失败"))
+        service = _service(temp_dir, fake)
+
+        with pytest.raises(RuntimeError):
+            await service.asummarize("开发日志")
+
+        fake.error = None
+        assert await service.asummarize("开发日志") == "总结：开发日志"
+        assert fake.calls == 2
+
+    def test_summarize_sync(self, temp_dir):
+        """测试同步接口与异步接口共享缓存"""
+        fake = _FakeModel()
+        service = _service(temp_dir, fake)
+
+        assert service.summarize("开发日志") == "总结：开发日志"
+        assert asyncio.run(service.asummarize("开发日志")) == "总结：开发日志"
+        assert fake.calls == 1
+
+    def test_summarize_sync_concurrent_requests_collapse(self, temp_dir):
+        """测试多个线程同时发起相同的同步请求只调用一次模型，之后不留下按 key 的锁"""
+        fake = _FakeModel(sync_delay=0.1)
+        service = _service(temp_dir, fake)
+        results = []
+
+        threads = [
+            threading.Thread(target=lambda: results.append(service.summarize("开发日志")))
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert results == ["总结：开发日志"] * 5
+        assert fake.calls == 1
+        assert service._key_locks == {}
+
+    def test_summarize_sync_failure_releases_lock(self, temp_dir):
+        """测试同步请求失败时抛出异常，且不留下按 key 的锁"""
+        fake = _FakeModel(error=RuntimeError("请求失败"))
+        service = _service(temp_dir, fake)
+
+        with pytest.raises(RuntimeError):
+            service.summarize("开发日志")
+        assert service._key_locks == {}
+
+        fake.error = None
+        assert service.summarize("开发日志") == "总结：开发日志"
+
+    def test_model_factory_called_on_first_use(self, temp_dir):
+        """测试传入创建模型的函数时，第一次总结才创建模型且只创建一次"""
+        fake = _FakeModel()
+        created = []
+
+        def factory():
+            created.append(fake)
+            return fake.runnable()
+
+        cache = SummaryCache(os.path.join(temp_dir, "cache"), 1024 * 1024)
+        service = SummaryService(factory, {"detail": detail_prompt}, cache)
+        assert created == []
+
+        assert service.summarize("开发日志") == "总结：开发日志"
+        assert service.summarize("新的开发日志") == "总结：新的开发日志"
+        assert len(created) == 1
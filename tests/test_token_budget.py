@@ -0,0 +1,89 @@
+"""
+测试 token_budget.py 模块
+"""
+
+import pytest
+from unittest.mock import patch
+
+from token_budget import ContextBudget, count_tokens, get_budget, DEFAULT_CONTEXT_WINDOW
+
+
+class TestCountTokens:
+    """测试 count_tokens 函数"""
+
+    def test_count_tokens_empty(self):
+        """测试空文本"""
+        assert count_tokens("") == 0
+
+    def test_count_tokens_grows_with_text(self):
+        """测试文本越长 token 数越多"""
+        assert count_tokens("实现用户认证功能" * 10) > count_tokens("实现用户认证功能")
+
+    def test_count_tokens_fallback(self):
+        """测试 tiktoken 不可用时按字符估算：中文每字一个 token，其他字符约四个一个 token"""
+        with patch("token_budget._get_encoding", return_value=None):
+            assert count_tokens("用户认证") == 4
+            assert count_tokens("login page") == 3
+            assert count_tokens("用户login") == 4
+
+
+class TestContextBudget:
+    """测试 ContextBudget 类"""
+
+    @pytest.fixture
+    def budget(self):
+        return ContextBudget(
+            11000,
+            shares={"todo": 0.3, "plan": 0.1, "past_steps": 0.3, "project_status": 0.3},
+            reserved=1000,
+            summary_max_length=2000,
+        )
+
+    def test_section_budget(self, budget):
+        """测试各部分预算按比例分配可用上下文"""
+        assert budget.available == 10000
+        assert budget.section_budget("todo") == 3000
+        assert budget.section_budget("plan") == 1000
+        assert budget.section_budget("unknown") == 0
+
+    def test_allocate_within_budget(self, budget):
+        """测试都没有超出预算时，预算等于实际用量"""
+        usage = {"todo": 100, "plan": 100, "past_steps": 100, "project_status": 100}
+        assert budget.allocate(usage) == usage
+
+    def test_allocate_gives_slack_to_over_budget_section(self, budget):
+        """测试没用完的预算让给超出预算的部分"""
+        allocation = budget.allocate(
+            {"todo": 500, "plan": 500, "past_steps": 1000, "project_status": 6000}
+        )
+
+        assert allocation["todo"] == 500
+        assert allocation["project_status"] == 6000
+
+    def test_allocate_splits_slack_by_share(self, budget):
+        """测试多个部分超出预算时按比例分配剩余预算，且不低于各自的份额"""
+        allocation = budget.allocate(
+            {"todo": 20000, "plan": 1000, "past_steps": 20000, "project_status": 20000}
+        )
+
+        assert allocation["plan"] == 1000
+        assert (
+            allocation["todo"] == allocation["past_steps"] == allocation["project_status"] == 3000
+        )
+
+    def test_summary_target(self, budget):
+        """测试总结目标不超过 SUMMARY_MAX_LENGTH"""
+        assert budget.summary_target(5000) == 2000
+        assert budget.summary_target(500) == 500
+
+
+class TestGetBudget:
+    """测试 get_budget 函数"""
+
+    def test_get_budget_known_model(self):
+        """测试已知模型使用对应的上下文窗口"""
+        assert get_budget("qwen-plus").context_window == 131072
+
+    def test_get_budget_unknown_model(self):
+        """测试未知模型使用默认上下文窗口"""
+        assert get_budget("unknown-model").context_window == DEFAULT_CONTEXT_WINDOW
@@ -0,0 +1,187 @@
+"""
+测试 tracing.py 模块
+"""
+
+import pytest
+import os
+import json
+import asyncio
+from unittest.mock import patch
+from typing_extensions import TypedDict
+
+from langgraph.graph import StateGraph, START, END
+
+from tracing import Tracer, span, traced, tracer, export_trace
+
+
+def _spans(start):
+    return {event["name"]: event for event in tracer.chrome_trace(start)["traceEvents"]}
+
+
+class TestSpan:
+    """测试计时片段的嵌套"""
+
+    def test_nested_spans_share_lane(self):
+        """顺序执行的子片段和父片段在同一条泳道上"""
+        start = tracer.start_run()
+        with span("parent"):
+            with span("child_a", "tool"):
+                pass
+            with span("child_b", "tool"):
+                pass
+
+        events = _spans(start)
+        assert events["child_a"]["tid"] == events["parent"]["tid"]
+        assert events["child_b"]["tid"] == events["parent"]["tid"]
+        assert events["child_a"]["cat"] == "tool"
+        assert events["parent"]["ts"] <= events["child_a"]["ts"]
+
+    @pytest.mark.asyncio
+    async def test_concurrent_spans_use_different_lanes(self):
+        """并发的子片段放在不同的泳道上"""
+        start = tracer.start_run()
+
+        async def work(name):
+            with span(name):
+                await asyncio.sleep(0.01)
+
+        with span("parent"):
+            await asyncio.gather(work("a"), work("b"))
+
+        events = _spans(start)
+        assert events["a"]["tid"] != events["b"]["tid"]
+        stacks = tracer.folded_stacks(start)
+        assert any(line.startswith("parent;a ") for line in stacks)
+        assert any(line.startswith("parent;b ") for line in stacks)
+
+    @pytest.mark.asyncio
+    async def test_span_in_thread(self):
+        """asyncio.to_thread 中的片段挂在调用者下面"""
+        start = tracer.start_run()
+
+        def work():
+            with span("in_thread"):
+                pass
+
+        with span("parent"):
+            await asyncio.to_thread(work)
+
+        assert any(line.startswith("parent;in_thread ") for line in tracer.folded_stacks(start))
+
+    def test_error_recorded(self):
+        """抛出异常时记录异常类型"""
+        start = tracer.start_run()
+        with pytest.raises(ValueError):
+            with span("failing"):
+                raise ValueError("失败")
+
+        assert _spans(start)["failing"]["args"]["error"] == "ValueError"
+
+
+class TestTraced:
+    """测试装饰器"""
+
+    @pytest.mark.asyncio
+    async def test_traced_async_and_sync(self):
+        """同步和异步函数都能记录片段，返回值不变"""
+        start = tracer.start_run()
+
+        @traced(category="tool")
+        def add(a, b):
+            return a + b
+
+        @traced("async_add")
+        async def aadd(a, b):
+            return add(a, b)
+
+        assert await aadd(1, 2) == 3
+        assert any(line.startswith("async_add;add ") for line in tracer.folded_stacks(start))
+
+    @pytest.mark.asyncio
+    async def test_traced_graph_nodes(self):
+        """包装后的节点可以加入 LangGraph 的工作流"""
+
+        class State(TypedDict):
+            value: int
+
+        async def first(state: State):
+            await asyncio.sleep(0.001)
+            return {"value": state["value"] + 1}
+
+        def second(state: State):
+            return {"value": state["value"] * 2}
+
+        workflow = StateGraph(State)
+        workflow.add_node("first", traced("first", "node")(first))
+        workflow.add_node("second", traced("second", "node")(second))
+        workflow.add_edge(START, "first")
+        workflow.add_edge("first", "second")
+        workflow.add_edge("second", END)
+        app = workflow.compile()
+
+        start = tracer.start_run()
+        with span("run"):
+            result = await app.ainvoke({"value": 1})
+
+        assert result["value"] == 4
+        stacks = tracer.folded_stacks(start)
+        assert any(line.startswith("run;first ") for line in stacks)
+        assert _spans(start)["second"]["cat"] == "node"
+
+
+class TestExport:
+    """测试导出"""
+
+    def test_export(self, tmp_path):
+        """导出 Chrome trace 和折叠栈文件"""
+        start = tracer.start_run()
+        with span("root"):
+            with span("leaf"):
+                pass
+
+        with patch("tracing.config", {"TRACE_DIR": str(tmp_path)}):
+            chrome_path, folded_path = export_trace(start)
+
+        with open(chrome_path, "r", encoding="utf-8") as f:
+            events = json.load(f)["traceEvents"]
+        assert {event["name"] for event in events} == {"root", "leaf"}
+        assert all(event["ph"] == "X" for event in events)
+
+        with open(folded_path, "r", encoding="utf-8") as f:
+            lines = f.read().splitlines()
+        assert all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
+        assert os.path.dirname(folded_path) == str(tmp_path)
+
+
+class TestRetention:
+    """测试内存中片段的释放和上限"""
+
+    def test_export_and_discard_subtree(self, tmp_path):
+        """只导出和释放一个片段及其后代，不影响并发的其他片段"""
+        with span("other"):
+            with span("job") as job_span:
+                with span("step"):
+                    pass
+            with span("sibling"):
+                pass
+
+        chrome_path, _ = tracer.export(str(tmp_path), root=job_span.id, name="trace_job")
+        with open(chrome_path, "r", encoding="utf-8") as f:
+            assert {event["name"] for event in json.load(f)["traceEvents"]} == {"job", "step"}
+        assert os.path.basename(chrome_path) == "trace_job.json"
+
+        tracer.discard(job_span.id)
+        remaining = {span.name for span in tracer._by_id.values()}
+        assert "step" not in remaining
+        assert {"other", "sibling"} <= remaining
+
+    def test_max_spans(self):
+        """超出上限时丢弃最早结束的片段，未结束的片段保留"""
+        local = Tracer(max_spans=10)
+        running = local.start("running", "function")
+        for index in range(50):
+            local.finish(local.start(f"span_{index}", "function"))
+
+        assert len(local._by_id) <= 10
+        assert running.id in local._by_id
+        assert local._by_id[max(local._by_id)].name == "span_49"
@@ -0,0 +1,136 @@
+from functools import lru_cache
+from typing import Dict, Optional
+
+import re
+import json
+import logging
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    handlers=[logging.StreamHandler()],
+)
+logger = logging.getLogger(__name__)
+
+config = json.load(open("./config.json", "r", encoding="utf-8"))
+
+# 各模型的上下文窗口（token），可以通过配置 MODEL_CONTEXT_WINDOWS 覆盖或补充
+MODEL_CONTEXT_WINDOWS = {
+    "qwen-max": 32768,
+    "qwen-plus": 131072,
+    "deepseek-chat": 65536,
+}
+
+DEFAULT_CONTEXT_WINDOW = 32768
+
+# 为系统提示词和模型输出预留的 token
+RESERVED_TOKENS = 4096
+
+# 各部分内容占可用上下文的比例，可以通过配置 CONTEXT_BUDGET_SHARES 覆盖
+SECTION_SHARES = {
+    "todo": 0.3,
+    "plan": 0.1,
+    "past_steps": 0.25,
+    "project_status": 0.2,
+    "development_log": 0.25,
+}
+
+# 中日韩文字和全角标点，tiktoken 不可用时按每个字符一个 token 估算
+_CJK_PATTERN = re.compile(r"[\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uff00-\uffef]")
+
+
+@lru_cache(maxsize=1)
+def _get_encoding():
+    try:
+        import tiktoken
+
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        logger.warning(f"加载 tiktoken 编码失败，将按字符估算 token 数: {e}")
+        return None
+
+
+def count_tokens(text: str) -> int:
+    """
+    计算文本的 token 数
+
+    使用 tiktoken 的 cl100k_base 编码；不同模型的分词器略有差异，这里只需要一个稳定的近似值。
+    """
+    if not text:
+        return 0
+
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+
+    cjk = len(_CJK_PATTERN.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+class ContextBudget:
+    """
+    按模型上下文窗口分配各部分内容的 token 预算
+
+    每个部分的预算为可用上下文按比例分配的份额；
+    allocate 会把没用完的份额让给超出预算的部分，尽量少压缩内容。
+    """
+
+    def __init__(
+        self,
+        context_window: int,
+        shares: Optional[Dict[str, float]] = None,
+        reserved: int = RESERVED_TOKENS,
+        summary_max_length: Optional[int] = None,
+    ):
+        self.context_window = context_window
+        self.shares = shares or SECTION_SHARES
+        self.available = max(context_window - reserved, 0)
+        self.summary_max_length = summary_max_length
+
+    def section_budget(self, section: str) -> int:
+        """返回某部分内容的 token 预算"""
+        return int(self.available * self.shares.get(section, 0))
+
+    def over_budget(self, text: str, section: str) -> bool:
+        return count_tokens(text) > self.section_budget(section)
+
+    def allocate(self, usage: Dict[str, int]) -> Dict[str, int]:
+        """
+        根据各部分实际的 token 数分配预算
+
+        Args:
+            usage: 部分名称 -> 实际 token 数
+
+        Returns:
+            部分名称 -> 预算。未超出份额的部分预算等于实际用量，剩余的 token 按份额比例分给超出的部分
+        """
+        budgets = {section: self.section_budget(section) for section in usage}
+        over = {section for section, tokens in usage.items() if tokens > budgets[section]}
+        slack = self.available - sum(
+            tokens for section, tokens in usage.items() if section not in over
+        )
+
+        allocation = {section: tokens for section, tokens in usage.items() if section not in over}
+        total_share = sum(self.shares.get(section, 0) for section in over)
+        for section in over:
+            share = self.shares.get(section, 0) / total_share if total_share else 1 / len(over)
+            allocation[section] = max(budgets[section], min(usage[section], int(slack * share)))
+
+        return allocation
+
+    def summary_target(self, budget: int) -> int:
+        """总结内容时的目标 token 数，不超过预算和 SUMMARY_MAX_LENGTH"""
+        if self.summary_max_length is not None:
+            budget = min(budget, self.summary_max_length)
+        return max(budget, 1)
+
+
+@lru_cache(maxsize=None)
+def get_budget(model_name: str) -> ContextBudget:
+    """返回指定模型的上下文预算"""
+    windows = {**MODEL_CONTEXT_WINDOWS, **config.get("MODEL_CONTEXT_WINDOWS", {})}
+    return ContextBudget(
+        windows.get(model_name, DEFAULT_CONTEXT_WINDOW),
+        shares={**SECTION_SHARES, **config.get("CONTEXT_BUDGET_SHARES", {})},
+        summary_max_length=config.get("SUMMARY_MAX_LENGTH"),
+    )
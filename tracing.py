@@ -0,0 +1,270 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import os
+import json
+import time
+import inspect
+import logging
+import functools
+import threading
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    handlers=[logging.StreamHandler()],
+)
+logger = logging.getLogger(__name__)
+
+config = json.load(open("./config.json", "r", encoding="utf-8"))
+
+TRACE_DIR = "./traces"
+
+# 内存中最多保留的片段数，超出时丢弃最早结束的片段
+TRACE_MAX_SPANS = 100000
+
+
+@dataclass
+class Span:
+    """一段计时，start 和 end 为微秒"""
+
+    id: int
+    parent_id: Optional[int]
+    name: str
+    category: str
+    lane: int
+    start: int
+    end: Optional[int] = None
+    args: Dict = field(default_factory=dict)
+
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+def _now_us() -> int:
+    return time.perf_counter_ns() // 1000
+
+
+class Tracer:
+    """
+    收集嵌套的计时片段
+
+    父片段取自 contextvars，所以片段在图的节点、工具、asyncio 任务和线程之间都能正确嵌套。
+    Chrome trace 要求同一条泳道上的片段严格嵌套：子片段优先放在父片段的泳道上，
+    父片段的泳道上已经有其他子片段在执行（并发）时，放到新的泳道上。
+
+    片段保存在内存中，最多保留 max_spans 个；常驻进程可以在导出一段片段后用 discard 释放。
+    """
+
+    def __init__(self, max_spans: int = TRACE_MAX_SPANS):
+        self.max_spans = max_spans
+        # 片段编号 -> 片段，按编号（开始的先后）排列
+        self._by_id: Dict[int, Span] = {}
+        self._next_id = 0
+        # 每条泳道上最内层未结束的片段，None 表示泳道空闲
+        self._lane_top: Dict[int, Optional[int]] = {}
+        self._lock = threading.Lock()
+
+    def _allocate_lane(self, parent: Optional[Span]) -> int:
+        if parent is not None and self._lane_top.get(parent.lane) == parent.id:
+            return parent.lane
+
+        for lane, top in sorted(self._lane_top.items()):
+            if top is None:
+                return lane
+
+        return len(self._lane_top)
+
+    def start(self, name: str, category: str, args: Optional[Dict] = None) -> Span:
+        parent = _current_span.get()
+        with self._lock:
+            span = Span(
+                id=self._next_id,
+                parent_id=parent.id if parent is not None else None,
+                name=name.replace(";", ","),
+                category=category,
+                lane=self._allocate_lane(parent),
+                start=_now_us(),
+                args=dict(args or {}),
+            )
+            self._next_id += 1
+            self._by_id[span.id] = span
+            self._lane_top[span.lane] = span.id
+            if len(self._by_id) > self.max_spans:
+                self._evict()
+
+        return span
+
+    def _evict(self) -> None:
+        """丢弃最早结束的片段，一次腾出十分之一的空间，未结束的片段保留"""
+        target = self.max_spans - max(1, self.max_spans // 10)
+        excess = len(self._by_id) - target
+        evicted = [span_id for span_id, span in self._by_id.items() if span.end is not None]
+        for span_id in evicted[:excess]:
+            del self._by_id[span_id]
+        logger.warning(
+            f"耗时片段超过{self.max_spans}个，丢弃了最早结束的{min(excess, len(evicted))}个"
+        )
+
+    def finish(self, span: Span) -> None:
+        with self._lock:
+            span.end = _now_us()
+            parent = self._by_id.get(span.parent_id) if span.parent_id is not None else None
+            if self._lane_top.get(span.lane) == span.id:
+                self._lane_top[span.lane] = (
+                    parent.id if parent is not None and parent.lane == span.lane else None
+                )
+
+    def start_run(self) -> int:
+        """返回下一个片段的编号，用于导出这次运行的片段"""
+        with self._lock:
+            return self._next_id
+
+    def _subtree(self, root: int) -> List[Span]:
+        """root 和它的所有后代片段，子片段总在父片段之后开始，按编号顺序一次遍历即可"""
+        ids = {root}
+        spans = []
+        for span in self._by_id.values():
+            if span.id == root or span.parent_id in ids:
+                ids.add(span.id)
+                spans.append(span)
+
+        return spans
+
+    def _finished(self, start: int, root: Optional[int] = None) -> List[Span]:
+        with self._lock:
+            spans = self._subtree(root) if root is not None else self._by_id.values()
+            return [span for span in spans if span.id >= start and span.end is not None]
+
+    def discard(self, root: int) -> None:
+        """释放 root 和它已经结束的所有后代片段，例如任务守护进程导出一个任务的片段之后"""
+        with self._lock:
+            for span in self._subtree(root):
+                if span.end is not None:
+                    del self._by_id[span.id]
+
+    def chrome_trace(self, start: int = 0, root: Optional[int] = None) -> Dict:
+        """Chrome trace 格式（chrome://tracing、Perfetto 可以打开）"""
+        events = [
+            {
+                "name": span.name,
+                "cat": span.category,
+                "ph": "X",
+                "ts": span.start,
+                "dur": span.end - span.start,
+                "pid": os.getpid(),
+                "tid": span.lane,
+                "args": span.args,
+            }
+            for span in self._finished(start, root)
+        ]
+
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def folded_stacks(self, start: int = 0, root: Optional[int] = None) -> List[str]:
+        """
+        折叠栈格式（flamegraph.pl、speedscope 可以打开）
+
+        每行是“根;...;片段 自身耗时（微秒）”，自身耗时为片段耗时减去子片段耗时。
+        """
+        spans = self._finished(start, root)
+        by_id = {span.id: span for span in spans}
+        child_time: Dict[int, int] = {}
+        for span in spans:
+            if span.parent_id in by_id:
+                child_time[span.parent_id] = (
+                    child_time.get(span.parent_id, 0) + span.end - span.start
+                )
+
+        weights: Dict[str, int] = {}
+        for span in spans:
+            names = []
+            current: Optional[Span] = span
+            while current is not None:
+                names.append(current.name)
+                current = by_id.get(current.parent_id)
+            stack = ";".join(reversed(names))
+            # 并发的子片段耗时之和可能超过父片段
+            self_time = max(0, span.end - span.start - child_time.get(span.id, 0))
+            weights[stack] = weights.get(stack, 0) + self_time
+
+        return [f"{stack} {weight}" for stack, weight in weights.items()]
+
+    def export(
+        self,
+        trace_dir: str,
+        start: int = 0,
+        root: Optional[int] = None,
+        name: Optional[str] = None,
+    ) -> Tuple[str, str]:
+        """
+        把这次运行的片段写入 Chrome trace 文件和折叠栈文件
+
+        Args:
+            trace_dir: 输出目录
+            start: 只导出编号不小于 start 的片段，见 start_run
+            root: 只导出这个片段和它的后代
+            name: 文件名（不含扩展名），默认按时间命名
+        """
+        os.makedirs(trace_dir, exist_ok=True)
+        name = name or time.strftime("trace_%Y%m%d_%H%M%S")
+        chrome_path = os.path.join(trace_dir, f"{name}.json")
+        folded_path = os.path.join(trace_dir, f"{name}.folded")
+
+        with open(chrome_path, "w", encoding="utf-8") as f:
+            json.dump(self.chrome_trace(start, root), f, ensure_ascii=False)
+        with open(folded_path, "w", encoding="utf-8") as f:
+            f.write("\n".join(self.folded_stacks(start, root)) + "\n")
+
+        return chrome_path, folded_path
+
+
+tracer = Tracer(config.get("TRACE_MAX_SPANS", TRACE_MAX_SPANS))
+
+
+@contextmanager
+def span(name: str, category: str = "function", **args) -> Iterator[Span]:
+    """记录一段计时，可以在 with 块中往 span.args 里补充信息"""
+    current = tracer.start(name, category, args)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.args["error"] = type(e).__name__
+        raise
+    finally:
+        _current_span.reset(token)
+        tracer.finish(current)
+
+
+def traced(name: Optional[str] = None, category: str = "function"):
+    """给同步或异步函数加上计时片段，保留函数签名和文档，可以放在 @tool 下面"""
+
+    def decorator(func):
+        span_name = name or func.__name__
+
+        if inspect.iscoroutinefunction(func):
+
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with span(span_name, category):
+                    return await func(*args, **kwargs)
+
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(span_name, category):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def export_trace(
+    start: int = 0, root: Optional[int] = None, name: Optional[str] = None
+) -> Tuple[str, str]:
+    return tracer.export(config.get("TRACE_DIR", TRACE_DIR), start, root, name)